@@ -36,6 +36,9 @@ def main():
     # Every day at scheduled time run the compactor
     if compactor.enabled:
         schedule.every().day.at(config.compactor["scheduled_time"]).do(compactor.run)
+        # Every index frequency add the current revision to the time to revision index used by the clients
+        if compactor.index_path:
+            schedule.every(compactor.index_frequency).minutes.do(compactor.update_index)
 
     # Every day at scheduled time run the cleaner
     if cleaner.enabled:
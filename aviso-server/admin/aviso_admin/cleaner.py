@@ -15,6 +15,7 @@ from . import logger
 from .utils import decode_to_bytes, encode_to_str_base64, incr_last_byte
 
 DATE_FORMAT = "%Y%m%d"
+MAX_KV_RETURNED = 10000
 
 
 class Cleaner:
@@ -41,23 +42,40 @@ class Cleaner:
         key = os.path.join(self.dest_path, date_s)
         encoded_key = encode_to_str_base64(key)
         encoded_end_key = encode_to_str_base64(str(incr_last_byte(key), "utf-8"))
-        body = {"key": encoded_key, "range_end": encoded_end_key, "keys_only": True}
-        # make the call
-        resp = requests.post(url, json=body, timeout=self.req_timeout)
-        assert resp.status_code == 200, (
-            f"Not able to request destinations for {date_s}, status {resp.status_code}, "
-            f"{resp.reason}, {resp.content.decode()}"
-        )
-        logger.debug("Query for destinations completed")
-        resp_body = resp.json()
-
-        # read the body and extract the destinations
+        # read the destinations a page at the time, the keys are sorted in descending order so each page ends where the
+        # previous one has stopped
         destinations = []
-        if "kvs" in resp_body:
-            for kv in resp_body["kvs"]:
+        revision = None
+        more = True
+        while more:
+            body = {
+                "key": encoded_key,
+                "range_end": encoded_end_key,
+                "keys_only": True,
+                "limit": MAX_KV_RETURNED,
+                "sort_order": "DESCEND",
+                "sort_target": "KEY",
+                "revision": revision,
+            }
+            # make the call
+            resp = requests.post(url, json=body, timeout=self.req_timeout)
+            assert resp.status_code == 200, (
+                f"Not able to request destinations for {date_s}, status {resp.status_code}, "
+                f"{resp.reason}, {resp.content.decode()}"
+            )
+            resp_body = resp.json()
+
+            # read the body and extract the destinations
+            kvs = resp_body.get("kvs", [])
+            for kv in kvs:
                 k = decode_to_bytes(kv["key"]).decode()
                 destinations.append(k.replace(key + "/", ""))
-
+            more = resp_body.get("more", False) and len(kvs) > 0
+            if more:
+                # next page at the same revision
+                encoded_end_key = kvs[-1]["key"]
+                revision = resp_body["header"]["revision"]
+        logger.debug("Query for destinations completed")
         logger.debug(f"Number of destinations retrieved: {len(destinations)}")
         return destinations
 
@@ -23,6 +23,8 @@ class Compactor:
         self.url = config["url"]
         self.req_timeout = config["req_timeout"]
         self.history_path = config["history_path"]
+        self.index_path = config.get("index_path")
+        self.index_frequency = config.get("index_frequency")
         self.retention_period = config["retention_period"]
         self.enabled = config["enabled"]
 
@@ -58,32 +60,46 @@ class Compactor:
         """
         :return: the history saved on the server
         """
-        logger.debug("Getting the history...")
+        return self._get_revisions(self.history_path, "history")
+
+    def get_index(self):
+        """
+        :return: the time to revision index saved on the server
+        """
+        return self._get_revisions(self.index_path, "index")
+
+    def _get_revisions(self, path, name):
+        """
+        :param path: key where the revisions are saved
+        :param name: name of the revisions for the logging
+        :return: the list of revisions, with their timestamp, saved on the server
+        """
+        logger.debug(f"Getting the {name}...")
 
         url = self.url + "/v3/kv/range"
 
         body = {
-            "key": encode_to_str_base64(self.history_path),
+            "key": encode_to_str_base64(path),
         }
         # make the call
         resp = requests.post(url, json=body, timeout=self.req_timeout)
         assert resp.status_code == 200, (
-            f"Not able to request history, status {resp.status_code}, " f"{resp.reason}, {resp.content.decode()}"
+            f"Not able to request {name}, status {resp.status_code}, " f"{resp.reason}, {resp.content.decode()}"
         )
-        logger.debug("Query for current history completed")
+        logger.debug(f"Query for current {name} completed")
 
         # decode the value and load it as yaml
         resp_body = resp.json()
         if "kvs" in resp_body:
-            assert len(resp_body["kvs"]) == 1, f"Retrieved more than a key on history path, {resp_body['kvs']}"
+            assert len(resp_body["kvs"]) == 1, f"Retrieved more than a key on {name} path, {resp_body['kvs']}"
             kv = resp_body["kvs"][0]
-            history_s = decode_to_bytes(kv["value"]).decode()
-            history = json.loads(history_s)
-            logger.debug(f"Current history retrieved {history}")
+            revisions_s = decode_to_bytes(kv["value"]).decode()
+            revisions = json.loads(revisions_s)
+            logger.debug(f"Current {name} retrieved {revisions}")
         else:
-            logger.debug("No history found")
-            history = []
-        return history
+            logger.debug(f"No {name} found")
+            revisions = []
+        return revisions
 
     def save_history(self, history):
         """
@@ -91,18 +107,36 @@ class Compactor:
         :param history:
         :return: True if successful
         """
-        logger.debug("Saving the history...")
+        return self._save_revisions(self.history_path, history, "history")
+
+    def save_index(self, index):
+        """
+        Save the time to revision index to the server
+        :param index:
+        :return: True if successful
+        """
+        return self._save_revisions(self.index_path, index, "index")
+
+    def _save_revisions(self, path, revisions, name):
+        """
+        Save a list of revisions to the server
+        :param path: key where the revisions are saved
+        :param revisions: list of revisions with their timestamp
+        :param name: name of the revisions for the logging
+        :return: True if successful
+        """
+        logger.debug(f"Saving the {name}...")
 
         url = self.url + "/v3/kv/put"
-        history_s = json.dumps(history)
+        revisions_s = json.dumps(revisions)
 
-        body = {"key": encode_to_str_base64(self.history_path), "value": encode_to_str_base64(history_s)}
+        body = {"key": encode_to_str_base64(path), "value": encode_to_str_base64(revisions_s)}
         # make the call
         resp = requests.post(url, json=body, timeout=self.req_timeout)
         assert resp.status_code == 200, (
-            f"Not able to save history, status {resp.status_code}, " f"{resp.reason}, {resp.content.decode()}"
+            f"Not able to save {name}, status {resp.status_code}, " f"{resp.reason}, {resp.content.decode()}"
         )
-        logger.debug("Saving history completed")
+        logger.debug(f"Saving {name} completed")
 
         # check the save was successful
         resp_body = resp.json()
@@ -168,6 +202,40 @@ class Compactor:
             new_old_rev = new_old_rev["revision"]
         return new_old_rev
 
+    def update_index(self, date: datetime = None):
+        """
+        Add the current server revision to the time to revision index. This runs more often than the compactor so that
+        the clients can find the revision of a date with a binary search instead of walking back the status history
+        :param date: date associated to the current revision, now if None
+        :return: True if successful
+        """
+        logger.debug("Updating the index...")
+        if date is None:
+            date = datetime.datetime.utcnow()
+
+        # check the current server revision
+        curr_rev = self.get_current_server_rev()
+
+        # append the new entry, the index is therefore sorted by revision and timestamp
+        index = self.get_index()
+        index.append({"revision": curr_rev, "timestamp": date.strftime(DATE_FORMAT)})
+        self.save_index(index)
+        logger.debug(f"Revision {curr_rev} added to the index at date {date}")
+        return True
+
+    def clean_index(self, compacted_rev):
+        """
+        Clean the index from the revisions no longer available on the server
+        :param compacted_rev: revision the server has been compacted to
+        :return: True if successful
+        """
+        logger.debug(f"Removing from the index revisions older than {compacted_rev}")
+        index = self.get_index()
+        new_index = [i for i in index if i["revision"] >= compacted_rev]
+        if len(new_index) < len(index):
+            self.save_index(new_index)
+        return True
+
     def compact(self, rev):
         """
         Compact the server to the revision passed
@@ -245,6 +313,8 @@ class Compactor:
             # compact revision
             self.compact(old_rev)
             logger.info(f"Server compacted at revision {old_rev}")
+            if self.index_path:
+                self.clean_index(old_rev)
 
         logger.debug("Compactor execution completed.")
         return True
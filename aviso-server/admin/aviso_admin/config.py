@@ -72,6 +72,8 @@ class Config:
             "url": "http://localhost:2379",
             "req_timeout": 120,  # seconds
             "history_path": "/ec/admin/history",
+            "index_path": "/ec/admin/index",
+            "index_frequency": 60,  # minutes
             "retention_period": 16,  # days
             "scheduled_time": "00:00",
             "enabled": True,
@@ -155,6 +157,8 @@ class Config:
             config["compactor"]["scheduled_time"] = os.environ["AVISO_ADMIN_COMPACTOR_SCHEDULED_TIME"]
         if "AVISO_ADMIN_COMPACTOR_ENABLED" in os.environ:
             config["compactor"]["enabled"] = os.environ["AVISO_ADMIN_COMPACTOR_ENABLED"]
+        if "AVISO_ADMIN_COMPACTOR_INDEX_FREQUENCY" in os.environ:
+            config["compactor"]["index_frequency"] = int(os.environ["AVISO_ADMIN_COMPACTOR_INDEX_FREQUENCY"])
         return config
 
     def logging_setup(self, logging_conf_path):
@@ -57,10 +57,10 @@ def push_kvpairs(etcd_repo, kvs):
 
 def pull_kvpairs(etcd_repo, revision):
     """
-    Retrieve key-value pairs newer than the revision number from the etcd_repo
+    Retrieve key-value pairs newer than the revision number from the etcd_repo, a page at the time
     :param etcd_repo
     :param revision
-    :return: kv pairs as dictionary
+    :return: iterator of the pages of kv pairs as dictionary
     """
     main_key = "/ec/"
 
@@ -73,36 +73,46 @@ def pull_kvpairs(etcd_repo, revision):
     # encode key
     encoded_key = encode_to_str_base64(main_key)
 
-    # create the body for the get range on the etcd sever, order them newest first
-    body = {
-        "key": encoded_key,
-        "range_end": range_end,
-        "limit": MAX_KV_RETURNED,
-        "sort_order": "DESCEND",
-        "sort_target": "KEY",
-        "min_mod_revision": revision,
-    }
-    # make the call
-    # print(f"Pull request: {body}")
-
-    # start an infinite loop of request if the server side is unreachable
-    resp = requests.post(old_etcd_url, json=body)
-    resp.raise_for_status()
+    total = 0
+    at_revision = None
+    more = True
+    while more:
+        # create the body for the get range on the etcd sever, order them newest first
+        body = {
+            "key": encoded_key,
+            "range_end": range_end,
+            "limit": MAX_KV_RETURNED,
+            "sort_order": "DESCEND",
+            "sort_target": "KEY",
+            "min_mod_revision": revision,
+            "revision": at_revision,
+        }
+        # make the call
+        # print(f"Pull request: {body}")
+
+        resp = requests.post(old_etcd_url, json=body)
+        resp.raise_for_status()
+
+        # parse the result to return just key-value pairs
+        new_kvs = []
+        resp_body = resp.json()
+        if "kvs" in resp_body:
+            print("Building key-value list")
+            for kv in resp_body["kvs"]:
+                new_kv = parse_raw_kv(kv, False)
+                new_kvs.append(new_kv)
+                print(f"Key: {new_kv['key']} pulled successfully")
+        total += len(new_kvs)
+        yield new_kvs
+
+        # the next page ends where this one has stopped and it is read at the same revision
+        more = resp_body.get("more", False) and len(new_kvs) > 0
+        if more:
+            range_end = resp_body["kvs"][-1]["key"]
+            at_revision = resp_body["header"]["revision"]
 
     print("Retrival completed")
-
-    # parse the result to return just key-value pairs
-    new_kvs = []
-    resp_body = resp.json()
-    if "kvs" in resp_body:
-        print("Building key-value list")
-        for kv in resp_body["kvs"]:
-            new_kv = parse_raw_kv(kv, False)
-            new_kvs.append(new_kv)
-            print(f"Key: {new_kv['key']} pulled successfully")
-
-    print(f"{len(new_kvs)} keys found")
-    return new_kvs
+    print(f"{total} keys found")
 
 
 def parse_raw_kv(kv: Dict[str, any], key_only: bool = False) -> Dict[str, any]:
@@ -171,8 +181,6 @@ def incr_last_byte(path: str) -> bytes:
     return bytes(s)
 
 
-# first get the key-value pairs from the old repo
-kvs = pull_kvpairs(old_etcd, from_revision)
-
-# send them to the new repo
-completed = push_kvpairs(new_etcd, kvs)
+# get the key-value pairs from the old repo and send them to the new repo a page at the time
+for kvs in pull_kvpairs(old_etcd, from_revision):
+    completed = push_kvpairs(new_etcd, kvs)
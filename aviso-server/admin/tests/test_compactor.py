@@ -27,12 +27,12 @@ def conf() -> config.Config:  # this automatically configure the logging
 def clear_history():
     yield
     url = conf().compactor["url"] + "/v3/kv/deleterange"
-    key = conf().compactor["history_path"]
-    encoded_key = encode_to_str_base64(key)
-    encoded_end_key = encode_to_str_base64(str(incr_last_byte(key), "utf-8"))
-    body = {"key": encoded_key, "range_end": encoded_end_key}
-    # make the call
-    requests.post(url, json=body)
+    for key in [conf().compactor["history_path"], conf().compactor["index_path"]]:
+        encoded_key = encode_to_str_base64(key)
+        encoded_end_key = encode_to_str_base64(str(incr_last_byte(key), "utf-8"))
+        body = {"key": encoded_key, "range_end": encoded_end_key}
+        # make the call
+        requests.post(url, json=body)
 
 
 def test_get_current_server_rev():
@@ -69,6 +69,26 @@ def test_clean_history():
     assert old_rev == 1112
 
 
+def test_update_index():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    compactor = Compactor(conf().compactor)
+    compactor.save_index([])
+
+    # every update adds the current revision
+    for i in range(3):
+        rev = compactor.get_current_server_rev()
+        assert compactor.update_index()
+        assert compactor.get_index()[-1]["revision"] == rev
+    index = compactor.get_index()
+    assert len(index) == 3
+    assert sorted(index, key=lambda i: i["revision"]) == index
+
+    # the revisions compacted are removed
+    assert compactor.clean_index(index[1]["revision"])
+    assert compactor.get_index() == index[1:]
+    compactor.save_index([])
+
+
 def test_compact():
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
     compactor = Compactor(conf().compactor)
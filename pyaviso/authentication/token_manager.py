@@ -0,0 +1,94 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import base64
+import json
+import threading
+import time
+from typing import Callable, Optional
+
+from .. import logger
+
+# seconds before the expiry of a token when this is considered already expired
+EXPIRY_MARGIN = 30
+
+
+class TokenManager:
+    """
+    This class manages the lifecycle of the authentication token used to talk to the server. The token is cached and
+    shared by all the threads of an engine. A new one is requested only when there is none yet, when the server has
+    rejected the current one or when it is about to expire. Concurrent refreshes are serialised so only one request
+    of authentication is sent to the server.
+    """
+
+    def __init__(self, authenticate: Callable[[], str]):
+        """
+        :param authenticate: function requesting a new token to the server
+        """
+        self._authenticate = authenticate
+        self._token = None
+        self._expiry = None
+        self._lock = threading.Lock()
+
+    def token(self) -> str:
+        """
+        :return: the current token, authenticating first if there is none or if it is expired
+        """
+        with self._lock:
+            if self._token is None or self._expired():
+                self._refresh()
+            return self._token
+
+    def refresh(self, rejected_token: Optional[str]) -> str:
+        """
+        This method replaces the token rejected by the server. If another thread has already replaced it, the new token
+        is returned without authenticating again
+        :param rejected_token: token rejected by the server, None if not known
+        :return: the new token
+        """
+        with self._lock:
+            if rejected_token is None or self._token is None or self._token == rejected_token or self._expired():
+                self._refresh()
+            return self._token
+
+    def invalidate(self):
+        """
+        This method drops the current token, the next call will authenticate again
+        """
+        with self._lock:
+            self._token = None
+            self._expiry = None
+
+    def _refresh(self):
+        """
+        Internal method requesting a new token, it must be called holding the lock
+        """
+        logger.debug("Requesting a new token")
+        token = self._authenticate()
+        self._token = token
+        self._expiry = self._token_expiry(token)
+
+    def _expired(self) -> bool:
+        return self._expiry is not None and time.time() >= self._expiry - EXPIRY_MARGIN
+
+    @staticmethod
+    def _token_expiry(token: str) -> Optional[float]:
+        """
+        Internal method reading the expiry time of a JWT token. The simple tokens of etcd are opaque and have no
+        expiry time, these are replaced only once rejected by the server
+        :param token: token to read
+        :return: expiry time as epoch in seconds, None if not available
+        """
+        parts = token.split(".")
+        if len(parts) != 3:
+            return None
+        try:
+            payload = parts[1] + "=" * (-len(parts[1]) % 4)
+            return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except Exception:
+            return None
@@ -123,6 +123,18 @@ def stop_listeners(signum=None, frame=None):
         sys.exit(-1)
 
 
+def reload_listeners(signum=None, frame=None):
+    """
+    This function reloads the listener files, from a separate thread to not hold the signal handler.
+    :param signum:
+    :param frame:
+    :return:
+    """
+    t = threading.Thread(target=manager.reload_listeners)
+    t.setDaemon(True)
+    t.start()
+
+
 def stop_listeners_and_exit(signum=None, frame=None):
     """
     This function takes care of gracefully stopping the listeners and then exit
@@ -227,7 +239,10 @@ def cli():
 )
 @click.option("--now", "now", is_flag=True, default=False, help="Ignore missed notifications, only listen to new ones.")
 @click.option("--catchup", "catchup", is_flag=True, default=False, help="Retrieve first the missed notifications.")
-def listen(listener_files: List[str], configuration: conf.UserConfig, from_date, to_date, now, catchup):
+@click.option(
+    "--reload", "reload", is_flag=True, default=False, help="Reload the listener files when they change or on SIGHUP."
+)
+def listen(listener_files: List[str], configuration: conf.UserConfig, from_date, to_date, now, catchup, reload):
     """
     This method allows the user to execute the listeners defined in the YAML listener file
 
@@ -246,6 +261,9 @@ def listen(listener_files: List[str], configuration: conf.UserConfig, from_date,
             signal.signal(signal.SIGQUIT, stop_listeners_and_exit)
             # this is sent whit the default kill command
             signal.signal(signal.SIGTERM, stop_listeners_and_exit)
+            if reload:
+                # this is sent with kill -HUP to reload the listener files
+                signal.signal(signal.SIGHUP, reload_listeners)
 
         # call the main listen method
         manager.listen(
@@ -255,6 +273,7 @@ def listen(listener_files: List[str], configuration: conf.UserConfig, from_date,
             to_date=to_date,
             now=now,
             catchup=catchup,
+            reload=reload,
         )
 
     except KNOWN_EXCEPTION as e:
@@ -6,11 +6,37 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
-__all__ = ["engine", "engine_factory", "etcd_grpc_engine", "etcd_rest_engine", "file_based_engine", "EngineType"]
+__all__ = [
+    "adaptive_interval",
+    "async_etcd_engine",
+    "async_etcd_grpc_engine",
+    "async_etcd_rest_engine",
+    "callback_executor",
+    "checkpoint_store",
+    "engine",
+    "engine_factory",
+    "engine_pool",
+    "etcd_grpc_engine",
+    "etcd_rest_engine",
+    "file_based_engine",
+    "http_pool",
+    "key_value",
+    "in_memory_engine",
+    "lease_pool",
+    "memory_store",
+    "notification_dedup",
+    "EngineType",
+    "ListenMode",
+    "TriggerOrdering",
+    "DedupPolicy",
+    "WATCH_PROGRESS_INTERVAL",
+]
 
 import importlib
 from enum import Enum
 
+WATCH_PROGRESS_INTERVAL = 600  # seconds between the progress notifications of the watches, the default of etcd
+
 
 class EngineType(Enum):
     """
@@ -21,10 +47,54 @@ class EngineType(Enum):
     ETCD_GRPC = ("etcd_grpc_engine", "EtcdGrpcEngine")
     ETCD_REST = ("etcd_rest_engine", "EtcdRestEngine")
     FILE_BASED = ("file_based_engine", "FileBasedEngine")
+    IN_MEMORY = ("in_memory_engine", "InMemoryEngine")
 
     def __str__(self):
         return self.name.lower()
 
-    def get_class(self):
+    def get_class(self, asynchronous: bool = False):
+        if asynchronous:
+            module = importlib.import_module("pyaviso.engine.async_" + self.value[0])
+            return getattr(module, "Async" + self.value[1])
         module = importlib.import_module("pyaviso.engine." + self.value[0])
         return getattr(module, self.value[1])
+
+
+class ListenMode(Enum):
+    """
+    This Enum describes the various mechanisms available to the engines for listening to changes on the notification
+    server.
+    """
+
+    POLLING = "polling"
+    WATCH = "watch"
+
+    def __str__(self):
+        return self.name.lower()
+
+
+class DedupPolicy(Enum):
+    """
+    This Enum describes how often the same notification, fetched more than once, is delivered: once for each listener,
+    once for the whole process or every time it is fetched.
+    """
+
+    LISTENER = "listener"
+    PROCESS = "process"
+    NONE = "none"
+
+    def __str__(self):
+        return self.name.lower()
+
+
+class TriggerOrdering(Enum):
+    """
+    This Enum describes which notifications have their triggers executed in order, one after the other. The triggers of
+    the notifications not in the same group can run in parallel.
+    """
+
+    LISTENER = "listener"
+    KEY = "key"
+
+    def __str__(self):
+        return self.name.lower()
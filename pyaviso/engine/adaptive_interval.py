@@ -0,0 +1,72 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import random
+import time
+
+# default settings of the adaptive polling
+POLLING_BACKOFF = 2  # factor applied to the interval at every poll without changes
+POLLING_JITTER = 0.1  # max fraction of the interval randomly added or removed
+
+
+class AdaptiveInterval:
+    """
+    This class tracks the polling interval of a key. The interval drops to the minimum as soon as a poll returns some
+    changes and grows by the backoff factor at every poll without changes, up to the maximum. A random jitter is
+    applied to the time of the next poll so that keys starting together do not keep polling together.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        min_interval: float,
+        max_interval: float,
+        backoff: float = POLLING_BACKOFF,
+        jitter: float = POLLING_JITTER,
+    ):
+        """
+        :param interval: initial interval, in seconds
+        :param min_interval: interval used after a poll returning changes, in seconds
+        :param max_interval: max interval reached while the key is quiet, in seconds
+        :param backoff: factor applied to the interval at every poll without changes
+        :param jitter: max fraction of the interval randomly added or removed
+        """
+        assert 0 < min_interval <= max_interval, "min_interval must be positive and not greater than max_interval"
+        assert backoff >= 1, "backoff must be at least 1"
+        assert 0 <= jitter < 1, "jitter must be between 0 and 1"
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._jitter = jitter
+        self._interval = min(max(interval, min_interval), max_interval)
+        # the first poll is due straight away
+        self._due = time.monotonic()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def due(self) -> float:
+        """
+        :return: time of the next poll, as returned by time.monotonic
+        """
+        return self._due
+
+    def update(self, changed: bool) -> float:
+        """
+        This method adapts the interval to the result of the last poll and schedules the next one
+        :param changed: True if the last poll has returned some changes
+        :return: time of the next poll, as returned by time.monotonic
+        """
+        if changed:
+            self._interval = self._min_interval
+        else:
+            self._interval = min(self._interval * self._backoff, self._max_interval)
+        self._due = time.monotonic() + self._interval * (1 + random.uniform(-self._jitter, self._jitter))
+        return self._due
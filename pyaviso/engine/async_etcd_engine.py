@@ -0,0 +1,587 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Set, Tuple
+
+from .. import logger
+from ..authentication.auth import Auth
+from ..custom_exceptions import EngineException
+from ..user_config import EngineConfig
+from . import ListenMode
+from .etcd_engine import MAX_STATUS_CONFLICTS, MAX_TXN_OPS, EtcdEngine
+
+
+class AsyncEtcdEngine(EtcdEngine, ABC):
+    """
+    This class extends the EtcdEngine with coroutines to talk to the server from an asyncio event loop. The blocking
+    methods inherited are still available. All the keys listened by the engine are polled by a single task, so a
+    large number of listeners can share the same event loop without a thread each.
+    """
+
+    def __init__(self, config: EngineConfig, auth: Auth):
+        super(AsyncEtcdEngine, self).__init__(config, auth)
+        # keys polled by the scheduler task, with their next revision and callback
+        self._async_polled = {}
+        self._async_scheduler = None
+        self._async_loop = None
+        self._async_wakeup = None
+        # tasks setting up the listening, a reference is kept until they are done
+        self._async_tasks = set()
+
+    async def pull_async(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> List[Dict[str, any]]:
+        """
+        Coroutine equivalent to pull. All the pages of the result are retrieved, use pull_iter_async to process them
+        without holding them all in memory
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: List of key-value pairs formatted as dictionary
+        """
+        kvs = []
+        async for page in self._pull_pages_async(key, key_only, rev, prefix, min_rev, max_rev):
+            kvs.extend(page)
+        return kvs
+
+    async def pull_iter_async(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> AsyncIterator[Dict[str, any]]:
+        """
+        Asynchronous generator equivalent to pull_iter, the key-values are requested a page at the time
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: asynchronous iterator of the key-value pairs formatted as dictionary
+        """
+        async for page in self._pull_pages_async(key, key_only, rev, prefix, min_rev, max_rev):
+            for kv in page:
+                yield kv
+
+    async def _pull_pages_async(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> AsyncIterator[List[Dict[str, any]]]:
+        """
+        Asynchronous generator equivalent to _pull_pages, all the pages are read at the revision of the first one
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: asynchronous iterator of the pages of key-value pairs
+        """
+        # determine the range_end
+        if prefix:
+            range_end = self._incr_last_byte(key)
+        else:
+            range_end = None
+
+        while True:
+            kvs, more, header_rev = await self._pull_page_async(
+                key, range_end=range_end, key_only=key_only, rev=rev, min_rev=min_rev, max_rev=max_rev
+            )
+            yield kvs
+            if not more or len(kvs) == 0:
+                return
+            logger.debug(f"More keys available for {key}, requesting the next page")
+            range_end = kvs[-1]["key"].encode()
+            rev = header_rev
+
+    @abstractmethod
+    async def _pull_page_async(
+        self,
+        key: str,
+        range_end: bytes = None,
+        key_only: bool = False,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        Coroutine equivalent to _pull_page
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
+        """
+        pass
+
+    @abstractmethod
+    async def _pull_batch_async(
+        self, ranges: List[Tuple[str, int]]
+    ) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        Coroutine equivalent to _pull_batch
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        pass
+
+    @abstractmethod
+    async def _latest_revision_async(self, key: str) -> int:
+        """
+        :param: key used for the server request
+        :return: latest revision of the notification server.
+        """
+        pass
+
+    @abstractmethod
+    async def push_async(self, kvs: List[Dict[str, any]], ks_delete: List[str] = None, ttl: int = None) -> bool:
+        """
+        Coroutine equivalent to push
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        pass
+
+    @abstractmethod
+    async def delete_async(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
+        """
+        Coroutine equivalent to delete
+        :param key: key prefix to delete
+        :param prefix: if true the function will delete all the KV pairs starting with the key passed
+        :return: kvs deleted
+        """
+        pass
+
+    @abstractmethod
+    async def _lease_async(self, ttl: int) -> str:
+        """
+        Coroutine equivalent to _lease
+        :param ttl: Lease TTL
+        :return: lease id
+        """
+        pass
+
+    async def _pooled_lease_async(self, ttl: int) -> str:
+        """
+        Coroutine equivalent to _pooled_lease
+        :param ttl: time to live of the keys to push
+        :return: lease id
+        """
+        bucket, lease_ttl = self._lease_pool.bucket(ttl)
+        lease = self._lease_pool.get(bucket)
+        if lease is None:
+            lease = await self._lease_async(lease_ttl)
+            self._lease_pool.add(bucket, lease)
+        return lease
+
+    @abstractmethod
+    async def _push_if_statuses_async(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        Coroutine equivalent to _push_if_statuses
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        pass
+
+    @abstractmethod
+    async def close_async(self):
+        """
+        This coroutine releases the connections opened by the coroutines of this engine
+        """
+        pass
+
+    async def push_with_status_async(
+        self,
+        kvs: List[Dict[str, any]],
+        base_key: str,
+        message: str = "",
+        admin_key: str = None,
+        ks_delete: List[str] = None,
+        ttl: int = None,
+    ) -> bool:
+        """
+        Coroutine equivalent to push_with_status
+        :param kvs: List of KV pair
+        :param base_key: base key where to push the status
+        :param message: message to be part of the status update
+        :param admin_key: admin key to push together with the status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        lease = await self._pooled_lease_async(ttl) if ttl else None
+        try:
+            return await self._push_with_statuses_async(kvs, {base_key: (message, admin_key)}, ks_delete, lease)
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+
+    async def push_many_with_status_async(self, updates: List[Dict[str, any]]) -> List[any]:
+        """
+        Coroutine equivalent to push_many_with_status
+        :param updates: List of updates, each a dictionary of kvs, base_key, message, admin_key and ttl
+        :return: for each update True if successful, otherwise the exception raised by its transaction
+        """
+        results = [None] * len(updates)
+        for indexes, kvs, statuses, ttl in self._status_chunks(updates):
+            lease = None
+            try:
+                lease = await self._pooled_lease_async(ttl) if ttl else None
+                result = await self._push_with_statuses_async(kvs, statuses, None, lease)
+            except Exception as e:
+                self._lease_pool.discard(lease)
+                logger.warning(f"Not able to submit {len(indexes)} updates of {', '.join(statuses)}, {e}")
+                logger.debug("", exc_info=True)
+                result = e
+            for i in indexes:
+                results[i] = result
+        return results
+
+    async def _push_with_statuses_async(
+        self, kvs: List[Dict[str, any]], statuses: Dict[str, Tuple[str, str]], ks_delete: List[str], lease: str
+    ) -> bool:
+        """
+        Coroutine equivalent to _push_with_statuses
+        :param kvs: List of KV pair
+        :param statuses: message and admin key of each base key
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :return: True if successful
+        """
+        old_statuses = {base_key: self._statuses.get(base_key, []) for base_key in statuses}
+        for i in range(MAX_STATUS_CONFLICTS):
+            status_kvs, status_revs = self._add_statuses(kvs, statuses, old_statuses)
+            pushed, rev, current_statuses = await self._push_if_statuses_async(
+                status_kvs, ks_delete, lease, status_revs
+            )
+            if pushed:
+                for base_key in statuses:
+                    self._update_status(base_key, status_kvs, rev)
+                return True
+            logger.debug(f"Status of {', '.join(statuses)} changed at revision {rev}, trying again...")
+            old_statuses.update(current_statuses)
+            self._statuses.update(current_statuses)
+        raise EngineException(f"Not able to update the status of {', '.join(statuses)}, too many concurrent updates")
+
+    async def listen_async(
+        self,
+        keys: List[str],
+        callback: callable([str, str]),
+        from_date: datetime = None,
+        to_date: datetime = None,
+        channel: asyncio.Queue = None,
+    ) -> bool:
+        """
+        Coroutine equivalent to listen. The keys are set up by a task of the running event loop and then handed to the
+        single task polling all the keys of this engine. The callback is executed by the trigger executor of the
+        engine, as for listen, so that the triggers cannot block the loop. This method can be called multiple times.
+
+        :param keys: keys to watch
+        :param callback: function to trigger in case of changes
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :param channel: queue where True is put once all the keys have been retrieved until to_date, False in case of
+        errors
+        :return: True if the listener is in execution, False otherwise
+        """
+        logger.debug("Calling listen...")
+        if self.listen_mode != ListenMode.POLLING:
+            logger.error(f"Listen mode {self.listen_mode} not supported by {type(self).__name__}")
+            return False
+        self._add_checkpoint(keys)
+        for key in keys:
+            self._add_listener(key)
+        task = asyncio.ensure_future(self._polling_async(keys, callback, channel, from_date, to_date))
+        self._async_tasks.add(task)
+        task.add_done_callback(self._async_tasks.discard)
+        return True
+
+    async def _polling_async(
+        self,
+        keys: List[str],
+        callback: callable([str, str]),
+        channel: asyncio.Queue,
+        from_date: datetime = None,
+        to_date: datetime = None,
+    ):
+        """
+        Coroutine equivalent to _polling, it sets up the listening of all the keys passed together
+        :param keys: keys to watch as a prefix
+        :param callback: function to call if any change happen
+        :param channel: queue where to signal the end of the listening
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :return:
+        """
+        loop = asyncio.get_event_loop()
+
+        def trigger_callback(notifications):
+            for notification in notifications:
+                v = notification["value"].decode()
+                k = notification["key"]
+                if not self._first_delivery(callback, notification):
+                    logger.debug(f"Notification for key {k} already delivered, dropped")
+                    continue
+                logger.debug(f"Notification received for key {k}")
+                try:
+                    callback(k, v)
+                except Exception as err:
+                    logger.error(f"Error with notification trigger: {err}")
+                    logger.debug("", exc_info=True)
+
+        try:
+            if from_date is None:  # no start date defined
+                if self.catchup is None:
+                    raise EngineException("catchup not defined for notification engine")
+                checkpoint = self._checkpoints[keys[0]]
+                saved_rev = checkpoint.load() if self.catchup else -1
+                if saved_rev != -1:  # we start from the saved one
+                    logger.info("Starting from last notification received")
+                    next_rev = saved_rev
+                else:
+                    if not self.catchup:  # delete the saved state
+                        checkpoint.reset()
+                    # we start from now, a single request serves all the keys
+                    next_rev = await self._latest_revision_async(keys[0]) + 1
+                for key in keys:
+                    checkpoint.update(key, next_rev)
+                    self._schedule_polling_async(key, next_rev, trigger_callback, channel)
+                return
+
+            # start date defined, the search of the history is done one key at the time
+            for key in keys:
+                logger.info("Searching for past notifications...")
+                next_rev, final_rev = await loop.run_in_executor(None, self._from_to_revisions, key, from_date, to_date)
+                if next_rev == -1 and final_rev == -1:
+                    logger.warning("No history available in the time period selected")
+                    self._signal(channel, True)
+                    return
+                elif next_rev:
+                    logger.info("Search completed, retrieving...")
+                else:
+                    logger.error("Error in one of the listening process")
+                    self._signal(channel, False)
+                    return
+
+                if to_date:  # end date defined, retrieve only past notifications
+                    if final_rev:
+                        # trigger the callback a page at the time, removing the status from the result
+                        async for kvs in self._pull_pages_async(key, min_rev=next_rev, max_rev=final_rev):
+                            # the triggers are blocking, run them outside of the event loop
+                            await loop.run_in_executor(None, trigger_callback, [kv for kv in kvs if kv["key"] != key])
+                    # de-register this key as we have finished
+                    self.stop(key)
+                    logger.info("Search and retrieval completed")
+                    if len(self._listeners) == 0:  # this is the last key
+                        self._signal(channel, True)
+                else:  # no end date defined, hand the key to the scheduler polling for new notifications
+                    self._schedule_polling_async(key, next_rev, trigger_callback, channel)
+
+        except Exception as e:
+            logger.error(f"Error while listening to keys {keys}: {e}")
+            logger.debug("", exc_info=True)
+            self._signal(channel, False)
+
+    def _schedule_polling_async(self, key: str, next_rev: int, trigger_callback, channel: asyncio.Queue):
+        """
+        This method adds the key to the ones polled by the scheduler task of this engine, starting it if not running yet
+        :param key: key to poll as a prefix
+        :param next_rev: revision from when to poll
+        :param trigger_callback: function to call with the list of key-values changed
+        :param channel: queue where to signal the end of the listening
+        """
+        self._async_polled[key] = {
+            "next_rev": next_rev,
+            "trigger_callback": trigger_callback,
+            "channel": channel,
+            "interval": self._adaptive_interval(),
+            "checkpoint": self._checkpoints[key],
+        }
+        if self._async_scheduler is None:
+            self._async_loop = asyncio.get_event_loop()
+            self._async_wakeup = asyncio.Event()
+            self._async_scheduler = asyncio.ensure_future(self._scheduling_async())
+            logger.debug("Scheduler task started")
+        # the new key is due straight away
+        self._async_wakeup.set()
+
+    async def _scheduling_async(self):
+        """
+        Coroutine equivalent to _scheduling, polling the keys of this engine as they are due
+        """
+        while True:
+            self._async_wakeup.clear()
+            # drop the keys no longer listened, this is the stop condition
+            listening = set(self._listeners)
+            for key in [k for k in self._async_polled if k not in listening]:
+                del self._async_polled[key]
+            if len(self._async_polled) == 0:
+                self._async_scheduler = None
+                logger.debug("No more keys to poll, scheduler stopped")
+                return
+            polled = self._due_keys(self._async_polled)
+
+            try:
+                if len(polled) > 0:
+                    await self._poll_cycle_async(polled)
+            except Exception as e:
+                logger.error(f"Error while polling keys {list(polled)}: {e}")
+                logger.debug("", exc_info=True)
+                channels = set(p["channel"] for p in self._async_polled.values())
+                self._async_polled.clear()
+                self._async_scheduler = None
+                for channel in channels:
+                    self._signal(channel, False)
+                return
+
+            # wait until the next key is due, or a new key is added
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), self._next_due(self._async_polled))
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self, key: str = None) -> bool:
+        """
+        This method is used to stop a listening thread. if no key is provided all the listening thread will be stopped
+
+        :param key: the key associated to the listening thread
+        :return: True if the listener is cancelled, False otherwise
+        """
+        result = super(AsyncEtcdEngine, self).stop(key)
+        # wake up the scheduler task so it can drop the keys stopped, this can be called from any thread
+        if self._async_scheduler is not None:
+            self._async_loop.call_soon_threadsafe(self._async_wakeup.set)
+        return result
+
+    @property
+    def polling_intervals(self) -> Dict[str, float]:
+        """
+        :return: the current polling interval of each key polled, in seconds
+        """
+        intervals = super(AsyncEtcdEngine, self).polling_intervals
+        intervals.update({key: p["interval"].interval for key, p in self._async_polled.items()})
+        return intervals
+
+    async def _poll_cycle_async(self, polled: Dict[str, Dict[str, any]]):
+        """
+        Coroutine equivalent to _poll_cycle. Only one transaction is in flight at the time, so the memory used does not
+        depend on the number of keys polled
+        :param polled: keys polled with their next revision, callback and interval
+        """
+        groups = self._covering_prefixes(polled.keys())
+        prefixes = list(groups.keys())
+        checkpoints = set()
+        for i in range(0, len(prefixes), MAX_TXN_OPS):
+            ranges = [(p, min(polled[k]["next_rev"] for k in groups[p])) for p in prefixes[i : i + MAX_TXN_OPS]]
+            results, header_rev = await self._pull_batch_async(ranges)
+            for (prefix, min_rev), (kvs, more) in zip(ranges, results):
+                keys = groups[prefix]
+                changed = set()
+                if more:
+                    # too many changes for a single page, deliver them a page at the time, all read at the same revision
+                    pages = self._pull_pages_async(prefix, rev=header_rev, min_rev=min_rev)
+                    kvs = await pages.__anext__()
+                    async for next_kvs in pages:
+                        changed.update(await self._route_async(keys, polled, kvs))
+                        kvs = next_kvs
+                # the last page moves the keys to the revision of the transaction
+                changed.update(await self._route_async(keys, polled, kvs, header_rev))
+                for key in keys:
+                    # poll again sooner if the key is busy, later if it is quiet
+                    polled[key]["interval"].update(key in changed)
+                    checkpoints.add(polled[key]["checkpoint"])
+        # the checkpoints are written only every few cycles, outside of the event loop as the writes are synced to disk
+        loop = asyncio.get_event_loop()
+        for checkpoint in checkpoints:
+            await loop.run_in_executor(None, checkpoint.save)
+
+    async def _route_async(
+        self, keys: List[str], polled: Dict[str, Dict[str, any]], kvs: List[Dict[str, any]], header_rev: int = None
+    ) -> Set[str]:
+        """
+        Coroutine equivalent to _route. The triggers are handed to the trigger executor, the task waits only if its
+        queue is full
+        :param keys: keys under the prefix
+        :param polled: keys polled with their next revision, callback and interval
+        :param kvs: page of the changes of the prefix
+        :param header_rev: revision the prefix was read at, None if more pages follow. The keys and their checkpoints
+        move past it only with the last page
+        :return: the keys changed
+        """
+        changed = set()
+        for key in keys:
+            listener = polled[key]
+            key_kvs = self._key_changes(key, kvs, listener["next_rev"])
+            if len(key_kvs) > 0:
+                changed.add(key)
+            if header_rev is not None:
+                # all the changes up to the revision of the transaction have been read, a member lagging behind
+                # the one read last time cannot move the listener back
+                listener["next_rev"] = max(listener["next_rev"], header_rev + 1)
+                # trigger the callback, once delivered a restart can skip the changes
+                await self._deliver_async(key, key_kvs, listener["next_rev"], listener["trigger_callback"])
+            elif len(key_kvs) > 0:
+                await self._deliver_async(key, key_kvs, None, listener["trigger_callback"])
+        return changed
+
+    async def _deliver_async(
+        self, key: str, kvs: List[Dict[str, any]], next_rev: int, trigger_callback: callable([list])
+    ):
+        """
+        Coroutine equivalent to _deliver
+        :param key: key listened
+        :param kvs: changes of the key, possibly empty
+        :param next_rev: next revision of the key once the changes are delivered, None if more changes follow
+        :param trigger_callback: function to call with the list of key-values changed
+        """
+        task = self._delivery(key, kvs, next_rev, trigger_callback)
+        if task is not None:
+            await self.trigger_executor.submit_async(*task)
+
+    @staticmethod
+    def _signal(channel: asyncio.Queue, result: bool):
+        """
+        Internal method signalling the end of the listening on the channel, if any
+        :param channel: queue where to put the result
+        :param result: True if successful
+        """
+        if channel is not None:
+            channel.put_nowait(result)
@@ -0,0 +1,276 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+from typing import Dict, List, Tuple
+
+import grpc
+from etcd3 import etcdrpc
+
+from .. import logger
+from ..authentication.auth import Auth
+from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
+from ..user_config import EngineConfig
+from .async_etcd_engine import AsyncEtcdEngine
+from .etcd_engine import MAX_KV_RETURNED, MAX_TXN_KV_RETURNED
+from .etcd_grpc_engine import EtcdGrpcEngine
+
+
+class AsyncEtcdGrpcEngine(AsyncEtcdEngine, EtcdGrpcEngine):
+    """
+    This class is a specialisation of the EtcdGrpcEngine providing coroutines to connect to a etcd3 server directly
+    via the gRPC interface. The requests are built with pythonEtcd3 and sent on a grpc.aio channel.
+    """
+
+    def __init__(self, config: EngineConfig, auth: Auth):
+        super(AsyncEtcdGrpcEngine, self).__init__(config, auth)
+        # the channel is bound to the event loop, it is created by the first coroutine using it
+        self._aio_channel = None
+        self._aio_kvstub = None
+        self._aio_leasestub = None
+
+    def _kvstub_async(self) -> etcdrpc.KVStub:
+        """
+        Internal method returning the KV stub of the channel shared by all the coroutines of this engine
+        :return: the stub
+        """
+        if self._aio_channel is None:
+            self._aio_channel = grpc.aio.insecure_channel(f"{self.host}:{self.port}")
+            self._aio_kvstub = etcdrpc.KVStub(self._aio_channel)
+            self._aio_leasestub = etcdrpc.LeaseStub(self._aio_channel)
+        return self._aio_kvstub
+
+    async def close_async(self):
+        """
+        This coroutine closes the channel opened by the coroutines of this engine
+        """
+        if self._aio_channel is not None:
+            await self._aio_channel.close()
+            self._aio_channel = None
+
+    async def _call_async(self, method: str, request, stub=None):
+        """
+        Internal coroutine sending a request to the server. If the server rejects the token, this is refreshed and the
+        request is sent once more. The token is shared with the blocking methods, it is requested in the default
+        executor of the loop as this happens only the first time and once expired
+        :param method: name of the method of the stub to call
+        :param request: request to send
+        :param stub: stub to use, the KV one by default
+        :return: the response of the server
+        """
+        kvstub = self._kvstub_async()
+        stub = stub or kvstub
+        loop = asyncio.get_event_loop()
+        while True:
+            if self._token_manager is not None:
+                metadata = await loop.run_in_executor(None, self._authenticate)
+            else:
+                metadata = self._server.metadata
+            try:
+                return await getattr(stub, method)(request, timeout=self.timeout, metadata=metadata)
+            except grpc.aio.AioRpcError as e:
+                if e.code() == grpc.StatusCode.UNAUTHENTICATED and self._token_manager is not None:
+                    # the token has expired or has been revoked, refresh it and try again
+                    logger.debug(f"Error {e}, trying again", exc_info=True)
+                    await loop.run_in_executor(None, self._refresh_token, metadata)
+                    continue
+                raise
+
+    async def _read_async(self, method: str, request, action: str):
+        """
+        Internal coroutine sending a read request to the server. The request is sent again if the server is
+        unreachable, after waiting the automatic retry delay
+        :param method: name of the method of the KV stub to call
+        :param request: request to send
+        :param action: description of the request for the error messages
+        :return: the response of the server
+        """
+        while True:
+            try:
+                return await self._call_async(method, request)
+            except grpc.aio.AioRpcError as e:
+                if e.code() in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+                    logger.warning(
+                        f"Unable to connect to {self.host}, trying again in {self.automatic_retry_delay}s..."
+                    )
+                    logger.debug(f"Not able to {action}, {e}, trying again...")
+                    await asyncio.sleep(self.automatic_retry_delay)
+                elif e.code() == grpc.StatusCode.OUT_OF_RANGE and "required revision has been compacted" in e.details():
+                    raise EngineHistoryNotAvailableError()
+                else:
+                    raise EngineException(f"Not able to {action}, {e}")
+
+    async def _pull_page_async(
+        self,
+        key: str,
+        range_end: bytes = None,
+        key_only: bool = False,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        Coroutine equivalent to _pull_page
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
+        """
+        logger.debug(f"Calling pull for {key}...")
+        range_request = self._server._build_get_range_request(
+            key=key, range_end=range_end, sort_order="descend", sort_target="key", keys_only=key_only
+        )
+        range_request.limit = MAX_KV_RETURNED
+        if rev:
+            range_request.revision = rev
+        if min_rev:
+            range_request.min_mod_revision = min_rev
+        if max_rev:
+            range_request.max_mod_revision = max_rev
+        range_result = await self._read_async("Range", range_request, f"pull key {key}")
+        logger.debug(f"Query for {key} completed")
+
+        # parse the result to return just key-value pairs
+        new_kvs = [self._parse_raw_kv(kv, key_only) for kv in range_result.kvs]
+        logger.debug(f"{len(new_kvs)} keys found")
+        return new_kvs, range_result.more, int(range_result.header.revision)
+
+    async def _pull_batch_async(
+        self, ranges: List[Tuple[str, int]]
+    ) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        Coroutine equivalent to _pull_batch
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        logger.debug(f"Calling pull for {len(ranges)} keys...")
+        ops = []
+        for key, min_rev in ranges:
+            range_request = self._server._build_get_range_request(
+                key=key, range_end=self._incr_last_byte(key), sort_order="descend", sort_target="key"
+            )
+            range_request.limit = MAX_TXN_KV_RETURNED
+            range_request.min_mod_revision = min_rev
+            ops.append(etcdrpc.RequestOp(request_range=range_request))
+        txn_response = await self._read_async("Txn", etcdrpc.TxnRequest(success=ops), f"pull {len(ranges)} keys")
+
+        # parse the result of each range
+        results = []
+        for op in txn_response.responses:
+            range_response = op.response_range
+            results.append(([self._parse_raw_kv(kv) for kv in range_response.kvs], range_response.more))
+        logger.debug(f"Query for {len(ranges)} keys completed")
+        return results, int(txn_response.header.revision)
+
+    async def _latest_revision_async(self, key: str) -> int:
+        """
+        :param: key used for the server request
+        :return: latest revision of the notification server.
+        """
+        logger.debug("Querying notification server for latest revision")
+        range_request = self._server._build_get_range_request(key=key, keys_only=True)
+        range_result = await self._read_async("Range", range_request, "request latest revision")
+        rev = int(range_result.header.revision)
+        logger.debug(f"Latest revision {rev}")
+        return rev
+
+    async def delete_async(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
+        """
+        Coroutine equivalent to delete
+        :param key: key prefix to delete
+        :param prefix: if true the function will delete all the KV pairs starting with the key passed
+        :return: kvs deleted
+        """
+        logger.debug(f"Calling delete for {key}...")
+        range_end = self._incr_last_byte(key) if prefix else None
+        del_request = self._server._build_delete_request(key=key, range_end=range_end, prev_kv=True)
+        try:
+            del_result = await self._call_async("DeleteRange", del_request)
+        except grpc.aio.AioRpcError as e:
+            raise EngineException(f"Not able to delete key {key}, {e}")
+        logger.debug(f"Delete request for key {key} completed")
+        return [self._parse_raw_kv(kv) for kv in del_result.prev_kvs]
+
+    async def _lease_async(self, ttl: int) -> str:
+        """
+        Coroutine equivalent to _lease
+        :param ttl: Lease TTL
+        :return: lease id
+        """
+        self._kvstub_async()
+        lease_grant_request = etcdrpc.LeaseGrantRequest(TTL=ttl, ID=None)
+        try:
+            return (await self._call_async("LeaseGrant", lease_grant_request, self._aio_leasestub)).ID
+        except grpc.aio.AioRpcError as e:
+            raise EngineException(f"Not able to acquire lease, {e}")
+
+    async def push_async(self, kvs: List[Dict[str, any]], ks_delete: List[str] = None, ttl: int = None) -> bool:
+        """
+        Coroutine equivalent to push
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        logger.debug("Calling push...")
+
+        # check if we need to request a lease for the ttl
+        lease = await self._pooled_lease_async(ttl) if ttl else None
+
+        try:
+            txn_response = await self._call_async(
+                "Txn", etcdrpc.TxnRequest(success=self._push_ops(kvs, ks_delete, lease))
+            )
+        except grpc.aio.AioRpcError as e:
+            self._lease_pool.discard(lease)
+            raise EngineException(f"Not able to execute the transaction, {e}")
+        assert txn_response.succeeded, "Not able to execute the transaction"
+        logger.debug(f"Transaction completed, new server revision {txn_response.header.revision}")
+        return True
+
+    async def _push_if_statuses_async(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        Coroutine equivalent to _push_if_statuses
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        logger.debug(f"Calling push if status is at revisions {status_revs}...")
+        compare = [
+            etcdrpc.Compare(
+                key=base_key.encode(), target=etcdrpc.Compare.MOD, result=etcdrpc.Compare.EQUAL, mod_revision=status_rev
+            )
+            for base_key, status_rev in status_revs.items()
+        ]
+        failure = [
+            etcdrpc.RequestOp(request_range=self._server._build_get_range_request(key=base_key))
+            for base_key in status_revs
+        ]
+        request = etcdrpc.TxnRequest(compare=compare, success=self._push_ops(kvs, ks_delete, lease), failure=failure)
+        try:
+            txn_response = await self._call_async("Txn", request)
+        except grpc.aio.AioRpcError as e:
+            raise EngineException(f"Not able to execute the transaction, {e}")
+        rev = int(txn_response.header.revision)
+        if txn_response.succeeded:
+            return True, rev, None
+        # at least one status has changed, return them so the new ones can be linked to them
+        statuses = {}
+        for base_key, response in zip(status_revs, txn_response.responses):
+            statuses[base_key] = [self._parse_raw_kv(kv) for kv in response.response_range.kvs]
+        return False, rev, statuses
@@ -0,0 +1,315 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+from typing import Dict, List, Tuple
+
+from .. import logger
+from ..authentication.auth import Auth
+from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
+from ..user_config import EngineConfig
+from .async_etcd_engine import AsyncEtcdEngine
+from .etcd_engine import MAX_KV_RETURNED, MAX_TXN_KV_RETURNED
+from .etcd_rest_engine import EtcdRestEngine
+from .key_value import decode_kvs, loads
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only needed by this engine
+    aiohttp = None
+
+
+class AsyncEtcdRestEngine(AsyncEtcdEngine, EtcdRestEngine):
+    """
+    This class is a specialisation of the EtcdRestEngine providing coroutines to connect to a etcd3 server via the
+    gRPC gateway. It relies on the non-blocking aiohttp library, installed with the async extra of pyaviso.
+    """
+
+    def __init__(self, config: EngineConfig, auth: Auth):
+        if aiohttp is None:
+            raise EngineException(f"{type(self).__name__} requires aiohttp, install it with pip install pyaviso[async]")
+        super(AsyncEtcdRestEngine, self).__init__(config, auth)
+        self._pool_maxsize = config.pool_maxsize
+        self._pool_idle_timeout = config.pool_idle_timeout
+        # the session is bound to the event loop, it is created by the first coroutine using it
+        self._session = None
+
+    def _async_session(self) -> "aiohttp.ClientSession":
+        """
+        Internal method returning the session of keep-alive connections shared by all the coroutines of this engine
+        :return: the session
+        """
+        if self._session is None or self._session.closed:
+            connector_args = {"limit": self._pool_maxsize}
+            if self._pool_idle_timeout is not None:
+                connector_args["keepalive_timeout"] = self._pool_idle_timeout
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**connector_args),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close_async(self):
+        """
+        This coroutine closes the connections opened by the coroutines of this engine
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _authenticate_async(self) -> bool:
+        """
+        Coroutine equivalent to _authenticate. The token is shared with the blocking methods, it is requested in the
+        default executor of the loop as this happens only the first time and once expired
+        :return: True if successfully authenticated
+        """
+        if self._token_manager is not None:
+            self.auth.token = await asyncio.get_event_loop().run_in_executor(None, self._token_manager.token)
+        return True
+
+    async def _post_async(self, url: str, body: Dict[str, any]) -> Tuple[int, bytes]:
+        """
+        Coroutine equivalent to _post. If the server rejects the token, this is refreshed and the request is sent
+        once more
+        :param url: url of the request
+        :param body: body of the request
+        :return: a tuple: status code, content of the response
+        """
+        header = self.auth.header()
+        async with self._async_session().post(url, json=body, headers=header) as resp:
+            status, content = resp.status, await resp.read()
+        if status == 401 and self._token_manager is not None:
+            logger.debug("Token rejected by the server, authenticating again...")
+            self.auth.token = await asyncio.get_event_loop().run_in_executor(
+                None, self._token_manager.refresh, header.get("Authorization")
+            )
+            async with self._async_session().post(url, json=body, headers=self.auth.header()) as resp:
+                status, content = resp.status, await resp.read()
+        return status, content
+
+    async def _request_async(self, url: str, body: Dict[str, any], action: str) -> Dict[str, any]:
+        """
+        Internal coroutine sending a read request to the server. The request is sent again if the server is
+        unreachable, after waiting the automatic retry delay
+        :param url: url of the request
+        :param body: body of the request
+        :param action: description of the request for the error messages
+        :return: the body of the response
+        """
+        # first authenticate and use the token for the header
+        await self._authenticate_async()
+
+        # start an infinite loop of request if the server side is unreachable
+        while True:
+            try:
+                status, content = await self._post_async(url, body)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
+                logger.debug(f"Not able to {action}, {str(err)}, trying again...")
+                await asyncio.sleep(self.automatic_retry_delay)
+                continue
+            if status == 408 or (status >= 500 and status < 600):
+                logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
+                logger.debug(f"Not able to {action}, status {status}, trying again...")
+                await asyncio.sleep(self.automatic_retry_delay)
+                continue
+            elif status == 400 and (
+                "History not available" in content.decode()
+                or "required revision has been compacted" in content.decode()
+            ):
+                raise EngineHistoryNotAvailableError()
+            elif status != 200:
+                raise EngineException(f"Not able to {action}, status {status}, {content.decode()}")
+            return loads(content)
+
+    async def _pull_page_async(
+        self,
+        key: str,
+        range_end: bytes = None,
+        key_only: bool = False,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        Coroutine equivalent to _pull_page
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
+        """
+        logger.debug(f"Calling pull for {key}...")
+        body = {
+            "key": self._encode_to_str_base64(key),
+            "range_end": self._encode_to_str_base64(range_end) if range_end else None,
+            "limit": MAX_KV_RETURNED,
+            "sort_order": "DESCEND",
+            "sort_target": "KEY",
+            "keys_only": key_only,
+            "revision": rev,
+            "min_mod_revision": min_rev,
+            "max_mod_revision": max_rev,
+        }
+        resp_body = await self._request_async(self._base_url + "kv/range", body, f"pull key {key}")
+        logger.debug(f"Query for {key} completed")
+
+        # parse the result to return just key-value pairs
+        new_kvs = decode_kvs(resp_body.get("kvs", []), key_only)
+        logger.debug(f"{len(new_kvs)} keys found")
+        return new_kvs, resp_body.get("more", False), int(resp_body["header"]["revision"])
+
+    async def _pull_batch_async(
+        self, ranges: List[Tuple[str, int]]
+    ) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        Coroutine equivalent to _pull_batch
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        logger.debug(f"Calling pull for {len(ranges)} keys...")
+        ops = []
+        for key, min_rev in ranges:
+            range_request = {
+                "key": self._encode_to_str_base64(key),
+                "range_end": self._encode_to_str_base64(self._incr_last_byte(key)),
+                "limit": MAX_TXN_KV_RETURNED,
+                "sort_order": "DESCEND",
+                "sort_target": "KEY",
+                "min_mod_revision": min_rev,
+            }
+            ops.append({"requestRange": range_request})
+        body = {"success": ops}
+        resp_body = await self._request_async(self._base_url + "kv/txn", body, f"pull {len(ranges)} keys")
+
+        # parse the result of each range
+        results = []
+        for op in resp_body.get("responses", []):
+            range_response = op.get("response_range", {})
+            results.append((decode_kvs(range_response.get("kvs", [])), range_response.get("more", False)))
+        logger.debug(f"Query for {len(ranges)} keys completed")
+        return results, int(resp_body["header"]["revision"])
+
+    async def _latest_revision_async(self, key: str) -> int:
+        """
+        :param: key used for the server request
+        :return: latest revision of the notification server.
+        """
+        logger.debug("Querying notification server for latest revision")
+        body = {"key": self._encode_to_str_base64(key), "keys_only": True}
+        resp_body = await self._request_async(self._base_url + "kv/range", body, "request latest revision")
+        if "header" not in resp_body:
+            raise EngineException("Error in reading server revision. Response does not contain header")
+        rev = int(resp_body["header"]["revision"])
+        logger.debug(f"Latest revision {rev}")
+        return rev
+
+    async def _write_async(self, url: str, body: Dict[str, any], action: str) -> Dict[str, any]:
+        """
+        Internal coroutine sending a write request to the server, this is not sent again in case of failure
+        :param url: url of the request
+        :param body: body of the request
+        :param action: description of the request for the error messages
+        :return: the body of the response
+        """
+        # first authenticate and use the token for the header
+        await self._authenticate_async()
+        try:
+            status, content = await self._post_async(url, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            raise EngineException(f"Not able to {action}, {str(err)}")
+        if status != 200:
+            raise EngineException(f"Not able to {action}, status {status}, {content.decode()}")
+        return loads(content)
+
+    async def delete_async(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
+        """
+        Coroutine equivalent to delete
+        :param key: key prefix to delete
+        :param prefix: if true the function will delete all the KV pairs starting with the key passed
+        :return: kvs deleted
+        """
+        logger.debug(f"Calling delete for {key}...")
+        body = {
+            "key": self._encode_to_str_base64(key),
+            "range_end": self._encode_to_str_base64(self._incr_last_byte(key)) if prefix else None,
+            "prev_kv": True,
+        }
+        resp_body = await self._write_async(self._base_url + "kv/deleterange", body, f"delete key {key}")
+        logger.debug(f"Delete request for key {key} completed")
+        return [self._parse_raw_kv(kv) for kv in resp_body.get("prev_kvs", [])]
+
+    async def _lease_async(self, ttl: int) -> str:
+        """
+        Coroutine equivalent to _lease
+        :param ttl: Lease TTL
+        :return: lease id
+        """
+        resp_body = await self._write_async(self._base_url + "lease/grant", {"TTL": ttl, "ID": 0}, "request a lease")
+        if "ID" not in resp_body:
+            logger.error(f"Not able to read lease id from {resp_body}")
+            raise EngineException("Not able to acquire lease")
+        return resp_body["ID"]
+
+    async def push_async(self, kvs: List[Dict[str, any]], ks_delete: List[str] = None, ttl: int = None) -> bool:
+        """
+        Coroutine equivalent to push
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        logger.debug("Calling push...")
+
+        # check if we need to request a lease for the ttl
+        lease = await self._pooled_lease_async(ttl) if ttl else None
+
+        body = {"success": self._push_ops(kvs, ks_delete, lease)}
+        try:
+            resp_body = await self._write_async(self._base_url + "kv/txn", body, "execute the transaction")
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+        logger.debug(f"Transaction completed, new server revision {resp_body.get('header', {}).get('revision')}")
+        return True
+
+    async def _push_if_statuses_async(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        Coroutine equivalent to _push_if_statuses
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        logger.debug(f"Calling push if status is at revisions {status_revs}...")
+        ks = {base_key: self._encode_to_str_base64(base_key) for base_key in status_revs}
+        body = {
+            "compare": [
+                {"key": ks[base_key], "target": "MOD", "result": "EQUAL", "mod_revision": status_rev}
+                for base_key, status_rev in status_revs.items()
+            ],
+            "success": self._push_ops(kvs, ks_delete, lease),
+            "failure": [{"requestRange": {"key": ks[base_key]}} for base_key in status_revs],
+        }
+        resp_body = await self._write_async(self._base_url + "kv/txn", body, "execute the transaction")
+        rev = int(resp_body["header"]["revision"])
+        if resp_body.get("succeeded", False):
+            return True, rev, None
+        # at least one status has changed, return them so the new ones can be linked to them
+        statuses = {}
+        for base_key, response in zip(status_revs, resp_body.get("responses", [])):
+            statuses[base_key] = [self._parse_raw_kv(kv) for kv in response.get("response_range", {}).get("kvs", [])]
+        return False, rev, statuses
@@ -0,0 +1,232 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+import threading
+import time
+import zlib
+from queue import Empty, Full, Queue
+from typing import Dict, Tuple
+
+from .. import logger
+
+# default settings of the executor
+TRIGGER_WORKERS = 1  # threads running the triggers
+TRIGGER_QUEUE_SIZE = 100  # batches of notifications waiting for each thread before the polling waits
+LATENCY_SMOOTHING = 0.1  # weight of the last batch in the average latency
+PUT_INTERVAL = 1  # seconds between the checks of the executor closing while waiting for a full queue
+ASYNC_PUT_INTERVAL = 0.05  # seconds between the attempts of a coroutine to queue in a full queue
+
+
+class CallbackExecutor:
+    """
+    This class runs the callbacks of the notifications in worker threads, so that slow triggers do not stall the
+    polling. The callbacks submitted with the same ordering key always go to the same worker, so they run in order,
+    while the others can run in parallel. Each worker has a bounded queue: once full, the polling waits for the
+    triggers to catch up. Every callback can be followed by a function run once it has completed, used to advance the
+    checkpoint only for the notifications delivered. The callbacks can also be submitted from an event loop, without
+    blocking it.
+    """
+
+    def __init__(self, workers: int = TRIGGER_WORKERS, queue_size: int = TRIGGER_QUEUE_SIZE):
+        """
+        :param workers: number of threads running the callbacks
+        :param queue_size: max number of callbacks waiting for each thread
+        """
+        assert workers > 0, "workers must be positive"
+        assert queue_size > 0, "queue_size must be positive"
+        self._queues = [Queue(maxsize=queue_size) for _ in range(workers)]
+        self._pending = {}  # callbacks submitted and not completed yet for each ordering key
+        self._lock = threading.Lock()
+        self._latency = 0.0  # average seconds from submission to completion
+        self._max_latency = 0.0
+        self._completed = 0
+        self._closed = False
+        self._cancelled = False
+        self._submitting = 0  # submissions waiting for room in a queue
+        self._threads = []
+        for queue in self._queues:
+            t = threading.Thread(target=self._work, args=(queue,))
+            t.setDaemon(True)
+            t.start()
+            self._threads.append(t)
+
+    @property
+    def workers(self) -> int:
+        return len(self._queues)
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: number of callbacks waiting or running
+        """
+        with self._lock:
+            return sum(self._pending.values())
+
+    @property
+    def latency(self) -> float:
+        """
+        :return: average seconds from the submission of a callback to its completion
+        """
+        with self._lock:
+            return self._latency
+
+    def stats(self) -> Dict[str, any]:
+        """
+        :return: dictionary of the queue depth, callbacks completed and their average and max latency, in seconds
+        """
+        with self._lock:
+            return {
+                "depth": sum(self._pending.values()),
+                "completed": self._completed,
+                "latency": self._latency,
+                "max_latency": self._max_latency,
+            }
+
+    def pending(self, ordering_key: str) -> bool:
+        """
+        :param ordering_key: ordering key of the callbacks
+        :return: True if callbacks with this ordering key are waiting or running
+        """
+        with self._lock:
+            return self._pending.get(ordering_key, 0) > 0
+
+    def submit(self, ordering_key: str, callback: callable(()) = None, done: callable(()) = None) -> bool:
+        """
+        This method queues the callback, waiting if the queue is full
+        :param ordering_key: the callbacks with the same ordering key are run in the order they are submitted
+        :param callback: function to run, if None only done is run after the callbacks already submitted
+        :param done: function to run once the callback has completed, even if it has failed
+        :return: True if queued, False if the executor has been closed
+        """
+        queue, task = self._task(ordering_key, callback, done)
+        warned = False
+        try:
+            while not self._closed:
+                try:
+                    queue.put(task, timeout=PUT_INTERVAL)
+                    return True
+                except Full:
+                    if not warned:
+                        logger.warning("Triggers are slower than the notifications received, waiting for them...")
+                        warned = True
+        finally:
+            self._submitted()
+        self._task_done(ordering_key)
+        return False
+
+    async def submit_async(self, ordering_key: str, callback: callable(()) = None, done: callable(()) = None) -> bool:
+        """
+        Coroutine equivalent to submit, the event loop is not blocked while waiting for the queue
+        :param ordering_key: the callbacks with the same ordering key are run in the order they are submitted
+        :param callback: function to run, if None only done is run after the callbacks already submitted
+        :param done: function to run once the callback has completed, even if it has failed
+        :return: True if queued, False if the executor has been closed
+        """
+        queue, task = self._task(ordering_key, callback, done)
+        warned = False
+        try:
+            while not self._closed:
+                try:
+                    queue.put_nowait(task)
+                    return True
+                except Full:
+                    if not warned:
+                        logger.warning("Triggers are slower than the notifications received, waiting for them...")
+                        warned = True
+                    await asyncio.sleep(ASYNC_PUT_INTERVAL)
+        finally:
+            self._submitted()
+        self._task_done(ordering_key)
+        return False
+
+    def _task(self, ordering_key: str, callback: callable(()), done: callable(())) -> Tuple[Queue, tuple]:
+        """
+        Internal method counting a new callback as pending and its submission as in progress
+        :return: a tuple: queue of the worker of the ordering key, task to queue
+        """
+        with self._lock:
+            self._pending[ordering_key] = self._pending.get(ordering_key, 0) + 1
+            self._submitting += 1
+        queue = self._queues[zlib.crc32(ordering_key.encode()) % len(self._queues)]
+        return queue, (ordering_key, callback, done, time.monotonic())
+
+    def close(self, wait: bool = True, cancel: bool = False):
+        """
+        This method stops the workers once the callbacks already submitted have completed. It never waits for room in
+        the queues, so it can also be called from a callback
+        :param wait: if True it waits for the workers to stop
+        :param cancel: if True the callbacks not started yet are dropped, together with the functions to run after them
+        """
+        self._cancelled = self._cancelled or cancel
+        self._closed = True
+        for queue in self._queues:
+            try:
+                queue.put_nowait(None)  # wakes up the worker
+            except Full:
+                pass  # the worker is busy, it checks the closing before waiting again
+        if wait:
+            for t in self._threads:
+                if t is not threading.current_thread():
+                    t.join()
+
+    def _stopping(self, queue: Queue) -> bool:
+        """
+        :param queue: queue of a worker
+        :return: True if the worker can stop, as the executor is closed and nothing else can reach its queue
+        """
+        # the closing is checked before the submissions, which count themselves before checking it
+        if not self._closed:
+            return False
+        with self._lock:
+            return self._submitting == 0 and queue.empty()
+
+    def _work(self, queue: Queue):
+        """
+        This method runs the callbacks of a queue in order until the executor is closed
+        :param queue: queue of the worker
+        """
+        while not self._stopping(queue):
+            try:
+                task = queue.get(timeout=PUT_INTERVAL)
+            except Empty:
+                continue
+            if task is None:
+                continue
+            ordering_key, callback, done, submitted = task
+            if self._cancelled:
+                self._task_done(ordering_key)
+                continue
+            try:
+                if callback is not None:
+                    callback()
+            except Exception as e:
+                logger.error(f"Error in executing the triggers: {e}")
+                logger.debug("", exc_info=True)
+            try:
+                if done is not None:
+                    done()
+            except Exception as e:
+                logger.error(f"Error after executing the triggers: {e}")
+                logger.debug("", exc_info=True)
+            latency = time.monotonic() - submitted
+            with self._lock:
+                self._latency += (latency - self._latency) * (1 if self._completed == 0 else LATENCY_SMOOTHING)
+                self._max_latency = max(self._max_latency, latency)
+                self._completed += 1
+            self._task_done(ordering_key)
+
+    def _submitted(self):
+        with self._lock:
+            self._submitting -= 1
+
+    def _task_done(self, ordering_key: str):
+        with self._lock:
+            self._pending[ordering_key] -= 1
+            if self._pending[ordering_key] == 0:
+                del self._pending[ordering_key]
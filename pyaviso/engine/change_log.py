@@ -0,0 +1,183 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple
+
+from .. import logger
+
+# fields of the entries of the log
+REV = 0
+TIME = 1
+OP = 2
+KEY = 3
+
+PUT = "put"
+DELETE = "delete"
+
+
+class ChangeLog:
+    """
+    This class implements an append-only log of the changes made to a file-based store. Each change is a JSON line with
+    its revision, unix time, operation and key. The changes pushed together share the same revision, and the revisions
+    are monotonically increasing also when many processes append to the log, as the appending is done under a file
+    lock. The log is read incrementally and indexed in memory, so that the changes after a revision or a date, and the
+    last revision of each key, can be found without reading the store.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: file of the log, created if not existing
+        """
+        self._path = path
+        self._lock = threading.RLock()
+        self._offset = 0  # position of the log read so far
+        self._inode = None  # file of the log read so far
+        self._entries = []  # changes read so far, as (rev, time, op, key), ordered by revision
+        self._revs = []  # revision of each entry, to search them
+        self._times = []  # time of each entry, to search them
+        self._last = {}  # last revision of each key currently existing
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def revision(self) -> int:
+        """
+        :return: last revision of the log, 0 if empty
+        """
+        with self._lock:
+            self.sync()
+            return self._revs[-1] if self._revs else 0
+
+    def append(self, changes: List[Tuple[str, str]]) -> int:
+        """
+        This method appends the changes to the log as a single revision
+        :param changes: list of tuples: operation, put or delete, and key. A key deleted is read as a prefix
+        :return: revision of the changes
+        """
+        if not changes:
+            return self.revision
+        with self._lock:
+            with open(self._path, "ab+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    # other processes may have appended since the last read
+                    self._read(f)
+                    rev = (self._revs[-1] if self._revs else 0) + 1
+                    now = time.time()
+                    f.write("".join(json.dumps([rev, now, op, key]) + "\n" for op, key in changes).encode())
+                    f.flush()
+                    self._read(f)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return rev
+
+    def sync(self) -> bool:
+        """
+        This method reads the changes appended to the log since the last read
+        :return: True if new changes were read
+        """
+        with self._lock:
+            if not os.path.exists(self._path):
+                return False
+            with open(self._path, "rb") as f:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                try:
+                    return self._read(f)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def changes(self, min_rev: int = None, max_rev: int = None) -> List[Tuple[int, float, str, str]]:
+        """
+        :param min_rev: if provided only the changes with revision >= to min_rev are returned
+        :param max_rev: if provided only the changes with revision <= to max_rev are returned
+        :return: list of the changes as (rev, time, op, key), ordered by revision
+        """
+        with self._lock:
+            self.sync()
+            start = bisect_left(self._revs, min_rev) if min_rev else 0
+            end = bisect_right(self._revs, max_rev) if max_rev else len(self._revs)
+            return self._entries[start:end]
+
+    def last_revisions(self, min_rev: int = None, max_rev: int = None) -> List[Tuple[str, int]]:
+        """
+        :param min_rev: if provided only the keys last modified at a revision >= to min_rev are returned
+        :param max_rev: if provided only the keys last modified at a revision <= to max_rev are returned
+        :return: list of tuples: key currently existing, revision when it was last modified
+        """
+        with self._lock:
+            self.sync()
+            return [
+                (k, rev)
+                for k, rev in self._last.items()
+                if (min_rev is None or rev >= min_rev) and (max_rev is None or rev <= max_rev)
+            ]
+
+    def revision_at(self, date: float, after: bool = True) -> int:
+        """
+        :param date: unix time
+        :param after: if True the first revision at or after the date is returned, otherwise the last one at or before
+        :return: the revision, None if there is none
+        """
+        with self._lock:
+            self.sync()
+            # the times are ordered as the revisions, as they are assigned under the same lock
+            if after:
+                i = bisect_left(self._times, date)
+                return self._revs[i] if i < len(self._revs) else None
+            i = bisect_right(self._times, date)
+            return self._revs[i - 1] if i > 0 else None
+
+    def _read(self, f) -> bool:
+        """
+        This method reads the complete lines of the log after the last position read
+        :param f: log file, opened and locked
+        :return: True if new changes were read
+        """
+        stat = os.fstat(f.fileno())
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            if self._inode is not None:
+                # the log has been deleted and started again
+                logger.debug(f"Change log {self._path} restarted")
+            self._inode = stat.st_ino
+            self._offset = 0
+            self._entries, self._revs, self._times, self._last = [], [], [], {}
+        f.seek(self._offset)
+        data = f.read()
+        if not data:
+            return False
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            # the last line is not completely written yet
+            return False
+        for line in data[:end].splitlines():
+            try:
+                entry = tuple(json.loads(line))
+            except ValueError:
+                logger.warning(f"Ignoring corrupted entry of the change log {self._path}")
+                continue
+            self._entries.append(entry)
+            self._revs.append(entry[REV])
+            self._times.append(entry[TIME])
+            if entry[OP] == PUT:
+                self._last[entry[KEY]] = entry[REV]
+            else:
+                for k in [k for k in self._last if k.startswith(entry[KEY])]:
+                    del self._last[k]
+        self._offset += end
+        return True
@@ -0,0 +1,269 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from .. import logger
+
+# default settings of the checkpoints
+CHECKPOINT_INTERVAL = 5  # max seconds a new revision is kept in memory before being written
+CHECKPOINT_REVISIONS = 100  # number of revisions after which a new revision is written straight away
+CHECKPOINT_EXTENSION = ".json"
+LEGACY_CHECKPOINT_FILE = "revision.json"  # single revision shared by all the listeners of previous versions
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"  # same format of the engine, not imported as this module is used by the config
+
+
+class CheckpointStore:
+    """
+    This class keeps the last revision delivered to a set of listened keys, so that the listening can start again from
+    there. Each set of keys of a server has its own file, named by a hash of them. The revision of each key is tracked
+    in memory and the checkpoint is the oldest of them, this is written only when enough time has passed or enough
+    revisions have been delivered. The file is replaced atomically so a crash cannot leave it corrupted.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        keys: List[str],
+        host: str,
+        port: int,
+        interval: float = CHECKPOINT_INTERVAL,
+        revisions: int = CHECKPOINT_REVISIONS,
+    ):
+        """
+        :param folder: folder where the checkpoints are saved
+        :param keys: keys listened together
+        :param host: host of the notification server
+        :param port: port of the notification server
+        :param interval: max seconds a new revision is kept in memory before being written
+        :param revisions: number of revisions after which a new revision is written straight away
+        """
+        assert len(keys) > 0, "At least one key is required"
+        assert interval >= 0, "interval cannot be negative"
+        assert revisions > 0, "revisions must be positive"
+        self._folder = folder
+        self._keys = sorted(set(keys))
+        self._host = host
+        self._port = port
+        self._interval = interval
+        self._revisions = revisions
+        self._name = self.checkpoint_name(self._keys, host, port)
+        self._positions = {}
+        self._loaded = None
+        self._saved_rev = None
+        self._saved_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def checkpoint_name(keys: List[str], host: str, port: int) -> str:
+        """
+        :param keys: keys listened together
+        :param host: host of the notification server
+        :param port: port of the notification server
+        :return: name of the checkpoint of the keys
+        """
+        listener_set = json.dumps([host, port, sorted(set(keys))])
+        return hashlib.sha1(listener_set.encode()).hexdigest()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self._folder, self._name + CHECKPOINT_EXTENSION)
+
+    @property
+    def keys(self) -> List[str]:
+        return self._keys
+
+    @property
+    def revision(self) -> int:
+        """
+        :return: revision from which all the keys have still to be delivered, None until every key has one
+        """
+        with self._lock:
+            return self._revision()
+
+    def _revision(self) -> int:
+        if len(self._positions) < len(self._keys):
+            return None
+        return min(self._positions.values())
+
+    def load(self) -> int:
+        """
+        This method reads the checkpoint saved for the keys. The file is read only once, all the keys of the listener
+        share the result. If the keys have not been saved yet the revision saved by previous versions, if from the same
+        server, is used instead
+        :return: last revision saved or -1 if no revision could be read
+        """
+        with self._lock:
+            if self._loaded is None:
+                checkpoint = read_checkpoint(self.path)
+                if checkpoint is None:
+                    checkpoint = read_checkpoint(os.path.join(self._folder, LEGACY_CHECKPOINT_FILE))
+                    if checkpoint is not None and (
+                        checkpoint.get("server_host") != self._host or checkpoint.get("server_port") != self._port
+                    ):
+                        checkpoint = None
+                self._loaded = checkpoint["last_revision"] if checkpoint is not None else -1
+                self._saved_rev = self._loaded if self._loaded != -1 else None
+                logger.debug(f"Last revision saved for {self._keys} is {self._loaded}")
+            return self._loaded
+
+    def update(self, key: str, rev: int):
+        """
+        This method records in memory the revision from which the key has still to be delivered. It does not write
+        anything, use save for it
+        :param key: key listened
+        :param rev: next revision of the key
+        """
+        with self._lock:
+            self._positions[key] = rev
+
+    def save(self, force: bool = False) -> bool:
+        """
+        This method writes the checkpoint if enough time has passed or enough revisions have been delivered since the
+        last time it was written
+        :param force: if True the checkpoint is written as soon as it has changed
+        :return: True if written, False otherwise
+        """
+        with self._lock:
+            rev = self._revision()
+            if rev is None or rev == self._saved_rev:
+                return False
+            if not force:
+                due = time.monotonic() - self._saved_time >= self._interval
+                if not due and self._saved_rev is not None and rev - self._saved_rev < self._revisions:
+                    return False
+            checkpoint = {
+                "last_revision": rev,
+                "date_time": datetime.utcnow().strftime(DATE_FORMAT),
+                "server_host": self._host,
+                "server_port": self._port,
+                "keys": self._keys,
+            }
+            if not write_checkpoint(self.path, checkpoint):
+                return False
+            self._saved_rev = rev
+            self._saved_time = time.monotonic()
+            logger.debug(f"Last revision {rev} of {self._keys} has been successfully saved")
+            return True
+
+    def flush(self) -> bool:
+        """
+        This method writes the checkpoint if it has changed, it is called once the listening is stopped
+        :return: True if written, False otherwise
+        """
+        return self.save(force=True)
+
+    def reset(self) -> bool:
+        """
+        This method deletes the checkpoint of the keys, together with the one of previous versions
+        :return: True if successful, False otherwise
+        """
+        with self._lock:
+            self._loaded = -1
+            self._saved_rev = None
+            result = delete_checkpoint(self.path)
+            return delete_checkpoint(os.path.join(self._folder, LEGACY_CHECKPOINT_FILE)) and result
+
+
+def read_checkpoint(path: str) -> Dict[str, any]:
+    """
+    :param path: path of the checkpoint file
+    :return: content of the checkpoint or None if it could not be read
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        assert "last_revision" in checkpoint, "last_revision missing"
+        return checkpoint
+    except Exception as e:
+        logger.warning(f"Error occurred while reading the checkpoint {path}: {e}")
+        logger.debug("", exc_info=True)
+        return None
+
+
+def write_checkpoint(path: str, checkpoint: Dict[str, any]) -> bool:
+    """
+    This function writes the checkpoint to a temporary file that then replaces the previous one, so that readers and
+    crashes always find either the old or the new checkpoint. Both the file and the folder are synced to disk
+    :param path: path of the checkpoint file
+    :param checkpoint: content of the checkpoint
+    :return: True if written, False otherwise
+    """
+    folder = os.path.dirname(path)
+    try:
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(checkpoint, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        # make the rename durable
+        dir_fd = os.open(folder, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return True
+    except Exception:
+        logger.warning(f"Saving of the checkpoint has failed: {path}")
+        logger.debug("", exc_info=True)
+        return False
+
+
+def delete_checkpoint(path: str) -> bool:
+    """
+    :param path: path of the checkpoint file
+    :return: True if deleted or not existing, False otherwise
+    """
+    try:
+        os.remove(path)
+        logger.debug(f"Checkpoint {path} has been successfully deleted")
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logger.warning(f"Deleting the checkpoint has failed: {path}")
+        logger.debug("", exc_info=True)
+        return False
+    return True
+
+
+def list_checkpoints(folder: str) -> List[Dict[str, any]]:
+    """
+    This function is used to inspect the checkpoints saved in a folder
+    :param folder: folder where the checkpoints are saved
+    :return: content of each checkpoint, with its name
+    """
+    checkpoints = []
+    if not os.path.isdir(folder):
+        return checkpoints
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.endswith(CHECKPOINT_EXTENSION) or file_name == LEGACY_CHECKPOINT_FILE:
+            continue
+        checkpoint = read_checkpoint(os.path.join(folder, file_name))
+        if checkpoint is not None:
+            checkpoint["name"] = file_name[: -len(CHECKPOINT_EXTENSION)]
+            checkpoints.append(checkpoint)
+    return checkpoints
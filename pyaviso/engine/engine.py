@@ -13,12 +13,12 @@ import threading
 from abc import ABC, abstractmethod
 from datetime import datetime
 from queue import Queue
-from typing import Dict, List
+from typing import Dict, Iterator, List
 
 from .. import __version__, exit_channel, logger
 from ..authentication.auth import Auth
 from ..user_config import EngineConfig
-from . import EngineType
+from . import EngineType, ListenMode
 
 DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
@@ -34,15 +34,18 @@ class Engine(ABC):
         self._host = config.host
         self._port = config.port
         self._polling_interval = config.polling_interval
+        self._polling_interval_min = config.polling_interval_min
+        self._polling_interval_max = config.polling_interval_max
+        self._polling_backoff = config.polling_backoff
+        self._polling_jitter = config.polling_jitter
         self._engine_type = config.type
         self.timeout = config.timeout
         self.catchup = config.catchup
         self._auth = auth
         self._https = config.https
         self.automatic_retry_delay = config.automatic_retry_delay
+        self._listen_mode = config.listen_mode
         self._listeners = []
-        # this is used to synchronise multiple listening threads accessing the state
-        self._state_lock = threading.Lock()
         # this is used to synchronise multiple listening threads accessing the listeners list
         self._listeners_lock = threading.Lock()
 
@@ -66,6 +69,10 @@ class Engine(ABC):
     def https(self) -> bool:
         return self._https
 
+    @property
+    def listen_mode(self) -> ListenMode:
+        return self._listen_mode
+
     @abstractmethod
     def pull(
         self,
@@ -89,6 +96,28 @@ class Engine(ABC):
         """
         pass
 
+    def pull_iter(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Iterator[Dict[str, any]]:
+        """
+        This method queries the notification server like pull but it returns the key-values one by one. The engines
+        able to page through the results override it to keep a bounded memory usage
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: iterator of the key-value pairs formatted as dictionary
+        """
+        yield from self.pull(key, key_only=key_only, rev=rev, prefix=prefix, min_rev=min_rev, max_rev=max_rev)
+
     @abstractmethod
     def push(self, kvs: List[Dict[str, any]], ks_delete: List[str] = None, ttl: int = None) -> bool:
         """
@@ -135,8 +164,8 @@ class Engine(ABC):
     ) -> bool:
         """
         This method allows to listen for changes to specific keys. Note that the key is always considered as a prefix.
-        The listening is implemented with a background thread doing a active polling. Multiple listening threads can
-        be created by calling this method multiple times.
+        The listening of each key is set up by a background thread. The engines implementing a scheduler then poll all
+        their keys together from a single thread. This method can be called multiple times.
 
         :param keys: keys to watch
         :param callback: function to trigger in case of changes
@@ -162,6 +191,12 @@ class Engine(ABC):
                 return False
         return True
 
+    def close(self):
+        """
+        This method stops all the listeners of this engine and releases its connections
+        """
+        self.stop()
+
     def stop(self, key: str = None) -> bool:
         """
         This method is used to stop a listening thread. if no key is provided all the listening thread will be stopped
@@ -207,6 +242,53 @@ class Engine(ABC):
         :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
         :return: True if successful
         """
+        # update the status with the revision of the current status. This helps creating a linked list
+        old_status_kvs = self.pull(base_key, prefix=False)
+        self._add_status(kvs, base_key, old_status_kvs, message, admin_key)
+
+        return self.push(kvs, ks_delete, ttl)
+
+    def push_many_with_status(self, updates: List[Dict[str, any]]) -> List[any]:
+        """
+        Method to submit many updates, each made of a list of key-value pairs and the status of its base key. An
+        update failing does not stop the following ones
+        :param updates: List of updates, each a dictionary of kvs, base_key, message, admin_key and ttl
+        :return: for each update True if successful, otherwise the exception raised
+        """
+        results = []
+        for update in updates:
+            try:
+                results.append(
+                    self.push_with_status(
+                        list(update["kvs"]),
+                        base_key=update["base_key"],
+                        message=update.get("message", ""),
+                        admin_key=update.get("admin_key"),
+                        ttl=update.get("ttl"),
+                    )
+                )
+            except Exception as e:
+                logger.warning(f"Not able to submit the update of {update['base_key']}, {e}")
+                logger.debug("", exc_info=True)
+                results.append(e)
+        return results
+
+    def _add_status(
+        self,
+        kvs: List[Dict[str, any]],
+        base_key: str,
+        old_status_kvs: List[Dict[str, any]],
+        message: str = "",
+        admin_key: str = None,
+    ):
+        """
+        This method appends to the key-value pairs to push the new status of the base key and the admin key
+        :param kvs: List of KV pair to push
+        :param base_key: base key where to push the status
+        :param old_status_kvs: current status of the base key as returned by pull
+        :param message: message to be part of the status update
+        :param admin_key: admin key to push together with the status
+        """
         # create the status payload
         status = {
             "etcd_user": self.auth.username,
@@ -218,8 +300,6 @@ class Engine(ABC):
             "date_time": datetime.utcnow().strftime(DATE_FORMAT),
         }
 
-        # update the status with the revision of the current status. This helps creating a linked list
-        old_status_kvs = self.pull(base_key, prefix=False)
         if len(old_status_kvs) == 1:
             self._status_as_linked_list(status, old_status_kvs)
 
@@ -231,8 +311,6 @@ class Engine(ABC):
             admin_kv = {"key": admin_key, "value": "None"}
             kvs.append(admin_kv)
 
-        return self.push(kvs, ks_delete, ttl)
-
     def _status_as_linked_list(self, new_status, old_status_kvs):
         if "mod_rev" in old_status_kvs[0]:  # test engine does not have it
             new_status["prev_rev"] = old_status_kvs[0]["mod_rev"]
@@ -19,12 +19,13 @@ class EngineFactory:
     ServerType.ETCD3
     """
 
-    def __init__(self, engine_conf: EngineConfig, auth: Auth):
+    def __init__(self, engine_conf: EngineConfig, auth: Auth, asynchronous: bool = False):
         """
         It uses the EngineConfig object to instantiate one instance of the server object. This instance contains the
         user's authentication details and the server URL. It is unique across the various Engine objects
         :param engine_conf:
         :param auth
+        :param asynchronous: if True the engines created provide also the coroutines to be used from an asyncio loop
         """
         assert engine_conf is not None, "Engine configuration required"
         assert engine_conf.host != "", "Server host is required"
@@ -32,6 +33,7 @@ class EngineFactory:
         assert engine_conf.type != "", "Server type is required"
         self._conf = engine_conf
         self._auth = auth
+        self._asynchronous = asynchronous
 
     def create_engine(self):
         """
@@ -48,11 +50,17 @@ class EngineFactory:
         elif self._conf.type == EngineType.FILE_BASED:
             # connect to the test file based server
             logger.debug("Setting up file-based test engine")
+        elif self._conf.type == EngineType.IN_MEMORY:
+            # keep the notifications in a store of this process
+            logger.debug("Setting up in-memory test engine")
         else:
             raise EngineException(f"Configuration error - Engine: {self._conf.type} is not recognised")
 
         # instantiate the engine and return it
-        engine_class = self._conf.type.get_class()
+        try:
+            engine_class = self._conf.type.get_class(asynchronous=self._asynchronous)
+        except ImportError:
+            raise EngineException(f"Configuration error - Engine: {self._conf.type} does not support asyncio")
         try:
             # instantiate the engine and return
             return engine_class(config=self._conf, auth=self._auth)
@@ -0,0 +1,142 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+import threading
+from typing import Dict, Tuple
+
+from .. import logger
+from ..authentication.auth import Auth
+from ..user_config import EngineConfig
+from .engine import Engine
+from .engine_factory import EngineFactory
+
+
+class EnginePool:
+    """
+    This class keeps the engines created for each engine configuration and user, so that the calls sharing them reuse
+    the same connections and token instead of connecting and authenticating every time. The asynchronous engines are
+    bound to the event loop they are used from, so they are kept for each event loop. The engines are kept until the
+    pool is closed, which can be done by using the pool as context manager, or as asynchronous context manager to
+    release also the connections of the asynchronous engines.
+    """
+
+    def __init__(self):
+        self._engines = {}
+        self._async_engines = {}  # asynchronous engines of each event loop
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._engines) + sum(len(engines) for engines in self._async_engines.values())
+
+    def __enter__(self) -> "EnginePool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def __aenter__(self) -> "EnginePool":
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close_async()
+
+    def engine(self, engine_conf: EngineConfig, auth: Auth) -> Engine:
+        """
+        :param engine_conf: configuration of the engine
+        :param auth: authenticator of the user
+        :return: the engine for the configuration and the user, created if needed
+        """
+        key = self._key(engine_conf, auth)
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = EngineFactory(engine_conf, auth).create_engine()
+                self._engines[key] = engine
+                logger.debug(f"Engine {type(engine).__name__} added to the pool")
+            return engine
+
+    def async_engine(self, engine_conf: EngineConfig, auth: Auth) -> Engine:
+        """
+        This method must be called from a coroutine running on the event loop the engine is used from
+        :param engine_conf: configuration of the engine
+        :param auth: authenticator of the user
+        :return: the asynchronous engine for the configuration and the user on the running event loop, created if needed
+        """
+        loop = asyncio.get_event_loop()
+        key = self._key(engine_conf, auth)
+        with self._lock:
+            # the engines of the event loops closed can no longer be used
+            closed = [self._async_engines.pop(lp) for lp in list(self._async_engines) if lp.is_closed()]
+            engines = self._async_engines.setdefault(loop, {})
+            engine = engines.get(key)
+            if engine is None:
+                engine = EngineFactory(engine_conf, auth, asynchronous=True).create_engine()
+                engines[key] = engine
+                logger.debug(f"Engine {type(engine).__name__} added to the pool")
+        for engines in closed:
+            self._close_engines(engines)
+        return engine
+
+    def close(self):
+        """
+        This method closes all the engines of the pool and empties it. The connections of the asynchronous engines are
+        released by close_async
+        """
+        with self._lock:
+            engines = dict(self._engines)
+            self._engines.clear()
+            for async_engines in self._async_engines.values():
+                engines.update(async_engines)
+            self._async_engines.clear()
+        self._close_engines(engines)
+
+    async def close_async(self):
+        """
+        This coroutine closes all the engines of the pool and empties it, releasing the connections of the
+        asynchronous engines of the running event loop
+        """
+        with self._lock:
+            engines = self._async_engines.pop(asyncio.get_event_loop(), {})
+        for engine in engines.values():
+            try:
+                await engine.close_async()
+            except Exception as e:
+                logger.debug(f"Error in closing engine {type(engine).__name__}, {e}")
+        self._close_engines(engines)
+        self.close()
+
+    @staticmethod
+    def _close_engines(engines: Dict[Tuple[str, str, str, str], Engine]):
+        """
+        Internal method stopping the engines and releasing their blocking connections
+        :param engines: engines to close
+        """
+        for engine in engines.values():
+            try:
+                engine.close()
+            except Exception as e:
+                logger.debug(f"Error in closing engine {type(engine).__name__}, {e}")
+
+    @staticmethod
+    def _key(engine_conf: EngineConfig, auth: Auth) -> Tuple[str, str, str, str]:
+        """
+        :return: a key identifying the configuration and the user, the configurations are compared by all their settings
+        """
+        return str(engine_conf), type(auth).__name__, auth.username, auth.password
+
+
+# pool shared by the calls of this process
+_pool = EnginePool()
+
+
+def engine_pool() -> EnginePool:
+    """
+    :return: the engine pool shared by this process
+    """
+    return _pool
@@ -6,24 +6,44 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
-import fcntl
+import bisect
 import json
 import os
+import threading
 import time
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta
 from queue import Queue
-from typing import Any, Tuple
+from typing import Any, Dict, Iterator, List, Set, Tuple
 
 from .. import HOME_FOLDER, logger
 from ..authentication.auth import Auth
 from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
 from ..user_config import EngineConfig
+from . import DedupPolicy, ListenMode, TriggerOrdering
+from .adaptive_interval import AdaptiveInterval
+from .callback_executor import CallbackExecutor
+from .checkpoint_store import (
+    CHECKPOINT_EXTENSION,
+    LEGACY_CHECKPOINT_FILE,
+    CheckpointStore,
+    delete_checkpoint,
+    list_checkpoints,
+)
 from .engine import DATE_FORMAT, Engine
+from .lease_pool import LeasePool
+from .notification_dedup import NotificationDedup, process_dedup
 
 MAX_KV_RETURNED = 10000
+# key-values returned by each range of a transaction batching many ranges, so that the response stays well below the
+# max message size of the clients. The ranges with more changes are then retrieved a page at the time
+MAX_TXN_KV_RETURNED = 100
+MAX_TXN_OPS = 128  # default limit of operations in a single transaction of the etcd server
+WATCH_CHECK_INTERVAL = 1  # seconds between checks of the stop condition while watching
+WATCH_PROGRESS_MISSED = 3  # progress notifications missed after which a watch stream is considered dead
 LOCAL_STATE_FOLDER = "etcd/last"
-LAST_REVISION_FILE = "revision.json"
+REVISION_INDEX_MARGIN = timedelta(minutes=5)  # clock difference tolerated between the server and the clients
+MAX_STATUS_CONFLICTS = 10  # attempts to update a status changing concurrently
 
 
 class EtcdEngine(Engine, ABC):
@@ -34,6 +54,157 @@ class EtcdEngine(Engine, ABC):
 
     def __init__(self, config: EngineConfig, auth: Auth):
         super(EtcdEngine, self).__init__(config, auth)
+        # keys polled by the scheduler, with their next revision and callback
+        self._polled = {}
+        self._polled_lock = threading.Lock()
+        self._scheduler = None
+        # set to wake up the scheduler before the next key is due
+        self._poll_wakeup = threading.Event()
+        # checkpoint of the listener set each key belongs to
+        self._checkpoints = {}
+        self._checkpoint_interval = config.checkpoint_interval
+        self._checkpoint_revisions = config.checkpoint_revisions
+        # key of the time to revision index maintained by aviso-admin
+        self._revision_index_key = config.revision_index
+        # last status pushed or seen for each base key, used to link the next one without reading it first
+        self._statuses = {}
+        # leases shared by the keys expiring at about the same time
+        self._lease_pool = LeasePool(config.lease_granularity)
+        # triggers run apart from the polling, created by the first listener needing it
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._deferred_revs = {}  # next revision of the keys waiting for their triggers to complete
+        self._trigger_workers = config.trigger_workers
+        self._trigger_queue_size = config.trigger_queue_size
+        self._trigger_ordering = config.trigger_ordering
+        # notifications already delivered, to drop those fetched again
+        self._watch_progress_interval = config.watch_progress_interval
+        self._dedup_policy = config.dedup
+        if self._dedup_policy == DedupPolicy.LISTENER:
+            self._dedup = NotificationDedup()
+        elif self._dedup_policy == DedupPolicy.PROCESS:
+            self._dedup = process_dedup()
+        else:
+            self._dedup = None
+
+    def pull(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> List[Dict[str, any]]:
+        """
+        This method implements a query to the notification server for all the key-values associated to the key as input.
+        This key by default is a prefix, it can therefore return a set of key-values. All the pages of the result are
+        retrieved, use pull_iter to process them without holding them all in memory
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: List of key-value pairs formatted as dictionary
+        """
+        return list(self.pull_iter(key, key_only=key_only, rev=rev, prefix=prefix, min_rev=min_rev, max_rev=max_rev))
+
+    def pull_iter(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Iterator[Dict[str, any]]:
+        """
+        This method queries the notification server like pull but it returns the key-values one by one, requesting
+        them a page at the time
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: iterator of the key-value pairs formatted as dictionary
+        """
+        for page in self._pull_pages(key, key_only=key_only, rev=rev, prefix=prefix, min_rev=min_rev, max_rev=max_rev):
+            yield from page
+
+    def _pull_pages(
+        self,
+        key: str,
+        key_only: bool = False,
+        rev: int = None,
+        prefix: bool = True,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Iterator[List[Dict[str, any]]]:
+        """
+        This method pages through the range associated to the key. The keys are returned in descending order so each
+        page ends where the previous one has stopped. All the pages are read at the revision of the first one to
+        return a consistent result
+        :param key: input in the query
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: iterator of the pages of key-value pairs
+        """
+        # determine the range_end
+        if prefix:
+            range_end = self._incr_last_byte(key)
+        else:
+            range_end = None
+
+        while True:
+            kvs, more, header_rev = self._pull_page(
+                key, range_end=range_end, key_only=key_only, rev=rev, min_rev=min_rev, max_rev=max_rev
+            )
+            yield kvs
+            if not more or len(kvs) == 0:
+                return
+            logger.debug(f"More keys available for {key}, requesting the next page")
+            range_end = kvs[-1]["key"].encode()
+            rev = header_rev
+
+    @abstractmethod
+    def _pull_page(
+        self,
+        key: str,
+        range_end: bytes = None,
+        key_only: bool = False,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        This method implements a query to the notification server for one page of the key-values in the range as
+        input, sorted by key in descending order
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
+        """
+        pass
+
+    @abstractmethod
+    def _pull_batch(self, ranges: List[Tuple[str, int]]) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        This method queries the notification server for multiple prefixes in a single transaction. Each range is
+        limited to a page of MAX_TXN_KV_RETURNED pairs sorted by key in descending order, to bound the response
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        pass
 
     @abstractmethod
     def _latest_revision(self, key: str) -> int:
@@ -52,6 +223,193 @@ class EtcdEngine(Engine, ABC):
         """
         pass
 
+    def _pooled_lease(self, ttl: int) -> str:
+        """
+        This method returns a lease for the TTL specified, shared with the other keys expiring at about the same time.
+        A new lease is requested only if none of the pool fits
+        :param ttl: time to live of the keys to push
+        :return: lease id
+        """
+        bucket, lease_ttl = self._lease_pool.bucket(ttl)
+        lease = self._lease_pool.get(bucket)
+        if lease is None:
+            lease = self._lease(lease_ttl)
+            self._lease_pool.add(bucket, lease)
+        return lease
+
+    @abstractmethod
+    def _push_if_statuses(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        This method submits the key-value pairs and deletes the keys as a single transaction, only if the status of
+        the base keys has not changed
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        pass
+
+    def push_with_status(
+        self,
+        kvs: List[Dict[str, any]],
+        base_key: str,
+        message: str = "",
+        admin_key: str = None,
+        ks_delete: List[str] = None,
+        ttl: int = None,
+    ) -> bool:
+        """
+        Method to submit a list of key-value pairs and delete a list of keys from the server as a
+        single transaction. This method also updates the status of the base key.
+        The new status is linked to the last one seen by this engine, the transaction is committed only if this is
+        still the current status. Otherwise the transaction returns the current status and it is tried again, so a
+        single request is needed unless the status is updated concurrently.
+        :param kvs: List of KV pair
+        :param base_key: base key where to push the status
+        :param message: message to be part of the status update
+        :param admin_key: admin key to push together with the status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        lease = self._pooled_lease(ttl) if ttl else None
+        try:
+            return self._push_with_statuses(kvs, {base_key: (message, admin_key)}, ks_delete, lease)
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+
+    def push_many_with_status(self, updates: List[Dict[str, any]]) -> List[any]:
+        """
+        Method to submit many updates, each made of a list of key-value pairs and the status of its base key. The
+        updates are grouped by base key and committed in as few transactions as possible, each one updating once the
+        status of every base key it contains.
+        :param updates: List of updates, each a dictionary of kvs, base_key, message, admin_key and ttl
+        :return: for each update True if successful, otherwise the exception raised by its transaction
+        """
+        results = [None] * len(updates)
+        for indexes, kvs, statuses, ttl in self._status_chunks(updates):
+            lease = None
+            try:
+                lease = self._pooled_lease(ttl) if ttl else None
+                result = self._push_with_statuses(kvs, statuses, None, lease)
+            except Exception as e:
+                self._lease_pool.discard(lease)
+                logger.warning(f"Not able to submit {len(indexes)} updates of {', '.join(statuses)}, {e}")
+                logger.debug("", exc_info=True)
+                result = e
+            for i in indexes:
+                results[i] = result
+        return results
+
+    def _status_chunks(
+        self, updates: List[Dict[str, any]]
+    ) -> Iterator[Tuple[List[int], List[Dict[str, any]], Dict[str, Tuple[str, str]], int]]:
+        """
+        This method groups the updates by base key and ttl and splits them in chunks that can be committed as a single
+        transaction. A chunk cannot exceed MAX_TXN_OPS operations, including the statuses and the admin keys, nor write
+        the same key twice
+        :param updates: List of updates, each a dictionary of kvs, base_key, message, admin_key and ttl
+        :return: for each chunk a tuple: indexes of the updates, key-value pairs, message and admin key of each base
+        key, ttl
+        """
+        groups = {}
+        for i, update in enumerate(updates):
+            groups.setdefault((update["base_key"], update.get("ttl")), []).append(i)
+
+        indexes, kvs, keys, statuses, chunk_ttl = [], [], set(), {}, None
+        for (base_key, ttl), group in groups.items():
+            for i in group:
+                update = updates[i]
+                admin_key = update.get("admin_key")
+                update_keys = set(kv["key"] for kv in update["kvs"])
+                if base_key not in statuses:
+                    update_keys.update(k for k in (base_key, admin_key) if k)
+                full = len(keys) + len(update_keys) > MAX_TXN_OPS or not keys.isdisjoint(update_keys)
+                other_admin_key = base_key in statuses and statuses[base_key][1] != admin_key
+                if indexes and (full or ttl != chunk_ttl or other_admin_key):
+                    yield indexes, kvs, {b: ("; ".join(m), a) for b, (m, a) in statuses.items()}, chunk_ttl
+                    indexes, kvs, keys, statuses = [], [], set(), {}
+                    update_keys = set(kv["key"] for kv in update["kvs"])
+                    update_keys.update(k for k in (base_key, admin_key) if k)
+                indexes.append(i)
+                kvs.extend(update["kvs"])
+                keys.update(update_keys)
+                statuses.setdefault(base_key, ([], admin_key))[0].append(update.get("message", ""))
+                chunk_ttl = ttl
+        if indexes:
+            yield indexes, kvs, {b: ("; ".join(m), a) for b, (m, a) in statuses.items()}, chunk_ttl
+
+    def _push_with_statuses(
+        self, kvs: List[Dict[str, any]], statuses: Dict[str, Tuple[str, str]], ks_delete: List[str], lease: str
+    ) -> bool:
+        """
+        This method pushes the key-value pairs together with the new status of each base key. Each status is linked
+        to the last one seen by this engine, if any of them has changed meanwhile the transaction is tried again
+        :param kvs: List of KV pair
+        :param statuses: message and admin key of each base key
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :return: True if successful
+        """
+        old_statuses = {base_key: self._statuses.get(base_key, []) for base_key in statuses}
+        for i in range(MAX_STATUS_CONFLICTS):
+            status_kvs, status_revs = self._add_statuses(kvs, statuses, old_statuses)
+            pushed, rev, current_statuses = self._push_if_statuses(status_kvs, ks_delete, lease, status_revs)
+            if pushed:
+                for base_key in statuses:
+                    self._update_status(base_key, status_kvs, rev)
+                return True
+            logger.debug(f"Status of {', '.join(statuses)} changed at revision {rev}, trying again...")
+            old_statuses.update(current_statuses)
+            self._statuses.update(current_statuses)
+        raise EngineException(f"Not able to update the status of {', '.join(statuses)}, too many concurrent updates")
+
+    def _add_statuses(
+        self,
+        kvs: List[Dict[str, any]],
+        statuses: Dict[str, Tuple[str, str]],
+        old_statuses: Dict[str, List[Dict[str, any]]],
+    ) -> Tuple[List[Dict[str, any]], Dict[str, int]]:
+        """
+        :param kvs: List of KV pair
+        :param statuses: message and admin key of each base key
+        :param old_statuses: status each new one is linked to, for each base key
+        :return: a tuple: key-value pairs including the new statuses, revision expected for each old status
+        """
+        status_kvs = list(kvs)
+        status_revs = {}
+        for base_key, (message, admin_key) in statuses.items():
+            old_status_kvs = old_statuses[base_key]
+            self._add_status(status_kvs, base_key, old_status_kvs, message, admin_key)
+            status_revs[base_key] = old_status_kvs[0]["mod_rev"] if len(old_status_kvs) == 1 else 0
+        return status_kvs, status_revs
+
+    def _update_status(self, base_key: str, kvs: List[Dict[str, any]], rev: int):
+        """
+        This method remembers the status just pushed, so the next status can be linked to it
+        :param base_key: base key of the status
+        :param kvs: List of KV pair pushed, including the status
+        :param rev: revision of the server after the push
+        """
+        status_kv = next(kv for kv in reversed(kvs) if kv["key"] == base_key)
+        self._statuses[base_key] = [{"key": base_key, "value": status_kv["value"].encode(), "mod_rev": rev}]
+
+    def _watching(self, key: str, next_rev: int, trigger_callback: callable([list])):
+        """
+        This method implements the listening by relying on the server-side watch mechanism. It is only available for
+        the engines supporting it
+        :param key: key to watch as a prefix
+        :param next_rev: revision from when to start watching
+        :param trigger_callback: function to call with the list of key-values changed
+        :return:
+        """
+        raise EngineException(f"Listen mode {ListenMode.WATCH} not supported by {type(self).__name__}")
+
     def _polling(
         self,
         key: str,
@@ -74,6 +432,9 @@ class EtcdEngine(Engine, ABC):
             for notification in notifications:
                 v = notification["value"].decode()
                 k = notification["key"]
+                if not self._first_delivery(callback, notification):
+                    logger.debug(f"Notification for key {k} already delivered, dropped")
+                    continue
                 logger.debug(f"Notification received for key {k}")
                 try:
                     callback(k, v)
@@ -89,17 +450,19 @@ class EtcdEngine(Engine, ABC):
             if from_date is None:  # no start date defined
                 if self.catchup is None:
                     raise EngineException("catchup not defined for notification engine")
+                checkpoint = self._checkpoints[key]
                 if self.catchup:  # we start from the saved one
-                    saved_rev = self._last_saved_revision()
+                    saved_rev = checkpoint.load()
                     if saved_rev != -1:
                         logger.info("Starting from last notification received")
                         next_rev = saved_rev
                     else:  # if it's the first time we start from now
                         next_rev = self._latest_revision(key) + 1
                 else:  # delete the saved state
-                    self._delete_saved_revision()
+                    checkpoint.reset()
                     # we start from now
                     next_rev = self._latest_revision(key) + 1
+                checkpoint.update(key, next_rev)
 
             else:  # start date defined
                 logger.info("Searching for past notifications...")
@@ -118,14 +481,9 @@ class EtcdEngine(Engine, ABC):
             # check end date
             if to_date:  # end date defined, retrieve only past notifications
                 if final_rev:
-                    kvs = self.pull(key, min_rev=next_rev, max_rev=final_rev)
-                    # remove the status from the result
-                    for kv in kvs:
-                        if kv["key"] == key:  # this is the status
-                            kvs.remove(kv)
-                            break
-                    # trigger the callback
-                    trigger_callback(kvs)
+                    # trigger the callback a page at the time, removing the status from the result
+                    for kvs in self._pull_pages(key, min_rev=next_rev, max_rev=final_rev):
+                        trigger_callback([kv for kv in kvs if kv["key"] != key])
                 # de-register this pooling thread as we have finished
                 self.stop(key)
                 logger.info("Search and retrieval completed")
@@ -134,118 +492,397 @@ class EtcdEngine(Engine, ABC):
                     channel.put(True)
                     return
 
-            else:  # no end date defined, start the polling for new notifications
-                while key in self._listeners:  # this is the stop condition
-                    # retrieve any change since the last revision
-                    kvs = self.pull(key, min_rev=next_rev)
-                    # remove the status from the result
-                    for kv in kvs:
-                        if kv["key"] == key:  # this is the status
-                            kvs.remove(kv)
-                            break
-                    if len(kvs) > 0:
-                        # update the current revision
-                        for kv in kvs:
-                            if next_rev < kv["mod_rev"] + 1:
-                                next_rev = kv["mod_rev"] + 1
-                        # save current rev
-                        self._save_last_revision(next_rev)
-                        # trigger the callback
-                        trigger_callback(kvs)
-                    # wait the polling interval before trying again
-                    time.sleep(self._polling_interval)
+            elif self.listen_mode == ListenMode.WATCH:  # no end date defined, watch for new notifications
+                self._watching(key, next_rev, trigger_callback)
+
+            else:  # no end date defined, hand the key to the scheduler polling for new notifications
+                self._schedule_polling(key, next_rev, trigger_callback, channel)
 
         except Exception as e:
             logger.error(f"Error while listening to key {key}: {e}")
             logger.debug("", exc_info=True)
             channel.put(False)
 
-    def _last_saved_revision(self) -> int:
+    def _first_delivery(self, callback: callable([str, str]), kv: Dict[str, any]) -> bool:
+        """
+        This method checks a notification is delivered for the first time, according to the deduplication policy
+        :param callback: function of the listener the notification is delivered to
+        :param kv: key-value pair of the notification
+        :return: True if the notification has to be delivered, False if it is a duplicate
+        """
+        if self._dedup is None or kv.get("mod_rev") is None:
+            return True
+        # the same listener has the same callback for all its keys
+        scope = callback if self._dedup_policy == DedupPolicy.LISTENER else (self.host, self.port)
+        return self._dedup.first(scope, kv["key"], kv["mod_rev"])
+
+    def _schedule_polling(self, key: str, next_rev: int, trigger_callback: callable([list]), channel: Queue):
+        """
+        This method adds the key to the ones polled by the scheduler of this engine. A single thread polls all the keys
+        of the engine, starting it if not running yet
+        :param key: key to poll as a prefix
+        :param next_rev: revision from when to poll
+        :param trigger_callback: function to call with the list of key-values changed
+        :param channel: global communication channel among threads
+        """
+        with self._polled_lock:
+            self._polled[key] = {
+                "next_rev": next_rev,
+                "trigger_callback": trigger_callback,
+                "channel": channel,
+                "interval": self._adaptive_interval(),
+                "checkpoint": self._checkpoints[key],
+            }
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._scheduling)
+                self._scheduler.setDaemon(True)
+                self._scheduler.start()
+                logger.debug(f"Scheduler thread {self._scheduler.ident} started")
+        # the new key is due straight away
+        self._poll_wakeup.set()
+
+    def _scheduling(self):
         """
-        This method is used to read the last revision saved to file in the home folder
-        :return: last revision or -1 if no revision could be read
+        This method implements the active polling of all the keys handed to the scheduler. Each key has its own
+        polling interval, the keys due are retrieved together by batching their prefixes in as few transactions as
+        possible
         """
-        # build the path where the last revision is saved
-        full_home_path = os.path.expanduser(HOME_FOLDER)
-        full_rev_path = os.path.join(full_home_path, LOCAL_STATE_FOLDER, LAST_REVISION_FILE)
-        if os.path.exists(full_rev_path):
+        while True:
+            self._poll_wakeup.clear()
+            with self._polled_lock:
+                # drop the keys no longer listened, this is the stop condition
+                listening = set(self._listeners)
+                for key in [k for k in self._polled if k not in listening]:
+                    del self._polled[key]
+                if len(self._polled) == 0:
+                    self._scheduler = None
+                    logger.debug("No more keys to poll, scheduler stopped")
+                    return
+                polled = self._due_keys(self._polled)
+
             try:
-                with open(full_rev_path, "r") as f:
-                    # acquire a file lock to avoid concurrency among processes
-                    fcntl.lockf(f, fcntl.LOCK_SH)
-                    rev_dict = json.loads(f.read())
-                    last_rev = rev_dict["last_revision"]
-                    # release file lock
-                    fcntl.lockf(f, fcntl.LOCK_UN)
-                logger.debug(f"Last revision saved is {last_rev}")
-                return last_rev
+                if len(polled) > 0:
+                    self._poll_cycle(polled)
             except Exception as e:
-                logger.warning(f"Error occurred while reading the last revision saved: {e}")
+                logger.error(f"Error while polling keys {list(polled)}: {e}")
                 logger.debug("", exc_info=True)
+                with self._polled_lock:
+                    channels = set(p["channel"] for p in self._polled.values())
+                    self._polled.clear()
+                    self._scheduler = None
+                for channel in channels:
+                    channel.put(False)
+                return
 
-        # default return
-        return -1
+            # wait until the next key is due, or a new key is added
+            with self._polled_lock:
+                wait = self._next_due(self._polled)
+            self._poll_wakeup.wait(wait)
 
-    def _delete_saved_revision(self):
+    def stop(self, key: str = None) -> bool:
         """
-        This method is used to delete the file where the last revision is saved
+        This method is used to stop a listening thread. if no key is provided all the listening thread will be stopped
+
+        :param key: the key associated to the listening thread
+        :return: True if the listener is cancelled, False otherwise
         """
-        # build the path where the last revision is saved
-        full_home_path = os.path.expanduser(HOME_FOLDER)
-        full_state_path = os.path.join(full_home_path, LOCAL_STATE_FOLDER)
-        full_rev_path = os.path.join(full_state_path, LAST_REVISION_FILE)
+        result = super(EtcdEngine, self).stop(key)
+        # wake up the scheduler so it can drop the keys stopped
+        self._poll_wakeup.set()
+        # save the revisions delivered so far
+        if key is None:
+            checkpoints = set(self._checkpoints.values())
+        else:
+            checkpoints = set([self._checkpoints[key]]) if key in self._checkpoints else set()
+        for checkpoint in checkpoints:
+            checkpoint.flush()
+        return result
 
-        with self._state_lock:  # multiple listing threads could access this simultaneously
-            if os.path.exists(full_rev_path):
-                try:
-                    # delete the file
-                    os.remove(full_rev_path)
-                    logger.debug("Last revision file has been successfully deleted")
-                except Exception:
-                    logger.warning(f"Deleting the last revision file has failed: {full_rev_path}")
-                    logger.debug("", exc_info=True)
-                    return False
+    def close(self):
+        """
+        This method stops all the listeners of this engine, waits for the triggers already started and releases its
+        connections
+        """
+        super(EtcdEngine, self).close()
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            # the triggers not started yet are dropped, their notifications are not checkpointed
+            executor.close(cancel=True)
+            # save the revisions delivered by the last triggers
+            for checkpoint in set(self._checkpoints.values()):
+                checkpoint.flush()
 
-    def _save_last_revision(self, rev: int) -> bool:
+    @property
+    def trigger_executor(self) -> CallbackExecutor:
         """
-        This method is used to save to file the revision passed as the last revision pulled
-        :param rev: last revision to save
-        :return: True if saved otherwise False
+        :return: the executor running the triggers of the notifications received, with their queue depth and latency
         """
-        if rev is not None:
-            rev_dict = {
-                "last_revision": rev,
-                "date_time": datetime.utcnow().strftime(DATE_FORMAT),
-                "server_host": self.host,
-                "server_port": self.port,
-            }
-            # build the path where the last revision will be saved
-            full_home_path = os.path.expanduser(HOME_FOLDER)
-            full_state_path = os.path.join(full_home_path, LOCAL_STATE_FOLDER)
-
-            with self._state_lock:  # multiple listing threads could access this simultaneously
-                if not os.path.exists(full_state_path):
-                    try:
-                        os.makedirs(full_state_path, exist_ok=True)
-                    except OSError:
-                        logger.warning(f"Cannot create the directory for the last revision: {full_state_path}")
-                        logger.debug("", exc_info=True)
-                        return False
-                try:
-                    full_rev_path = os.path.join(full_state_path, LAST_REVISION_FILE)
-                    with open(full_rev_path, "w") as f:
-                        # acquire a file lock to avoid concurrency among processes
-                        fcntl.lockf(f, fcntl.LOCK_EX)
-                        # write the revision in the file
-                        json.dump(rev_dict, f)
-                        # release file lock
-                        fcntl.lockf(f, fcntl.LOCK_UN)
-                    logger.debug(f"Last revision pulled {rev} has been successfully saved")
-                except Exception:
-                    logger.warning(f"Saving of the last revision has failed: {full_state_path}")
-                    logger.debug("", exc_info=True)
-                    return False
-        return True
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = CallbackExecutor(self._trigger_workers, self._trigger_queue_size)
+            return self._executor
+
+    def _deliver(self, key: str, kvs: List[Dict[str, any]], next_rev: int, trigger_callback: callable([list])):
+        """
+        This method hands the changes of a key to the trigger executor, so the listening can go on while the triggers
+        run. The checkpoint of the key advances to the next revision only once the triggers submitted before have
+        completed
+        :param key: key listened
+        :param kvs: changes of the key, possibly empty
+        :param next_rev: next revision of the key once the changes are delivered, None to leave the checkpoint where
+        it is as more changes of the same revisions follow
+        :param trigger_callback: function to call with the list of key-values changed
+        """
+        task = self._delivery(key, kvs, next_rev, trigger_callback)
+        if task is not None:
+            self.trigger_executor.submit(*task)
+
+    def _delivery(
+        self, key: str, kvs: List[Dict[str, any]], next_rev: int, trigger_callback: callable([list])
+    ) -> Tuple[str, callable(()), callable(())]:
+        """
+        This method prepares the delivery of the changes of a key, see _deliver
+        :param key: key listened
+        :param kvs: changes of the key, possibly empty
+        :param next_rev: next revision of the key once the changes are delivered, None if more changes follow
+        :param trigger_callback: function to call with the list of key-values changed
+        :return: the arguments to submit to the trigger executor, None if nothing has to be submitted
+        """
+        checkpoint = self._checkpoints[key]
+        ordering_key = key if self._trigger_ordering == TriggerOrdering.KEY else checkpoint.name
+
+        def done():
+            checkpoint.update(key, next_rev)
+            checkpoint.save()
+
+        if next_rev is None:
+            return ordering_key, lambda: trigger_callback(kvs), None
+        elif len(kvs) > 0:
+            return ordering_key, lambda: trigger_callback(kvs), done
+        elif self._executor is not None and self._executor.pending(ordering_key):
+            # the checkpoint cannot move past the changes still to deliver, a single update per key waits for them
+            with self._executor_lock:
+                queued = key in self._deferred_revs
+                self._deferred_revs[key] = next_rev
+            if not queued:
+                return ordering_key, None, lambda: self._deferred_update(key)
+        else:
+            checkpoint.update(key, next_rev)
+        return None
+
+    def _deferred_update(self, key: str):
+        """
+        This method advances the checkpoint of a key to the last revision polled while its triggers were running
+        :param key: key listened
+        """
+        with self._executor_lock:
+            next_rev = self._deferred_revs.pop(key)
+        checkpoint = self._checkpoints[key]
+        checkpoint.update(key, next_rev)
+        checkpoint.save()
+
+    @property
+    def polling_intervals(self) -> Dict[str, float]:
+        """
+        :return: the current polling interval of each key polled, in seconds
+        """
+        with self._polled_lock:
+            return {key: p["interval"].interval for key, p in self._polled.items()}
+
+    def _adaptive_interval(self) -> AdaptiveInterval:
+        """
+        :return: the polling interval of a new key, according to the configuration of the engine
+        """
+        return AdaptiveInterval(
+            self._polling_interval,
+            self._polling_interval_min,
+            self._polling_interval_max,
+            backoff=self._polling_backoff,
+            jitter=self._polling_jitter,
+        )
+
+    def _due_keys(self, polled: Dict[str, Dict[str, any]]) -> Dict[str, Dict[str, any]]:
+        """
+        This method selects the keys to poll. The keys due within the jitter of the min interval are polled as well,
+        so that they are still batched together
+        :param polled: keys polled with their next revision, callback and interval
+        :return: the keys whose poll is due
+        """
+        horizon = time.monotonic() + self._polling_interval_min * self._polling_jitter
+        return {key: p for key, p in polled.items() if p["interval"].due <= horizon}
+
+    @staticmethod
+    def _next_due(polled: Dict[str, Dict[str, any]]) -> float:
+        """
+        :param polled: keys polled with their next revision, callback and interval
+        :return: number of seconds until the next key is due
+        """
+        if len(polled) == 0:
+            return 0
+        return max(min(p["interval"].due for p in polled.values()) - time.monotonic(), 0)
+
+    def _poll_cycle(self, polled: Dict[str, Dict[str, any]]):
+        """
+        This method retrieves any change since the last revision of the keys polled and triggers their callbacks. The
+        keys under another one are retrieved with it, the others are batched as multiple ranges of a transaction. The
+        interval of each key is then adapted to whether it has changed
+        :param polled: keys polled with their next revision, callback and interval
+        """
+        groups = self._covering_prefixes(polled.keys())
+        prefixes = list(groups.keys())
+        checkpoints = set()
+        for i in range(0, len(prefixes), MAX_TXN_OPS):
+            ranges = [(p, min(polled[k]["next_rev"] for k in groups[p])) for p in prefixes[i : i + MAX_TXN_OPS]]
+            results, header_rev = self._pull_batch(ranges)
+            for (prefix, min_rev), (kvs, more) in zip(ranges, results):
+                keys = groups[prefix]
+                changed = set()
+                if more:
+                    # too many changes for a single page, deliver them a page at the time, all read at the same revision
+                    pages = self._pull_pages(prefix, rev=header_rev, min_rev=min_rev)
+                    kvs = next(pages)
+                    for next_kvs in pages:
+                        changed.update(self._route(keys, polled, kvs))
+                        kvs = next_kvs
+                # the last page moves the keys to the revision of the transaction
+                changed.update(self._route(keys, polled, kvs, header_rev))
+                for key in keys:
+                    # poll again sooner if the key is busy, later if it is quiet
+                    polled[key]["interval"].update(key in changed)
+                    checkpoints.add(polled[key]["checkpoint"])
+        # the checkpoints are written only every few cycles
+        for checkpoint in checkpoints:
+            checkpoint.save()
+
+    def _route(
+        self, keys: List[str], polled: Dict[str, Dict[str, any]], kvs: List[Dict[str, any]], header_rev: int = None
+    ) -> Set[str]:
+        """
+        This method routes a page of the changes of a prefix to the keys under it and triggers their callbacks
+        :param keys: keys under the prefix
+        :param polled: keys polled with their next revision, callback and interval
+        :param kvs: page of the changes of the prefix
+        :param header_rev: revision the prefix was read at, None if more pages follow. The keys and their checkpoints
+        move past it only with the last page
+        :return: the keys changed
+        """
+        changed = set()
+        for key in keys:
+            listener = polled[key]
+            key_kvs = self._key_changes(key, kvs, listener["next_rev"])
+            if len(key_kvs) > 0:
+                changed.add(key)
+            if header_rev is not None:
+                # all the changes up to the revision of the transaction have been read, a member lagging behind
+                # the one read last time cannot move the listener back
+                listener["next_rev"] = max(listener["next_rev"], header_rev + 1)
+                # trigger the callback, once delivered a restart can skip the changes
+                self._deliver(key, key_kvs, listener["next_rev"], listener["trigger_callback"])
+            elif len(key_kvs) > 0:
+                self._deliver(key, key_kvs, None, listener["trigger_callback"])
+        return changed
+
+    @staticmethod
+    def _key_changes(key: str, kvs: List[Dict[str, any]], next_rev: int) -> List[Dict[str, any]]:
+        """
+        :param key: key listened
+        :param kvs: changes of a prefix of the key
+        :param next_rev: next revision of the key
+        :return: the changes of the key not delivered yet, removing its status
+        """
+        return [kv for kv in kvs if kv["key"].startswith(key) and kv["key"] != key and kv["mod_rev"] >= next_rev]
+
+    @staticmethod
+    def _covering_prefixes(keys) -> Dict[str, List[str]]:
+        """
+        This method groups the keys under the shortest of them that is their prefix, these are retrieved in a
+        single range
+        :param keys: keys to group
+        :return: dictionary of the covering prefixes with the list of keys under each of them
+        """
+        groups = {}
+        prefix = None
+        for key in sorted(keys):
+            if prefix is not None and key.startswith(prefix):
+                groups[prefix].append(key)
+            else:
+                prefix = key
+                groups[prefix] = [key]
+        return groups
+
+    def listen(
+        self, keys: List[str], callback: callable([str, str]), from_date: datetime = None, to_date: datetime = None
+    ) -> bool:
+        """
+        This method allows to listen for changes to specific keys. The keys listened together share a checkpoint of
+        the last revision delivered, used to catch up when listening to the same keys again.
+
+        :param keys: keys to watch
+        :param callback: function to trigger in case of changes
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :return: True if the listener is in execution, False otherwise
+        """
+        self._add_checkpoint(keys)
+        return super(EtcdEngine, self).listen(keys, callback, from_date, to_date)
+
+    def _add_checkpoint(self, keys: List[str]) -> CheckpointStore:
+        """
+        This method creates the checkpoint of the keys listened together
+        :param keys: keys listened together
+        :return: the checkpoint
+        """
+        checkpoint = self._checkpoint_store(keys)
+        for key in keys:
+            self._checkpoints[key] = checkpoint
+        return checkpoint
+
+    def _checkpoint_store(self, keys: List[str]) -> CheckpointStore:
+        """
+        :param keys: keys listened together
+        :return: the checkpoint of the keys, according to the configuration of the engine
+        """
+        return CheckpointStore(
+            self._checkpoint_folder(),
+            keys,
+            self.host,
+            self.port,
+            interval=self._checkpoint_interval,
+            revisions=self._checkpoint_revisions,
+        )
+
+    @staticmethod
+    def _checkpoint_folder() -> str:
+        """
+        :return: the folder in the home folder where the checkpoints are saved
+        """
+        return os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+
+    def checkpoints(self) -> List[Dict[str, any]]:
+        """
+        This method is used to inspect the checkpoints saved for this server
+        :return: for each set of keys listened, the keys, the last revision saved and when it was saved
+        """
+        return [
+            c
+            for c in list_checkpoints(self._checkpoint_folder())
+            if c.get("server_host") == self.host and c.get("server_port") == self.port
+        ]
+
+    def reset_checkpoints(self, keys: List[str] = None) -> bool:
+        """
+        This method deletes the checkpoints saved for this server, so that the next listening starts from now
+        :param keys: keys listened together whose checkpoint is deleted, if None all the checkpoints are deleted
+        :return: True if successful, False otherwise
+        """
+        if keys is not None:
+            return self._checkpoint_store(keys).reset()
+        folder = self._checkpoint_folder()
+        result = delete_checkpoint(os.path.join(folder, LEGACY_CHECKPOINT_FILE))
+        for c in self.checkpoints():
+            result = delete_checkpoint(os.path.join(folder, c["name"] + CHECKPOINT_EXTENSION)) and result
+        return result
 
     def _retrieve_status_history(self, key, rev=None) -> Tuple[int, Any, int, Any]:
         """
@@ -321,8 +958,26 @@ class EtcdEngine(Engine, ABC):
             to_rev = status_rev
 
         # start navigating the history
+        index = None  # read only if needed
         while status_date > from_date and status_prev_rev != -1:
-            if status_date.date() == from_date.date():  # same day
+            if index is None:
+                index = self._revision_index()
+            # first jump close to the date searched, using the index if it has a revision older than the current one
+            seek_date = to_date if to_date and to_rev is None else from_date
+            seek_rev = self._indexed_revision(index, seek_date)
+            seek_status = None
+            if seek_rev is not None and seek_rev < status_rev:
+                seek_status = self._retrieve_status_history(key, seek_rev)
+                if seek_status[1] is None:
+                    # no status before this revision or compacted, any older revision of the index is the same
+                    logger.debug(f"No status available at revision {seek_rev}, walking back the history")
+                    seek_status = None
+                    index = []
+            if seek_status is not None:
+                status_rev, status_date, status_prev_rev, status_last_prev_day_rev = seek_status
+            elif status_date.date() == from_date.date() or (
+                to_date and to_rev is None and status_date.date() == to_date.date()
+            ):  # same day of the dates searched
                 # go back one revision
                 status_rev, status_date, status_prev_rev, status_last_prev_day_rev = self._retrieve_status_history(
                     key, status_prev_rev
@@ -354,6 +1009,36 @@ class EtcdEngine(Engine, ABC):
 
         return from_rev, to_rev
 
+    def _revision_index(self) -> List[Tuple[datetime, int]]:
+        """
+        This method retrieves the time to revision index periodically updated by aviso-admin
+        :return: list of dates with the revision of the server at that date, sorted, empty if not available
+        """
+        if not self._revision_index_key:
+            return []
+        try:
+            kvs = self.pull(self._revision_index_key, prefix=False)
+        except EngineException as e:
+            logger.debug(f"Revision index not available, {e}")
+            return []
+        if len(kvs) == 0:
+            logger.debug("Revision index not available")
+            return []
+        index = json.loads(kvs[0]["value"].decode())
+        return sorted((datetime.strptime(i["timestamp"], DATE_FORMAT), i["revision"]) for i in index)
+
+    @staticmethod
+    def _indexed_revision(index: List[Tuple[datetime, int]], date: datetime) -> int:
+        """
+        This method searches the index for the first revision of the server certainly later than the date. All the
+        statuses newer than this revision are therefore later than the date as well
+        :param index: list of dates with the revision of the server at that date, sorted
+        :param date: date searched
+        :return: the revision or None if the index has no revision later than the date
+        """
+        i = bisect.bisect_left(index, (date + REVISION_INDEX_MARGIN,))
+        return index[i][1] if i < len(index) else None
+
     def _incr_last_byte(self, path: str) -> bytes:
         """
         This function determines the end of the range required for a range call with the etcd3 API
@@ -6,68 +6,238 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
-from typing import Dict, List
+import time
+from queue import Empty, Queue
+from typing import Dict, List, Tuple
 
 import grpc
 from etcd3 import Etcd3Client, etcdrpc
+from etcd3.client import EtcdTokenCallCredentials
+from etcd3.events import PutEvent
+from etcd3.exceptions import (
+    ConnectionFailedError,
+    ConnectionTimeoutError,
+    RevisionCompactedError,
+    WatchTimedOut,
+)
 
 from .. import logger
 from ..authentication.auth import Auth
 from ..authentication.etcd_auth import EtcdAuth
+from ..authentication.token_manager import TokenManager
 from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
 from ..user_config import EngineConfig
-from .etcd_engine import MAX_KV_RETURNED, EtcdEngine
+from .etcd_engine import (
+    MAX_KV_RETURNED,
+    MAX_TXN_KV_RETURNED,
+    WATCH_CHECK_INTERVAL,
+    WATCH_PROGRESS_MISSED,
+    EtcdEngine,
+)
+from .key_value import KeyValue
+from .member_pool import PROBE_TIMEOUT, Member, MemberPool
+
+# keepalive pings of the channels, a connection not answering is closed so the streams open on it fail. The etcd server
+# rejects the pings more frequent than 5s by default
+KEEPALIVE_TIME = 30000  # milliseconds between the pings of a connection with open streams
+KEEPALIVE_TIMEOUT = 10000  # milliseconds to wait for the answer of a ping
+GRPC_OPTIONS = [
+    ("grpc.keepalive_time_ms", KEEPALIVE_TIME),
+    ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT),
+    # keep pinging while a watch stream is idle
+    ("grpc.http2.max_pings_without_data", 0),
+]
 
 
 class EtcdGrpcEngine(EtcdEngine):
     """
     This class is a specialisation of the Engine class, able to connect to a etcd3 server directly via the gRPC
-    interface. This class is relying on the pythonEtcd3 python module for implementing the gRPC protocol.
+    interface. This class is relying on the pythonEtcd3 python module for implementing the gRPC protocol. If multiple
+    endpoints are configured, the polling is spread across the members of the cluster while the other requests are
+    sent to the leader, failing over to the next member.
     """
 
     def __init__(self, config: EngineConfig, auth: Auth):
         super(EtcdGrpcEngine, self).__init__(config, auth)
+        endpoints = config.endpoints
+        self._members = MemberPool(endpoints, status=self._member_status if len(endpoints) > 1 else None)
         self._initialise_server()
         self._listening_list = []
         # set base url
         self._base_url = f"http://{self._host}:{self._port}/v3/"
 
     def _initialise_server(self):
+        # the clients are created without credentials, the token is handled by the token manager and set on the
+        # clients so that the channels are kept alive when the token is refreshed
+        self._servers = {
+            m.address: Etcd3Client(m.host, m.port, timeout=self.timeout, grpc_options=GRPC_OPTIONS)
+            for m in self._members.members
+        }
+        # the client of the first member builds the requests and holds the locks
+        self._server = self._servers[self._members.members[0].address]
         if type(self.auth) == EtcdAuth:
-            self._server = Etcd3Client(
-                self.host, self.port, user=self.auth.username, password=self.auth.password, timeout=self.timeout
-            )
+            self._token_manager = TokenManager(self._request_token)
+            self._authenticate()
         else:
-            self._server = Etcd3Client(self.host, self.port, timeout=self.timeout)
+            self._token_manager = None
+
+    def close(self):
+        """
+        This method stops all the listeners of this engine and closes its channels
+        """
+        super(EtcdGrpcEngine, self).close()
+        for server in self._servers.values():
+            server.close()
+
+    def _authenticate(self):
+        """
+        This method makes sure the client uses a valid token, this is only done for Etcd authentication. The token is
+        requested to the server only the first time and once expired, otherwise the cached one is used
+        :return: the metadata to attach to the requests
+        """
+        if self._token_manager is not None:
+            self._set_token(self._token_manager.token())
+        return self._server.metadata
+
+    def _refresh_token(self, metadata):
+        """
+        This method replaces the token rejected by the server. The token is requested only once if multiple threads
+        have been rejected with the same token
+        :param metadata: metadata attached to the rejected request
+        """
+        if self._token_manager is not None:
+            rejected_token = dict(metadata).get("token") if metadata else None
+            self._set_token(self._token_manager.refresh(rejected_token))
+
+    def _request_token(self) -> str:
+        """
+        This method authenticates the user to the server
+        :return: the new token
+        """
+        logger.debug(f"Authenticating user {self.auth.username}...")
+        auth_request = etcdrpc.AuthenticateRequest(name=self.auth.username, password=self.auth.password)
+        try:
+            resp = self._call(lambda server: etcdrpc.AuthStub(server.channel).Authenticate(auth_request, self.timeout))
+        except grpc.RpcError as e:
+            raise EngineException(f"Not able to authenticate {self.auth.username}, {e}")
+        logger.debug(f"User {self.auth.username} successfully authenticated")
+        return resp.token
+
+    def _set_token(self, token: str):
+        """
+        Internal method setting the token on the clients, including their watcher that reads it every time its stream
+        is created again. The watcher has no public setter and it cannot be replaced as it holds the watches running,
+        so its attributes are set directly: these are those of the etcd3 versions allowed by the requirements
+        :param token: token to use
+        """
+        if self._server.metadata is not None and dict(self._server.metadata).get("token") == token:
+            return
+        for server in self._servers.values():
+            server.metadata = (("token", token),)
+            server.call_credentials = grpc.metadata_call_credentials(EtcdTokenCallCredentials(token))
+            server.watcher._metadata = server.metadata
+            server.watcher._credentials = server.call_credentials
+        self.auth.token = token
+
+    def _call(self, request: callable([Etcd3Client]), serializable: bool = False, idempotent: bool = True):
+        """
+        This method sends a request to the members of the cluster in turn, until one of them is reachable. The
+        requests not idempotent are sent to the next member only if the channel to the member could not be connected,
+        as once sent they may have been applied even if failing
+        :param request: function sending the request with the client of a member
+        :param serializable: True if the request can be served by any member, False if it should go to the leader
+        :param idempotent: True if the request can be sent again after failing
+        :return: the response of the server
+        """
+        members = self._members.order(serializable)
+        for i, member in enumerate(members):
+            server = self._servers[member.address]
+            if not idempotent and i < len(members) - 1:
+                try:
+                    grpc.channel_ready_future(server.channel).result(timeout=self.timeout)
+                except grpc.FutureTimeoutError:
+                    # nothing has been sent to the member
+                    self._members.failed(member)
+                    logger.warning(f"Unable to connect to {member}, trying the next member...")
+                    continue
+            try:
+                response = request(server)
+            except grpc.RpcError as e:
+                if e.code() in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED):
+                    self._members.failed(member)
+                    if i < len(members) - 1 and idempotent:
+                        logger.warning(f"Unable to connect to {member}, trying the next member...")
+                        logger.debug(f"Error {e}")
+                        continue
+                raise
+            self._members.succeeded(member)
+            return response
+
+    def _call_kv(self, method: str, request, serializable: bool = False, idempotent: bool = True):
+        """
+        This method sends a request to the KV service of the cluster. If the server rejects the token, this is
+        refreshed and the request is sent once more
+        :param method: name of the method of the KV stub
+        :param request: request to send
+        :param serializable: True if the request can be served by any member, False if it should go to the leader
+        :param idempotent: True if the request can be sent again after timing out
+        :return: the response of the server
+        """
+        try_again = True
+        while try_again:
+            metadata = self._authenticate()
+            try:
+                try_again = False
+                return self._call(
+                    lambda server: getattr(server.kvstub, method)(
+                        request, server.timeout, credentials=server.call_credentials, metadata=metadata
+                    ),
+                    serializable=serializable,
+                    idempotent=idempotent,
+                )
+            except grpc._channel._InactiveRpcError as e:
+                if e._state.code.name == "UNAUTHENTICATED":
+                    # the token has expired or has been revoked, refresh it and try again
+                    try_again = True
+                    logger.debug(f"Error {e}, trying again", exc_info=True)
+                    self._refresh_token(metadata)
+                else:
+                    raise
+
+    def _member_status(self, member: Member) -> Tuple[int, int]:
+        """
+        This method is used as health probe of the members of the cluster
+        :param member: member to ask
+        :return: a tuple: id of the member, id of the leader it knows
+        """
+        server = self._servers[member.address]
+        status = server.maintenancestub.Status(
+            etcdrpc.StatusRequest(), PROBE_TIMEOUT, credentials=server.call_credentials, metadata=server.metadata
+        )
+        return status.header.member_id, status.leader
 
-    def pull(
+    def _pull_page(
         self,
         key: str,
+        range_end: bytes = None,
         key_only: bool = False,
         rev: int = None,
-        prefix: bool = True,
         min_rev: int = None,
         max_rev: int = None,
-    ) -> List[Dict[str, any]]:
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
         """
-        This method implements a query to the notification server for all the key-values associated to the key as input.
-        This key by default is a prefix, it can therefore return a set of key-values
-        :param key: input in the query
+        This method implements a query to the notification server for one page of the key-values in the range as input
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
         :param key_only: if True no values are returned
         :param rev: revision to pull
-        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
         :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
         :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
-        :return: List of key-value pairs formatted as dictionary
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
         """
         logger.debug(f"Calling pull for {key}...")
 
-        # determine the range_end
-        if prefix:
-            range_end = self._incr_last_byte(key)
-        else:
-            range_end = None
-
         # call the get range on the ETCD_GRPC sever, order them newest first
         range_request = self._server._build_get_range_request(
             key=key, range_end=range_end, sort_order="descend", sort_target="key", keys_only=key_only
@@ -82,40 +252,55 @@ class EtcdGrpcEngine(EtcdEngine):
             range_request.max_mod_revision = max_rev
         # make the call
         logger.debug(f"Pull request: {range_request}")
-        try_again = True
-        while try_again:
-            try:
-                try_again = False
-                range_result = self._server.kvstub.Range(
-                    range_request,
-                    self._server.timeout,
-                    credentials=self._server.call_credentials,
-                    metadata=self._server.metadata,
-                )
-            except grpc._channel._InactiveRpcError as e:
-                if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
-                    try_again = True
-                    logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
-                elif (
-                    e._state.code.name == "OUT_OF_RANGE" and "required revision has been compacted" in e._state.details
-                ):
-                    raise EngineHistoryNotAvailableError()
-                else:
-                    raise EngineException(e)
+        try:
+            range_result = self._call_kv("Range", range_request)
+        except grpc._channel._InactiveRpcError as e:
+            if e._state.code.name == "OUT_OF_RANGE" and "required revision has been compacted" in e._state.details:
+                raise EngineHistoryNotAvailableError()
+            else:
+                raise EngineException(e)
         logger.debug(f"Query for {key} completed")
 
         # parse the result to return just key-value pairs
-        new_kvs: List[Dict[str, bytes]] = []
-        logger.debug("Building key-value list")
-        for kv in range_result.kvs:
-            new_kv = self._parse_raw_kv(kv, key_only)
-            new_kvs.append(new_kv)
-            logger.debug(f"Key: {new_kv['key']} pulled successfully")
+        new_kvs = [self._parse_raw_kv(kv, key_only) for kv in range_result.kvs]
 
         logger.debug(f"{len(new_kvs)} keys found")
-        return new_kvs
+        return new_kvs, range_result.more, int(range_result.header.revision)
+
+    def _pull_batch(self, ranges: List[Tuple[str, int]]) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        This method queries the notification server for multiple prefixes in a single transaction. Each range is
+        limited to a page of MAX_TXN_KV_RETURNED pairs sorted by key in descending order, to bound the response
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        logger.debug(f"Calling pull for {len(ranges)} keys...")
+        ops = []
+        for key, min_rev in ranges:
+            range_request = self._server._build_get_range_request(
+                key=key, range_end=self._incr_last_byte(key), sort_order="descend", sort_target="key"
+            )
+            range_request.limit = MAX_TXN_KV_RETURNED
+            range_request.min_mod_revision = min_rev
+            # any member can serve the polling, the revision of the response tells how recent it is
+            range_request.serializable = True
+            ops.append(etcdrpc.RequestOp(request_range=range_request))
+        transaction_request = etcdrpc.TxnRequest(success=ops)
+
+        # make the call
+        try:
+            txn_response = self._call_kv("Txn", transaction_request, serializable=True)
+        except grpc._channel._InactiveRpcError as e:
+            raise EngineException(e)
+
+        # parse the result of each range
+        results = []
+        for op in txn_response.responses:
+            range_response = op.response_range
+            results.append(([self._parse_raw_kv(kv) for kv in range_response.kvs], range_response.more))
+        logger.debug(f"Query for {len(ranges)} keys completed")
+        return results, int(txn_response.header.revision)
 
     def delete(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
         """
@@ -132,29 +317,11 @@ class EtcdGrpcEngine(EtcdEngine):
             range_end = None
 
         # call the delete range on the ETCD_GRPC sever
-        try_again = False
         del_request = self._server._build_delete_request(key=key, range_end=range_end, prev_kv=True)
 
         # make the call
         logger.debug(f"Deleting key range associated to key {key}")
-        try_again = True
-        while try_again:
-            try:
-                try_again = False
-                del_result = self._server.kvstub.DeleteRange(
-                    del_request,
-                    self._server.timeout,
-                    credentials=self._server.call_credentials,
-                    metadata=self._server.metadata,
-                )
-            except grpc._channel._InactiveRpcError as e:
-                if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
-                    try_again = True
-                    logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
-                else:
-                    raise e
+        del_result = self._call_kv("DeleteRange", del_request)
         logger.debug(f"Delete request for key {key} completed")
 
         # parse the result to return just key-value pairs of what has been deleted
@@ -177,16 +344,70 @@ class EtcdGrpcEngine(EtcdEngine):
         :return: True if successful
         """
         logger.debug("Calling push...")
-        logger.debug("Preparing the transaction statement")
-        ops = []
 
         # check if we need to request a lease for the ttl
+        lease = None
         if ttl:
             try:
-                lease = self._lease(ttl)
+                lease = self._pooled_lease(ttl)
             except EngineException:
                 raise EngineException("Not able to push keys")
 
+        try:
+            txn_response = self._txn(etcdrpc.TxnRequest(success=self._push_ops(kvs, ks_delete, lease)))
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+        assert txn_response.succeeded, "Not able to execute the transaction"
+        return True
+
+    def _push_if_statuses(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        This method submits the key-value pairs and deletes the keys as a single transaction, only if the status of
+        the base keys has not changed
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        logger.debug(f"Calling push if status is at revisions {status_revs}...")
+        compare = [
+            etcdrpc.Compare(
+                key=base_key.encode(), target=etcdrpc.Compare.MOD, result=etcdrpc.Compare.EQUAL, mod_revision=status_rev
+            )
+            for base_key, status_rev in status_revs.items()
+        ]
+        failure = [
+            etcdrpc.RequestOp(request_range=self._server._build_get_range_request(key=base_key))
+            for base_key in status_revs
+        ]
+        txn_response = self._txn(
+            etcdrpc.TxnRequest(compare=compare, success=self._push_ops(kvs, ks_delete, lease), failure=failure)
+        )
+        rev = int(txn_response.header.revision)
+        if txn_response.succeeded:
+            return True, rev, None
+        # at least one status has changed, return them so the new ones can be linked to them
+        statuses = {}
+        for base_key, response in zip(status_revs, txn_response.responses):
+            statuses[base_key] = [self._parse_raw_kv(kv) for kv in response.response_range.kvs]
+        return False, rev, statuses
+
+    def _push_ops(self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str) -> List[etcdrpc.RequestOp]:
+        """
+        This method prepares the operations of a transaction deleting and then pushing keys
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :return: list of operations of the transaction
+        """
+        logger.debug("Preparing the transaction statement")
+        ops = []
+
         # first delete the keys requested
         if ks_delete is not None and len(ks_delete) != 0:
             for kd in ks_delete:
@@ -201,42 +422,27 @@ class EtcdGrpcEngine(EtcdEngine):
             k = kv["key"]
             v = kv["value"]
             put = self._server._build_put_request(k, v)
-            if ttl:
+            if lease:
                 put.lease = lease
             request_op = etcdrpc.RequestOp(request_put=put)
             ops.append(request_op)
+        return ops
 
-        transaction_request = etcdrpc.TxnRequest(success=ops)
-
-        # commit transaction
-        # logger.debug(f"Committing the transaction statement: {ops}")
-        try_again = True
-        while try_again:
-            try:
-                try_again = False
-                txn_response = self._server.kvstub.Txn(
-                    transaction_request,
-                    self._server.timeout,
-                    credentials=self._server.call_credentials,
-                    metadata=self._server.metadata,
-                )
-            except grpc._channel._InactiveRpcError as e:
-                if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
-                    try_again = True
-                    logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
-                else:
-                    raise e
-        assert txn_response.succeeded, "Not able to execute the transaction"
+    def _txn(self, transaction_request: etcdrpc.TxnRequest) -> etcdrpc.TxnResponse:
+        """
+        This method commits a transaction
+        :param transaction_request: transaction to commit
+        :return: response of the server
+        """
+        # a transaction failing once sent may have been applied, it is not sent again
+        txn_response = self._call_kv("Txn", transaction_request, idempotent=False)
         logger.debug("Transaction completed")
         # read the header
         if hasattr(txn_response, "header"):
             h = txn_response.header
             rev = int(h.revision)
             logger.debug(f"New server revision {rev}")
-
-        return True
+        return txn_response
 
     def lock(self, lock_id: str):
         """
@@ -247,16 +453,17 @@ class EtcdGrpcEngine(EtcdEngine):
         logger.debug("Calling lock...")
         try_again = True
         while try_again:
+            metadata = self._authenticate()
             try:
                 try_again = False
                 lock = self._server.lock(lock_id)
                 res = lock.acquire(timeout=10)
             except grpc._channel._InactiveRpcError as e:
                 if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
+                    # the token has expired or has been revoked, refresh it and try again
                     try_again = True
                     logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
+                    self._refresh_token(metadata)
                 else:
                     raise e
             except Exception as e:
@@ -276,15 +483,16 @@ class EtcdGrpcEngine(EtcdEngine):
         logger.debug("Calling unlock...")
         try_again = True
         while try_again:
+            metadata = self._authenticate()
             try:
                 try_again = False
                 res = lock.release()
             except grpc._channel._InactiveRpcError as e:
                 if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
+                    # the token has expired or has been revoked, refresh it and try again
                     try_again = True
                     logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
+                    self._refresh_token(metadata)
                 else:
                     raise e
 
@@ -301,24 +509,7 @@ class EtcdGrpcEngine(EtcdEngine):
         range_request = self._server._build_get_range_request(key=key, keys_only=True)
 
         # make the call
-        try_again = True
-        while try_again:
-            try:
-                try_again = False
-                range_result = self._server.kvstub.Range(
-                    range_request,
-                    self._server.timeout,
-                    credentials=self._server.call_credentials,
-                    metadata=self._server.metadata,
-                )
-            except grpc._channel._InactiveRpcError as e:
-                if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
-                    try_again = True
-                    logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
-                else:
-                    raise e
+        range_result = self._call_kv("Range", range_request)
         logger.debug("Query for latest revision completed")
 
         # read the header
@@ -345,20 +536,20 @@ class EtcdGrpcEngine(EtcdEngine):
         # make the call
         try_again = True
         while try_again:
+            metadata = self._authenticate()
             try:
                 try_again = False
-                res = self._server.leasestub.LeaseGrant(
-                    lease_grant_request,
-                    self._server.timeout,
-                    credentials=self._server.call_credentials,
-                    metadata=self._server.metadata,
+                res = self._call(
+                    lambda server: server.leasestub.LeaseGrant(
+                        lease_grant_request, server.timeout, credentials=server.call_credentials, metadata=metadata
+                    )
                 )
             except grpc._channel._InactiveRpcError as e:
                 if e._state.code.name == "UNAUTHENTICATED":
-                    # it seems that sometimes the token expires, so re-init the server and try again
+                    # the token has expired or has been revoked, refresh it and try again
                     try_again = True
                     logger.debug(f"Error {e}, trying again", exc_info=True)
-                    self._initialise_server()
+                    self._refresh_token(metadata)
                 else:
                     raise e
         if res:
@@ -367,19 +558,121 @@ class EtcdGrpcEngine(EtcdEngine):
         else:
             raise EngineException("Not able to acquire lease")
 
-    def _parse_raw_kv(self, kv, key_only: bool = False) -> Dict[str, any]:
+    def _watching(self, key: str, next_rev: int, trigger_callback: callable([list])):
+        """
+        This method implements the listening by relying on the etcd Watch API. All the watches created by this engine
+        are multiplexed on the single bidirectional stream owned by the watcher of the Etcd3Client of a member, the
+        watches are spread across the members and moved to the next member if the stream is interrupted. The server
+        sends progress notifications on idle watches, a watch silent for a few of them is considered dead, as a
+        half-open connection or a partitioned member, and it is moved to the next member
+        :param key: key to watch as a prefix
+        :param next_rev: revision from when to start watching
+        :param trigger_callback: function to call with the list of key-values changed
+        :return:
+        """
+        # the watcher thread pushes here either the watch responses or the errors of the stream
+        responses = Queue()
+        watch_id = None
+        member = None
+        while key in self._listeners:  # this is the stop condition
+            if watch_id is None:
+                if member is None:
+                    member = self._members.order(serializable=True)[0]
+                    server = self._servers[member.address]
+                metadata = self._authenticate()
+                try:
+                    watch_id = server.add_watch_prefix_callback(
+                        key, responses.put, start_revision=next_rev, progress_notify=True
+                    )
+                    last_response = time.monotonic()
+                    logger.debug(f"Watch {watch_id} created for key {key} from revision {next_rev}")
+                except RevisionCompactedError as e:
+                    logger.warning(
+                        f"Revision {next_rev} has been compacted, notifications for key {key} older than revision "
+                        f"{e.compacted_revision} are no longer available"
+                    )
+                    next_rev = e.compacted_revision
+                    continue
+                except (ConnectionFailedError, ConnectionTimeoutError, WatchTimedOut, grpc.RpcError) as e:
+                    if isinstance(e, grpc.RpcError) and e.code() == grpc.StatusCode.UNAUTHENTICATED:
+                        # the token has expired or has been revoked, refresh it and try again
+                        logger.debug(f"Error {e}, trying again", exc_info=True)
+                        self._refresh_token(metadata)
+                    else:
+                        self._watch_failed(member, f"Unable to watch key {key}")
+                        logger.debug("", exc_info=True)
+                        member = None
+                    continue
+
+            try:
+                response = responses.get(timeout=WATCH_CHECK_INTERVAL)
+            except Empty:
+                if time.monotonic() - last_response > self._watch_progress_interval * WATCH_PROGRESS_MISSED:
+                    # not even the progress notifications are received, the stream is dead
+                    server.cancel_watch(watch_id)
+                    watch_id = None
+                    self._watch_failed(member, f"No progress notification received for the watch of key {key}")
+                    member = None
+                continue
+            last_response = time.monotonic()
+
+            if isinstance(response, RevisionCompactedError):
+                # the watcher has already cancelled the watch, restart it from the oldest revision available
+                logger.warning(
+                    f"Revision {next_rev} has been compacted, notifications for key {key} older than revision "
+                    f"{response.compacted_revision} are no longer available"
+                )
+                next_rev = response.compacted_revision
+                watch_id = None
+                continue
+            elif isinstance(response, Exception):
+                # the stream has been interrupted and the watcher has dropped all its watches, create it again
+                if isinstance(response, grpc.RpcError) and response.code() == grpc.StatusCode.UNAUTHENTICATED:
+                    logger.debug(f"Error {response}, trying again", exc_info=True)
+                    self._refresh_token(metadata)
+                else:
+                    self._watch_failed(member, f"Watch of key {key} interrupted")
+                    logger.debug(f"Watch error: {response}")
+                    member = None
+                watch_id = None
+                continue
+
+            # consider only new or updated keys, excluding the status and anything already delivered before a restart
+            kvs = []
+            for event in response.events:
+                if isinstance(event, PutEvent) and event.key.decode() != key and event.mod_revision >= next_rev:
+                    kvs.append(self._parse_raw_kv(event))
+            if len(kvs) > 0:
+                next_rev = max(kv["mod_rev"] for kv in kvs) + 1
+                # trigger the callback, once delivered a restart can skip the changes
+                self._deliver(key, kvs, next_rev, trigger_callback)
+
+        # the listener has been stopped
+        if watch_id is not None:
+            server.cancel_watch(watch_id)
+
+    def _watch_failed(self, member: Member, message: str):
+        """
+        This method ejects the member whose watch has failed. The watch is created again straight away on the next
+        member, or after the retry delay if no other member is healthy
+        :param member: member failing
+        :param message: warning to log
+        """
+        self._members.failed(member)
+        if self._members.order(serializable=True)[0].failures == 0:
+            logger.warning(f"{message}, trying the next member...")
+        else:
+            logger.warning(f"{message}, trying again in {self.automatic_retry_delay}s...")
+            time.sleep(self.automatic_retry_delay)
+
+    def _parse_raw_kv(self, kv, key_only: bool = False) -> KeyValue:
         """
-        Internal method to translate the kv pair coming from the etcd server into a dictionary that fits better this
+        Internal method to translate the kv pair coming from the etcd server into a record that fits better this
         application
         :param kv: raw kv pair from the etcd server
         :param key_only:
-        :return: translated kv pair as dictionary
-        """
-        new_kv = {}
-        if not key_only:
-            new_kv["value"] = kv.value  # leave it as binary
-        new_kv["key"] = kv.key.decode()
-        new_kv["version"] = int(kv.version)
-        new_kv["create_rev"] = int(kv.create_revision)
-        new_kv["mod_rev"] = int(kv.mod_revision)
-        return new_kv
+        :return: translated kv pair, readable as dictionary
+        """
+        return KeyValue(
+            kv.key.decode(), None if key_only else kv.value, kv.version, kv.create_revision, kv.mod_revision
+        )
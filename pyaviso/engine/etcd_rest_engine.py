@@ -9,63 +9,149 @@
 import base64
 import http.client
 import logging
+import socket
+import threading
 import time
-from typing import Dict, List
+from queue import Empty, Queue
+from typing import Dict, Iterator, List, Tuple
 
 import requests
+from urllib3.exceptions import NewConnectionError
 
 from .. import logger
 from ..authentication.auth import Auth
 from ..authentication.etcd_auth import EtcdAuth
+from ..authentication.token_manager import TokenManager
 from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
 from ..user_config import EngineConfig
-from .etcd_engine import MAX_KV_RETURNED, EtcdEngine
+from .etcd_engine import (
+    MAX_KV_RETURNED,
+    MAX_TXN_KV_RETURNED,
+    WATCH_CHECK_INTERVAL,
+    WATCH_PROGRESS_MISSED,
+    EtcdEngine,
+)
+from .http_pool import HttpConnectionPool
+from .key_value import KeyValue, decode_kvs, loads
+from .member_pool import PROBE_TIMEOUT, Member, MemberPool
 
 
 class EtcdRestEngine(EtcdEngine):
     """
     This class is a specialisation of the Engine class, able to connect to a etcd3 server via the gRPC gateway by
-    relying on the standard REST requests library.
+    relying on the standard REST requests library. If multiple endpoints are configured, the polling is spread across
+    the members of the cluster while the other requests are sent to the leader, failing over to the next member.
     """
 
     def __init__(self, config: EngineConfig, auth: Auth):
         super(EtcdRestEngine, self).__init__(config, auth)
-        # set base url
-        if self.https:
-            self._base_url = f"https://{self._host}:{self._port}/v3/"
+        # set base url of each member of the cluster
+        scheme = "https" if self.https else "http"
+        endpoints = config.endpoints
+        self._members = MemberPool(endpoints, status=self._member_status if len(endpoints) > 1 else None)
+        self._base_urls = {m.address: f"{scheme}://{m.host}:{m.port}/v3/" for m in self._members.members}
+        # keep-alive connections shared by all the requests and listening threads of this engine
+        self._http = HttpConnectionPool(
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            idle_timeout=config.pool_idle_timeout,
+        )
+        # the token is shared by all the requests and listening threads of this engine
+        if type(self.auth) == EtcdAuth:
+            self._token_manager = TokenManager(self._request_token)
         else:
-            self._base_url = f"http://{self._host}:{self._port}/v3/"
+            self._token_manager = None
+
+    def close(self):
+        """
+        This method stops all the listeners of this engine and closes its connections
+        """
+        super(EtcdRestEngine, self).close()
+        self._http.close()
+
+    @property
+    def _base_url(self) -> str:
+        """
+        :return: base url of the first member of the cluster
+        """
+        return self._base_urls[self._members.members[0].address]
+
+    @_base_url.setter
+    def _base_url(self, url: str):
+        self._base_urls[self._members.members[0].address] = url
 
-    def pull(
+    def _url(self, member: Member, path: str) -> str:
+        """
+        :param member: member of the cluster
+        :param path: path of the API
+        :return: url of the API on the member
+        """
+        return self._base_urls[member.address] + path
+
+    def _attempts(self, serializable: bool = False) -> Iterator[Tuple[Member, bool]]:
+        """
+        This method yields the members of the cluster to send a request to, in the order to try them, until the
+        caller stops
+        :param serializable: True if the request can be served by any member, False if it should go to the leader
+        :return: iterator of tuples: member, True if it is the last member to try before waiting the automatic retry
+        delay
+        """
+        while True:
+            members = self._members.order(serializable)
+            for i, member in enumerate(members):
+                yield member, i == len(members) - 1
+
+    def _failover(self, member: Member, last: bool, url: str, action: str, err: any):
+        """
+        This method handles a request that has failed because the member is unreachable. The request is sent to the
+        next member straight away, the automatic retry delay is waited only once all the members have failed
+        :param member: member failing
+        :param last: True if it is the last member to try
+        :param url: url of the request
+        :param action: description of the request for the error messages
+        :param err: error of the request
+        """
+        self._members.failed(member)
+        logger.debug(f"Not able to {action}, {str(err)}, trying again...")
+        if last:
+            logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
+            time.sleep(self.automatic_retry_delay)
+        else:
+            logger.warning(f"Unable to connect to {url}, trying the next member...")
+
+    def _member_status(self, member: Member) -> Tuple[str, str]:
+        """
+        This method is used as health probe of the members of the cluster
+        :param member: member to ask
+        :return: a tuple: id of the member, id of the leader it knows
+        """
+        resp = self._post(self._url(member, "maintenance/status"), {}, timeout=PROBE_TIMEOUT)
+        resp.raise_for_status()
+        resp_body = resp.json()
+        return resp_body["header"]["member_id"], resp_body["leader"]
+
+    def _pull_page(
         self,
         key: str,
+        range_end: bytes = None,
         key_only: bool = False,
         rev: int = None,
-        prefix: bool = True,
         min_rev: int = None,
         max_rev: int = None,
-    ) -> List[Dict[str, any]]:
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
         """
-        This method implements a query to the notification server for all the key-values associated to the key as input.
-        This key by default is a prefix, it can therefore return a set of key-values
-        :param key: input in the query
+        This method implements a query to the notification server for one page of the key-values in the range as input
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
         :param key_only: if True no values are returned
         :param rev: revision to pull
-        :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
         :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
         :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
-        :return: List of key-value pairs formatted as dictionary
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        server when the page was read
         """
         logger.debug(f"Calling pull for {key}...")
 
-        url = self._base_url + "kv/range"
-
-        # determine the range_end
-        if prefix:
-            range_end = self._encode_to_str_base64(str(self._incr_last_byte(key), "utf-8"))
-        else:
-            range_end = None
-
         # first authenticate and use the token for the header
         self._authenticate()
 
@@ -75,7 +161,7 @@ class EtcdRestEngine(EtcdEngine):
         # create the body for the get range on the etcd sever, order them newest first
         body = {
             "key": encoded_key,
-            "range_end": range_end,
+            "range_end": self._encode_to_str_base64(range_end) if range_end else None,
             "limit": MAX_KV_RETURNED,
             "sort_order": "DESCEND",
             "sort_target": "KEY",
@@ -88,9 +174,10 @@ class EtcdRestEngine(EtcdEngine):
         logger.debug(f"Pull request: {body}")
 
         # start an infinite loop of request if the server side is unreachable
-        while True:
+        for member, last in self._attempts():
+            url = self._url(member, "kv/range")
             try:
-                resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
+                resp = self._post(url, body)
                 resp.raise_for_status()
             except requests.exceptions.HTTPError as err:
                 if (
@@ -98,9 +185,7 @@ class EtcdRestEngine(EtcdEngine):
                     or resp.status_code == 404
                     or (resp.status_code >= 500 and resp.status_code < 600)
                 ):
-                    logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
-                    logger.debug(f"Not able to pull key {key}, {str(err)}, trying again...")
-                    time.sleep(self.automatic_retry_delay)
+                    self._failover(member, last, url, f"pull key {key}", err)
                     continue
                 elif resp.status_code == 400 and (
                     "History not available" in resp.content.decode()
@@ -110,9 +195,7 @@ class EtcdRestEngine(EtcdEngine):
                 else:
                     raise EngineException(f"Not able to pull key {key}, {str(err)}")
             except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
-                logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
-                logger.debug(f"Not able to pull key {key}, {str(err)}, trying again...")
-                time.sleep(self.automatic_retry_delay)
+                self._failover(member, last, url, f"pull key {key}", err)
                 continue
             except Exception as e:
                 logger.exception(e)
@@ -121,22 +204,73 @@ class EtcdRestEngine(EtcdEngine):
                 )
 
             # we got a good responce, exit from the loop
+            self._members.succeeded(member)
             break
 
         logger.debug(f"Query for {key} completed")
 
         # parse the result to return just key-value pairs
-        new_kvs: List[Dict[str, bytes]] = []
-        resp_body = resp.json()
-        if "kvs" in resp_body:
-            logger.debug("Building key-value list")
-            for kv in resp_body["kvs"]:
-                new_kv = self._parse_raw_kv(kv, key_only)
-                new_kvs.append(new_kv)
-                logger.debug(f"Key: {new_kv['key']} pulled successfully")
+        resp_body = loads(resp.content)
+        new_kvs = decode_kvs(resp_body.get("kvs", []), key_only)
 
         logger.debug(f"{len(new_kvs)} keys found")
-        return new_kvs
+        return new_kvs, resp_body.get("more", False), int(resp_body["header"]["revision"])
+
+    def _pull_batch(self, ranges: List[Tuple[str, int]]) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        This method queries the notification server for multiple prefixes in a single transaction. Each range is
+        limited to a page of MAX_TXN_KV_RETURNED pairs sorted by key in descending order, to bound the response
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the server when the ranges were read
+        """
+        logger.debug(f"Calling pull for {len(ranges)} keys...")
+
+        # first authenticate and use the token for the header
+        self._authenticate()
+
+        ops = []
+        for key, min_rev in ranges:
+            range_end = self._encode_to_str_base64(self._incr_last_byte(key))
+            range_request = {
+                "key": self._encode_to_str_base64(key),
+                "range_end": range_end,
+                "limit": MAX_TXN_KV_RETURNED,
+                "sort_order": "DESCEND",
+                "sort_target": "KEY",
+                "min_mod_revision": min_rev,
+                # any member can serve the polling, the revision of the response tells how recent it is
+                "serializable": True,
+            }
+            ops.append({"requestRange": range_request})
+        body = {"success": ops}
+
+        # start an infinite loop of request if the server side is unreachable
+        for member, last in self._attempts(serializable=True):
+            url = self._url(member, "kv/txn")
+            try:
+                resp = self._post(url, body)
+                resp.raise_for_status()
+            except requests.exceptions.HTTPError as err:
+                if resp.status_code == 408 or (resp.status_code >= 500 and resp.status_code < 600):
+                    self._failover(member, last, url, f"pull {len(ranges)} keys", err)
+                    continue
+                else:
+                    raise EngineException(f"Not able to pull {len(ranges)} keys, {str(err)}")
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                self._failover(member, last, url, f"pull {len(ranges)} keys", err)
+                continue
+            self._members.succeeded(member)
+            break
+
+        # parse the result of each range
+        resp_body = loads(resp.content)
+        results = []
+        for op in resp_body.get("responses", []):
+            range_response = op.get("response_range", {})
+            results.append((decode_kvs(range_response.get("kvs", [])), range_response.get("more", False)))
+        logger.debug(f"Query for {len(ranges)} keys completed")
+        return results, int(resp_body["header"]["revision"])
 
     def delete(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
         """
@@ -147,8 +281,6 @@ class EtcdRestEngine(EtcdEngine):
         """
         logger.debug(f"Calling delete for {key}...")
 
-        url = self._base_url + "kv/deleterange"
-
         # determine the range_end
         if prefix:
             range_end = self._encode_to_str_base64(str(self._incr_last_byte(key), "utf-8"))
@@ -166,7 +298,7 @@ class EtcdRestEngine(EtcdEngine):
         # make the call
         logger.debug(f"Deleting key range associated to key {key}")
         try:
-            resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
+            resp = self._write("kv/deleterange", body)
             resp.raise_for_status()
         except Exception as err:
             raise EngineException(f"Not able to delete key {key}, {str(err)}")
@@ -194,15 +326,59 @@ class EtcdRestEngine(EtcdEngine):
         :return: True if successful
         """
         logger.debug("Calling push...")
-        url = self._base_url + "kv/txn"
-
-        # first authenticate and use the token for the header
-        self._authenticate()
 
         # check if we need to request a lease for the ttl
-        if ttl:
-            lease = self._lease(ttl)
+        lease = self._pooled_lease(ttl) if ttl else None
 
+        body = {"success": self._push_ops(kvs, ks_delete, lease)}
+        try:
+            self._txn(body)
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+        return True
+
+    def _push_if_statuses(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        This method submits the key-value pairs and deletes the keys as a single transaction, only if the status of
+        the base keys has not changed
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the server, current status of each base key as returned by pull if
+        not pushed
+        """
+        logger.debug(f"Calling push if status is at revisions {status_revs}...")
+        ks = {base_key: self._encode_to_str_base64(base_key) for base_key in status_revs}
+        body = {
+            "compare": [
+                {"key": ks[base_key], "target": "MOD", "result": "EQUAL", "mod_revision": status_rev}
+                for base_key, status_rev in status_revs.items()
+            ],
+            "success": self._push_ops(kvs, ks_delete, lease),
+            "failure": [{"requestRange": {"key": ks[base_key]}} for base_key in status_revs],
+        }
+        resp_body = self._txn(body)
+        rev = int(resp_body["header"]["revision"])
+        if resp_body.get("succeeded", False):
+            return True, rev, None
+        # at least one status has changed, return them so the new ones can be linked to them
+        statuses = {}
+        for base_key, response in zip(status_revs, resp_body.get("responses", [])):
+            statuses[base_key] = [self._parse_raw_kv(kv) for kv in response.get("response_range", {}).get("kvs", [])]
+        return False, rev, statuses
+
+    def _push_ops(self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str) -> List[Dict[str, any]]:
+        """
+        This method prepares the operations of a transaction deleting and then pushing keys
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :return: list of operations of the transaction
+        """
         logger.debug("Preparing the transaction statement")
         ops = []
         # first delete the keys requested
@@ -219,15 +395,23 @@ class EtcdRestEngine(EtcdEngine):
             k = self._encode_to_str_base64(kv["key"])
             v = self._encode_to_str_base64(kv["value"])
             put = {"requestPut": {"key": k, "value": v}}
-            if ttl:
+            if lease:
                 put["requestPut"]["lease"] = lease
             ops.append(put)
+        return ops
+
+    def _txn(self, body: Dict[str, any]) -> Dict[str, any]:
+        """
+        This method commits a transaction
+        :param body: body of the transaction request
+        :return: body of the response
+        """
+        # first authenticate and use the token for the header
+        self._authenticate()
 
-        body = {"success": ops}
         # commit transaction
-        # logger.debug(f"Committing the transaction statement: {body}")
         try:
-            resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
+            resp = self._write("kv/txn", body)
             resp.raise_for_status()
         except Exception as err:
             raise EngineException(f"Not able to execute the transaction, {str(err)}")
@@ -239,30 +423,98 @@ class EtcdRestEngine(EtcdEngine):
             h = resp_body["header"]
             rev = int(h["revision"])
             logger.debug(f"New server revision {rev}")
-
-        return True
+        return resp_body
 
     def _authenticate(self) -> bool:
         """
-        This method authenticates  the user and set the internal token, this is only done for Etcd authentication
+        This method makes sure the internal token is set, this is only done for Etcd authentication. The token is
+        requested to the server only the first time and once expired, otherwise the cached one is used
         :return: True if successfully authenticated
         """
-        if type(self.auth) == EtcdAuth:
-            logger.debug(f"Authenticating user {self.auth.username}...")
+        if self._token_manager is not None:
+            self.auth.token = self._token_manager.token()
+        return True
+
+    def _request_token(self) -> str:
+        """
+        This method authenticates the user to the server
+        :return: the new token
+        """
+        logger.debug(f"Authenticating user {self.auth.username}...")
 
-            url = self._base_url + "auth/authenticate"
-            body = {"name": self.auth.username, "password": self.auth.password}
+        body = {"name": self.auth.username, "password": self.auth.password}
+        try:
+            resp = self._write("auth/authenticate", body, authenticated=False)
+            resp.raise_for_status()
+        except Exception as err:
+            raise EngineException(f"Not able to authenticate {self.auth.username}, {str(err)}")
+        assert resp.json().get("token") is not None, "No token found in authentication response"
+
+        logger.debug(f"User {self.auth.username} successfully authenticated")
+        return resp.json()["token"]
+
+    def _write(self, path: str, body: Dict[str, any], authenticated: bool = True) -> requests.Response:
+        """
+        This method sends a request to the leader of the cluster. If the connection to the member cannot be opened,
+        the request is sent to the next one. Requests failing once the connection is open are not sent again, as they
+        may have been applied
+        :param path: path of the API
+        :param body: body of the request
+        :param authenticated: if False the authentication header is not sent
+        :return: the response of the server
+        """
+        members = self._members.order()
+        for i, member in enumerate(members):
+            url = self._url(member, path)
             try:
-                resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
-                resp.raise_for_status()
-            except Exception as err:
-                raise EngineException(f"Not able to authenticate {self.auth.username}, {str(err)}")
-            assert resp.json().get("token") is not None, "No token found in authentication response"
-            self.auth.token = resp.json()["token"]
+                if authenticated:
+                    resp = self._post(url, body)
+                else:
+                    resp = self._http.post(url, json=body, timeout=self.timeout)
+            except requests.exceptions.ConnectionError as err:
+                if i == len(members) - 1 or not self._not_sent(err):
+                    raise
+                self._members.failed(member)
+                logger.warning(f"Unable to connect to {url}, trying the next member...")
+                logger.debug(f"Connection error: {err}")
+                continue
+            if resp.status_code == 503 and i < len(members) - 1:
+                # the member has no leader, another one may have
+                self._members.failed(member)
+                logger.warning(f"Member {member} unavailable, trying the next member...")
+                continue
+            self._members.succeeded(member)
+            return resp
 
-            logger.debug(f"User {self.auth.username} successfully authenticated")
+    @staticmethod
+    def _not_sent(err: requests.exceptions.ConnectionError) -> bool:
+        """
+        :param err: error of a request
+        :return: True if the connection to the server could not be opened, so the request has not been sent
+        """
+        if isinstance(err, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(err.args[0], "reason", None) if err.args else None
+        return isinstance(reason, NewConnectionError)
 
-        return True
+    def _post(self, url: str, body: Dict[str, any], **kwargs) -> requests.Response:
+        """
+        This method sends a request to the server with the authentication header. If the server rejects the token, this
+        is refreshed and the request is sent once more
+        :param url: url of the request
+        :param body: body of the request
+        :param kwargs: other arguments accepted by requests.post, the timeout defaults to the engine one
+        :return: the response of the server
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        header = self.auth.header()
+        resp = self._http.post(url, json=body, headers=header, **kwargs)
+        if resp.status_code == 401 and self._token_manager is not None:
+            logger.debug("Token rejected by the server, authenticating again...")
+            resp.close()
+            self.auth.token = self._token_manager.refresh(header.get("Authorization"))
+            resp = self._http.post(url, json=body, headers=self.auth.header(), **kwargs)
+        return resp
 
     def _latest_revision(self, key: str) -> int:
         """
@@ -271,8 +523,6 @@ class EtcdRestEngine(EtcdEngine):
         """
         logger.debug("Querying notification server for latest revision")
 
-        url = self._base_url + "kv/range"
-
         # first authenticate and use the token for the header
         self._authenticate()
 
@@ -280,22 +530,19 @@ class EtcdRestEngine(EtcdEngine):
         encoded_key = self._encode_to_str_base64(key)
         body = {"key": encoded_key, "keys_only": True}
         # make the call
-        while True:
+        for member, last in self._attempts():
+            url = self._url(member, "kv/range")
             try:
-                resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
+                resp = self._post(url, body)
                 resp.raise_for_status()
             except requests.exceptions.HTTPError as err:
                 if resp.status_code == 408 or (resp.status_code >= 500 and resp.status_code < 600):
-                    logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
-                    logger.debug(f"Not able to request latest revision, {str(err)}, trying again...")
-                    time.sleep(self.automatic_retry_delay)
+                    self._failover(member, last, url, "request latest revision", err)
                     continue
                 else:
                     raise EngineException(f"Not able to request latest revision, {str(err)}")
             except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
-                logger.warning(f"Unable to connect to {url}, trying again in {self.automatic_retry_delay}s...")
-                logger.debug(f"Not able to request latest revision, {str(err)}, trying again...")
-                time.sleep(self.automatic_retry_delay)
+                self._failover(member, last, url, "request latest revision", err)
                 continue
             except Exception as e:
                 logger.exception(e)
@@ -305,6 +552,7 @@ class EtcdRestEngine(EtcdEngine):
                 )
 
             # we got a good responce, exit from the loop
+            self._members.succeeded(member)
             break
 
         logger.debug("Query for latest revision completed")
@@ -326,8 +574,6 @@ class EtcdRestEngine(EtcdEngine):
         """
         logger.debug(f"Calling lease for ttl {ttl}...")
 
-        url = self._base_url + "lease/grant"
-
         # first authenticate and use the token for the header
         self._authenticate()
 
@@ -336,7 +582,7 @@ class EtcdRestEngine(EtcdEngine):
 
         # make the call
         try:
-            resp = requests.post(url, json=body, headers=self.auth.header(), timeout=self.timeout)
+            resp = self._write("lease/grant", body)
             resp.raise_for_status()
         except Exception as err:
             raise EngineException(f"Not able to request a lease, {str(err)}")
@@ -350,22 +596,148 @@ class EtcdRestEngine(EtcdEngine):
             logger.error(f"Not able to read lease id from {resp_body}")
             raise EngineException("Not able to acquire lease")
 
-    def _parse_raw_kv(self, kv: Dict[str, any], key_only: bool = False) -> Dict[str, any]:
+    def _watching(self, key: str, next_rev: int, trigger_callback: callable([list])):
+        """
+        This method implements the listening by relying on the streaming watch endpoint of the gRPC gateway. The watch
+        responses are read incrementally from the chunked HTTP response and dispatched as they arrive. The server sends
+        progress notifications on idle watches, a stream silent for a few of them is considered dead, as a half-open
+        connection or a partitioned member, and the watch is created again on the next member
+        :param key: key to watch as a prefix
+        :param next_rev: revision from when to start watching
+        :param trigger_callback: function to call with the list of key-values changed
+        :return:
+        """
+        # the watches are spread across the members of the cluster
+        attempts = self._attempts(serializable=True)
+        range_end = self._encode_to_str_base64(str(self._incr_last_byte(key), "utf-8"))
+        stream = None
+        responses = None
+        while key in self._listeners:  # this is the stop condition
+            if stream is None:
+                # first authenticate and use the token for the header
+                self._authenticate()
+                body = {
+                    "create_request": {
+                        "key": self._encode_to_str_base64(key),
+                        "range_end": range_end,
+                        "start_revision": next_rev,
+                        "progress_notify": True,
+                    }
+                }
+                logger.debug(f"Watch request: {body}")
+                member, last = next(attempts)
+                url = self._url(member, "watch")
+                try:
+                    # the read timeout is disabled as the stream is idle until a change happens
+                    stream = self._post(url, body, stream=True, timeout=(self.timeout, None))
+                    stream.raise_for_status()
+                except (
+                    requests.exceptions.HTTPError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout,
+                ) as err:
+                    if stream is not None:
+                        stream.close()
+                    stream = None
+                    self._failover(member, last, url, f"watch key {key}", err)
+                    continue
+                self._members.succeeded(member)
+                # read the stream in background so the stop condition can still be checked
+                responses = Queue()
+                t = threading.Thread(target=self._read_watch_stream, args=(stream, responses))
+                t.setDaemon(True)
+                t.start()
+                last_response = time.monotonic()
+                logger.debug(f"Watch created for key {key} from revision {next_rev}")
+
+            try:
+                response = responses.get(timeout=WATCH_CHECK_INTERVAL)
+            except Empty:
+                if time.monotonic() - last_response > self._watch_progress_interval * WATCH_PROGRESS_MISSED:
+                    # not even the progress notifications are received, the stream is dead
+                    self._close_watch_stream(stream)
+                    stream = None
+                    self._failover(member, last, url, f"watch key {key}", "no progress notification received")
+                continue
+            last_response = time.monotonic()
+
+            result = response.get("result", {}) if isinstance(response, dict) else {}
+            compact_rev = int(result.get("compact_revision", 0))
+            if compact_rev > 0:
+                # the server has cancelled the watch, restart it from the oldest revision available
+                logger.warning(
+                    f"Revision {next_rev} has been compacted, notifications for key {key} older than revision "
+                    f"{compact_rev} are no longer available"
+                )
+                next_rev = compact_rev
+                self._close_watch_stream(stream)
+                stream = None
+                continue
+            elif not isinstance(response, dict) or "error" in response or result.get("canceled"):
+                # the stream has been interrupted, create it again on the next member from the last revision received
+                logger.warning(f"Watch of key {key} interrupted")
+                logger.debug(f"Watch response: {response}")
+                self._close_watch_stream(stream)
+                stream = None
+                self._failover(member, last, url, f"watch key {key}", response)
+                continue
+
+            # consider only new or updated keys, excluding the status and anything already delivered before a restart
+            kvs = []
+            for event in result.get("events", []):
+                if event.get("type", "PUT") != "PUT":
+                    continue
+                kv = self._parse_raw_kv(event["kv"])
+                if kv["key"] != key and kv["mod_rev"] >= next_rev:
+                    kvs.append(kv)
+            if len(kvs) > 0:
+                next_rev = max(kv["mod_rev"] for kv in kvs) + 1
+                # trigger the callback, once delivered a restart can skip the changes
+                self._deliver(key, kvs, next_rev, trigger_callback)
+
+        # the listener has been stopped
+        if stream is not None:
+            self._close_watch_stream(stream)
+
+    def _close_watch_stream(self, stream: requests.Response):
+        """
+        Internal method closing a watch stream. The underlying socket is shut down first to unblock the reading thread,
+        otherwise the close would wait for the next response from the server
+        :param stream: streaming response of the watch request
         """
-        Internal method to translate the kv pair coming from the etcd server into a dictionary that fits better this
+        connection = getattr(stream.raw, "_connection", None)
+        sock = getattr(connection, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        stream.close()
+
+    def _read_watch_stream(self, stream: requests.Response, responses: Queue):
+        """
+        Internal method reading the watch responses from the stream, one JSON object per line. It puts in the queue
+        each response, or the exception that interrupted the stream, or None once the stream ends
+        :param stream: streaming response of the watch request
+        :param responses: queue where to put the responses read
+        """
+        try:
+            for line in stream.iter_lines():
+                if line:
+                    responses.put(loads(line))
+            responses.put(None)
+        except Exception as e:
+            responses.put(e)
+
+    def _parse_raw_kv(self, kv: Dict[str, any], key_only: bool = False) -> KeyValue:
+        """
+        Internal method to translate the kv pair coming from the etcd server into a record that fits better this
         application
         :param kv: raw kv pair from the etcd server
         :param key_only:
-        :return: translated kv pair as dictionary
+        :return: translated kv pair, readable as dictionary
         """
-        new_kv = {}
-        if not key_only:
-            new_kv["value"] = self._decode_to_bytes(kv["value"])  # leave it as binary
-        new_kv["key"] = self._decode_to_bytes(kv["key"]).decode()
-        new_kv["version"] = int(kv["version"])
-        new_kv["create_rev"] = int(kv["create_revision"])
-        new_kv["mod_rev"] = int(kv["mod_revision"])
-        return new_kv
+        return decode_kvs([kv], key_only)[0]
 
     def _encode_to_str_base64(self, obj: any) -> str:
         """
@@ -384,15 +756,6 @@ class EtcdRestEngine(EtcdEngine):
 
         return str(base64.b64encode(binary), "utf-8")
 
-    def _decode_to_bytes(self, string: str) -> any:
-        """
-        Internal method to translate what is coming back from the notification server.
-        The request library returns only string base64 encoded
-        :param string:
-        :return: the payload decoded from the base64 string representation
-        """
-        return base64.decodebytes(string.encode())
-
 
 # Enable HTTPConnection debug logging to the logging framework
 httpclient_logger = logging.getLogger("http.client")
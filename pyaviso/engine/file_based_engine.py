@@ -6,35 +6,47 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
-import _thread
 import os
 import threading
-import time
-from datetime import datetime
+from datetime import datetime, timezone
 from queue import Queue
 from shutil import rmtree
-from typing import Dict, List
+from typing import Dict, List, Tuple
 
 import pyinotify
 
-from .. import logger
+from .. import HOME_FOLDER, logger
 from ..authentication.auth import Auth
 from ..user_config import EngineConfig
+from .change_log import DELETE, KEY, OP, PUT, REV, ChangeLog
 from .engine import Engine
 
+CHANGE_LOG_FILE = "file_based/changes.log"
+
 
 class FileBasedEngine(Engine):
     """
-    This class is a specialisation of the Engine class. It implements a file-based server to be used for testing
+    This class is a specialisation of the Engine class. It implements a file-based server to be used for testing.
+    The changes pushed are recorded in a change log that assigns them a revision. A single reactor thread per engine
+    watches the change log and notifies all the keys listened, reading only the files changed.
     """
 
     def __init__(self, config: EngineConfig, auth: Auth):
         super(FileBasedEngine, self).__init__(config, auth)
-        self._listening_list = []
         logger.warning("TEST MODE")
         self._polling_interval = 1  # for testing we can do a much faster polling time
         self._host = "localhost"
         self._port = ""
+        self._change_log = ChangeLog(os.path.join(os.path.expanduser(HOME_FOLDER), CHANGE_LOG_FILE))
+        # keys listened by the reactor, with their callback and first revision to notify
+        self._reacting: Dict[str, Dict[str, any]] = {}
+        self._reactor = None
+        self._reactor_next_rev = None
+        self._reactor_lock = threading.RLock()
+
+    @property
+    def change_log(self) -> ChangeLog:
+        return self._change_log
 
     def pull(
         self,
@@ -52,34 +64,29 @@ class FileBasedEngine(Engine):
         :param key_only: ignored for TestEngine
         :param rev: ignored for TestEngine
         :param prefix: if true the function will retrieve all the KV pairs starting with the key passed
-        :param min_rev: ignored for TestEngine
-        :param max_rev: ignored for TestEngine
+        :param min_rev: if provided it filters for only KV pairs changed at a revision >= to min_rev of the change log
+        :param max_rev: if provided it filters for only KV pairs changed at a revision <= to max_rev of the change log
         :return: List of key-value pairs formatted as dictionary
         """
         if key_only:
             logger.warning("key_only option is disabled in TestMode")
         if rev:
             logger.warning("rev option is disabled in TestMode")
-        if min_rev:
-            logger.warning("min_rev option is disabled in TestMode")
-        if max_rev:
-            logger.warning("max_rev option is disabled in TestMode")
 
         def read_key(k):
-            try:
-                with open(k, "r") as f:
-                    v = f.read()
-            except Exception:
-                logger.warning(f"Reading of the {k} has failed")
-                logger.debug("", exc_info=True)
-                return
-            new_kv = {"key": k, "value": v.encode()}
-            new_kvs.append(new_kv)
-            logger.debug(f"Key: {k} pulled successfully")
+            v = self._read_key(k)
+            if v is not None:
+                new_kvs.append({"key": k, "value": v})
+                logger.debug(f"Key: {k} pulled successfully")
 
         logger.debug(f"Calling pull for {key}...")
         new_kvs: List[Dict[str, bytes]] = []
-        if os.path.exists(key):
+        if min_rev or max_rev:
+            # only the keys changed in the revisions requested are read
+            for k, _ in sorted(self._change_log.last_revisions(min_rev, max_rev)):
+                if self._match(k, key, prefix):
+                    read_key(k)
+        elif os.path.exists(key):
             if os.path.isdir(key):
                 # first list the directory
                 for x in os.walk(key):
@@ -95,6 +102,32 @@ class FileBasedEngine(Engine):
         logger.debug(f"{len(new_kvs)} keys found")
         return new_kvs
 
+    @staticmethod
+    def _read_key(k: str) -> bytes:
+        """
+        :param k: key to read
+        :return: value of the key, None if it cannot be read
+        """
+        try:
+            with open(k, "rb") as f:
+                return f.read()
+        except Exception:
+            logger.warning(f"Reading of the {k} has failed")
+            logger.debug("", exc_info=True)
+            return None
+
+    @staticmethod
+    def _match(k: str, key: str, prefix: bool = True) -> bool:
+        """
+        :param k: key changed
+        :param key: key queried
+        :param prefix: if False only the keys in the directory of the key queried match
+        :return: True if the key changed matches the key queried
+        """
+        if not k.startswith(key):
+            return False
+        return prefix or k == key or os.path.dirname(k) == key.rstrip("/")
+
     def delete(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
         """
         This method deletes all the keys associated to this key, the key is a prefix as default
@@ -126,6 +159,7 @@ class FileBasedEngine(Engine):
             except Exception as e:
                 logger.warning(f"Cannot delete the key {key},  {e}")
                 logger.debug("", exc_info=True)
+            self._change_log.append([(DELETE, key)])
 
         logger.debug(f"Delete request for key {key} completed")
 
@@ -140,10 +174,12 @@ class FileBasedEngine(Engine):
         :return: True if successful
         """
         logger.debug("Calling push...")
+        changes = []
 
         # first delete the keys requested
         if ks_delete is not None and len(ks_delete) != 0:
             for kd in ks_delete:
+                changes.append((DELETE, kd))
                 if os.path.exists(kd):
                     try:
                         if os.path.isdir(kd):
@@ -177,9 +213,13 @@ class FileBasedEngine(Engine):
             except Exception:
                 logger.warning(f"Saving of the {k} has failed")
                 logger.debug("", exc_info=True)
+                self._change_log.append(changes)
                 return False
+            changes.append((PUT, k))
 
-        logger.debug("Transaction completed")
+        # record the changes, this notifies the listeners
+        rev = self._change_log.append(changes)
+        logger.debug(f"Transaction completed at revision {rev}")
 
         return True
 
@@ -192,18 +232,14 @@ class FileBasedEngine(Engine):
         to_date: datetime = None,
     ):
         """
-        This method implements the active polling
+        This method replays the past notifications requested and then hands the key to the reactor of this engine
         :param key: key to watch as a prefix
         :param callback: function to call if any change happen
         :param channel: global communication channel among threads
-        :param from_date: ignored for TestMode
-        :param to_date: ignored for TestMode
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
         :return:
         """
-        if from_date:
-            logger.warning("from_date option is disabled in TestMode")
-        if to_date:
-            logger.warning("to_date option is disabled in TestMode")
         try:
             # first create the directory to watch
             if not os.path.exists(key):
@@ -214,52 +250,147 @@ class FileBasedEngine(Engine):
                     logger.debug("", exc_info=True)
                     return False
 
-            # create a watch manager
-            wm = pyinotify.WatchManager()  # Watch Manager
-            mask = pyinotify.IN_CLOSE_WRITE  # watched events
-
-            # define a class to handle the new events
-            class EventHandler(pyinotify.ProcessEvent):
-                def __init__(self, engine):
-                    super(EventHandler, self).__init__()
-                    self._engine = engine
-
-                def process_IN_CLOSE_WRITE(self, event):
-                    if not os.path.isdir(event.pathname):
-                        kvs = self._engine.pull(key=event.pathname)
-                        for kv in kvs:
-                            k = kv["key"]
-                            v = kv["value"].decode()
-                            # skip the status
-                            if kv["key"].endswith("status"):
-                                continue
-                            logger.debug(f"Notification received for key {k}")
-                            try:
-                                # execute the trigger
-                                callback(k, v)
-                            except Exception as ee:
-                                logger.error(f"Error with notification trigger, exception: {type(ee)} {ee}")
-                                logger.debug("", exc_info=True)
-
-            # add the handler to the watch manager and define the watching task
-            handler = EventHandler(engine=self)
-            notifier = pyinotify.Notifier(wm, handler, read_freq=self._polling_interval)
-            wm.add_watch(key, mask, rec=True, auto_add=True)
-
-            # encapsulate the watcher in a daemon thread so we can stop it
-            def t_run():
-                notifier.loop()
-
-            t = threading.Thread(target=t_run)
-            t.setDaemon(True)
-            t.start()
-
-            # this is the stop condition
-            while key in self._listeners:
-                time.sleep(0.1)
-            notifier.stop()
+            with self._reactor_lock:
+                # the reactor notifies from its current revision, the past ones are replayed here
+                next_rev = self._reactor_next_rev or self._change_log.revision + 1
+                if from_date:
+                    logger.info("Searching for past notifications...")
+                    from_rev = self._change_log.revision_at(self._timestamp(from_date))
+                    to_rev = self._change_log.revision_at(self._timestamp(to_date), after=False) if to_date else None
+                    if from_rev is None or (to_rev is not None and to_rev < from_rev):
+                        logger.warning("No history available in the time period selected")
+                    else:
+                        logger.info("Search completed, retrieving...")
+                        max_rev = min(to_rev, next_rev - 1) if to_rev else next_rev - 1
+                        self._notify(key, callback, self._change_log.changes(from_rev, max_rev))
+
+                if to_date:  # end date defined, retrieve only past notifications
+                    self.stop(key)
+                    logger.info("Search and retrieval completed")
+                    if len(self._listeners) == 0:  # this is the last listening thread
+                        # terminate the main execution
+                        channel.put(True)
+                    return
+
+                self._reacting[key] = {"callback": callback, "next_rev": next_rev, "channel": channel}
+                if self._reactor is None:
+                    self._reactor_next_rev = next_rev
+                    self._reactor = threading.Thread(target=self._reacting_loop)
+                    self._reactor.setDaemon(True)
+                    self._reactor.start()
+                    logger.debug(f"Reactor thread {self._reactor.ident} started")
 
         except Exception as e:
             logger.error(f"Error while listening to key {key}, {e}")
             logger.debug("", exc_info=True)
-            _thread.interrupt_main()
+            channel.put(False)
+
+    def _reacting_loop(self):
+        """
+        This method implements the reactor of the engine. It watches the change log with inotify and notifies the
+        changes appended to it to all the keys listened. The change log is also checked every polling interval, in
+        case an event is missed. The reactor stops when no key is listened anymore. The changes are collected under the
+        lock while the callbacks run after releasing it, so a slow trigger does not hold the keys being listened
+        """
+        wm = pyinotify.WatchManager()
+        notifier = pyinotify.Notifier(wm, pyinotify.ProcessEvent())
+        wm.add_watch(os.path.dirname(self._change_log.path), pyinotify.IN_CLOSE_WRITE)
+        try:
+            while True:
+                with self._reactor_lock:
+                    # drop the keys no longer listened, this is the stop condition
+                    listening = set(self._listeners)
+                    for key in [k for k in self._reacting if k not in listening]:
+                        del self._reacting[key]
+                    if len(self._reacting) == 0:
+                        self._reactor = None
+                        self._reactor_next_rev = None
+                        logger.debug("No more keys to listen, reactor stopped")
+                        return
+                    try:
+                        notifications = self._react()
+                    except Exception as e:
+                        logger.error(f"Error while listening to keys {list(self._reacting)}: {e}")
+                        logger.debug("", exc_info=True)
+                        channels = set(r["channel"] for r in self._reacting.values())
+                        self._reacting.clear()
+                        self._reactor = None
+                        self._reactor_next_rev = None
+                        for channel in channels:
+                            channel.put(False)
+                        return
+
+                # execute the triggers
+                values = {}  # each file changed is read only once
+                for key, callback, changes in notifications:
+                    if key in self._listeners:  # not stopped in the meantime
+                        self._notify(key, callback, changes, values)
+
+                # wait for the change log to be written
+                if notifier.check_events(timeout=self._polling_interval * 1000):
+                    notifier.read_events()
+                    notifier.process_events()
+        finally:
+            notifier.stop()
+
+    def _react(self) -> List[Tuple[str, callable, List[tuple]]]:
+        """
+        This method collects the changes appended to the change log since the last call, for each key listened
+        :return: list of tuples: key listened, its callback, its changes to notify
+        """
+        if self._change_log.revision < self._reactor_next_rev - 1:
+            # the change log has been deleted and started again
+            self._reactor_next_rev = 1
+            for reacting in self._reacting.values():
+                reacting["next_rev"] = 1
+        changes = self._change_log.changes(min_rev=self._reactor_next_rev)
+        if len(changes) == 0:
+            return []
+        notifications = []
+        for key, reacting in self._reacting.items():
+            new_changes = [c for c in changes if c[REV] >= reacting["next_rev"]]
+            if len(new_changes) > 0:
+                notifications.append((key, reacting["callback"], new_changes))
+            reacting["next_rev"] = changes[-1][REV] + 1
+        self._reactor_next_rev = changes[-1][REV] + 1
+        return notifications
+
+    def _notify(
+        self,
+        key: str,
+        callback: callable([str, str]),
+        changes: List[tuple],
+        values: Dict[str, bytes] = None,
+    ):
+        """
+        This method calls the callback for the keys put under the key listened
+        :param key: key listened as a prefix
+        :param callback: function to call for each key put
+        :param changes: changes of the change log as (rev, time, op, key)
+        :param values: values already read, shared among the keys listened
+        """
+        values = {} if values is None else values
+        for change in changes:
+            k = change[KEY]
+            # skip the status
+            if change[OP] != PUT or not k.startswith(key) or k.endswith("status"):
+                continue
+            if k not in values:
+                values[k] = self._read_key(k) if os.path.exists(k) else None
+            if values[k] is None:
+                continue
+            logger.debug(f"Notification received for key {k}")
+            try:
+                # execute the trigger
+                callback(k, values[k].decode())
+            except Exception as ee:
+                logger.error(f"Error with notification trigger, exception: {type(ee)} {ee}")
+                logger.debug("", exc_info=True)
+
+    @staticmethod
+    def _timestamp(date: datetime) -> float:
+        """
+        :param date: date in UTC, as used for the notifications
+        :return: unix time of the date
+        """
+        return date.replace(tzinfo=timezone.utc).timestamp()
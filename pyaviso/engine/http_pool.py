@@ -0,0 +1,94 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .. import logger
+
+# default settings of the pool
+POOL_CONNECTIONS = 10  # number of hosts for which a pool is cached
+POOL_MAXSIZE = 10  # number of connections kept alive for each host
+POOL_IDLE_TIMEOUT = 60  # seconds
+
+
+class HttpConnectionPool:
+    """
+    This class implements a thread-safe keep-alive connection pool used by the engines talking HTTP to the server. The
+    connections are reused across requests and threads, and dropped once the pool has been idle for longer than the
+    idle timeout, before the server closes them on its side.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        idle_timeout: int = POOL_IDLE_TIMEOUT,
+    ):
+        """
+        :param pool_connections: number of hosts for which a pool of connections is cached
+        :param pool_maxsize: max number of connections kept alive for each host
+        :param idle_timeout: number of seconds after which idle connections are closed, None to never close them
+        """
+        assert pool_connections > 0, "pool_connections must be positive"
+        assert pool_maxsize > 0, "pool_maxsize must be positive"
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._idle_timeout = idle_timeout
+        self._session = requests.Session()
+        # extra connections beyond pool_maxsize are still opened, but not kept alive, so long-lived watch streams
+        # cannot starve the other requests
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=False)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._adapter = adapter
+        self._last_used = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def pool_connections(self) -> int:
+        return self._pool_connections
+
+    @property
+    def pool_maxsize(self) -> int:
+        return self._pool_maxsize
+
+    @property
+    def idle_timeout(self) -> int:
+        return self._idle_timeout
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """
+        This method sends a POST request reusing one of the connections of the pool
+        :param url: url of the request
+        :param kwargs: same arguments accepted by requests.post
+        :return: the response of the server
+        """
+        self._evict_idle()
+        return self._session.post(url, **kwargs)
+
+    def close(self):
+        """
+        This method closes all the connections of the pool
+        """
+        with self._lock:
+            self._adapter.poolmanager.clear()
+
+    def _evict_idle(self):
+        """
+        Internal method dropping the connections of the pool if this has been idle for longer than the idle timeout
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._idle_timeout is not None and now - self._last_used > self._idle_timeout:
+                logger.debug("Connection pool idle, closing connections")
+                self._adapter.poolmanager.clear()
+            self._last_used = now
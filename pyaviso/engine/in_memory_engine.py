@@ -0,0 +1,140 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+from typing import Dict, List, Tuple
+
+from .. import logger
+from ..authentication.auth import Auth
+from ..user_config import EngineConfig
+from .etcd_engine import MAX_KV_RETURNED, MAX_TXN_KV_RETURNED, EtcdEngine
+from .memory_store import MemoryStore, memory_store
+
+
+class InMemoryEngine(EtcdEngine):
+    """
+    This class is a specialisation of the EtcdEngine class. It keeps the notifications in a multi-version store of this
+    process instead of an etcd server, so that listening, catch-up and replay can be tested and benchmarked locally.
+    The engines with the same host and port share the same store.
+    """
+
+    def __init__(self, config: EngineConfig, auth: Auth):
+        super(InMemoryEngine, self).__init__(config, auth)
+        self._store = memory_store(f"{self._host}:{self._port}", config.memory_path)
+
+    @property
+    def store(self) -> MemoryStore:
+        return self._store
+
+    def _pull_page(
+        self,
+        key: str,
+        range_end: bytes = None,
+        key_only: bool = False,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        This method reads one page of the key-values in the range as input
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is retrieved
+        :param key_only: if True no values are returned
+        :param rev: revision to pull
+        :param min_rev: if provided it filters for only KV pairs with mod_revision >= to min_rev
+        :param max_rev: if provided it filters for only KV pairs with mod_revision <= to max_rev
+        :return: a tuple: key-value pairs formatted as dictionary, True if more pairs are in the range, revision of the
+        store when the page was read
+        """
+        logger.debug(f"Calling pull for {key}...")
+        return self._store.range(key, range_end, rev, min_rev, max_rev, MAX_KV_RETURNED, key_only)
+
+    def _pull_batch(self, ranges: List[Tuple[str, int]]) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        This method reads multiple prefixes at the same revision. Each range is limited to a page of
+        MAX_TXN_KV_RETURNED pairs sorted by key in descending order, as the etcd engines
+        :param ranges: list of tuples: key used as prefix, min mod_revision of the KV pairs to return
+        :return: a tuple: list of the pages of KV pairs, one for each range, with a flag True if more pairs are
+        available, revision of the store when the ranges were read
+        """
+        logger.debug(f"Calling pull for {len(ranges)} keys...")
+        ranges = [(key, self._incr_last_byte(key), min_rev) for key, min_rev in ranges]
+        return self._store.ranges(ranges, MAX_TXN_KV_RETURNED)
+
+    def delete(self, key: str, prefix: bool = True) -> List[Dict[str, bytes]]:
+        """
+        This method deletes all the keys associated to this key, the key is a prefix as default
+        :param key: key prefix to delete
+        :param prefix: if true the function will delete all the KV pairs starting with the key passed
+        :return: kvs deleted
+        """
+        logger.debug(f"Calling delete for {key}...")
+        return self._store.delete_range(key, self._incr_last_byte(key) if prefix else None)
+
+    def push(self, kvs: List[Dict[str, any]], ks_delete: List[str] = None, ttl: int = None) -> bool:
+        """
+        Method to submit a list of key-value pairs and delete a list of keys from the store as a single transaction
+        :param kvs: List of KV pair
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param ttl: time to leave of the keys pushed, once expired the keys will be deleted
+        :return: True if successful
+        """
+        logger.debug("Calling push...")
+        lease = self._pooled_lease(ttl) if ttl else None
+        try:
+            self._store.txn(self._puts(kvs, lease), self._deletes(ks_delete))
+        except Exception:
+            self._lease_pool.discard(lease)
+            raise
+        return True
+
+    def _push_if_statuses(
+        self, kvs: List[Dict[str, any]], ks_delete: List[str], lease: str, status_revs: Dict[str, int]
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        This method submits the key-value pairs and deletes the keys as a single transaction, only if the status of
+        the base keys has not changed
+        :param kvs: List of KV pair, including the new status
+        :param ks_delete: List of keys to delete before the push of the new ones. Note that each key is read as a folder
+        :param lease: lease of the keys pushed, if None they do not expire
+        :param status_revs: mod_revision expected for the status of each base key, 0 if expected not to exist
+        :return: a tuple: True if pushed, revision of the store, current status of each base key as returned by pull if
+        not pushed
+        """
+        logger.debug(f"Calling push if status is at revisions {status_revs}...")
+        return self._store.txn(self._puts(kvs, lease), self._deletes(ks_delete), status_revs)
+
+    def _puts(self, kvs: List[Dict[str, any]], lease: str) -> List[Tuple[str, any, int]]:
+        return [(kv["key"], kv["value"], lease) for kv in kvs]
+
+    def _deletes(self, ks_delete: List[str]) -> List[Tuple[str, bytes]]:
+        # every key is deleted with prefix=True
+        return [(kd, self._incr_last_byte(kd)) for kd in ks_delete or []]
+
+    def _latest_revision(self, key: str) -> int:
+        """
+        :param: key used for the request, not needed by the store
+        :return: latest revision of the store
+        """
+        return self._store.revision
+
+    def _lease(self, ttl) -> str:
+        """
+        This method grants a Lease for the TTL specified
+        :param ttl: Lease TTL
+        :return: lease id
+        """
+        logger.debug(f"Calling lease for ttl {ttl}...")
+        return self._store.grant(ttl)
+
+    def compact(self, rev: int):
+        """
+        This method discards the history of the store older than the revision, as the compaction of the etcd server
+        :param rev: revision to compact to
+        """
+        logger.debug(f"Compacting the store to revision {rev}...")
+        self._store.compact(rev)
@@ -0,0 +1,91 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import json
+from binascii import a2b_base64
+from typing import Dict, List
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the standard json module is used otherwise
+    orjson = None
+
+FIELDS = ("key", "value", "version", "create_rev", "mod_rev")
+
+
+class KeyValue:
+    """
+    This class represents a key-value pair pulled from the notification server. It is lighter than a dictionary, as
+    many of them are created for each page pulled, but it can be read as the dictionaries used for the key-value pairs
+    in the rest of the application. The value is missing if only the keys were pulled.
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, key: str, value: bytes, version: int, create_rev: int, mod_rev: int):
+        self.key = key
+        self.value = value
+        self.version = version
+        self.create_rev = create_rev
+        self.mod_rev = mod_rev
+
+    def __getitem__(self, field: str) -> any:
+        if field not in FIELDS or (field == "value" and self.value is None):
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field: str) -> bool:
+        return field in FIELDS and (field != "value" or self.value is not None)
+
+    def get(self, field: str, default: any = None) -> any:
+        return self[field] if field in self else default
+
+    def keys(self) -> List[str]:
+        return [f for f in FIELDS if f in self]
+
+    def to_dict(self) -> Dict[str, any]:
+        return {f: getattr(self, f) for f in self.keys()}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, KeyValue):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+def decode_kvs(raw_kvs: List[Dict[str, str]], key_only: bool = False) -> List[KeyValue]:
+    """
+    This function translates a page of key-value pairs returned by the gRPC gateway, with keys and values encoded in
+    base64 and the integers as strings
+    :param raw_kvs: key-value pairs as returned by the gateway
+    :param key_only: if True the values are not decoded
+    :return: the key-value pairs
+    """
+    return [
+        KeyValue(
+            a2b_base64(kv["key"]).decode(),
+            None if key_only else a2b_base64(kv.get("value", "")),
+            int(kv["version"]),
+            int(kv["create_revision"]),
+            int(kv["mod_revision"]),
+        )
+        for kv in raw_kvs
+    ]
+
+
+def loads(content: bytes) -> any:
+    """
+    This function parses a JSON document, with orjson if installed
+    :param content: JSON document
+    :return: the object parsed
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
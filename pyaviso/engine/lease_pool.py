@@ -0,0 +1,87 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import math
+import threading
+import time
+from typing import Tuple
+
+# default settings of the lease pool
+LEASE_GRANULARITY = 60  # seconds of the expiry buckets, the keys can live up to this longer than their ttl
+LEASE_MAX_EXTENSION = 0.1  # max fraction of the ttl the keys can live longer, it narrows the buckets of short ttls
+
+
+class LeasePool:
+    """
+    This class shares the leases among the keys pushed with a ttl. The time is divided in buckets and the keys expiring
+    in the same bucket share a lease expiring at the end of it, so a new lease is granted at most once per bucket
+    instead of once per push. The keys never expire before their ttl and at most one bucket later. A lease is used only
+    while the bucket of the new keys is its own, so leases are naturally rotated well before they expire. The buckets
+    are narrowed for short ttls, and the pool is bypassed if they would be shorter than a second.
+    """
+
+    def __init__(self, granularity: float = LEASE_GRANULARITY, max_extension: float = LEASE_MAX_EXTENSION):
+        """
+        :param granularity: seconds of the expiry buckets, 0 to grant a lease for each push
+        :param max_extension: max fraction of the ttl the keys can live longer than requested
+        """
+        assert granularity >= 0, "granularity cannot be negative"
+        assert max_extension >= 0, "max_extension cannot be negative"
+        self._granularity = granularity
+        self._max_extension = max_extension
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, ttl: int) -> Tuple[Tuple[float, int], int]:
+        """
+        :param ttl: time to live of the keys to push, in seconds
+        :return: a tuple: bucket of the expiry of the keys, None if not pooled, and ttl of a new lease for it
+        """
+        width = min(self._granularity, ttl * self._max_extension)
+        if width < 1:
+            return None, ttl
+        now = time.monotonic()
+        bucket = (width, math.ceil((now + ttl) / width))
+        return bucket, math.ceil(bucket[1] * width - now)
+
+    def get(self, bucket: Tuple[float, int]) -> str:
+        """
+        :param bucket: bucket of the expiry of the keys, as returned by bucket
+        :return: lease of the bucket, None if not granted yet
+        """
+        if bucket is None:
+            return None
+        with self._lock:
+            return self._leases.get(bucket)
+
+    def add(self, bucket: Tuple[float, int], lease: str):
+        """
+        This method records the lease granted for a bucket and drops the leases that have expired
+        :param bucket: bucket of the expiry of the keys, as returned by bucket
+        :param lease: lease granted
+        """
+        if bucket is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            for b in [b for b in self._leases if b[0] * b[1] <= now]:
+                del self._leases[b]
+            self._leases[bucket] = lease
+
+    def discard(self, lease: str):
+        """
+        This method forgets a lease, it is used when the server does not accept it anymore
+        :param lease: lease to forget
+        """
+        with self._lock:
+            for b in [b for b, pooled in self._leases.items() if pooled == lease]:
+                del self._leases[b]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._leases)
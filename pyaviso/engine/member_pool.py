@@ -0,0 +1,208 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import threading
+import time
+from typing import List, Tuple
+
+from .. import logger
+
+# default settings of the member pool
+EJECTION_TIME = 5  # seconds a member failing a request is skipped before being probed again
+MAX_EJECTION_TIME = 60  # max seconds a member failing repeatedly is skipped
+PROBE_TIMEOUT = 2  # seconds to wait for the answer of a member probed
+
+
+class Member:
+    """
+    This class represents a member of the etcd cluster the engine can connect to
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.member_id = None
+        self.failures = 0
+        self.ejected_until = 0
+
+    @property
+    def address(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def __repr__(self):
+        return self.address
+
+
+class MemberPool:
+    """
+    This class keeps the members of the etcd cluster the engine connects to and orders them for each request. The
+    serializable reads are spread across the healthy members in turn, while the writes and the linearizable reads are
+    sent to the leader first. A member failing a request is ejected for a time growing with its consecutive failures,
+    after which it is probed before being used again. The members ejected are still tried last, so a request fails
+    over to the next member straight away and is never refused only because of the ejections.
+    """
+
+    def __init__(
+        self,
+        endpoints: List[Tuple[str, int]],
+        status: callable([Member]) = None,
+        ejection_time: float = EJECTION_TIME,
+        max_ejection_time: float = MAX_EJECTION_TIME,
+    ):
+        """
+        :param endpoints: list of tuples: host, port of each member
+        :param status: function returning the id of a member and the id of the leader it knows, raising an exception
+        if the member is unhealthy. If None the members are not probed and the leader is not searched
+        :param ejection_time: seconds a member failing a request is skipped at first
+        :param max_ejection_time: max seconds a member failing repeatedly is skipped
+        """
+        assert len(endpoints) > 0, "at least one endpoint is needed"
+        self._members = [Member(host, port) for host, port in endpoints]
+        self._status = status
+        self._ejection_time = ejection_time
+        self._max_ejection_time = max_ejection_time
+        self._leader = None
+        self._leader_searched = None  # when the leader was last searched
+        self._next = 0  # next member serving a serializable read
+        self._lock = threading.RLock()
+
+    @property
+    def members(self) -> List[Member]:
+        return self._members
+
+    @property
+    def leader(self) -> Member:
+        return self._leader
+
+    def order(self, serializable: bool = False) -> List[Member]:
+        """
+        :param serializable: True if the request can be served by any member, False if it should go to the leader
+        :return: the members to send the request to, in the order to try them
+        """
+        if len(self._members) == 1:
+            return self._members
+        with self._lock:
+            self._probe_due()
+            now = time.monotonic()
+            healthy = [m for m in self._members if m.ejected_until <= now]
+            ejected = sorted([m for m in self._members if m.ejected_until > now], key=lambda m: m.ejected_until)
+            if serializable:
+                # spread the reads across the healthy members
+                if healthy:
+                    self._next = (self._next + 1) % len(healthy)
+                    healthy = healthy[self._next :] + healthy[: self._next]
+            else:
+                leader = self._search_leader(healthy)
+                if leader in healthy:
+                    healthy.remove(leader)
+                    healthy.insert(0, leader)
+            return healthy + ejected
+
+    def failed(self, member: Member):
+        """
+        This method ejects a member that has failed a request
+        :param member: member failing
+        """
+        with self._lock:
+            member.failures += 1
+            ejection = min(self._ejection_time * 2 ** (member.failures - 1), self._max_ejection_time)
+            member.ejected_until = time.monotonic() + ejection
+            if member is self._leader:
+                self._leader = None
+                self._leader_searched = None
+        if len(self._members) > 1:
+            logger.warning(f"Member {member} of the cluster is unhealthy, skipped for {ejection}s")
+
+    def succeeded(self, member: Member):
+        """
+        This method marks a member as healthy after it has served a request
+        :param member: member serving the request
+        """
+        if member.failures:
+            with self._lock:
+                member.failures = 0
+                member.ejected_until = 0
+            logger.debug(f"Member {member} of the cluster is healthy again")
+
+    def _probe_due(self):
+        """
+        This method probes the members whose ejection has expired, they are used again only if healthy
+        """
+        if self._status is None:
+            return
+        now = time.monotonic()
+        for member in [m for m in self._members if m.failures and m.ejected_until <= now]:
+            # not probed again by the requests sent while probing
+            member.ejected_until = now + self._ejection_time
+            try:
+                self._member_status(member)
+                self.succeeded(member)
+            except Exception as e:
+                logger.debug(f"Probe of member {member} failed, {e}")
+                self.failed(member)
+
+    def _search_leader(self, healthy: List[Member]) -> Member:
+        """
+        This method asks the healthy members for the leader, unless searched recently. The leader is searched again
+        after the max ejection time, in case it has changed
+        :param healthy: healthy members
+        :return: the leader, None if unknown
+        """
+        if self._status is None:
+            return None
+        now = time.monotonic()
+        if self._leader_searched is not None:
+            elapsed = now - self._leader_searched
+            if self._leader is not None and elapsed < self._max_ejection_time:
+                return self._leader
+            if self._leader is None and elapsed < self._ejection_time:
+                return None
+        # not searched again by the requests sent while searching
+        self._leader_searched = now
+        self._leader = None
+        for member in healthy:
+            try:
+                leader_id = self._member_status(member)
+            except Exception as e:
+                logger.debug(f"Status of member {member} not available, {e}")
+                self.failed(member)
+                continue
+            self._leader = self._member_by_id(leader_id, healthy)
+            if self._leader is not None:
+                logger.debug(f"Member {self._leader} is the leader of the cluster")
+                return self._leader
+        # the leader is not among the endpoints or it is not reachable
+        return None
+
+    def _member_status(self, member: Member) -> int:
+        """
+        :param member: member to ask
+        :return: id of the leader known by the member
+        """
+        member_id, leader_id = self._status(member)
+        member.member_id = member_id
+        return leader_id
+
+    def _member_by_id(self, member_id: int, healthy: List[Member]) -> Member:
+        """
+        :param member_id: id of the member to find
+        :param healthy: healthy members, asked for their id if not known yet
+        :return: the member with the id, None if not found
+        """
+        for member in self._members:
+            if member.member_id == member_id:
+                return member
+        for member in [m for m in healthy if m.member_id is None]:
+            try:
+                self._member_status(member)
+            except Exception:
+                self.failed(member)
+                continue
+            if member.member_id == member_id:
+                return member
+        return None
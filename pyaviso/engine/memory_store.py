@@ -0,0 +1,395 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import base64
+import heapq
+import json
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterator, List, Tuple
+
+from .. import logger
+from ..custom_exceptions import EngineException, EngineHistoryNotAvailableError
+
+# fields of the records of the history of a key
+MOD_REV, CREATE_REV, VERSION, VALUE, LEASE = range(5)
+
+# stores shared by the engines of this process, by name
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class MemoryStore:
+    """
+    This class implements a multi-version key-value store with the semantic of etcd. The keys are kept in a sorted index
+    and each key has the list of its records, one for each revision it was modified in. A deleted key has a record
+    without value. Past revisions can be read until they are compacted. Keys can be attached to leases that delete them
+    once expired. All the changes can be appended to a log file that is replayed when the store is opened again.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        :param path: file where the changes are logged, if None the store is kept only in memory
+        """
+        self._lock = threading.RLock()
+        self._keys = []  # sorted keys, as bytes, with a history
+        self._history = {}  # records of each key, oldest first
+        self._revs = {}  # mod_revision of the records of each key, to search them
+        self._revision = 1
+        self._compact_revision = 0
+        self._leases = {}  # keys attached to each lease
+        self._expiries = []  # heap of expiry time and lease
+        self._next_lease = 1
+        self._path = path
+        self._log = None
+        if path:
+            self._replay(path)
+            self._log = open(path, "a")
+
+    @property
+    def revision(self) -> int:
+        with self._lock:
+            self._expire_leases()
+            return self._revision
+
+    @property
+    def compact_revision(self) -> int:
+        return self._compact_revision
+
+    def range(
+        self,
+        key: str,
+        range_end: bytes = None,
+        rev: int = None,
+        min_rev: int = None,
+        max_rev: int = None,
+        limit: int = None,
+        key_only: bool = False,
+    ) -> Tuple[List[Dict[str, any]], bool, int]:
+        """
+        This method reads the key-values in the range as they were at the revision requested
+        :param key: start of the range
+        :param range_end: end of the range, excluded, if None only the key is read
+        :param rev: revision to read, if None the current one
+        :param min_rev: if provided only KV pairs with mod_revision >= to min_rev are returned
+        :param max_rev: if provided only KV pairs with mod_revision <= to max_rev are returned
+        :param limit: max number of KV pairs returned
+        :param key_only: if True no values are returned
+        :return: a tuple: key-value pairs sorted by key in descending order, True if more pairs are in the range,
+        current revision of the store
+        """
+        with self._lock:
+            self._expire_leases()
+            return self._range(key.encode(), range_end, rev, min_rev, max_rev, limit, key_only) + (self._revision,)
+
+    def ranges(
+        self, ranges: List[Tuple[str, bytes, int]], limit: int = None
+    ) -> Tuple[List[Tuple[List[Dict[str, any]], bool]], int]:
+        """
+        This method reads many ranges at the same revision
+        :param ranges: list of tuples: start of the range, end of the range, min mod_revision of the KV pairs to return
+        :param limit: max number of KV pairs returned for each range
+        :return: a tuple: key-value pairs of each range with True if more pairs are in it, current revision of the store
+        """
+        with self._lock:
+            self._expire_leases()
+            results = [
+                self._range(key.encode(), range_end, None, min_rev, None, limit) for key, range_end, min_rev in ranges
+            ]
+            return results, self._revision
+
+    def txn(
+        self,
+        puts: List[Tuple[str, any, int]],
+        deletes: List[Tuple[str, bytes]] = None,
+        compares: Dict[str, int] = None,
+    ) -> Tuple[bool, int, Dict[str, List[Dict[str, any]]]]:
+        """
+        This method applies the deletes and then the puts as a single revision, only if the keys compared have the
+        mod_revision expected
+        :param puts: list of tuples: key, value, lease or None
+        :param deletes: list of tuples: start of the range to delete, end of the range or None to delete only the key
+        :param compares: mod_revision expected for each key, 0 if expected not to exist
+        :return: a tuple: True if applied, current revision of the store, current value of the keys compared if not
+        applied
+        """
+        with self._lock:
+            self._expire_leases()
+            if compares and any(self._mod_revision(k.encode()) != rev for k, rev in compares.items()):
+                current = {k: self._range(k.encode(), None, None, None, None, None)[0] for k in compares}
+                return False, self._revision, current
+            keys = [k for k, v, lease in puts]
+            if len(set(keys)) != len(keys):
+                raise EngineException("duplicate key given in txn request")
+            for k, v, lease in puts:
+                if lease and lease not in self._leases:
+                    raise EngineException(f"requested lease {lease} not found")
+            puts = [(k.encode(), v.encode() if isinstance(v, str) else v, lease) for k, v, lease in puts]
+            deletes = [(k.encode(), range_end) for k, range_end in deletes or []]
+            self._apply(puts, deletes)
+            return True, self._revision, None
+
+    def delete_range(self, key: str, range_end: bytes = None) -> List[Dict[str, any]]:
+        """
+        :param key: start of the range to delete
+        :param range_end: end of the range, excluded, if None only the key is deleted
+        :return: key-values deleted
+        """
+        with self._lock:
+            self._expire_leases()
+            return self._apply([], [(key.encode(), range_end)])
+
+    def grant(self, ttl: int) -> int:
+        """
+        :param ttl: seconds after which the keys attached to the lease are deleted
+        :return: id of the new lease
+        """
+        with self._lock:
+            self._expire_leases()
+            lease = self._next_lease
+            expiry = time.time() + ttl
+            self._grant(lease, expiry)
+            self._write({"op": "grant", "lease": lease, "expiry": expiry})
+            return lease
+
+    def compact(self, rev: int):
+        """
+        This method discards the history older than the revision, the keys can still be read at this revision or later
+        :param rev: revision to compact to
+        """
+        with self._lock:
+            self._expire_leases()
+            if rev <= self._compact_revision:
+                raise EngineException("mvcc: required revision has been compacted")
+            if rev > self._revision:
+                raise EngineException("mvcc: required revision is a future revision")
+            self._compact(rev)
+            self._write({"op": "compact", "rev": rev})
+
+    def close(self):
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+
+    def __len__(self):
+        with self._lock:
+            return sum(1 for k in self._keys if self._history[k][-1][VALUE] is not None)
+
+    def _range(
+        self,
+        key: bytes,
+        range_end: bytes,
+        rev: int,
+        min_rev: int,
+        max_rev: int,
+        limit: int,
+        key_only: bool = False,
+    ) -> Tuple[List[Dict[str, any]], bool]:
+        if rev:
+            if rev < self._compact_revision:
+                raise EngineHistoryNotAvailableError()
+            if rev > self._revision:
+                raise EngineException("mvcc: required revision is a future revision")
+        else:
+            rev = self._revision
+        kvs = []
+        for k in self._range_keys(key, range_end, reverse=True):
+            record = self._record(k, rev)
+            if record is None or record[VALUE] is None:
+                continue
+            if (min_rev and record[MOD_REV] < min_rev) or (max_rev and record[MOD_REV] > max_rev):
+                continue
+            if limit and len(kvs) == limit:
+                return kvs, True
+            kvs.append(self._kv(k, record, key_only))
+        return kvs, False
+
+    def _range_keys(self, key: bytes, range_end: bytes, reverse: bool = False) -> Iterator[bytes]:
+        """
+        :return: keys with a history in the range
+        """
+        start = bisect_left(self._keys, key)
+        if range_end is None:
+            end = start + 1 if start < len(self._keys) and self._keys[start] == key else start
+        elif range_end == b"\0":
+            end = len(self._keys)
+        else:
+            end = bisect_left(self._keys, range_end)
+        indexes = range(end - 1, start - 1, -1) if reverse else range(start, end)
+        return (self._keys[i] for i in indexes)
+
+    def _record(self, key: bytes, rev: int) -> tuple:
+        """
+        :return: last record of the key at the revision, None if the key did not exist yet
+        """
+        i = bisect_right(self._revs[key], rev) - 1
+        return self._history[key][i] if i >= 0 else None
+
+    def _mod_revision(self, key: bytes) -> int:
+        if key not in self._history or self._history[key][-1][VALUE] is None:
+            return 0
+        return self._history[key][-1][MOD_REV]
+
+    @staticmethod
+    def _kv(key: bytes, record: tuple, key_only: bool = False) -> Dict[str, any]:
+        kv = {
+            "key": key.decode(),
+            "version": record[VERSION],
+            "create_rev": record[CREATE_REV],
+            "mod_rev": record[MOD_REV],
+        }
+        if not key_only:
+            kv["value"] = record[VALUE]
+        return kv
+
+    def _apply(self, puts: List[Tuple[bytes, bytes, int]], deletes: List[Tuple[bytes, bytes]]) -> List[Dict[str, any]]:
+        """
+        This method applies the changes as a new revision, if anything changes
+        :return: key-values deleted
+        """
+        rev = self._revision + 1
+        deleted = []
+        for key, range_end in deletes:
+            for k in list(self._range_keys(key, range_end)):
+                kv = self._delete(k, rev)
+                if kv is not None:
+                    deleted.append(kv)
+        for k, v, lease in puts:
+            self._put(k, v, lease, rev)
+        if puts or deleted:
+            self._revision = rev
+            self._write(
+                {
+                    "op": "txn",
+                    "puts": [[_encode(k), _encode(v), lease] for k, v, lease in puts],
+                    "deletes": [[_encode(k), _encode(range_end) if range_end else None] for k, range_end in deletes],
+                }
+            )
+        return deleted
+
+    def _put(self, key: bytes, value: bytes, lease: int, rev: int):
+        if key not in self._history:
+            insort(self._keys, key)
+            self._history[key] = []
+            self._revs[key] = []
+        history = self._history[key]
+        last = history[-1] if history and history[-1][VALUE] is not None else None
+        if last is None:
+            record = (rev, rev, 1, value, lease)
+        else:
+            record = (rev, last[CREATE_REV], last[VERSION] + 1, value, lease)
+            if last[LEASE] and last[LEASE] != lease and last[LEASE] in self._leases:
+                self._leases[last[LEASE]].discard(key)
+        history.append(record)
+        self._revs[key].append(rev)
+        if lease in self._leases:
+            self._leases[lease].add(key)
+
+    def _delete(self, key: bytes, rev: int) -> Dict[str, any]:
+        last = self._history[key][-1]
+        if last[VALUE] is None:
+            return None
+        self._history[key].append((rev, 0, 0, None, None))
+        self._revs[key].append(rev)
+        if last[LEASE] and last[LEASE] in self._leases:
+            self._leases[last[LEASE]].discard(key)
+        return self._kv(key, last)
+
+    def _grant(self, lease: int, expiry: float):
+        self._leases[lease] = set()
+        heapq.heappush(self._expiries, (expiry, lease))
+        self._next_lease = max(self._next_lease, lease + 1)
+
+    def _expire_leases(self):
+        """
+        This method revokes the leases expired, their keys are deleted in a new revision for each lease
+        """
+        now = time.time()
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, lease = heapq.heappop(self._expiries)
+            keys = self._leases.pop(lease, set())
+            logger.debug(f"Lease {lease} expired, deleting {len(keys)} keys")
+            self._write({"op": "revoke", "lease": lease})
+            if keys:
+                self._apply([], [(k, None) for k in sorted(keys)])
+
+    def _compact(self, rev: int):
+        for k in list(self._keys):
+            history = self._history[k]
+            i = bisect_right(self._revs[k], rev) - 1
+            # keep the record valid at the revision, unless the key was deleted
+            first = i if i >= 0 and history[i][VALUE] is not None else i + 1
+            if first > 0:
+                del history[:first]
+                del self._revs[k][:first]
+            if not history:
+                del self._keys[bisect_left(self._keys, k)]
+                del self._history[k]
+                del self._revs[k]
+        self._compact_revision = rev
+
+    def _write(self, entry: Dict[str, any]):
+        if self._log is not None:
+            self._log.write(json.dumps(entry) + "\n")
+            self._log.flush()
+
+    def _replay(self, path: str):
+        """
+        This method rebuilds the store from its log
+        :param path: file where the changes are logged
+        """
+        if not os.path.exists(path):
+            return
+        logger.debug(f"Replaying memory store log {path}")
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line not completely written
+                    logger.warning(f"Ignoring corrupted entry of the memory store log {path}")
+                    break
+                if entry["op"] == "txn":
+                    puts = [(_decode(k), _decode(v), lease) for k, v, lease in entry["puts"]]
+                    deletes = [
+                        (_decode(k), _decode(range_end) if range_end else None) for k, range_end in entry["deletes"]
+                    ]
+                    self._apply(puts, deletes)
+                elif entry["op"] == "grant":
+                    self._grant(entry["lease"], entry["expiry"])
+                elif entry["op"] == "revoke":
+                    self._leases.pop(entry["lease"], None)
+                    self._expiries = [e for e in self._expiries if e[1] != entry["lease"]]
+                    heapq.heapify(self._expiries)
+                elif entry["op"] == "compact":
+                    self._compact(entry["rev"])
+
+
+def memory_store(name: str, path: str = None) -> MemoryStore:
+    """
+    :param name: name of the store, the engines using the same name share it
+    :param path: file where the changes are logged, if None the store is kept only in memory
+    :return: the store with the name, created if needed
+    """
+    with _stores_lock:
+        store = _stores.get(name)
+        if store is None:
+            store = MemoryStore(path)
+            _stores[name] = store
+        return store
+
+
+def _encode(b: bytes) -> str:
+    return base64.b64encode(b).decode()
+
+
+def _decode(s: str) -> bytes:
+    return base64.b64decode(s)
@@ -0,0 +1,82 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_SIZE = 10000  # notifications remembered
+DEDUP_WINDOW = 600  # seconds a notification is remembered
+
+
+class NotificationDedup:
+    """
+    This class remembers the notifications delivered, identified by their key and mod_revision, so the same
+    notification fetched more than once, for instance by keys that are one the prefix of the other, is dropped before
+    its triggers run. The notifications are remembered within a scope, a listener or the whole process, and only the
+    most recent ones are kept, up to a max number and for a max time.
+    """
+
+    def __init__(self, size: int = DEDUP_SIZE, window: float = DEDUP_WINDOW):
+        """
+        :param size: max number of notifications remembered
+        :param window: max number of seconds a notification is remembered
+        """
+        assert size > 0, "size must be positive"
+        self._size = size
+        self._window = window
+        self._delivered = OrderedDict()  # time of the delivery of each notification, from the oldest
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    @property
+    def dropped(self) -> int:
+        """
+        :return: number of duplicated notifications dropped
+        """
+        return self._dropped
+
+    def __len__(self):
+        return len(self._delivered)
+
+    def first(self, scope: any, key: str, mod_rev: int) -> bool:
+        """
+        This method records the delivery of a notification
+        :param scope: scope of the deduplication, the same notification is delivered once for each scope
+        :param key: key of the notification
+        :param mod_rev: revision of the key
+        :return: True if the notification has not been delivered yet in this scope, False if it is a duplicate
+        """
+        now = time.monotonic()
+        notification = (scope, key, mod_rev)
+        with self._lock:
+            # forget the notifications out of the window
+            while len(self._delivered) > 0 and next(iter(self._delivered.values())) < now - self._window:
+                self._delivered.popitem(last=False)
+            if notification in self._delivered:
+                self._dropped += 1
+                return False
+            self._delivered[notification] = now
+            if len(self._delivered) > self._size:
+                self._delivered.popitem(last=False)
+            return True
+
+
+_process_dedup = None
+_process_dedup_lock = threading.Lock()
+
+
+def process_dedup() -> NotificationDedup:
+    """
+    :return: the deduplication shared by all the engines of the process
+    """
+    global _process_dedup
+    with _process_dedup_lock:
+        if _process_dedup is None:
+            _process_dedup = NotificationDedup()
+        return _process_dedup
@@ -6,4 +6,4 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
-__all__ = ["event_listener", "event_listener_factory", "listener_manager"]
+__all__ = ["dispatcher", "event_listener", "event_listener_factory", "listener_file_watcher", "listener_manager"]
@@ -0,0 +1,214 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+from functools import partial
+from typing import Dict, List, NamedTuple, Set
+
+from .. import logger
+from ..engine.engine import Engine
+from .event_listener import EventListener
+
+
+class _Index(NamedTuple):
+    listeners: List[EventListener]
+    # listeners, by position, filtering each attribute on each of its values
+    filtered: Dict[str, Dict[any, Set[int]]]
+    # listeners, by position, not filtering each attribute
+    unfiltered: Dict[str, Set[int]]
+    # attributes filtered as integers by some listeners
+    int_attributes: Set[str]
+
+
+class NotificationDispatcher:
+    """
+    This class routes the notifications to a group of event listeners of the same event type sharing an engine. The
+    keys of all of them are listened once, each notification is parsed once and the listeners expecting it are looked
+    up in an inverted index of the attribute values they filter, so that the cost of the routing does not grow with
+    the number of listeners. Each key is listened on its own, so it keeps its own checkpoint whatever the other keys of
+    the group, and a notification under more keys is delivered only through the shortest of them. The listeners can be
+    updated while listening, only the keys added or removed are started or stopped.
+    """
+
+    def __init__(self, listeners: List[EventListener], engine: Engine = None):
+        """
+        :param listeners: event listeners of the same event type, engine and dates
+        :param engine: engine listening to the keys, if None the one of the first listener
+        """
+        assert len(listeners) > 0, "At least one listener is required"
+        self._engine = engine if engine is not None else listeners[0].engine
+        self._from_date = listeners[0].from_date
+        self._to_date = listeners[0].to_date
+        self._index = self._build_index(listeners)
+        self._listened: List[str] = []  # keys currently listened
+        self._covered: Set[str] = set()  # keys listened under another key listened
+
+    @staticmethod
+    def _build_index(listeners: List[EventListener]) -> _Index:
+        """
+        :param listeners: event listeners to index
+        :return: the index of the values filtered by the listeners
+        """
+        index = _Index(list(listeners), {}, {}, set())
+        attributes = {attribute for listener in index.listeners for attribute in listener.filter}
+        for attribute in attributes:
+            index.filtered[attribute] = {}
+            index.unfiltered[attribute] = set()
+            for i, listener in enumerate(index.listeners):
+                values = listener.filter.get(attribute)
+                if values is None:
+                    index.unfiltered[attribute].add(i)
+                    continue
+                for value in values:
+                    index.filtered[attribute].setdefault(value, set()).add(i)
+                    if type(value) is int:
+                        index.int_attributes.add(attribute)
+        return index
+
+    @property
+    def engine(self) -> Engine:
+        return self._engine
+
+    @property
+    def listeners(self) -> List[EventListener]:
+        return self._index.listeners
+
+    @property
+    def keys(self) -> List[str]:
+        """
+        :return: keys of all the listeners, each one once. The keys under another one are kept, the engine retrieves
+        them together and the notifications fetched by both are delivered only through the shortest key
+        """
+        return sorted({key for listener in self.listeners for key in listener.keys})
+
+    @property
+    def listened(self) -> List[str]:
+        """
+        :return: keys currently listened
+        """
+        return list(self._listened)
+
+    def listen(self) -> bool:
+        """
+        This method listens to the keys of all the listeners, the notifications are routed by a single callback
+        :return: True if the listeners are in execution, False otherwise
+        """
+        self._listened = []
+        return self._listen_keys(self.keys)
+
+    def _listen_keys(self, keys: List[str]) -> bool:
+        """
+        This method listens to each key separately, so that the checkpoint of a key, named after the keys listened
+        together, does not change when other listeners are added, removed or edited
+        :param keys: keys to listen to
+        :return: True if all the keys are in execution, False otherwise
+        """
+        # the keys covered are known before any notification is received
+        self._covered = self._covered_keys(self._listened + keys)
+        result = True
+        for key in keys:
+            if self._engine.listen([key], partial(self._key_callback, key), self._from_date, self._to_date):
+                self._listened.append(key)
+            else:
+                result = False
+        self._covered = self._covered_keys(self._listened)
+        return result
+
+    @staticmethod
+    def _covered_keys(keys: List[str]) -> Set[str]:
+        """
+        :param keys: keys listened
+        :return: the keys under another one of the keys
+        """
+        covered = set()
+        prefix = None
+        for key in sorted(keys):
+            if prefix is not None and key.startswith(prefix):
+                covered.add(key)
+            else:
+                prefix = key
+        return covered
+
+    def update(self, listeners: List[EventListener]) -> bool:
+        """
+        This method replaces the listeners of the dispatcher. The keys no longer needed are stopped and the new ones
+        are listened, while the others keep being listened with no interruption
+        :param listeners: new event listeners, of the same event type, engine and dates
+        :return: True if the new keys are in execution, False otherwise
+        """
+        self._index = self._build_index(listeners)
+        keys = self.keys
+        added = [key for key in keys if key not in self._listened]
+        removed = [key for key in self._listened if key not in keys]
+        for key in removed:
+            self._engine.stop(key)
+        self._listened = [key for key in self._listened if key in keys]
+        self._covered = self._covered_keys(self._listened)
+        if len(added) > 0:
+            logger.debug(f"Starting to listen to {added}")
+            return self._listen_keys(added)
+        return True
+
+    def stop(self):
+        """
+        This method stops listening to the keys of the listeners
+        """
+        for key in self._listened:
+            self._engine.stop(key)
+        self._listened = []
+        self._covered = set()
+
+    def match(self, not_request: Dict[str, any]) -> List[EventListener]:
+        """
+        This method looks up the listeners expecting a notification
+        :param not_request: attributes parsed from the key of the notification
+        :return: the listeners expecting it, in the order they were given
+        """
+        index = self._index  # the index can be replaced while matching
+        matched = None
+        for attribute, values in index.filtered.items():
+            found = set(index.unfiltered[attribute])
+            n_value = not_request.get(attribute)
+            if n_value is not None:
+                found.update(values.get(n_value, ()))
+                if attribute in index.int_attributes:
+                    try:
+                        found.update(values.get(int(n_value), ()))
+                    except ValueError:
+                        pass
+            matched = found if matched is None else matched & found
+            if len(matched) == 0:
+                return []
+        if matched is None:  # no filters at all
+            return list(index.listeners)
+        return [index.listeners[i] for i in sorted(matched)]
+
+    def _key_callback(self, listened_key: str, key: str, value: str):
+        """
+        This callback receives the notifications of a key listened. Those under a shorter key listened are dropped, as
+        delivered through it
+        :param listened_key: key listened
+        :param key:
+        :param value:
+        """
+        if listened_key in self._covered:
+            logger.debug(f"Notification for key {key} delivered through a shorter key, dropped")
+            return
+        self.callback(key, value)
+
+    def callback(self, key: str, value: str):
+        """
+        This callback parses the key once and delivers the notification to the listeners expecting it
+        :param key:
+        :param value:
+        """
+        not_request: Dict[str, any] = self.listeners[0].parse_key(key)
+        listeners = self.match(not_request)
+        if len(listeners) == 0:
+            logger.debug(f"Notification {not_request} not expected by any listener therefore it will be ignored")
+        for listener in listeners:
+            listener.deliver(dict(not_request), value)
@@ -6,10 +6,11 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import ast
 import itertools
-import re
+import string
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, Iterator, List, Set, Tuple
 
 import parse
 
@@ -21,6 +22,7 @@ from ..triggers import trigger_factory as tf
 from .validation import *  # noqa: F403
 
 DEFAULT_PAYLOAD_KEY = "payload"
+MAX_KEYS = 100  # keys listened by a listener, beyond it shorter prefixes covering them are listened
 
 
 class EventListener:
@@ -45,8 +47,14 @@ class EventListener:
         self._triggers = triggers
         self._listener_schema = listener_schema
         self._trigger_factory = tf.TriggerFactory()
+        self._key_parser = None  # compiled by the first notification
         self._keys = self.key_expansion(self._request)
         self._filter = self.filter_expansion(self._request)
+        # values accepted for each attribute, and whether the notification values are compared as integers
+        self._filter_sets: Dict[str, Tuple[Set[any], bool]] = {
+            attribute: (set(values), len(values) > 0 and type(values[0]) is int)
+            for attribute, values in self._filter.items()
+        }
         self._from_date = from_date
         self._to_date = to_date
         self.payload_key = payload_key
@@ -93,6 +101,10 @@ class EventListener:
     def triggers(self) -> List[Dict[str, any]]:
         return self._triggers
 
+    @property
+    def filter(self) -> Dict[str, List[any]]:
+        return self._filter
+
     @property
     def listener_schema(self) -> Dict[str, any]:
         return self._listener_schema
@@ -103,36 +115,90 @@ class EventListener:
 
     def key_expansion(self, request: Dict[str, any]) -> List[str]:
         """
-        This functions composes the keys to watch using the listener request dictionary
+        This functions composes the keys to watch using the listener request dictionary. The attributes with a list of
+        values are expanded to all their combinations. If these are more than MAX_KEYS, the keys are cut before the
+        attributes that would exceed it, so a bounded number of prefixes covers them and the remaining attributes are
+        checked by the filter of the listener
         :param request:
         :return: List of keys
         """
         # read the key format from the schema
         key_base = EventListener._key_base_format(self.listener_schema, self.engine.engine_type)
-        try:
-            key: str = key_base.format(**request)
-        except KeyError as e:
-            raise KeyError(f"Wrong listener file: {','.join(e.args)} required")
-
-        # compose multiple keys from the list values
-        keys: List[str] = []
-        template = r"\[[^\[\]]*\]"
-        matches = re.findall(template, key)
-        if len(matches) == 0:
-            keys.append(key)
-        else:
-            # Build a list of the possible substitutions
-            ldests = []
-            for m in matches:
-                ldests.append(eval(m))
-            # Generate the various pairings
-            for lproduct in itertools.product(*ldests):
-                k = key
-                for src, dest in itertools.zip_longest(matches, lproduct):
-                    # Replace each term (you could optimise this using a single re.sub)
-                    k = k.replace(src, dest)
-                keys.append(k)
-        return keys
+        texts, values = EventListener._split_key_format(key_base, request)
+
+        # expand the attributes as long as the number of keys stays bounded
+        n_attributes = 0
+        n_keys = 1
+        for attribute_values in values:
+            if n_keys * len(attribute_values) > MAX_KEYS:
+                logger.debug(f"Listening to the prefixes of the keys {key_base} before attribute {n_attributes + 1}")
+                break
+            n_keys *= len(attribute_values)
+            n_attributes += 1
+
+        # the same key can be composed more than once if a value is repeated
+        return list(dict.fromkeys(EventListener._compose_keys(texts, values, n_attributes)))
+
+    @staticmethod
+    def _split_key_format(key_format: str, request: Dict[str, any]) -> Tuple[List[str], List[List[str]]]:
+        """
+        This method splits a key format in its literal text and the attributes in between, each with the list of its
+        values in the request. Lists can be passed as such or as list literals.
+        :param key_format: key format from the schema
+        :param request: listener request dictionary
+        :return: the texts around the attributes, one more than the attributes, and the values of the attributes
+        """
+        formatter = string.Formatter()
+        texts = [""]
+        values = []
+        for literal, field, spec, conversion in formatter.parse(key_format):
+            texts[-1] += literal
+            if field is None:
+                continue
+            try:
+                value = formatter.get_field(field, (), request)[0]
+            except KeyError as e:
+                raise KeyError(f"Wrong listener file: {','.join(e.args)} required")
+            if type(value) is not list:
+                value = formatter.format_field(formatter.convert_field(value, conversion), spec)
+                value = EventListener._list_literal(value)
+            if type(value) is list:
+                value = [formatter.format_field(formatter.convert_field(v, conversion), spec) for v in value]
+            else:
+                value = [value]
+            values.append(value)
+            texts.append("")
+        return texts, values
+
+    @staticmethod
+    def _list_literal(value: str) -> any:
+        """
+        :param value: value of an attribute
+        :return: the list if the value is a list literal, the value itself otherwise
+        """
+        if value.startswith("[") and value.endswith("]"):
+            try:
+                parsed = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                return value
+            if type(parsed) is list:
+                return parsed
+        return value
+
+    @staticmethod
+    def _compose_keys(texts: List[str], values: List[List[str]], n_attributes: int) -> Iterator[str]:
+        """
+        This method generates the keys, or their prefixes, one by one
+        :param texts: texts around the attributes
+        :param values: values of the attributes
+        :param n_attributes: number of attributes to compose, the key is cut after the text that follows the last one
+        :return: iterator of the keys
+        """
+        for combination in itertools.product(*values[:n_attributes]):
+            key = texts[0]
+            for value, text in zip(combination, texts[1 : n_attributes + 1]):
+                key += value + text
+            yield key
 
     def filter_expansion(self, request: Dict[str, any]) -> Dict[str, List[any]]:
         """
@@ -167,18 +233,25 @@ class EventListener:
         :param key:
         :return:
         """
-        # read the key format from the schema
-        key_put_format = EventListener._key_base_format(
-            self.listener_schema, self.engine.engine_type
-        ) + EventListener._key_stem_format(self.listener_schema, self.engine.engine_type)
-
         try:
-            notification: Dict[str, any] = parse.parse(key_put_format, key, extra_types=[str]).named
+            notification: Dict[str, any] = self.key_parser.parse(key).named
         except AttributeError as e:
             logger.debug("", exc_info=True)
             raise EventListenerException(f"Key {key} failed validation, exception: {e}")
         return notification
 
+    @property
+    def key_parser(self) -> parse.Parser:
+        """
+        :return: the parser of the keys notified to this listener, compiled once from the key format in the schema
+        """
+        if self._key_parser is None:
+            key_put_format = EventListener._key_base_format(
+                self.listener_schema, self.engine.engine_type
+            ) + EventListener._key_stem_format(self.listener_schema, self.engine.engine_type)
+            self._key_parser = parse.compile(key_put_format, extra_types=[str])
+        return self._key_parser
+
     def callback(self, key: str, value: str):
         """
         This callback function first parses the key and build a notification dictionary, it then filters it using the
@@ -192,14 +265,23 @@ class EventListener:
         not_request: Dict[str, any] = self.parse_key(key)
 
         if self._is_expected(not_request):
-            # prepare the notification dictionary to pass to the trigger
-            notification: Dict[str, any] = {"event": self.event_type, "request": not_request}
-            if value != "None":
-                notification[self.payload_key] = value
-            # execute all the triggers defined in the EventListener
-            logger.info("A valid notification has been received, executing triggers...")
-            logger.debug(f"{notification}")
-            self.execute_triggers(notification)
+            self.deliver(not_request, value)
+
+    def deliver(self, not_request: Dict[str, any], value: str):
+        """
+        This method builds the notification dictionary of a key already parsed and filtered and passes it to the
+        triggers
+        :param not_request: attributes parsed from the key
+        :param value: value of the key
+        """
+        # prepare the notification dictionary to pass to the trigger
+        notification: Dict[str, any] = {"event": self.event_type, "request": not_request}
+        if value != "None":
+            notification[self.payload_key] = value
+        # execute all the triggers defined in the EventListener
+        logger.info("A valid notification has been received, executing triggers...")
+        logger.debug(f"{notification}")
+        self.execute_triggers(notification)
 
     def listen(self) -> bool:
         """
@@ -211,6 +293,14 @@ class EventListener:
         """
         return self._engine.listen(self.keys, self.callback, self.from_date, self.to_date)
 
+    async def listen_async(self, channel=None) -> bool:
+        """
+        Coroutine equivalent to listen, it requires an engine providing the asyncio coroutines
+        :param channel: asyncio queue where the engine signals the end of the listening
+        :return: True if the listener is in execution, False otherwise
+        """
+        return await self._engine.listen_async(self.keys, self.callback, self.from_date, self.to_date, channel)
+
     def stop(self) -> bool:
         """
         This method is used to stop an active notification listener running on the underlying notification mechanism.
@@ -299,11 +389,11 @@ class EventListener:
         :return:
         """
         expected = True
-        for f_key, f_values in self._filter.items():
+        for f_key, (f_values, is_int) in self._filter_sets.items():
             assert f_key in notification, "Filter attribute not present in the notification"
             n_value = notification[f_key]
             # infer the type of the attributes from the filter type, the default is string
-            if type(f_values[0]) is int:
+            if is_int:
                 n_value = int(n_value)
             # now check if it matches the filters
             if n_value not in f_values:
@@ -392,17 +482,14 @@ class EventListener:
         :param schema:
         :return:
         """
+        # the validators are built once for each schema
+        compiled_schema: CompiledSchema = compile_schema(schema)  # noqa: F405
         for p in params.keys():
             # check if this attribute is defined in the schema
             assert p in schema.keys(), f"Key {p} is not allowed"
-            type_list = schema[p]
             valid = False
-            for p_schema in type_list:
+            for validator in compiled_schema.validators(p):
                 try:
-                    assert "type" in p_schema, f"Wrong schema structure, 'type' could not be located for {p}"
-                    p_schema_c = p_schema.copy()
-                    validator_class = p_schema_c.pop("type")
-                    validator: TypeHandler = eval(f"{validator_class}(key=p, **p_schema_c)")  # noqa: F405
                     # format the values associated to this attribute
                     value = params[p]
                     if type(value) is list:
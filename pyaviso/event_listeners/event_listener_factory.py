@@ -10,6 +10,7 @@ from datetime import datetime
 from typing import Dict, List, Optional
 
 from .. import logger
+from ..engine.engine import Engine
 from ..engine.engine_factory import EngineFactory
 from ..triggers import trigger_factory as tf
 from . import event_listener as el
@@ -34,6 +35,7 @@ class EventListenerFactory:
         from_date: datetime = None,
         to_date: datetime = None,
         payload_key: str = None,
+        engine: Engine = None,
     ) -> List[el.EventListener]:
         """
         This method is used to parse a key-value dictionary and create a list of event listeners.
@@ -42,6 +44,7 @@ class EventListenerFactory:
         :param from_date: date from when to request notifications, if None it will be from now
         :param to_date: date until when to request notifications, if None it will be until now
         :param payload_key: key to use for the payload in the notification dictionary
+        :param engine: engine to use for the listeners, if None a new one is created
         :return: a list of EventListener objects
         """
         listeners: List[el.EventListener] = []
@@ -53,7 +56,8 @@ class EventListenerFactory:
         assert listener_list is not None, "Event listeners definition must start with the keyword 'listeners'"
 
         # Create the engine to connect to the notification server
-        engine = self._engine_factory.create_engine()
+        if engine is None:
+            engine = self._engine_factory.create_engine()
 
         for listen in listener_list:
             # each listener is a dictionary
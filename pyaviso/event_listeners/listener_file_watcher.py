@@ -0,0 +1,88 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import threading
+from typing import Dict, List, Tuple
+
+from .. import logger
+
+RELOAD_INTERVAL = 5  # seconds between two checks of the listener files
+
+
+class ListenerFileWatcher:
+    """
+    This class watches the listener files from a background thread and calls back when any of them changes. The files
+    are polled for their modification time and size, so no dependency on the file system notifications is required.
+    """
+
+    def __init__(self, paths: List[str], on_change: callable, interval: float = RELOAD_INTERVAL):
+        """
+        :param paths: file paths of the listener files
+        :param on_change: function to call when any of the files changes
+        :param interval: seconds between two checks of the files
+        """
+        self._paths = list(paths)
+        self._on_change = on_change
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = self._stat_files()
+
+    def _stat_files(self) -> Dict[str, Tuple[int, int]]:
+        """
+        :return: modification time and size of each file, None for the files not accessible
+        """
+        stats = {}
+        for path in self._paths:
+            try:
+                stat = os.stat(path)
+                stats[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stats[path] = None
+        return stats
+
+    def check(self) -> bool:
+        """
+        This method checks the files and calls back if any of them has changed since the previous check
+        :return: True if the files have changed
+        """
+        stats = self._stat_files()
+        if stats == self._stats:
+            return False
+        self._stats = stats
+        logger.info("Listener files changed, reloading the listeners")
+        try:
+            self._on_change()
+        except Exception as e:
+            logger.error(f"Error in reloading the listener files, {e}")
+            logger.debug("", exc_info=True)
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self._interval):
+            self.check()
+
+    def start(self):
+        """
+        This method starts watching the files in a background thread
+        """
+        assert self._thread is None, "Watcher already started"
+        self._thread = threading.Thread(target=self._watch, name="listener-file-watcher")
+        self._thread.setDaemon(True)
+        self._thread.start()
+        logger.debug(f"Watching the listener files {self._paths}")
+
+    def stop(self):
+        """
+        This method stops watching the files
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
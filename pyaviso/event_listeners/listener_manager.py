@@ -6,6 +6,8 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import asyncio
+import threading
 from datetime import datetime
 from typing import Dict, List
 
@@ -13,7 +15,9 @@ from .. import logger, user_config
 from ..authentication.auth import Auth
 from ..custom_exceptions import EventListenerException
 from ..engine import engine_factory as ef
+from ..engine.engine import Engine
 from . import event_listener_factory as elf
+from .dispatcher import NotificationDispatcher
 from .event_listener import EventListener
 
 
@@ -24,6 +28,10 @@ class ListenerManager:
 
     def __init__(self):
         self._listeners: List[EventListener] = []
+        # dispatchers executing the listeners, for each group of listeners
+        self._dispatchers: Dict[tuple, NotificationDispatcher] = {}
+        # listen, reload and cancel can be called from different threads, for instance on signals
+        self._lock = threading.RLock()
 
     @property
     def listeners(self) -> List[EventListener]:
@@ -31,19 +39,44 @@ class ListenerManager:
 
     def _run_listeners(self) -> bool:
         """
-        This method is used to execute all the listeners currently managed
+        This method is used to execute all the listeners currently managed. The listeners of the same event type
+        and server are executed together by a dispatcher, so each notification is parsed only once. The dispatchers
+        already running are updated, so only the keys added or removed are started or stopped
 
         :return: True if all the listeners are in execution, False otherwise
         """
         logger.debug("Calling run all listeners...")
         result = True
         listener_to_remove: List[EventListener] = []
-        for listener in self._listeners:
-            # Execute the listener
-            if not listener.listen():
+        groups = self._group_listeners()
+        # stop the groups left with no listeners
+        for group_key in [g for g in self._dispatchers if g not in groups]:
+            self._dispatchers.pop(group_key).stop()
+        for group_key, group in groups.items():
+            # Execute the listeners
+            dispatcher = self._dispatchers.get(group_key)
+            if dispatcher is None:
+                logger.debug(f"Dispatching the notifications of {len(group)} {group[0].event_type} listeners")
+                dispatcher = NotificationDispatcher(group)
+                started = dispatcher.listen()
+            else:
+                started = dispatcher.update(group)
+            if not started:
                 result = False
-                listener_to_remove.append(listener)
+                # only the listeners of the keys not started are removed, the others keep running untouched
+                listened = set(dispatcher.listened)
+                failed = [listener for listener in group if not listened.issuperset(listener.keys)]
+                listener_to_remove.extend(failed)
+                group = [listener for listener in group if listener not in failed]
+                if len(group) > 0:
+                    # the keys started only for the listeners removed are stopped
+                    dispatcher.update(group)
+            if len(group) > 0:
+                self._dispatchers[group_key] = dispatcher
             else:
+                dispatcher.stop()
+                self._dispatchers.pop(group_key, None)
+            for listener in group:
                 keys = ",".join(listener.keys)
                 logger.info(f"Listening to {keys} at {listener.engine.host}:{listener.engine.port}...")
 
@@ -53,6 +86,46 @@ class ListenerManager:
 
         return result
 
+    def _group_listeners(self) -> Dict[tuple, List[EventListener]]:
+        """
+        This method groups the listeners that can share a dispatcher, those with the same event type, server and dates
+        :return: the groups, in the order of the listeners
+        """
+        groups: Dict[tuple, List[EventListener]] = {}
+        for listener in self._listeners:
+            engine = listener.engine
+            group = (
+                engine.engine_type,
+                engine.host,
+                engine.port,
+                listener.event_type,
+                listener.from_date,
+                listener.to_date,
+            )
+            groups.setdefault(group, []).append(listener)
+        return groups
+
+    @staticmethod
+    def _signature(listener: EventListener) -> tuple:
+        """
+        :param listener: EventListener object
+        :return: what identifies the listener, two listeners with the same signature receive the same notifications and
+        execute the same triggers
+        """
+        engine = listener.engine
+        return (
+            engine.engine_type,
+            engine.host,
+            engine.port,
+            listener.event_type,
+            tuple(listener.keys),
+            repr(sorted(listener.filter.items())),
+            repr(listener.triggers),
+            listener.from_date,
+            listener.to_date,
+            listener.payload_key,
+        )
+
     def _add_listener(self, listener: EventListener) -> None:
         """
         Add a listener to the internal listener list of the manager
@@ -103,12 +176,18 @@ class ListenerManager:
 
         :return: True if no listener is currently in execution
         """
-        # first cancel all the notification listeners
-        for listener in self._listeners:
-            self._stop_listener(listener)
+        with self._lock:
+            # first stop the keys listened by the dispatchers, their engines can be different from the listeners ones
+            for dispatcher in self._dispatchers.values():
+                dispatcher.stop()
+            self._dispatchers.clear()
+
+            # then cancel all the notification listeners
+            for listener in self._listeners:
+                self._stop_listener(listener)
 
-        # now remove all of them from the internal list
-        self._listeners.clear()
+            # now remove all of them from the internal list
+            self._listeners.clear()
 
     def listen(
         self,
@@ -129,12 +208,141 @@ class ListenerManager:
         """
         logger.debug("Calling listen in ListenerManager...")
 
+        with self._lock:
+            # Add the listeners to the manager and run them
+            self._add_listeners(self._create_listeners(listeners, listener_schema, config, from_date, to_date))
+            logger.debug("Starting listeners...")
+            self._check_started(self._run_listeners())
+
+            # return the number of listeners running
+            return len(self.listeners)
+
+    def reload(
+        self,
+        listeners: List[Dict[str, any]],
+        listener_schema: Dict[str, any],
+        config: user_config.UserConfig = None,
+        from_date: datetime = None,
+        to_date: datetime = None,
+    ) -> int:
+        """
+        This method replaces the listeners in execution with the ones passed, for instance read again from the listener
+        files. The listeners unchanged keep running, only the keys of the listeners added or removed are started or
+        stopped, while the engines and the checkpoints of the others are kept
+        :param listeners: listeners as list of dictionaries
+        :param listener_schema: schema to use to validate the listeners
+        :param config: UserConfig object
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :return: number of listeners running
+        """
+        logger.debug("Calling reload in ListenerManager...")
+        # a single reload at the time, the dispatchers cannot be updated by two of them
+        with self._lock:
+            # the new listeners use the engine already listening
+            engine = next(iter(self._dispatchers.values())).engine if len(self._dispatchers) > 0 else None
+            new_listeners = self._create_listeners(
+                listeners, listener_schema, config, from_date, to_date, engine=engine
+            )
+
+            # keep the listeners unchanged
+            current: Dict[tuple, EventListener] = {self._signature(listener): listener for listener in self._listeners}
+            reloaded: List[EventListener] = []
+            added = 0
+            for listener in new_listeners:
+                existing = current.pop(self._signature(listener), None)
+                if existing is None:
+                    added += 1
+                    reloaded.append(listener)
+                else:
+                    reloaded.append(existing)
+            logger.info(
+                f"Reloading listeners: {added} added, {len(current)} removed, {len(reloaded) - added} unchanged"
+            )
+            self._listeners = reloaded
+            self._check_started(self._run_listeners())
+
+            # return the number of listeners running
+            return len(self.listeners)
+
+    async def listen_async(
+        self,
+        listeners: List[Dict[str, any]],
+        listener_schema: Dict[str, any],
+        config: user_config.UserConfig = None,
+        from_date: datetime = None,
+        to_date: datetime = None,
+        channel: asyncio.Queue = None,
+    ) -> int:
+        """
+        Coroutine equivalent to listen. The listeners run as tasks of the current event loop
+        :param listeners: listeners as list of dictionaries
+        :param listener_schema: schema to use to validate the listeners
+        :param config: UserConfig object
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :param channel: queue where the engines signal the end of the listening
+        :return: number of listeners running
+        """
+        logger.debug("Calling listen_async in ListenerManager...")
+
+        # Add the listeners to the manager and run them
+        self._add_listeners(
+            self._create_listeners(listeners, listener_schema, config, from_date, to_date, asynchronous=True)
+        )
+        logger.debug("Starting listeners...")
+        result = True
+        for listener in list(self._listeners):
+            # Execute the listener
+            if not await listener.listen_async(channel):
+                result = False
+                self._listeners.remove(listener)
+            else:
+                keys = ",".join(listener.keys)
+                logger.info(f"Listening to {keys} at {listener.engine.host}:{listener.engine.port}...")
+        self._check_started(result)
+
+        # return the number of listeners running
+        return len(self.listeners)
+
+    async def close_async(self):
+        """
+        This coroutine stops all the listeners and closes the connections opened by their engines
+        """
+        listeners = list(self._listeners)
+        self.cancel_listeners()
+        for listener in listeners:
+            await listener.engine.close_async()
+
+    def _create_listeners(
+        self,
+        listeners: List[Dict[str, any]],
+        listener_schema: Dict[str, any],
+        config: user_config.UserConfig = None,
+        from_date: datetime = None,
+        to_date: datetime = None,
+        asynchronous: bool = False,
+        engine: Engine = None,
+    ) -> List[EventListener]:
+        """
+        This method instantiates the listeners, each one with its engine
+        :param listeners: listeners as list of dictionaries
+        :param listener_schema: schema to use to validate the listeners
+        :param config: UserConfig object
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :param asynchronous: if True the engines created provide the asyncio coroutines
+        :param engine: engine to use for all the listeners, if None one is created for each dictionary
+        :return: list of EventListener
+        """
         # first check the config
         if config is None:
             config = user_config.UserConfig()
 
         # Create the engine and listener factories
-        engine_factory: ef.EngineFactory = ef.EngineFactory(config.notification_engine, Auth.get_auth(config))
+        engine_factory: ef.EngineFactory = ef.EngineFactory(
+            config.notification_engine, Auth.get_auth(config), asynchronous=asynchronous
+        )
         listener_factory: elf.EventListenerFactory = elf.EventListenerFactory(engine_factory, listener_schema)
 
         # read the payload key from the schema
@@ -145,20 +353,20 @@ class ListenerManager:
         for ls in listeners:
             logger.debug(f"Reading listeners {ls}")
             try:
-                for ev_listener in listener_factory.create_listeners(ls, from_date, to_date, payload_key):
+                for ev_listener in listener_factory.create_listeners(ls, from_date, to_date, payload_key, engine):
                     event_listeners.append(ev_listener)
                 logger.debug("Listener dictionary correctly parsed")
             except Exception as e:
                 raise EventListenerException(f"Not able to load listener dictionary {ls}: {e}")
+        return event_listeners
 
-        # Add the listeners to the manager and run them
-        logger.debug("Starting listeners...")
-        self._add_listeners(event_listeners)
-        if not self._run_listeners():
+    def _check_started(self, result: bool):
+        """
+        This method checks the listeners have started
+        :param result: False if one or more listeners were not able to start
+        """
+        if not result:
             if len(self.listeners) == 0:
                 raise EventListenerException("Listeners could not start, please check logs")
             else:
                 logger.error("One or more listeners were not able to start")
-
-        # return the number of listeners running
-        return len(self.listeners)
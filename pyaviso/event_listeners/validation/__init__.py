@@ -6,6 +6,7 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+from .compiled_schema import CompiledSchema, compile_schema
 from .date_handler import DateHandler
 from .enum_handler import EnumHandler
 from .float_handler import FloatHandler
@@ -24,4 +25,6 @@ __all__ = [
     "TypeHandler",
     "FloatHandler",
     "RegexHandler",
+    "CompiledSchema",
+    "compile_schema",
 ]
@@ -0,0 +1,92 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import threading
+from collections import OrderedDict
+from typing import Dict, List
+
+from .date_handler import DateHandler
+from .enum_handler import EnumHandler
+from .float_handler import FloatHandler
+from .int_handler import IntHandler
+from .regex_handler import RegexHandler
+from .string_handler import StringHandler
+from .time_handler import TimeHandler
+from .type_handler import TypeHandler
+
+HANDLERS = {
+    "DateHandler": DateHandler,
+    "EnumHandler": EnumHandler,
+    "FloatHandler": FloatHandler,
+    "IntHandler": IntHandler,
+    "RegexHandler": RegexHandler,
+    "StringHandler": StringHandler,
+    "TimeHandler": TimeHandler,
+}
+
+MAX_COMPILED_SCHEMAS = 16  # request schemas whose validators are kept
+
+
+class CompiledSchema:
+    """
+    This class holds the validators of a request schema. The validators of each attribute are built the first time the
+    attribute is validated and then reused for all the following validations with the same schema.
+    """
+
+    def __init__(self, schema: Dict[str, List[Dict[str, any]]]):
+        """
+        :param schema: request schema, the list of type handlers of each attribute
+        """
+        self._schema = schema
+        self._validators: Dict[str, List[TypeHandler]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def schema(self) -> Dict[str, List[Dict[str, any]]]:
+        return self._schema
+
+    def validators(self, key: str) -> List[TypeHandler]:
+        """
+        :param key: attribute of the request
+        :return: the validators of the attribute, in the order they are tried
+        """
+        validators = self._validators.get(key)
+        if validators is None:
+            validators = []
+            for p_schema in self._schema[key]:
+                assert "type" in p_schema, f"Wrong schema structure, 'type' could not be located for {key}"
+                p_schema_c = p_schema.copy()
+                validator_class = p_schema_c.pop("type")
+                assert validator_class in HANDLERS, f"Wrong schema structure, type {validator_class} not recognised"
+                validators.append(HANDLERS[validator_class](key=key, **p_schema_c))
+            with self._lock:
+                self._validators[key] = validators
+        return validators
+
+
+_compiled: "OrderedDict[int, CompiledSchema]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def compile_schema(schema: Dict[str, List[Dict[str, any]]]) -> CompiledSchema:
+    """
+    This function returns the compiled version of a request schema, shared by all the validations with the same
+    schema object, so the validators are built once per schema loaded
+    :param schema: request schema
+    :return: the compiled schema
+    """
+    with _compiled_lock:
+        compiled = _compiled.get(id(schema))
+        if compiled is not None and compiled.schema is schema:
+            _compiled.move_to_end(id(schema))
+            return compiled
+        compiled = CompiledSchema(schema)
+        _compiled[id(schema)] = compiled
+        if len(_compiled) > MAX_COMPILED_SCHEMAS:
+            _compiled.popitem(last=False)
+        return compiled
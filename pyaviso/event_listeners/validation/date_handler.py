@@ -7,9 +7,22 @@
 # nor does it submit to any jurisdiction.
 
 import datetime
+from functools import lru_cache
 
 from .type_handler import TypeHandler
 
+DATE_CACHE_SIZE = 4096  # dates canonised kept in memory
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _canonise_date(value: str, canonic: str) -> str:
+    """
+    :param value: date to canonise
+    :param canonic: date format
+    :return: the date formatted again, as strptime tolerates months or days with no leading zero
+    """
+    return datetime.datetime.strptime(value, canonic).strftime(canonic)
+
 
 class DateHandler(TypeHandler):
     def __init__(self, key, canonic, required=False):
@@ -22,11 +35,11 @@ class DateHandler(TypeHandler):
 
     def valid(self, value: any) -> bool:
         try:
-            self._d_datetime = datetime.datetime.strptime(str(value), self.canonic)
+            _canonise_date(str(value), self.canonic)
             return True
         except ValueError as e:
             raise ValueError("Date attribute is not complying with the format defined", e)
 
     def canonise(self, value: any) -> str:
-        # strptime tolerates months or days with no leading zero, we need to format it again to be sure they are there
-        return self._d_datetime.strftime(self.canonic)
+        # the date parsed by valid is in the cache
+        return _canonise_date(str(value), self.canonic)
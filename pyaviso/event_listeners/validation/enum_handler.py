@@ -15,6 +15,9 @@ class EnumHandler(TypeHandler):
     def __init__(self, key, values: List[str], required=False, default=None):
         super(EnumHandler, self).__init__(key, required)
         self._valid_values = values
+        # set of the values to check the membership, the value validated is converted to the type of the first one
+        self._valid_set = frozenset(values)
+        self._type = type(values[0]) if len(values) > 0 else None
         self._default = default
 
     @property
@@ -25,12 +28,13 @@ class EnumHandler(TypeHandler):
         if value == "" and self._default is not None:
             value = self._default
         # convert the value to the same type of the enums otherwise it will not be able to validate
-        try:
-            value = type(self.valid_values[0])(value)
-        except ValueError as e:
-            raise ValueError(f"Key {self.key} is not of a valid type", e)
+        if self._type is not None:
+            try:
+                value = self._type(value)
+            except ValueError as e:
+                raise ValueError(f"Key {self.key} is not of a valid type", e)
 
-        if value in self.valid_values:
+        if value in self._valid_set:
             return True
         else:
             valid_values_str = ",".join(map(lambda x: str(x), self.valid_values))
@@ -6,16 +6,19 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Tuple
 
 import yaml
 
 from . import exit_channel, logger, user_config
 from .authentication.auth import Auth
 from .custom_exceptions import EventListenerException, InvalidInputError
-from .engine import engine_factory as ef
+from .engine.engine_pool import EnginePool, engine_pool
 from .event_listeners.event_listener import DEFAULT_PAYLOAD_KEY, EventListener
+from .event_listeners.listener_file_watcher import ListenerFileWatcher
 from .event_listeners.listener_manager import ListenerManager
 
 
@@ -24,8 +27,17 @@ class NotificationManager:
     This class manages implements the various operations associated to the notification system
     """
 
-    def __init__(self):
+    def __init__(self, engines: EnginePool = None):
+        """
+        :param engines: pool of the engines used to send and retrieve the notifications, if None the pool shared by
+        this process is used
+        """
         self.listener_manager = ListenerManager()
+        self._engines = engines if engines is not None else engine_pool()
+        # inputs of the listening, used to reload the listeners
+        self._listen_args = None
+        # reloads can be requested by signals and by the file watcher at the same time, they are applied in turn
+        self._reload_lock = threading.Lock()
 
     def _listen(
         self,
@@ -44,6 +56,24 @@ class NotificationManager:
         :param to_date: date until when to request notifications, if None it will be until now
         :return: number of listeners running
         """
+        listeners_list, listener_schema = self._parse_listeners(config, listeners_file_paths, listeners)
+
+        # Call the listener manager
+        return self.listener_manager.listen(listeners_list, listener_schema, config, from_date, to_date)
+
+    def _parse_listeners(
+        self,
+        config: user_config.UserConfig,
+        listeners_file_paths: List[str] = None,
+        listeners: Dict[str, any] = None,
+    ) -> Tuple[List[Dict[str, any]], Dict[str, any]]:
+        """
+        This method parses the listeners passed as input
+        :param config: UserConfig object
+        :param listeners_file_paths: list of file paths to YAML listener files
+        :param listeners: listeners as dictionaries
+        :return: a tuple: listeners as list of dictionaries, listener schema
+        """
         # check we have listeners
         listeners_list = []
         if listeners_file_paths is not None and len(listeners_file_paths) > 0:
@@ -58,9 +88,7 @@ class NotificationManager:
 
         # retrieve listener schema
         listener_schema = config.schema_parser.parser().load(config)
-
-        # Call the listener manager
-        return self.listener_manager.listen(listeners_list, listener_schema, config, from_date, to_date)
+        return listeners_list, listener_schema
 
     def listen(
         self,
@@ -71,6 +99,7 @@ class NotificationManager:
         to_date: datetime = None,
         now: bool = False,
         catchup: bool = False,
+        reload: bool = False,
     ):
         """
         This method implements the main workflow to instantiate and execute new listeners and holding the main thread in
@@ -82,10 +111,110 @@ class NotificationManager:
         :param to_date: date until when to request notifications, if None it will be until now
         :param now: if True ignore missed notifications, only listen to new ones
         :param catchup: if True retrieve first the missed notifications
+        :param reload: if True the listener files are watched and the listeners reloaded when they change
         :return:
         """
         logger.debug("Calling listen...")
+        config = self._listen_config(config, from_date, to_date, now, catchup)
+
+        # Call the listener manager
+        self._listen_args = (config, listeners_file_paths, listeners, from_date, to_date)
+        self._listen(config, listeners_file_paths, listeners, from_date, to_date)
 
+        # watch the listener files, there is nothing to reload if the listening ends at to_date
+        watcher = None
+        if reload and listeners_file_paths and to_date is None:
+            watcher = ListenerFileWatcher(listeners_file_paths, self.reload_listeners)
+            watcher.start()
+
+        # keep the main process running and wait for the listening thread to terminate
+        try:
+            l_exit = exit_channel.get()  # this is blocking until all listener ends or there is an error
+        finally:
+            if watcher is not None:
+                watcher.stop()
+        if l_exit:  # it exits successful
+            return
+        else:  # it exits with errors
+            raise EventListenerException("Error in one of the listening process")
+
+    def reload_listeners(self) -> int:
+        """
+        This method reads again the listeners passed to listen and replaces those in execution. Only the listeners
+        added or removed are started or stopped, the others keep listening. If the listeners are not valid the current
+        ones are kept
+        :return: number of listeners running
+        """
+        assert self._listen_args is not None, "Listeners can be reloaded only after listen"
+        config, listeners_file_paths, listeners, from_date, to_date = self._listen_args
+        logger.debug("Calling reload_listeners...")
+        # the files are read under the lock too, so a reload cannot apply files older than the previous one
+        with self._reload_lock:
+            try:
+                listeners_list, listener_schema = self._parse_listeners(config, listeners_file_paths, listeners)
+                return self.listener_manager.reload(listeners_list, listener_schema, config, from_date, to_date)
+            except (EventListenerException, InvalidInputError) as e:
+                logger.error(f"Listeners not reloaded, the current ones are kept: {e}")
+                logger.debug("", exc_info=True)
+                return len(self.listener_manager.listeners)
+
+    async def listen_async(
+        self,
+        config: user_config.UserConfig = None,
+        listeners_file_paths: List[str] = None,
+        listeners: Dict[str, any] = None,
+        from_date: datetime = None,
+        to_date: datetime = None,
+        now: bool = False,
+        catchup: bool = False,
+    ):
+        """
+        Coroutine equivalent to listen. All the listeners are polled from the current event loop, this coroutine
+        returns once they have terminated. The notification engine must be etcd_rest or etcd_grpc, the first one
+        requires the aiohttp package.
+        :param config: UserConfig object
+        :param listeners_file_paths: list of file paths to YAML listener files
+        :param listeners: listeners as dictionaries
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :param now: if True ignore missed notifications, only listen to new ones
+        :param catchup: if True retrieve first the missed notifications
+        :return:
+        """
+        logger.debug("Calling listen_async...")
+        config = self._listen_config(config, from_date, to_date, now, catchup)
+        listeners_list, listener_schema = self._parse_listeners(config, listeners_file_paths, listeners)
+
+        # Call the listener manager
+        channel = asyncio.Queue()
+        try:
+            await self.listener_manager.listen_async(
+                listeners_list, listener_schema, config, from_date, to_date, channel
+            )
+            # wait for the listeners to terminate
+            l_exit = await channel.get()
+        finally:
+            await self.listener_manager.close_async()
+        if not l_exit:  # it exits with errors
+            raise EventListenerException("Error in one of the listening process")
+
+    def _listen_config(
+        self,
+        config: user_config.UserConfig,
+        from_date: datetime = None,
+        to_date: datetime = None,
+        now: bool = False,
+        catchup: bool = False,
+    ) -> user_config.UserConfig:
+        """
+        This method checks the inputs of listen and sets the catchup behaviour in the configuration
+        :param config: UserConfig object
+        :param from_date: date from when to request notifications, if None it will be from now
+        :param to_date: date until when to request notifications, if None it will be until now
+        :param now: if True ignore missed notifications, only listen to new ones
+        :param catchup: if True retrieve first the missed notifications
+        :return: the configuration to use
+        """
         # first check the config
         if config is None:
             config = user_config.UserConfig()
@@ -106,16 +235,7 @@ class NotificationManager:
         else:
             if now:
                 config.notification_engine.catchup = False
-
-        # Call the listener manager
-        self._listen(config, listeners_file_paths, listeners, from_date, to_date)
-
-        # keep the main process running and wait for the listening thread to terminate
-        l_exit = exit_channel.get()  # this is blocking until all listener ends or there is an error
-        if l_exit:  # it exits successful
-            return
-        else:  # it exits with errors
-            raise EventListenerException("Error in one of the listening process")
+        return config
 
     def key(
         self, params: Dict, config: user_config.UserConfig = None, listener_schema: Dict = None
@@ -173,9 +293,8 @@ class NotificationManager:
         # first generate the key corresponding the to the parameters passed
         key, base_key, admin_key = self.key(params, config)
 
-        # create the engine
-        engine_factory: ef.EngineFactory = ef.EngineFactory(config.notification_engine, Auth.get_auth(config))
-        engine = engine_factory.create_engine()
+        # reuse the engine of the same configuration and user
+        engine = self._engines.engine(config.notification_engine, Auth.get_auth(config))
 
         # retrieve the value
         kvs = engine.pull(key=key, prefix=False)
@@ -198,11 +317,150 @@ class NotificationManager:
         # first check the config
         if config is None:
             config = user_config.UserConfig()
+        key, value, base_key, admin_key, ttl = self._prepare_notification(notification, config)
 
-        # retrieve listener schema
+        # reuse the engine of the same configuration and user
+        engine = self._engines.engine(config.notification_engine, Auth.get_auth(config))
+
+        # submit the notification with status update
+        logger.debug(f"Submit key {key}, value {value} with status update")
+        kvs = [{"key": key, "value": value}]
+        engine.push_with_status(
+            kvs, base_key=base_key, admin_key=admin_key, message=f"notification to key {key}", ttl=ttl
+        )
+
+        return True
+
+    async def notify_async(self, notification: Dict, config: user_config.UserConfig = None) -> bool:
+        """
+        Coroutine equivalent to notify
+        :param notification: dictionary of the notification ready to submit
+        :param config: UserConfig object
+        :return: True if the notification has been submitted
+        """
+        logger.debug(f"Calling notify_async with the following notification {notification}...")
+
+        # first check the config
+        if config is None:
+            config = user_config.UserConfig()
+        key, value, base_key, admin_key, ttl = self._prepare_notification(notification, config)
+
+        # reuse the engine of the same configuration and user on this event loop
+        engine = self._engines.async_engine(config.notification_engine, Auth.get_auth(config))
+
+        # submit the notification with status update
+        logger.debug(f"Submit key {key}, value {value} with status update")
+        kvs = [{"key": key, "value": value}]
+        await engine.push_with_status_async(
+            kvs, base_key=base_key, admin_key=admin_key, message=f"notification to key {key}", ttl=ttl
+        )
+
+        return True
+
+    def notify_many(self, notifications: Iterable[Dict], config: user_config.UserConfig = None) -> List[any]:
+        """
+        Send many notifications to the server. The schema is loaded once and the notifications are validated before
+        any is sent. The valid ones are then grouped by base key and submitted in as few transactions as possible, with
+        a single status update for each base key of a transaction.
+        :param notifications: dictionaries of the notifications ready to submit
+        :param config: UserConfig object
+        :return: for each notification True if submitted, otherwise the exception that prevented it
+        """
+        logger.debug("Calling notify_many...")
+
+        # first check the config
+        if config is None:
+            config = user_config.UserConfig()
+        results, positions, updates = self._prepare_notifications(notifications, config)
+
+        # reuse the engine of the same configuration and user
+        engine = self._engines.engine(config.notification_engine, Auth.get_auth(config))
+
+        # submit the valid notifications with status update
+        logger.debug(f"Submit {len(updates)} notifications with status update")
+        for i, result in zip(positions, engine.push_many_with_status(updates)):
+            results[i] = result
+        return results
+
+    async def notify_many_async(
+        self, notifications: Iterable[Dict], config: user_config.UserConfig = None
+    ) -> List[any]:
+        """
+        Coroutine equivalent to notify_many
+        :param notifications: dictionaries of the notifications ready to submit
+        :param config: UserConfig object
+        :return: for each notification True if submitted, otherwise the exception that prevented it
+        """
+        logger.debug("Calling notify_many_async...")
+
+        # first check the config
+        if config is None:
+            config = user_config.UserConfig()
+        results, positions, updates = self._prepare_notifications(notifications, config)
+
+        # reuse the engine of the same configuration and user on this event loop
+        engine = self._engines.async_engine(config.notification_engine, Auth.get_auth(config))
+
+        # submit the valid notifications with status update
+        logger.debug(f"Submit {len(updates)} notifications with status update")
+        pushed = await engine.push_many_with_status_async(updates)
+        for i, result in zip(positions, pushed):
+            results[i] = result
+        return results
+
+    def _prepare_notifications(
+        self, notifications: Iterable[Dict], config: user_config.UserConfig
+    ) -> Tuple[List[any], List[int], List[Dict[str, any]]]:
+        """
+        This method validates the notifications and generates the updates to submit
+        :param notifications: dictionaries of the notifications ready to submit
+        :param config: UserConfig object
+        :return: a tuple: the exception of each invalid notification, None for the valid ones, the position and the
+        update of each valid notification
+        """
+        # retrieve listener schema only once
         logger.debug("Getting schema...")
         listener_schema = config.schema_parser.parser().load(config)
 
+        results = []
+        positions = []
+        updates = []
+        for notification in notifications:
+            try:
+                key, value, base_key, admin_key, ttl = self._prepare_notification(
+                    dict(notification), config, listener_schema
+                )
+            except (InvalidInputError, EventListenerException, KeyError, ValueError) as e:
+                logger.warning(f"Invalid notification {notification}, {e}")
+                results.append(e)
+                continue
+            update = {
+                "kvs": [{"key": key, "value": value}],
+                "base_key": base_key,
+                "admin_key": admin_key,
+                "message": f"notification to key {key}",
+                "ttl": ttl,
+            }
+            positions.append(len(results))
+            updates.append(update)
+            results.append(None)
+        return results, positions, updates
+
+    def _prepare_notification(
+        self, notification: Dict, config: user_config.UserConfig, listener_schema: Dict = None
+    ) -> Tuple[str, str, str, str, int]:
+        """
+        This method validates the notification and generates the keys to submit
+        :param notification: dictionary of the notification ready to submit
+        :param config: UserConfig object
+        :param listener_schema: event listener schema loaded as dictionary, if None it is loaded from the config
+        :return: a tuple: key, value, base key, admin key, time to live of the key
+        """
+        if not listener_schema:
+            # retrieve listener schema
+            logger.debug("Getting schema...")
+            listener_schema = config.schema_parser.parser().load(config)
+
         # validate the input
         try:
             # check the payload key
@@ -216,10 +474,6 @@ class NotificationManager:
         except AssertionError as e:
             raise InvalidInputError(e)
 
-        # first check the config
-        if config is None:
-            config = user_config.UserConfig()
-
         # read the TTL for this key
         ttl = config.key_ttl
         if "ttl" in notification:
@@ -229,19 +483,7 @@ class NotificationManager:
 
         # generate the key
         key, base_key, admin_key = self.key(notification, config, listener_schema)
-
-        # create the engine
-        engine_factory: ef.EngineFactory = ef.EngineFactory(config.notification_engine, Auth.get_auth(config))
-        engine = engine_factory.create_engine()
-
-        # submit the notification with status update
-        logger.debug(f"Submit key {key}, value {value} with status update")
-        kvs = [{"key": key, "value": value}]
-        engine.push_with_status(
-            kvs, base_key=base_key, admin_key=admin_key, message=f"notification to key {key}", ttl=ttl
-        )
-
-        return True
+        return key, value, base_key, admin_key, ttl
 
     def _load_listener_files(self, listener_files: List[str]):
         """
@@ -14,7 +14,7 @@ from typing import Dict, List
 from . import logger
 from .authentication.auth import Auth
 from .custom_exceptions import ServiceConfigException
-from .engine import engine_factory as ef
+from .engine.engine_pool import engine_pool
 from .user_config import UserConfig
 
 KEY_PREFIX = "/ec/config/"
@@ -31,11 +31,8 @@ class ServiceConfigManager:
 
         :param config: UserConfig object
         """
-        logger.debug("Creating the engine")
-        # Create the engine factory
-        engine_factory: ef.EngineFactory = ef.EngineFactory(config.configuration_engine, Auth.get_auth(config))
-        # Create the engine to connect to the configuration server
-        self._engine = engine_factory.create_engine()
+        # reuse the engine connected to the configuration server with the same configuration and user
+        self._engine = engine_pool().engine(config.configuration_engine, Auth.get_auth(config))
         self._max_file_size = config.configuration_engine.max_file_size
 
     def push(self, service: str, directory: str, user_message: str, delete: bool) -> List[str]:
@@ -87,11 +84,8 @@ class ServiceConfigManager:
         # check if we need to delete any file
         ks_delete = []
         if delete:
-            old_kvs = self._engine.pull(service_key)
-            new_keys = []
-            for new_kv in kvs:
-                new_keys.append(new_kv["key"])
-            for old_kv in old_kvs:
+            new_keys = set(new_kv["key"] for new_kv in kvs)
+            for old_kv in self._engine.pull_iter(service_key, key_only=True):
                 old_key = old_kv["key"]
                 if old_key not in new_keys:  # we need to delete this key
                     ks_delete.append(old_key)
@@ -163,15 +157,13 @@ class ServiceConfigManager:
 
         service_key = self._build_service_key(service)
 
-        # pull the service
-        kvs: List[List[any]] = self._engine.pull(service_key)
-        # look at the result
+        # pull the service, the files are saved as they are retrieved
         pulled_files = []
         pulled_files_tmp = []
-        if len(kvs) > 0:
+        for kv in self._engine.pull_iter(service_key):
 
             # First check if we need to delete the existing folder
-            if delete and os.path.exists(directory):
+            if len(pulled_files) == 0 and delete and os.path.exists(directory):
                 try:
                     # try to delete it
                     rmtree(directory)
@@ -180,18 +172,20 @@ class ServiceConfigManager:
                     logger.warning(f"Error in deleting the folder {directory}: {e}")
                     logger.debug("", exc_info=True)
 
-            # save the files retrieved with .tmp suffix
-            for kv in kvs:
-                # extract the file path and create the directory structure
-                relative_file_path = kv["key"][len(service_key) :]
-                full_path = os.path.join(directory, relative_file_path)
-                full_path_tmp = full_path + ".tmp"
-                os.makedirs(os.path.dirname(full_path_tmp), exist_ok=True)
-                with open(full_path_tmp, "wb") as f:
-                    f.write(kv["value"])
-                    logger.debug(f"File successfully saved: {full_path_tmp}")
-                    pulled_files.append(full_path)
-                    pulled_files_tmp.append(full_path_tmp)
+            # save the file retrieved with .tmp suffix
+            # extract the file path and create the directory structure
+            relative_file_path = kv["key"][len(service_key) :]
+            full_path = os.path.join(directory, relative_file_path)
+            full_path_tmp = full_path + ".tmp"
+            os.makedirs(os.path.dirname(full_path_tmp), exist_ok=True)
+            with open(full_path_tmp, "wb") as f:
+                f.write(kv["value"])
+                logger.debug(f"File successfully saved: {full_path_tmp}")
+                pulled_files.append(full_path)
+                pulled_files_tmp.append(full_path_tmp)
+
+        # look at the result
+        if len(pulled_files) > 0:
 
             # unlink existing files
             for f in pulled_files:
@@ -249,15 +243,10 @@ class ServiceConfigManager:
         logger.debug("Calling revert...")
         # pull the service
         service_key = self._build_service_key(service, root_only=True)
-        kvs = self._engine.pull(service_key, key_only=True)
         reverted_files = []
-        if len(kvs) == 0:
-            logger.debug(f"No file found for service {service}")
-            return reverted_files
-
         revert_kvs = []
         # for each file
-        for kv in kvs:
+        for kv in self._engine.pull_iter(service_key, key_only=True):
             if kv["version"] == 1:  # we cannot revert this file
                 continue
             # first we need to find the revision associated with the previous version
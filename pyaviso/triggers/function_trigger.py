@@ -6,23 +6,43 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from typing import Callable, Dict
 
 from .. import logger
 from . import trigger
 from .trigger import TriggerType
 
+# pool of processes running the functions flagged as CPU-heavy, created by the first of them
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def process_pool() -> ProcessPoolExecutor:
+    """
+    :return: the pool of processes shared by the function triggers
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor()
+        return _process_pool
+
 
 class FunctionTrigger(trigger.Trigger):
     """
     This class implements the 'Function' trigger by executing the function defined by the user and
-    passing the notification key and value and the params as argument
+    passing the notification key and value and the params as argument. If the trigger has the flag 'process' the
+    function is run in a pool of processes, so that CPU-heavy functions do not hold the interpreter of the listeners.
+    In this case the function must be defined at the top level of a module
     """
 
     def __init__(self, notification: Dict[str, any], params: Dict[str, any]):
         trigger.Trigger.__init__(self, notification, params)
         assert self.params.get("function") is not None, "'function' is a mandatory field for the 'Function' trigger"
         self.function: Callable = self.params.get("function")
+        self.process: bool = bool(self.params.get("process", False))
         self.trigger_type = TriggerType.function
 
     def execute(self):
@@ -30,7 +50,11 @@ class FunctionTrigger(trigger.Trigger):
         logger.debug(f"calling function {self.function.__name__}")
 
         # run the function
-        logger.debug("Running function trigger")
-        self.function(self.notification)
+        if self.process:
+            logger.debug("Running function trigger in the process pool")
+            process_pool().submit(self.function, self.notification).result()
+        else:
+            logger.debug("Running function trigger")
+            self.function(self.notification)
 
         logger.info("Function Trigger completed")
@@ -14,13 +14,24 @@ import logging.handlers
 import os
 import re
 import sys
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import yaml
 
 from . import HOME_FOLDER, SYSTEM_FOLDER, logger
 from .authentication import AuthType
-from .engine import EngineType
+from .engine import (
+    WATCH_PROGRESS_INTERVAL,
+    DedupPolicy,
+    EngineType,
+    ListenMode,
+    TriggerOrdering,
+)
+from .engine.adaptive_interval import POLLING_BACKOFF, POLLING_JITTER
+from .engine.callback_executor import TRIGGER_QUEUE_SIZE, TRIGGER_WORKERS
+from .engine.checkpoint_store import CHECKPOINT_INTERVAL, CHECKPOINT_REVISIONS
+from .engine.http_pool import POOL_CONNECTIONS, POOL_IDLE_TIMEOUT, POOL_MAXSIZE
+from .engine.lease_pool import LEASE_GRANULARITY
 from .event_listeners.listener_schema_parser import ListenerSchemaParserType
 
 # Default configuration location
@@ -41,6 +52,25 @@ class EngineConfig:
         https: bool = False,
         catchup: Optional[bool] = None,
         automatic_retry_delay: Optional[int] = None,
+        listen_mode: Optional[str] = None,
+        pool_connections: Optional[int] = None,
+        pool_maxsize: Optional[int] = None,
+        pool_idle_timeout: Optional[int] = None,
+        polling_interval_min: Optional[int] = None,
+        polling_interval_max: Optional[int] = None,
+        polling_backoff: Optional[float] = None,
+        polling_jitter: Optional[float] = None,
+        checkpoint_interval: Optional[float] = None,
+        checkpoint_revisions: Optional[int] = None,
+        revision_index: Optional[str] = None,
+        lease_granularity: Optional[float] = None,
+        memory_path: Optional[str] = None,
+        endpoints: Optional[List[str]] = None,
+        trigger_workers: Optional[int] = None,
+        trigger_queue_size: Optional[int] = None,
+        trigger_ordering: Optional[str] = None,
+        dedup: Optional[str] = None,
+        watch_progress_interval: Optional[float] = None,
     ):
         """
         :param host: endpoint host of the notification server
@@ -54,6 +84,26 @@ class EngineConfig:
         :param https: if True the connection will go through HTTPS
         :param catchup: if True the notification engine will first look for the missed notifications
         :param automatic_retry_delay: Number of seconds to wait before retrying to connect to the engine
+        :param listen_mode: mechanism used to listen to new notifications, active polling or server-side watch
+        :param pool_connections: number of hosts for which a pool of HTTP connections is kept
+        :param pool_maxsize: max number of HTTP connections kept alive for each host
+        :param pool_idle_timeout: number of seconds after which idle HTTP connections are closed
+        :param polling_interval_min: interval used after new notifications are found, in seconds
+        :param polling_interval_max: max interval reached while no new notifications are found, in seconds
+        :param polling_backoff: factor applied to the interval every time no new notifications are found
+        :param polling_jitter: max fraction of the interval randomly added or removed
+        :param checkpoint_interval: max number of seconds the last revision delivered is kept before being saved
+        :param checkpoint_revisions: number of revisions delivered after which the last one is saved straight away
+        :param revision_index: key of the time to revision index used to search the history, if None it is not used
+        :param lease_granularity: seconds of the buckets of expiry sharing a lease, 0 to grant a lease for each push
+        :param memory_path: file where the in_memory engine logs its changes, if None they are kept only in memory
+        :param endpoints: list of host:port of the members of the notification server, if None only host and port
+        are used. The first one replaces host and port
+        :param trigger_workers: number of threads running the triggers apart from the listening
+        :param trigger_queue_size: notifications waiting for each trigger thread before the listening waits
+        :param trigger_ordering: notifications whose triggers run in order, those of the same listener or key
+        :param dedup: how often a notification fetched more than once is delivered, once per listener or process
+        :param watch_progress_interval: seconds between the progress notifications sent by the server on the watches
         """
         self.host = host
         self.port = port
@@ -65,6 +115,57 @@ class EngineConfig:
         self.service = service
         self.catchup = catchup
         self.automatic_retry_delay = automatic_retry_delay
+        self.listen_mode = ListenMode[listen_mode.upper()] if listen_mode else ListenMode.POLLING
+        self.pool_connections = pool_connections if pool_connections else POOL_CONNECTIONS
+        self.pool_maxsize = pool_maxsize if pool_maxsize else POOL_MAXSIZE
+        self.pool_idle_timeout = pool_idle_timeout if pool_idle_timeout is not None else POOL_IDLE_TIMEOUT
+        self.polling_interval_min = polling_interval_min if polling_interval_min else polling_interval
+        self.polling_interval_max = polling_interval_max if polling_interval_max else polling_interval
+        self.polling_backoff = polling_backoff if polling_backoff else POLLING_BACKOFF
+        self.polling_jitter = polling_jitter if polling_jitter is not None else POLLING_JITTER
+        self.checkpoint_interval = checkpoint_interval if checkpoint_interval is not None else CHECKPOINT_INTERVAL
+        self.checkpoint_revisions = checkpoint_revisions if checkpoint_revisions else CHECKPOINT_REVISIONS
+        self.revision_index = revision_index
+        self.lease_granularity = lease_granularity if lease_granularity is not None else LEASE_GRANULARITY
+        self.memory_path = memory_path
+        self.endpoints = endpoints
+        self.trigger_workers = trigger_workers if trigger_workers else TRIGGER_WORKERS
+        self.trigger_queue_size = trigger_queue_size if trigger_queue_size else TRIGGER_QUEUE_SIZE
+        self.trigger_ordering = (
+            TriggerOrdering[trigger_ordering.upper()] if trigger_ordering else TriggerOrdering.LISTENER
+        )
+        self.dedup = DedupPolicy[dedup.upper()] if dedup else DedupPolicy.LISTENER
+        self.watch_progress_interval = watch_progress_interval if watch_progress_interval else WATCH_PROGRESS_INTERVAL
+
+    @property
+    def endpoints(self) -> List[Tuple[str, int]]:
+        """
+        :return: list of tuples: host, port of the members of the server. If host or port have been changed after the
+        endpoints were set, as from the command line, only host and port are used
+        """
+        if self._endpoints and self._endpoints[0] == (self.host, self.port):
+            return self._endpoints
+        return [(self.host, self.port)]
+
+    @endpoints.setter
+    def endpoints(self, endpoints: List[str]):
+        if endpoints:
+            if type(endpoints) is str:
+                endpoints = endpoints.split(",")
+            self._endpoints = [self._parse_endpoint(e) for e in endpoints]
+            self.host, self.port = self._endpoints[0]
+        else:
+            self._endpoints = None
+
+    @staticmethod
+    def _parse_endpoint(endpoint: str) -> Tuple[str, int]:
+        """
+        :param endpoint: endpoint formatted as host:port
+        :return: a tuple: host, port
+        """
+        host, sep, port = endpoint.strip().rpartition(":")
+        assert sep and host and port.isdigit(), f"endpoint {endpoint} is not formatted as host:port"
+        return host, int(port)
 
     def __str__(self):
         config_string = (
@@ -78,6 +179,25 @@ class EngineConfig:
             + f", service: {self.service}"
             + f", catchup: {self.catchup}"
             + f", automatic_retry_delay: {self.automatic_retry_delay}"
+            + f", listen_mode: {self.listen_mode}"
+            + f", pool_connections: {self.pool_connections}"
+            + f", pool_maxsize: {self.pool_maxsize}"
+            + f", pool_idle_timeout: {self.pool_idle_timeout}"
+            + f", polling_interval_min: {self.polling_interval_min}"
+            + f", polling_interval_max: {self.polling_interval_max}"
+            + f", polling_backoff: {self.polling_backoff}"
+            + f", polling_jitter: {self.polling_jitter}"
+            + f", checkpoint_interval: {self.checkpoint_interval}"
+            + f", checkpoint_revisions: {self.checkpoint_revisions}"
+            + f", revision_index: {self.revision_index}"
+            + f", lease_granularity: {self.lease_granularity}"
+            + f", memory_path: {self.memory_path}"
+            + f", endpoints: {self.endpoints}"
+            + f", trigger_workers: {self.trigger_workers}"
+            + f", trigger_queue_size: {self.trigger_queue_size}"
+            + f", trigger_ordering: {self.trigger_ordering}"
+            + f", dedup: {self.dedup}"
+            + f", watch_progress_interval: {self.watch_progress_interval}"
         )
         return config_string
 
@@ -181,10 +301,20 @@ class UserConfig:
         notification_engine["https"] = False
         notification_engine["type"] = "etcd_rest"
         notification_engine["polling_interval"] = 30  # seconds
+        notification_engine["polling_backoff"] = POLLING_BACKOFF
+        notification_engine["polling_jitter"] = POLLING_JITTER
+        notification_engine["checkpoint_interval"] = CHECKPOINT_INTERVAL  # seconds
+        notification_engine["checkpoint_revisions"] = CHECKPOINT_REVISIONS
+        notification_engine["revision_index"] = "/ec/admin/index"
+        notification_engine["lease_granularity"] = LEASE_GRANULARITY  # seconds
         notification_engine["timeout"] = 60  # seconds
         notification_engine["service"] = "aviso/v1"
         notification_engine["catchup"] = True
         notification_engine["automatic_retry_delay"] = 15  # seconds
+        notification_engine["listen_mode"] = "polling"
+        notification_engine["pool_connections"] = POOL_CONNECTIONS
+        notification_engine["pool_maxsize"] = POOL_MAXSIZE
+        notification_engine["pool_idle_timeout"] = POOL_IDLE_TIMEOUT  # seconds
 
         # configuration engine
         configuration_engine = {}
@@ -195,6 +325,9 @@ class UserConfig:
         configuration_engine["max_file_size"] = 500  # KiB
         configuration_engine["timeout"] = 60  # seconds
         configuration_engine["automatic_retry_delay"] = 15  # seconds
+        configuration_engine["pool_connections"] = POOL_CONNECTIONS
+        configuration_engine["pool_maxsize"] = POOL_MAXSIZE
+        configuration_engine["pool_idle_timeout"] = POOL_IDLE_TIMEOUT  # seconds
 
         # main config
         config = {}
@@ -282,6 +415,8 @@ class UserConfig:
             config["notification_engine"]["host"] = os.environ["AVISO_NOTIFICATION_HOST"]
         if "AVISO_NOTIFICATION_PORT" in os.environ:
             config["notification_engine"]["port"] = int(os.environ["AVISO_NOTIFICATION_PORT"])
+        if "AVISO_NOTIFICATION_ENDPOINTS" in os.environ:
+            config["notification_engine"]["endpoints"] = os.environ["AVISO_NOTIFICATION_ENDPOINTS"].split(",")
         if "AVISO_NOTIFICATION_HTTPS" in os.environ:
             config["notification_engine"]["https"] = os.environ["AVISO_NOTIFICATION_HTTPS"]
         if "AVISO_NOTIFICATION_ENGINE" in os.environ:
@@ -290,8 +425,16 @@ class UserConfig:
             config["notification_engine"]["service"] = os.environ["AVISO_NOTIFICATION_SERVICE"]
         if "AVISO_NOTIFICATION_CATCHUP" in os.environ:
             config["notification_engine"]["catchup"] = os.environ["AVISO_NOTIFICATION_CATCHUP"]
+        if "AVISO_LISTEN_MODE" in os.environ:
+            config["notification_engine"]["listen_mode"] = os.environ["AVISO_LISTEN_MODE"]
         if "AVISO_POLLING_INTERVAL" in os.environ:
             config["notification_engine"]["polling_interval"] = int(os.environ["AVISO_POLLING_INTERVAL"])
+        if "AVISO_POLLING_INTERVAL_MIN" in os.environ:
+            config["notification_engine"]["polling_interval_min"] = int(os.environ["AVISO_POLLING_INTERVAL_MIN"])
+        if "AVISO_POLLING_INTERVAL_MAX" in os.environ:
+            config["notification_engine"]["polling_interval_max"] = int(os.environ["AVISO_POLLING_INTERVAL_MAX"])
+        if "AVISO_TRIGGER_WORKERS" in os.environ:
+            config["notification_engine"]["trigger_workers"] = int(os.environ["AVISO_TRIGGER_WORKERS"])
         if "AVISO_CONFIGURATION_HOST" in os.environ:
             config["configuration_engine"]["host"] = os.environ["AVISO_CONFIGURATION_HOST"]
         if "AVISO_CONFIGURATION_PORT" in os.environ:
@@ -334,6 +477,9 @@ class UserConfig:
             )
             config["notification_engine"]["automatic_retry_delay"] = automatic_retry_delay
             config["configuration_engine"]["automatic_retry_delay"] = automatic_retry_delay
+        if "AVISO_POOL_MAXSIZE" in os.environ:  # one variable for both engine
+            config["notification_engine"]["pool_maxsize"] = int(os.environ["AVISO_POOL_MAXSIZE"])
+            config["configuration_engine"]["pool_maxsize"] = int(os.environ["AVISO_POOL_MAXSIZE"])
         return config
 
     def logging_setup(self, logging_conf_path: str):
@@ -408,6 +554,25 @@ class UserConfig:
             service=ne["service"],
             catchup=ne["catchup"],
             automatic_retry_delay=ne["automatic_retry_delay"],
+            listen_mode=ne.get("listen_mode"),
+            pool_connections=ne.get("pool_connections"),
+            pool_maxsize=ne.get("pool_maxsize"),
+            pool_idle_timeout=ne.get("pool_idle_timeout"),
+            polling_interval_min=ne.get("polling_interval_min"),
+            polling_interval_max=ne.get("polling_interval_max"),
+            polling_backoff=ne.get("polling_backoff"),
+            polling_jitter=ne.get("polling_jitter"),
+            checkpoint_interval=ne.get("checkpoint_interval"),
+            checkpoint_revisions=ne.get("checkpoint_revisions"),
+            revision_index=ne.get("revision_index"),
+            lease_granularity=ne.get("lease_granularity"),
+            memory_path=ne.get("memory_path"),
+            endpoints=ne.get("endpoints"),
+            trigger_workers=ne.get("trigger_workers"),
+            trigger_queue_size=ne.get("trigger_queue_size"),
+            trigger_ordering=ne.get("trigger_ordering"),
+            dedup=ne.get("dedup"),
+            watch_progress_interval=ne.get("watch_progress_interval"),
         )
 
     @property
@@ -444,6 +609,10 @@ class UserConfig:
             timeout=ce["timeout"],
             https=ce["https"],
             automatic_retry_delay=ce["automatic_retry_delay"],
+            pool_connections=ce.get("pool_connections"),
+            pool_maxsize=ce.get("pool_maxsize"),
+            pool_idle_timeout=ce.get("pool_idle_timeout"),
+            endpoints=ce.get("endpoints"),
         )
 
     @property
@@ -35,6 +35,7 @@ setup(
     packages=find_packages(exclude=("tests", "aviso-server")),
     include_package_data=True,
     install_requires=INSTALL_REQUIRES,
+    extras_require={"async": ["aiohttp"], "fast": ["orjson"]},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -0,0 +1,80 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""
+Benchmark of the cost of routing a notification to the listeners of a process, for a growing number of listeners of
+the same event sharing an engine. Each listener parsing and filtering every key is compared with the dispatcher,
+parsing the key once and looking up the listeners in its inverted index.
+
+Usage: python tests/benchmarks/bench_dispatcher.py [n_keys]
+"""
+
+import json
+import sys
+import time
+
+from pyaviso import user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+from pyaviso.event_listeners.dispatcher import NotificationDispatcher
+from pyaviso.event_listeners.event_listener import EventListener
+
+AIRPORTS = [f"A{i:02d}" for i in range(100)]
+KEYS = [f"/tmp/aviso/flight/italy/20210101/{airport}/AZ{i}" for i in range(10) for airport in AIRPORTS]
+
+
+def _listeners(engine, schema, n_listeners: int):
+    # each listener expects one airport and one flight number
+    return [
+        EventListener(
+            "flight",
+            engine,
+            {"country": "italy", "airport": AIRPORTS[i % len(AIRPORTS)], "number": f"AZ{i % 10}"},
+            [],
+            schema,
+        )
+        for i in range(n_listeners)
+    ]
+
+
+def _per_listener(listeners, n_keys: int) -> float:
+    start = time.process_time()
+    for i in range(n_keys):
+        key = KEYS[i % len(KEYS)]
+        for listener in listeners:
+            listener._is_expected(listener.parse_key(key))
+    return (time.process_time() - start) / n_keys
+
+
+def _dispatcher(listeners, n_keys: int) -> float:
+    dispatcher = NotificationDispatcher(listeners)
+    start = time.process_time()
+    for i in range(n_keys):
+        dispatcher.match(listeners[0].parse_key(KEYS[i % len(KEYS)]))
+    return (time.process_time() - start) / n_keys
+
+
+def main(n_keys: int = 2000):
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml", notification_engine={"type": "in_memory", "host": "bench", "port": 1}
+    )
+    engine = InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+    with open("tests/unit/fixtures/listener_schema.json") as f:
+        schema = json.load(f)["flight"]
+
+    print(f"{'listeners':>10}{'per listener (us/key)':>24}{'dispatcher (us/key)':>22}")
+    for n_listeners in [1, 10, 100, 1000]:
+        listeners = _listeners(engine, schema, n_listeners)
+        n = max(n_keys // n_listeners, 20)
+        print(
+            f"{n_listeners:>10}{_per_listener(listeners, n) * 1e6:>24.1f}{_dispatcher(listeners, n_keys) * 1e6:>22.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
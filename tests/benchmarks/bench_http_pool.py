@@ -0,0 +1,115 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""
+Benchmark of the per-poll latency and client CPU time of EtcdRestEngine.pull, with the pooled keep-alive transport
+against a new connection per request. A local stand-in of the etcd gRPC gateway runs in a separate process.
+
+Usage: python tests/benchmarks/bench_http_pool.py [n_polls]
+"""
+
+import base64
+import json
+import multiprocessing
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import requests
+
+from pyaviso import user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.etcd_rest_engine import EtcdRestEngine
+
+PORT = 2398
+
+
+def _encode(s: str) -> str:
+    return base64.b64encode(s.encode()).decode()
+
+
+RANGE_RESPONSE = json.dumps(
+    {
+        "header": {"revision": "100"},
+        "kvs": [
+            {
+                "key": _encode(f"/ec/diss/SCL/date=20210101,step={i}"),
+                "value": _encode("{}"),
+                "create_revision": "10",
+                "mod_revision": "10",
+                "version": "1",
+            }
+            for i in range(10)
+        ],
+        "count": "10",
+    }
+).encode()
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # as the etcd gateway does
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RANGE_RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RANGE_RESPONSE)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def _serve():
+    _ThreadingHTTPServer(("localhost", PORT), _GatewayHandler).serve_forever()
+
+
+class _NoPool:
+    """Previous transport, a new connection for each request"""
+
+    def post(self, url, **kwargs):
+        return requests.post(url, **kwargs)
+
+
+def _run(engine: EtcdRestEngine, n_polls: int):
+    engine.pull("/ec/diss/SCL")  # warm up
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(n_polls):
+        engine.pull("/ec/diss/SCL")
+    return (time.perf_counter() - wall) / n_polls, (time.process_time() - cpu) / n_polls
+
+
+def main(n_polls: int = 1000):
+    server = multiprocessing.Process(target=_serve, daemon=True)
+    server.start()
+    time.sleep(0.5)
+    try:
+        c = user_config.UserConfig(notification_engine={"port": PORT, "type": "etcd_rest"})
+        engine = EtcdRestEngine(c.notification_engine, auth.Auth.get_auth(c))
+        pooled = _run(engine, n_polls)
+        engine._http = _NoPool()
+        unpooled = _run(engine, n_polls)
+    finally:
+        server.terminate()
+
+    print(f"{'transport':<12}{'latency/poll (ms)':>20}{'cpu/poll (ms)':>16}")
+    print(f"{'no pool':<12}{unpooled[0] * 1000:>20.3f}{unpooled[1] * 1000:>16.3f}")
+    print(f"{'pool':<12}{pooled[0] * 1000:>20.3f}{pooled[1] * 1000:>16.3f}")
+    print(f"speed-up: latency x{unpooled[0] / pooled[0]:.2f}, cpu x{unpooled[1] / pooled[1]:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
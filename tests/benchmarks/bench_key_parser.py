@@ -0,0 +1,87 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""
+Benchmark of the throughput of EventListener.callback on the keys of a dissemination stream, from the key received to
+the notification filtered. The previous parsing, looking up the key format in the schema and parsing it at every
+notification, is compared with the parser compiled once per listener.
+
+Usage: python tests/benchmarks/bench_key_parser.py [n_keys]
+"""
+
+import logging
+import sys
+import time
+
+import parse
+
+from pyaviso import logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+from pyaviso.event_listeners.event_listener import EventListener
+
+FIELDS = ["destination", "date", "target", "class", "expver", "domain", "time", "stream", "step"]
+
+SCHEMA = {
+    "endpoint": [
+        {
+            "engine": ["etcd_rest", "etcd_grpc", "file_based", "in_memory"],
+            "base": "/ec/diss/{destination}",
+            "stem": "date={date},target={target},class={class},expver={expver},domain={domain},time={time},"
+            "stream={stream},step={step}",
+        }
+    ],
+    "request": {f: [{"type": "StringHandler"}] for f in FIELDS},
+}
+
+KEYS = [
+    f"/ec/diss/SCL/date=20210101,target=E1,class=od,expver=0001,domain=g,time=0000,stream=enfo,step={i}"
+    for i in range(1000)
+]
+
+
+class _PreviousEventListener(EventListener):
+    """Previous parsing, the key format is looked up and parsed at every notification"""
+
+    def parse_key(self, key: str):
+        key_put_format = EventListener._key_base_format(
+            self.listener_schema, self.engine.engine_type
+        ) + EventListener._key_stem_format(self.listener_schema, self.engine.engine_type)
+        return parse.parse(key_put_format, key, extra_types=[str]).named
+
+
+def _run(listener: EventListener, n_keys: int) -> float:
+    for key in KEYS:  # warm up
+        listener.callback(key, "None")
+    start = time.process_time()
+    for i in range(n_keys):
+        listener.callback(KEYS[i % len(KEYS)], "None")
+    return n_keys / (time.process_time() - start)
+
+
+def main(n_keys: int = 20000):
+    logger.setLevel(logging.WARNING)  # the notifications are logged at info level
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml", notification_engine={"type": "in_memory", "host": "bench", "port": 1}
+    )
+    engine = InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+    request = {"destination": "SCL", "class": "od", "stream": "enfo"}
+
+    results = []
+    for name, cls in [("previous", _PreviousEventListener), ("compiled", EventListener)]:
+        listener = cls("diss", engine, request, [], SCHEMA)
+        results.append((name, _run(listener, n_keys)))
+
+    print(f"{'parsing':<12}{'callbacks/s':>14}")
+    for name, rate in results:
+        print(f"{name:<12}{rate:>14.0f}")
+    print(f"speed-up: x{results[1][1] / results[0][1]:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
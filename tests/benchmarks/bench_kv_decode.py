@@ -0,0 +1,103 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""
+Benchmark of the per-kv cost of parsing the range responses of the etcd gRPC gateway, from the body of the response
+to the key-value pairs returned by the pull, on pages of 10k keys. The previous parsing, a dictionary per kv decoded
+through base64.decodebytes, is compared with the KeyValue records decoded a page at the time, with the standard json
+module and with orjson if installed.
+
+Usage: python tests/benchmarks/bench_kv_decode.py [n_pages]
+"""
+
+import base64
+import json
+import sys
+import time
+import tracemalloc
+
+from pyaviso.engine import key_value
+from pyaviso.engine.key_value import decode_kvs
+
+PAGE_SIZE = 10000
+
+
+def _encode(s: str) -> str:
+    return base64.b64encode(s.encode()).decode()
+
+
+RANGE_RESPONSE = json.dumps(
+    {
+        "header": {"revision": "100000"},
+        "kvs": [
+            {
+                "key": _encode(f"/ec/diss/SCL/date=20210101,target=E1,class=od,expver=0001,step={i}"),
+                "value": _encode('{"location": "xxx://host/path/to/file.grib"}'),
+                "create_revision": str(10 + i),
+                "mod_revision": str(10 + i),
+                "version": "1",
+            }
+            for i in range(PAGE_SIZE)
+        ],
+        "count": str(PAGE_SIZE),
+    }
+).encode()
+
+
+def _previous(content: bytes):
+    """Previous parsing, a dictionary for each kv"""
+    kvs = []
+    for kv in json.loads(content)["kvs"]:
+        new_kv = {}
+        new_kv["value"] = base64.decodebytes(kv["value"].encode())
+        new_kv["key"] = base64.decodebytes(kv["key"].encode()).decode()
+        new_kv["version"] = int(kv["version"])
+        new_kv["create_rev"] = int(kv["create_revision"])
+        new_kv["mod_rev"] = int(kv["mod_revision"])
+        kvs.append(new_kv)
+    return kvs
+
+
+def _current(content: bytes):
+    return decode_kvs(key_value.loads(content)["kvs"])
+
+
+def _run(parse, n_pages: int):
+    parse(RANGE_RESPONSE)  # warm up
+    cpu = time.process_time()
+    for _ in range(n_pages):
+        parse(RANGE_RESPONSE)
+    per_kv = (time.process_time() - cpu) / n_pages / PAGE_SIZE
+    # memory held by the key-value pairs of a page
+    tracemalloc.start()
+    kvs = parse(RANGE_RESPONSE)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kvs
+    return per_kv, held / PAGE_SIZE
+
+
+def main(n_pages: int = 20):
+    orjson = key_value.orjson
+    results = [("dict", _run(_previous, n_pages))]
+    key_value.orjson = None
+    results.append(("KeyValue, json", _run(_current, n_pages)))
+    if orjson is not None:
+        key_value.orjson = orjson
+        results.append(("KeyValue, orjson", _run(_current, n_pages)))
+
+    print(f"{'parsing':<20}{'cpu/kv (us)':>14}{'memory/kv (B)':>16}")
+    for name, (per_kv, held) in results:
+        print(f"{name:<20}{per_kv * 1e6:>14.3f}{held:>16.0f}")
+    baseline = results[0][1][0]
+    for name, (per_kv, _) in results[1:]:
+        print(f"speed-up {name}: x{baseline / per_kv:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,109 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+"""
+Benchmark of the validation of the requests of notifications against a schema with enums as large as those merged
+from the MARS language. The previous validation, building each validator with eval at every call, scanning the enums
+as lists and parsing every date, is compared with the validators compiled once per schema.
+
+Usage: python tests/benchmarks/bench_validation.py [n_requests]
+"""
+
+import datetime
+import sys
+import time
+
+from pyaviso.event_listeners import validation
+from pyaviso.event_listeners.event_listener import EventListener
+
+ENUM_SIZE = 5000
+
+SCHEMA = {
+    "destination": [{"type": "StringHandler", "canonic": "upper"}],
+    "date": [{"type": "DateHandler", "canonic": "%Y%m%d"}],
+    "class": [{"type": "EnumHandler", "values": [f"c{i}" for i in range(ENUM_SIZE)] + ["od"]}],
+    "stream": [{"type": "EnumHandler", "values": [f"s{i}" for i in range(ENUM_SIZE)] + ["enfo"]}],
+    "expver": [{"type": "StringHandler"}],
+    "time": [{"type": "TimeHandler", "values": ["0", "6", "12", "18"], "canonic": "{0:0>2}"}],
+    "step": [{"type": "IntHandler"}],
+}
+
+REQUESTS = [
+    {
+        "destination": "scl",
+        "date": f"202101{d:02d}",
+        "class": "od",
+        "stream": "enfo",
+        "expver": "0001",
+        "time": "0",
+        "step": i,
+    }
+    for d in range(1, 29)
+    for i in range(10)
+]
+
+
+class _PreviousEnumHandler(validation.EnumHandler):
+    def valid(self, value: any) -> bool:
+        value = type(self.valid_values[0])(value)
+        if value in self.valid_values:
+            return True
+        raise ValueError(f"Key {self.key} accepts only the following values")
+
+
+class _PreviousTimeHandler(validation.TimeHandler, _PreviousEnumHandler):
+    pass
+
+
+class _PreviousDateHandler(validation.DateHandler):
+    def valid(self, value: any) -> bool:
+        self._d_datetime = datetime.datetime.strptime(str(value), self.canonic)
+        return True
+
+    def canonise(self, value: any) -> str:
+        return self._d_datetime.strftime(self.canonic)
+
+
+PREVIOUS_HANDLERS = {
+    "EnumHandler": _PreviousEnumHandler,
+    "TimeHandler": _PreviousTimeHandler,
+    "DateHandler": _PreviousDateHandler,
+    "StringHandler": validation.StringHandler,
+    "IntHandler": validation.IntHandler,
+}
+
+
+def _previous_validate(params, schema):
+    """Previous validation, the validators are built with eval for every parameter"""
+    for p in params.keys():
+        for p_schema in schema[p]:
+            p_schema_c = p_schema.copy()
+            validator_class = p_schema_c.pop("type")
+            validator = eval(f"{validator_class}(key=p, **p_schema_c)", dict(PREVIOUS_HANDLERS), locals())
+            params[p] = validator.process(params[p])
+            break
+
+
+def _run(validate, n_requests: int) -> float:
+    start = time.process_time()
+    for i in range(n_requests):
+        validate(dict(REQUESTS[i % len(REQUESTS)]), SCHEMA)
+    return n_requests / (time.process_time() - start)
+
+
+def main(n_requests: int = 5000):
+    previous = _run(_previous_validate, n_requests)
+    compiled = _run(EventListener._validate, n_requests)
+    print(f"{'validation':<12}{'requests/s':>14}")
+    print(f"{'previous':<12}{previous:>14.0f}")
+    print(f"{'compiled':<12}{compiled:>14.0f}")
+    print(f"speed-up: x{compiled / previous:.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
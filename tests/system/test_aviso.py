@@ -222,6 +222,36 @@ def test_notify_test(config):
     assert "Done" in result.output
 
 
+@pytest.mark.parametrize("config", configs)
+def test_notify_many(config):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    notifications = [
+        {
+            "event": "flight",
+            "country": "italy",
+            "date": "20210101",
+            "airport": "FCO",
+            "number": f"AZ{i}",
+            "payload": str(i),
+        }
+        for i in range(10)
+    ]
+    notifications.insert(5, {"event": "flight", "country": "italy"})
+    results = aviso.notify_many(notifications, config=config)
+
+    # the invalid notification does not stop the others
+    assert results[:5] == [True] * 5 and results[6:] == [True] * 5
+    assert isinstance(results[5], KeyError)
+    last_key = {k: v for k, v in notifications[10].items() if k != "payload"}
+    assert aviso.value(last_key, config=config) == "9"
+
+    # now test the status has been updated
+    eng = engine(config)
+    kvs = eng.pull("/tmp/aviso/flight/", prefix=False)
+    assert len(kvs) == 1
+    assert "notification to key /tmp/aviso/flight/20210101/italy/FCO/AZ9" in kvs[0]["value"].decode()
+
+
 @pytest.mark.parametrize("config", [c1, c2])
 def test_notify_ttl(config):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
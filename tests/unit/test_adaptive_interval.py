@@ -0,0 +1,65 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+import pytest
+
+from pyaviso import logger
+from pyaviso.engine.adaptive_interval import AdaptiveInterval
+
+
+def test_backoff_and_ramp_up():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    interval = AdaptiveInterval(2, 1, 10, backoff=2, jitter=0)
+    # the first poll is due straight away
+    assert interval.due <= time.monotonic()
+    assert interval.interval == 2
+
+    # back off while quiet, up to the max
+    intervals = []
+    for i in range(5):
+        interval.update(False)
+        intervals.append(interval.interval)
+    assert intervals == [4, 8, 10, 10, 10]
+
+    # back to the min as soon as something changes
+    now = time.monotonic()
+    due = interval.update(True)
+    assert interval.interval == 1
+    assert now + 1 <= due <= time.monotonic() + 1
+
+
+def test_fixed_interval():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # min and max equal to the initial interval, the default configuration
+    interval = AdaptiveInterval(30, 30, 30)
+    for changed in [False, True, False]:
+        interval.update(changed)
+        assert interval.interval == 30
+
+
+def test_jitter():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    intervals = [AdaptiveInterval(10, 10, 10, jitter=0.2) for i in range(50)]
+    now = time.monotonic()
+    dues = [interval.update(False) - now for interval in intervals]
+    assert all(8 <= due <= 12.1 for due in dues)
+    # the keys starting together are spread
+    assert len(set(round(due, 3) for due in dues)) > 1
+
+
+def test_invalid_settings():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    with pytest.raises(AssertionError):
+        AdaptiveInterval(10, 20, 10)
+    with pytest.raises(AssertionError):
+        AdaptiveInterval(10, 10, 20, backoff=0.5)
+    with pytest.raises(AssertionError):
+        AdaptiveInterval(10, 10, 20, jitter=1)
@@ -0,0 +1,204 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+import os
+import threading
+import time
+import zlib
+from shutil import rmtree
+
+import pytest
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.callback_executor import CallbackExecutor
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+
+
+def worker(executor: CallbackExecutor, key: str) -> int:
+    return zlib.crc32(key.encode()) % executor.workers
+
+
+@pytest.fixture(autouse=True)
+def pre_post_test():
+    yield
+    # delete the revision state
+    full_state_path = os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        rmtree(full_state_path, ignore_errors=True)
+
+
+def test_ordering():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    executor = CallbackExecutor(workers=4, queue_size=10)
+    delivered = {}
+    lock = threading.Lock()
+
+    def callback(key, i):
+        time.sleep(0.001)
+        with lock:
+            delivered.setdefault(key, []).append(i)
+
+    for i in range(20):
+        for key in ["a", "b", "c"]:
+            executor.submit(key, lambda key=key, i=i: callback(key, i))
+    executor.close()
+    # the callbacks of each key have run in order
+    assert delivered == {key: list(range(20)) for key in ["a", "b", "c"]}
+    assert executor.stats()["completed"] == 60
+    assert executor.depth == 0
+
+
+def test_parallel_keys():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    executor = CallbackExecutor(workers=2, queue_size=10)
+    release = threading.Event()
+    fast = threading.Event()
+    # the keys go to different workers
+    slow_key = "a"
+    fast_key = next(k for k in "bcdefgh" if worker(executor, k) != worker(executor, slow_key))
+    executor.submit(slow_key, lambda: release.wait(5))
+    executor.submit(fast_key, fast.set)
+    # a slow callback does not hold the other keys
+    assert fast.wait(2)
+    assert executor.pending(slow_key)
+    assert not executor.pending(fast_key)
+    release.set()
+    executor.close()
+
+
+def test_backpressure_and_done():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    executor = CallbackExecutor(workers=1, queue_size=1)
+    done = []
+    for i in range(3):
+        executor.submit("a", lambda: time.sleep(0.3), lambda i=i: done.append(i))
+    start = time.monotonic()
+    # the queue is full, the submission waits for the callbacks to catch up
+    executor.submit("a", None, lambda: done.append(3))
+    assert time.monotonic() - start > 0.2
+    # done runs after its callback, in order
+    executor.close()
+    assert done == [0, 1, 2, 3]
+    stats = executor.stats()
+    assert stats["max_latency"] >= 0.3
+    assert stats["latency"] > 0
+
+
+def test_backpressure_async():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    executor = CallbackExecutor(workers=1, queue_size=1)
+    done = []
+    ticks = []
+
+    async def tick():
+        while len(done) < 4:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def submit():
+        for i in range(4):
+            await executor.submit_async("a", lambda: time.sleep(0.3), lambda i=i: done.append(i))
+
+    async def run():
+        await asyncio.gather(tick(), submit())
+
+    asyncio.new_event_loop().run_until_complete(run())
+    executor.close()
+    # the loop has kept running while the queue was full, and the callbacks have run in order
+    assert done == [0, 1, 2, 3]
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.2
+
+
+def test_close_full_queue():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    executor = CallbackExecutor(workers=1, queue_size=1)
+    release = threading.Event()
+    done = []
+    executor.submit("a", lambda: release.wait(10), lambda: done.append(0))
+    time.sleep(0.1)
+    executor.submit("a", None, lambda: done.append(1))
+    # the queue is full, the close does not wait for room in it
+    start = time.monotonic()
+    executor.close(wait=False)
+    assert time.monotonic() - start < 0.5
+    release.set()
+    executor.close()
+    assert done == [0, 1]
+    assert executor.stats()["completed"] == 2
+    assert executor.depth == 0
+
+    # a callback closing the executor with a full queue
+    executor = CallbackExecutor(workers=1, queue_size=1)
+    closed = threading.Event()
+
+    def close():
+        executor.close(cancel=True)
+        closed.set()
+
+    executor.submit("a", close)
+    executor.submit("a", lambda: done.append(2), lambda: done.append(3))
+    assert closed.wait(2)
+    executor.close()
+    # the callbacks not started are dropped
+    assert done == [0, 1]
+    assert executor.depth == 0
+
+
+def test_engine_checkpoint():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "in_memory",
+            "host": "executor",
+            "port": 1,
+            "polling_interval": 1,
+            "trigger_workers": 2,
+            "trigger_ordering": "key",
+        },
+    )
+    engine = InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+    release = threading.Event()
+    received = []
+
+    def slow_callback(key, value):
+        release.wait(10)
+        received.append(key)
+
+    def fast_callback(key, value):
+        received.append(key)
+
+    # the keys go to different workers
+    slow_key = "/test/slow/"
+    executor = engine.trigger_executor
+    fast_key = next(
+        f"/test/fast{i}/" for i in range(20) if worker(executor, f"/test/fast{i}/") != worker(executor, slow_key)
+    )
+    assert engine.listen([slow_key], slow_callback)
+    assert engine.listen([fast_key], fast_callback)
+    time.sleep(1)
+    engine.push([{"key": slow_key + "1", "value": "1"}])
+    engine.push([{"key": fast_key + "1", "value": "1"}])
+    time.sleep(2.5)
+    # the slow trigger does not stall the polling of the other key
+    assert received == [fast_key + "1"]
+    assert executor.pending(slow_key)
+    assert not executor.pending(fast_key)
+    # the polls while waiting add at most a single update of the checkpoint
+    assert executor.depth <= 2
+    # the checkpoint of the slow key has not moved past the notification still running
+    slow_checkpoint = engine._checkpoints[slow_key]
+    assert slow_checkpoint._positions[slow_key] <= engine.store.revision - 1
+    release.set()
+    time.sleep(2)
+    assert received == [fast_key + "1", slow_key + "1"]
+    assert slow_checkpoint._positions[slow_key] > engine.store.revision
+    engine.close()
@@ -0,0 +1,53 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+from pyaviso import logger
+from pyaviso.engine.change_log import DELETE, PUT, ChangeLog
+
+
+def test_revisions(tmp_path, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    now = [1000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    log = ChangeLog(str(tmp_path / "changes.log"))
+    assert log.revision == 0
+
+    # the changes pushed together share the revision
+    assert log.append([(PUT, "a/1"), (PUT, "a/2")]) == 1
+    now[0] += 10
+    assert log.append([(PUT, "a/1")]) == 2
+    assert log.append([(DELETE, "a/2")]) == 3
+    assert [c[0] for c in log.changes(min_rev=2)] == [2, 3]
+    assert log.last_revisions() == [("a/1", 2)]
+    assert log.last_revisions(max_rev=1) == []
+
+    assert log.revision_at(1005) == 2
+    assert log.revision_at(1005, after=False) == 1
+    assert log.revision_at(1011) is None
+
+
+def test_shared_log(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    path = str(tmp_path / "changes.log")
+    log1 = ChangeLog(path)
+    log2 = ChangeLog(path)
+
+    # the revisions keep increasing across the instances appending to the same file
+    assert log1.append([(PUT, "a")]) == 1
+    assert log2.append([(PUT, "b")]) == 2
+    assert log1.append([(PUT, "c")]) == 3
+    assert [c[3] for c in log2.changes()] == ["a", "b", "c"]
+
+    # a log deleted starts again
+    os.remove(path)
+    assert log1.append([(PUT, "d")]) == 1
+    assert log2.revision == 1
+    assert log2.last_revisions() == [("d", 1)]
@@ -0,0 +1,107 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import json
+import os
+
+import pytest
+
+from pyaviso import logger
+from pyaviso.engine.checkpoint_store import (
+    LEGACY_CHECKPOINT_FILE,
+    CheckpointStore,
+    list_checkpoints,
+)
+
+
+def test_oldest_key(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    checkpoint = CheckpointStore(str(tmp_path), ["a", "b"], "localhost", 2379)
+    # nothing to save until every key has a revision
+    checkpoint.update("a", 10)
+    assert checkpoint.revision is None
+    assert not checkpoint.save()
+    # the checkpoint is the oldest revision, so no key can miss a notification
+    checkpoint.update("b", 5)
+    assert checkpoint.revision == 5
+    assert checkpoint.save()
+    checkpoint.update("b", 20)
+    assert checkpoint.flush()
+    assert CheckpointStore(str(tmp_path), ["b", "a"], "localhost", 2379).load() == 10
+
+
+def test_debounce(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    checkpoint = CheckpointStore(str(tmp_path), ["a"], "localhost", 2379, interval=3600, revisions=100)
+    # the first revision is saved straight away
+    checkpoint.update("a", 1)
+    assert checkpoint.save()
+    # the following ones are kept in memory
+    for rev in range(2, 101):
+        checkpoint.update("a", rev)
+        assert not checkpoint.save()
+    assert CheckpointStore(str(tmp_path), ["a"], "localhost", 2379).load() == 1
+    # until enough revisions have been delivered
+    checkpoint.update("a", 101)
+    assert checkpoint.save()
+    # or the listening is stopped
+    checkpoint.update("a", 102)
+    assert checkpoint.flush()
+    assert not checkpoint.flush()
+    assert CheckpointStore(str(tmp_path), ["a"], "localhost", 2379).load() == 102
+
+
+def test_atomic_write(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    checkpoint = CheckpointStore(str(tmp_path / "last"), ["a"], "localhost", 2379, interval=0)
+    for rev in range(10):
+        checkpoint.update("a", rev)
+        assert checkpoint.save()
+    # no temporary file is left behind
+    assert os.listdir(str(tmp_path / "last")) == [checkpoint.name + ".json"]
+
+    # a corrupted checkpoint is ignored
+    with open(checkpoint.path, "w") as f:
+        f.write('{"last_rev')
+    assert CheckpointStore(str(tmp_path / "last"), ["a"], "localhost", 2379).load() == -1
+
+
+def test_listener_sets(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    for keys, port, rev in [(["a"], 2379, 1), (["a", "b"], 2379, 2), (["a"], 2380, 3)]:
+        checkpoint = CheckpointStore(str(tmp_path), keys, "localhost", port)
+        for key in keys:
+            checkpoint.update(key, rev)
+        assert checkpoint.flush()
+    checkpoints = list_checkpoints(str(tmp_path))
+    assert sorted((c["keys"], c["server_port"], c["last_revision"]) for c in checkpoints) == [
+        (["a"], 2379, 1),
+        (["a"], 2380, 3),
+        (["a", "b"], 2379, 2),
+    ]
+    assert all(
+        c["name"] == CheckpointStore.checkpoint_name(c["keys"], "localhost", c["server_port"]) for c in checkpoints
+    )
+
+    # reset only one of them
+    assert CheckpointStore(str(tmp_path), ["b", "a"], "localhost", 2379).reset()
+    assert len(list_checkpoints(str(tmp_path))) == 2
+
+
+@pytest.mark.parametrize("host, expected", [("localhost", 42), ("otherhost", -1)])
+def test_legacy_checkpoint(tmp_path, host, expected):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    legacy = {"last_revision": 42, "date_time": "", "server_host": host, "server_port": 2379}
+    with open(str(tmp_path / LEGACY_CHECKPOINT_FILE), "w") as f:
+        json.dump(legacy, f)
+    # the single revision of previous versions is used only if from the same server
+    checkpoint = CheckpointStore(str(tmp_path), ["a"], "localhost", 2379)
+    assert checkpoint.load() == expected
+    assert list_checkpoints(str(tmp_path)) == []
+    assert checkpoint.reset()
+    assert os.listdir(str(tmp_path)) == []
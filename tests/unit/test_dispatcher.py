@@ -0,0 +1,315 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import json
+import os
+import threading
+import time
+from shutil import rmtree
+
+import pytest
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+from pyaviso.event_listeners.dispatcher import NotificationDispatcher
+from pyaviso.event_listeners.event_listener import EventListener
+from pyaviso.event_listeners.listener_manager import ListenerManager
+
+
+@pytest.fixture()
+def conf() -> user_config.UserConfig:  # this automatically configure the logging
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={"type": "in_memory", "host": "dispatcher", "port": 1, "polling_interval": 1},
+    )
+    yield c
+    # delete the revision state
+    full_state_path = os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        rmtree(full_state_path, ignore_errors=True)
+
+
+@pytest.fixture()
+def schema():
+    with open("tests/unit/fixtures/listener_schema.json") as schema:
+        return json.load(schema)
+
+
+REQUESTS = [
+    {"country": "italy"},
+    {"country": ["italy", "germany"], "airport": "fco"},
+    {"country": "germany", "date": 20210101},
+    {"country": "italy", "airport": ["FCO", "MXP"], "number": "AZ203"},
+]
+
+KEYS = [
+    "/tmp/aviso/flight/italy/20210101/FCO/AZ203",
+    "/tmp/aviso/flight/italy/20210102/MXP/AZ100",
+    "/tmp/aviso/flight/germany/20210101/FCO/LH400",
+    "/tmp/aviso/flight/germany/20210102/FRA/LH400",
+    "/tmp/aviso/flight/france/20210101/CDG/AF100",
+]
+
+
+def test_match(conf, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    engine = InMemoryEngine(conf.notification_engine, auth.Auth.get_auth(conf))
+    listeners = [EventListener("flight", engine, r, [{"type": "echo"}], schema["flight"]) for r in REQUESTS]
+    dispatcher = NotificationDispatcher(listeners)
+    # same listeners as filtering each of them
+    for key in KEYS:
+        not_request = listeners[0].parse_key(key)
+        expected = [listener for listener in listeners if listener._is_expected(not_request)]
+        assert dispatcher.match(not_request) == expected
+    assert dispatcher.match(listeners[0].parse_key(KEYS[0])) == [listeners[0], listeners[1], listeners[3]]
+    assert dispatcher.match(listeners[0].parse_key(KEYS[4])) == []
+
+
+def test_keys(conf, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    engine = InMemoryEngine(conf.notification_engine, auth.Auth.get_auth(conf))
+    listeners = [EventListener("flight", engine, r, [{"type": "echo"}], schema["flight"]) for r in REQUESTS]
+    # each key is listened once
+    assert NotificationDispatcher(listeners).keys == ["/tmp/aviso/flight/germany/", "/tmp/aviso/flight/italy/"]
+
+
+def test_nested_keys(schema, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the listener of many countries listens to their covering prefix
+    monkeypatch.setattr("pyaviso.event_listeners.event_listener.MAX_KEYS", 1)
+    # no deduplication by the engine
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "in_memory",
+            "host": "dispatcher_nested",
+            "port": 1,
+            "polling_interval": 1,
+            "dedup": "none",
+        },
+    )
+    received = {"many": [], "italy": []}
+
+    def listener(request, name):
+        trigger = {"type": "function", "function": lambda notification: received[name].append(notification["request"])}
+        return {"event": "flight", "request": request, "triggers": [trigger]}
+
+    listeners = [listener({"country": ["italy", "germany"]}, "many"), listener({"country": "italy"}, "italy")]
+    manager = ListenerManager()
+    try:
+        assert manager.listen([{"listeners": listeners}], schema, c) == 2
+        dispatcher = list(manager._dispatchers.values())[0]
+        assert dispatcher.keys == ["/tmp/aviso/flight/", "/tmp/aviso/flight/italy/"]
+        time.sleep(1)
+        InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c)).push([{"key": KEYS[0], "value": "None"}])
+        time.sleep(2)
+    finally:
+        manager.cancel_listeners()
+    # the notification under both keys is delivered once to each listener
+    assert [r["number"] for r in received["many"]] == ["AZ203"]
+    assert [r["number"] for r in received["italy"]] == ["AZ203"]
+
+
+def test_listener_manager(conf, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    received = {i: [] for i in range(len(REQUESTS))}
+    parsed = []
+
+    def trigger(i):
+        return {"type": "function", "function": lambda notification: received[i].append(notification["request"])}
+
+    listeners = {
+        "listeners": [{"event": "flight", "request": r, "triggers": [trigger(i)]} for i, r in enumerate(REQUESTS)]
+    }
+    manager = ListenerManager()
+    assert manager.listen([listeners], schema, conf) == len(REQUESTS)
+    engine = manager.listeners[0].engine
+    parse_key = EventListener.parse_key
+
+    def counting_parse_key(self, key):
+        parsed.append(key)
+        return parse_key(self, key)
+
+    EventListener.parse_key = counting_parse_key
+    try:
+        time.sleep(1)
+        engine.push([{"key": key, "value": "None"} for key in KEYS])
+        time.sleep(2)
+    finally:
+        EventListener.parse_key = parse_key
+        manager.cancel_listeners()
+
+    # each key is parsed once and delivered once to each listener expecting it
+    assert sorted(parsed) == sorted(KEYS[:4])
+    numbers = {i: sorted(r["number"] for r in received[i]) for i in received}
+    assert numbers == {0: ["AZ100", "AZ203"], 1: ["AZ203", "LH400"], 2: ["LH400"], 3: ["AZ203"]}
+
+
+def test_reload(conf, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    received = {"a": [], "b": [], "c": []}
+
+    def listener(request, name):
+        trigger = {"type": "function", "function": lambda notification: received[name].append(notification["request"])}
+        return {"event": "flight", "request": request, "triggers": [trigger]}
+
+    manager = ListenerManager()
+    a = listener({"country": "italy"}, "a")
+    assert manager.listen([{"listeners": [a, listener({"country": "germany"}, "b")]}], schema, conf) == 2
+    unchanged = manager.listeners[0]
+    dispatcher = manager._dispatchers[next(iter(manager._dispatchers))]
+    engine = dispatcher.engine
+    listened = list(engine._listeners)
+    try:
+        # germany is replaced by france, italy keeps listening
+        assert manager.reload([{"listeners": [a, listener({"country": "france"}, "c")]}], schema, conf) == 2
+        assert manager.listeners[0] is unchanged
+        assert list(manager._dispatchers.values()) == [dispatcher]
+        assert "/tmp/aviso/flight/italy/" in engine._listeners
+        assert "/tmp/aviso/flight/germany/" not in engine._listeners
+        assert "/tmp/aviso/flight/france/" in engine._listeners
+        assert engine._listeners[: len(listened) - 1] == [k for k in listened if "germany" not in k]
+        time.sleep(1)
+        engine.push([{"key": key, "value": "None"} for key in KEYS])
+        time.sleep(2)
+    finally:
+        manager.cancel_listeners()
+
+    assert sorted(r["number"] for r in received["a"]) == ["AZ100", "AZ203"]
+    assert received["b"] == []
+    assert [r["number"] for r in received["c"]] == ["AF100"]
+    assert manager._dispatchers == {}
+
+
+def test_reload_failed_key(conf, schema, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    received = {"a": [], "b": [], "c": []}
+
+    def listener(request, name):
+        trigger = {"type": "function", "function": lambda notification: received[name].append(notification["request"])}
+        return {"event": "flight", "request": request, "triggers": [trigger]}
+
+    manager = ListenerManager()
+    a = listener({"country": "italy"}, "a")
+    assert manager.listen([{"listeners": [a]}], schema, conf) == 1
+    unchanged = manager.listeners[0]
+    dispatcher = next(iter(manager._dispatchers.values()))
+    engine = dispatcher.engine
+    # the key of germany cannot be listened
+    listen = engine.listen
+    stopped = []
+    stop = engine.stop
+    monkeypatch.setattr(engine, "listen", lambda keys, *args: "germany" not in keys[0] and listen(keys, *args))
+    monkeypatch.setattr(engine, "stop", lambda key=None: stopped.append(key) or stop(key))
+    try:
+        listeners = [a, listener({"country": "germany"}, "b"), listener({"country": "france"}, "c")]
+        assert manager.reload([{"listeners": listeners}], schema, conf) == 2
+        # only the listener of the key not started is removed, the others are untouched
+        assert manager.listeners[0] is unchanged
+        assert [listener.keys for listener in manager.listeners[1:]] == [["/tmp/aviso/flight/france/"]]
+        assert list(manager._dispatchers.values()) == [dispatcher]
+        assert dispatcher.listened == ["/tmp/aviso/flight/italy/", "/tmp/aviso/flight/france/"]
+        assert stopped == []
+        time.sleep(1)
+        engine.push([{"key": key, "value": "None"} for key in KEYS])
+        time.sleep(2)
+    finally:
+        manager.cancel_listeners()
+
+    assert sorted(r["number"] for r in received["a"]) == ["AZ100", "AZ203"]
+    assert received["b"] == []
+    assert [r["number"] for r in received["c"]] == ["AF100"]
+
+
+def test_catchup_after_edit(schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "in_memory",
+            "host": "dispatcher_catchup",
+            "port": 1,
+            "polling_interval": 1,
+            "catchup": True,
+        },
+    )
+    received = {"italy": [], "france": []}
+
+    def listener(request, name):
+        trigger = {"type": "function", "function": lambda notification: received[name].append(notification["request"])}
+        return {"event": "flight", "request": request, "triggers": [trigger]}
+
+    def listen(*names):
+        manager = ListenerManager()
+        requests = {"italy": {"country": "italy"}, "france": {"country": "france"}}
+        assert manager.listen([{"listeners": [listener(requests[n], n) for n in names]}], schema, c) == len(names)
+        time.sleep(1)
+        return manager
+
+    def notify(key):
+        InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c)).push([{"key": key, "value": "None"}])
+
+    try:
+        manager = listen("italy")
+        manager.cancel_listeners()
+        # the italy listener catches up also when started with other listeners
+        notify(KEYS[0])
+        manager = listen("italy", "france")
+        time.sleep(1)
+        assert [r["number"] for r in received["italy"]] == ["AZ203"]
+
+        # a key added by a reload keeps its checkpoint at the next restart
+        manager.reload([{"listeners": [listener({"country": "italy"}, "italy")]}], schema, c)
+        manager.reload(
+            [{"listeners": [listener({"country": "italy"}, "italy"), listener({"country": "france"}, "france")]}],
+            schema,
+            c,
+        )
+        time.sleep(1)
+        manager.cancel_listeners()
+        notify(KEYS[4])
+        manager = listen("france")
+        time.sleep(1)
+        manager.cancel_listeners()
+        assert [r["number"] for r in received["france"]] == ["AF100"]
+    finally:
+        manager.cancel_listeners()
+
+
+def test_concurrent_reload(conf, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+
+    def listeners(*countries):
+        return [
+            {"listeners": [{"event": "flight", "request": {"country": c}, "triggers": [{"type": "echo"}]}]}
+            for c in countries
+        ]
+
+    manager = ListenerManager()
+    assert manager.listen(listeners("italy"), schema, conf) == 1
+    engine = manager.listeners[0].engine
+    versions = [listeners("italy", "france"), listeners("italy", "germany"), listeners("germany", "france")]
+    # many reloads at the same time, as from signals and the file watcher
+    threads = [
+        threading.Thread(target=manager.reload, args=(versions[i % len(versions)], schema, conf)) for i in range(12)
+    ]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        manager.reload(versions[0], schema, conf)
+        # each key is listened once, only those of the last reload
+        assert len(manager._dispatchers) == 1
+        dispatcher = next(iter(manager._dispatchers.values()))
+        assert sorted(engine._listeners) == dispatcher.keys == ["/tmp/aviso/flight/france/", "/tmp/aviso/flight/italy/"]
+    finally:
+        manager.cancel_listeners()
+    assert engine._listeners == []
@@ -0,0 +1,138 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+import os
+
+from pyaviso import logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.async_etcd_rest_engine import AsyncEtcdRestEngine
+from pyaviso.engine.engine_pool import EnginePool, engine_pool
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+from pyaviso.notification_manager import NotificationManager
+
+
+def config(host: str = "pool", **kwargs) -> user_config.UserConfig:
+    return user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={"type": "in_memory", "host": host, "port": 1, "polling_interval": 1},
+        **kwargs,
+    )
+
+
+def test_reuse():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    with EnginePool() as pool:
+        c = config()
+        engine = pool.engine(c.notification_engine, auth.Auth.get_auth(c))
+        assert isinstance(engine, InMemoryEngine)
+        # same configuration and user from a new config object
+        c = config()
+        assert pool.engine(c.notification_engine, auth.Auth.get_auth(c)) is engine
+        assert len(pool) == 1
+
+        # a different configuration or user has its own engine
+        c = config(host="pool2")
+        assert pool.engine(c.notification_engine, auth.Auth.get_auth(c)) is not engine
+        c = config(auth_type="etcd", username="user1", key_file="tests/unit/fixtures/key")
+        engine1 = pool.engine(c.notification_engine, auth.Auth.get_auth(c))
+        c = config(auth_type="etcd", username="user2", key_file="tests/unit/fixtures/key")
+        assert pool.engine(c.notification_engine, auth.Auth.get_auth(c)) is not engine1
+        assert len(pool) == 4
+    # the pool is emptied once closed
+    assert len(pool) == 0
+
+
+def test_close():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    pool = EnginePool()
+    c = config()
+    engine = pool.engine(c.notification_engine, auth.Auth.get_auth(c))
+    assert engine.listen(["pool/close"], lambda key, value: None)
+    pool.close()
+    # the listeners of the engines are stopped
+    assert len(engine._listeners) == 0
+    assert pool.engine(c.notification_engine, auth.Auth.get_auth(c)) is not engine
+    pool.close()
+
+
+def test_notification_manager(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the shared pool is used by default
+    assert NotificationManager()._engines is engine_pool()
+
+    created = []
+    init = InMemoryEngine.__init__
+
+    def counting_init(self, *args, **kwargs):
+        created.append(self)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(InMemoryEngine, "__init__", counting_init)
+    with EnginePool() as pool:
+        manager = NotificationManager(engines=pool)
+        c = config()
+        for i in range(3):
+            notification = {"event": "flight", "date": "20210101", "country": "it", "airport": "fco", "number": str(i)}
+            assert manager.notify(notification, config=c)
+        notification["number"] = "2"
+        assert manager.value(notification, config=c) is not None
+        # a single engine has served all the calls
+        assert len(created) == 1
+        assert len(created[0].pull("/tmp/aviso/flight/20210101/")) == 3
+
+
+def test_async_engines(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    closed = []
+
+    async def close_async(self):
+        closed.append(self)
+
+    monkeypatch.setattr(AsyncEtcdRestEngine, "close_async", close_async)
+    c = user_config.UserConfig(conf_path="tests/config.yaml", notification_engine={"type": "etcd_rest"})
+    pool = EnginePool()
+
+    async def get_engines():
+        # same configuration and user on the same event loop
+        engine = pool.async_engine(c.notification_engine, auth.Auth.get_auth(c))
+        assert isinstance(engine, AsyncEtcdRestEngine)
+        assert pool.async_engine(c.notification_engine, auth.Auth.get_auth(c)) is engine
+        return engine
+
+    loop1 = asyncio.new_event_loop()
+    engine1 = loop1.run_until_complete(get_engines())
+    # another event loop has its own engine
+    loop2 = asyncio.new_event_loop()
+    engine2 = loop2.run_until_complete(get_engines())
+    assert engine2 is not engine1
+    assert len(pool) == 2
+
+    # the engines of an event loop closed are dropped
+    loop1.close()
+    loop2.run_until_complete(get_engines())
+    assert len(pool) == 1
+
+    # the notifications sent from the same event loop reuse its engine
+    pushed = []
+
+    async def push_with_status_async(self, *args, **kwargs):
+        pushed.append(self)
+
+    monkeypatch.setattr(AsyncEtcdRestEngine, "push_with_status_async", push_with_status_async)
+    manager = NotificationManager(engines=pool)
+    for i in range(2):
+        notification = {"event": "flight", "date": "20210101", "country": "it", "airport": "fco", "number": str(i)}
+        assert loop2.run_until_complete(manager.notify_async(notification, config=c))
+    assert pushed == [engine2, engine2]
+
+    # the connections of the engines of the running event loop are released
+    loop2.run_until_complete(pool.close_async())
+    assert closed == [engine2]
+    assert len(pool) == 0
+    loop2.close()
@@ -6,6 +6,7 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import asyncio
 import contextlib
 import datetime
 import json
@@ -20,7 +21,14 @@ import pytest
 
 from pyaviso import HOME_FOLDER, logger, user_config
 from pyaviso.authentication import auth
-from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine import ListenMode
+from pyaviso.engine.async_etcd_grpc_engine import AsyncEtcdGrpcEngine
+from pyaviso.engine.async_etcd_rest_engine import AsyncEtcdRestEngine
+from pyaviso.engine.etcd_engine import (
+    LOCAL_STATE_FOLDER,
+    REVISION_INDEX_MARGIN,
+    EtcdEngine,
+)
 from pyaviso.engine.etcd_grpc_engine import EtcdGrpcEngine
 from pyaviso.engine.etcd_rest_engine import EtcdRestEngine
 
@@ -39,6 +47,34 @@ def grpc_engine():  # this automatically configure the logging
     return engine
 
 
+def grpc_watch_engine():  # this automatically configure the logging
+    c = user_config.UserConfig(conf_path="tests/config.yaml", notification_engine={"listen_mode": "watch"})
+    authenticator = auth.Auth.get_auth(c)
+    engine = EtcdGrpcEngine(c.notification_engine, authenticator)
+    return engine
+
+
+def rest_watch_engine():  # this automatically configure the logging
+    c = user_config.UserConfig(conf_path="tests/config.yaml", notification_engine={"listen_mode": "watch"})
+    authenticator = auth.Auth.get_auth(c)
+    engine = EtcdRestEngine(c.notification_engine, authenticator)
+    return engine
+
+
+def async_rest_engine():  # this automatically configure the logging
+    c = user_config.UserConfig(conf_path="tests/config.yaml")
+    authenticator = auth.Auth.get_auth(c)
+    engine = AsyncEtcdRestEngine(c.notification_engine, authenticator)
+    return engine
+
+
+def async_grpc_engine():  # this automatically configure the logging
+    c = user_config.UserConfig(conf_path="tests/config.yaml")
+    authenticator = auth.Auth.get_auth(c)
+    engine = AsyncEtcdGrpcEngine(c.notification_engine, authenticator)
+    return engine
+
+
 # setting up multiple engines to test
 engines = [rest_engine(), grpc_engine()]
 
@@ -130,6 +166,31 @@ def test_pull(engine):
     assert len(resp) == 0
 
 
+@pytest.mark.parametrize("engine", engines)
+def test_pull_pages(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # make the pages smaller than the keys to pull
+    monkeypatch.setattr("pyaviso.engine.etcd_rest_engine.MAX_KV_RETURNED", 2)
+    monkeypatch.setattr("pyaviso.engine.etcd_grpc_engine.MAX_KV_RETURNED", 2)
+    kvs = [{"key": f"test{i}", "value": str(i)} for i in range(5)]
+    assert engine.push(kvs)
+    rev = engine._latest_revision("test")
+
+    # all the pages are retrieved, newest key first
+    resp = engine.pull(key="test")
+    assert [kv["key"] for kv in resp] == ["test4", "test3", "test2", "test1", "test0"]
+
+    # the pages are read at the revision of the first one
+    it = engine.pull_iter(key="test")
+    assert next(it)["key"] == "test4"
+    assert engine.push([{"key": "test5", "value": "5"}])
+    assert [kv["key"] for kv in it] == ["test3", "test2", "test1", "test0"]
+
+    # filters are applied to all the pages
+    resp = engine.pull(key="test", min_rev=rev + 1)
+    assert [kv["key"] for kv in resp] == ["test5"]
+
+
 @pytest.mark.parametrize("engine", engines)
 def test_push_delete(engine):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
@@ -188,6 +249,61 @@ def test_revisions(engine):
     assert len(resp) == 2
 
 
+@pytest.mark.parametrize("engine_class", [EtcdRestEngine, EtcdGrpcEngine])
+def test_push_with_status_concurrent(engine_class):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(conf_path="tests/config.yaml")
+    engines = [engine_class(c.notification_engine, auth.Auth.get_auth(c)) for i in range(2)]
+    # the engines alternate, each time the status cached by one of them is out of date
+    for i, engine in enumerate(engines + engines + engines[:1]):
+        assert engine.push_with_status([{"key": f"test/test{i}", "value": "0"}], base_key="test/", message=str(i))
+    # the status still links every notification to the previous one
+    statuses = []
+    status = engine.pull(key="test/", prefix=False)[0]
+    while status is not None:
+        statuses.append(json.loads(status["value"].decode())["message"])
+        prev_rev = json.loads(status["value"].decode()).get("prev_rev")
+        status = engine.pull(key="test/", rev=prev_rev, prefix=False)[0] if prev_rev else None
+    assert statuses == ["4", "3", "2", "1", "0"]
+    engines[0].delete("test")
+
+
+@pytest.mark.parametrize("engine", engines)
+def test_push_many_with_status(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # 4 operations per transaction, so at most 3 keys with the status
+    monkeypatch.setattr("pyaviso.engine.etcd_engine.MAX_TXN_OPS", 4)
+    updates = [{"kvs": [{"key": f"test/test{i}", "value": str(i)}], "base_key": "test/"} for i in range(5)]
+    updates.append({"kvs": [{"key": "test2/test0", "value": "0"}], "base_key": "test2/"})
+    updates.append({"kvs": [{"key": "test/test0", "value": "again"}], "base_key": "test/"})
+    assert engine.push_many_with_status(updates) == [True] * 7
+    assert len(engine.pull(key="test/")) == 6
+    assert engine.pull(key="test/test0", prefix=False)[0]["value"] == b"again"
+    # one status update for each transaction, all linked together
+    status = json.loads(engine.pull(key="test/", prefix=False)[0]["value"].decode())
+    assert "prev_rev" in status
+    assert "test/test0" in status["message"]
+
+
+def test_status_chunks():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    updates = [{"kvs": [{"key": f"a/{i}", "value": "1"}], "base_key": "a/", "admin_key": "admin/a"} for i in range(200)]
+    updates += [
+        {"kvs": [{"key": "b/0", "value": "1"}], "base_key": "b/", "message": "m", "ttl": 10},
+        {"kvs": [{"key": "c/0", "value": "1"}], "base_key": "c/", "ttl": 10},
+        {"kvs": [{"key": "a/0", "value": "2"}], "base_key": "a/", "admin_key": "admin/a"},
+    ]
+    chunks = list(engines[0]._status_chunks(updates))
+    # the keys of the same base key are grouped, the status and the admin key count as operations
+    assert [len(indexes) for indexes, kvs, statuses, ttl in chunks] == [126, 75, 2]
+    indexes, kvs, statuses, ttl = chunks[1]
+    assert indexes[-1] == 202 and kvs[-1]["value"] == "2"
+    assert statuses == {"a/": ("; ".join([""] * 75), "admin/a")}
+    # base keys with the same ttl share the transaction
+    indexes, kvs, statuses, ttl = chunks[2]
+    assert statuses == {"b/": ("m", None), "c/": ("", None)} and ttl == 10
+
+
 @pytest.mark.parametrize("engine", engines)
 def test_listen(engine):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
@@ -228,6 +344,146 @@ def test_listen(engine):
     assert len(callback_list) == 2
 
 
+@pytest.mark.parametrize("engine", engines)
+def test_listen_many_keys(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append(key)
+
+    # listen to many keys, one is under another one
+    keys = [f"test{i}/" for i in range(20)] + ["test1/a/"]
+    assert engine.listen(keys, callback)
+    time.sleep(0.5)
+    # a single thread polls all of them
+    assert engine._scheduler is not None
+    assert len(engine._polled) == 21
+
+    # create a change for some of the keys
+    assert engine.push([{"key": "test3/a", "value": "1"}, {"key": "test1/a/b", "value": "1"}])
+    time.sleep(2)
+    assert sorted(callback_list) == ["test1/a/b", "test1/a/b", "test3/a"]
+
+    # stop listening, the scheduler stops as well
+    assert engine.stop()
+    time.sleep(2)
+    assert engine._scheduler is None
+
+
+@pytest.mark.parametrize("engine", [async_rest_engine(), async_grpc_engine()])
+def test_push_pull_delete_async(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+
+    async def run():
+        assert await engine.push_async([{"key": "test/a", "value": "1"}, {"key": "test/b", "value": "2"}])
+        kvs = await engine.pull_async("test/")
+        assert [kv["key"] for kv in kvs] == ["test/b", "test/a"]
+        assert [kv["key"] async for kv in engine.pull_iter_async("test/", key_only=True)] == ["test/b", "test/a"]
+        deleted = await engine.delete_async("test/")
+        assert len(deleted) == 2
+        assert await engine.pull_async("test/") == []
+        await engine.close_async()
+
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+@pytest.mark.parametrize("engine", [async_rest_engine(), async_grpc_engine()])
+def test_listen_async(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append(key)
+
+    async def run():
+        # all the keys are polled by a single task
+        keys = [f"test{i}/" for i in range(20)] + ["test1/a/"]
+        assert await engine.listen_async(keys, callback)
+        await asyncio.sleep(0.5)
+        assert engine._async_scheduler is not None
+        assert len(engine._async_polled) == 21
+
+        # create a change for some of the keys
+        assert await engine.push_with_status_async([{"key": "test3/a", "value": "1"}], base_key="test3/")
+        assert await engine.push_async([{"key": "test1/a/b", "value": "1"}])
+        await asyncio.sleep(2)
+        assert sorted(callback_list) == ["test1/a/b", "test1/a/b", "test3/a"]
+
+        # stop listening, the scheduler stops as well
+        assert engine.stop()
+        await asyncio.sleep(2)
+        assert engine._async_scheduler is None
+        await engine.close_async()
+
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+@pytest.mark.parametrize("engine_class", [EtcdRestEngine, EtcdGrpcEngine])
+def test_adaptive_polling(engine_class):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={"polling_interval_min": 0.2, "polling_interval_max": 1.6, "polling_jitter": 0},
+    )
+    engine = engine_class(c.notification_engine, auth.Auth.get_auth(c))
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append((key, engine.polling_intervals))
+
+    assert engine.listen(["test1/", "test2/"], callback)
+    # the interval grows while the keys are quiet
+    time.sleep(3)
+    assert engine.polling_intervals == {"test1/": 1.6, "test2/": 1.6}
+
+    # and drops to the min once a key changes
+    assert engine.push([{"key": "test1/a", "value": "1"}])
+    time.sleep(2)
+    assert callback_list == [("test1/a", {"test1/": 0.2, "test2/": 1.6})]
+    assert engine.stop()
+
+
+def test_covering_prefixes():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    groups = EtcdEngine._covering_prefixes(["a/b/", "a/", "ab", "c/d", "a/c", "c/e"])
+    assert groups == {"a/": ["a/", "a/b/", "a/c"], "ab": ["ab"], "c/d": ["c/d"], "c/e": ["c/e"]}
+
+
+@pytest.mark.parametrize("engine", [rest_watch_engine(), grpc_watch_engine()])
+def test_listen_watch(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    assert engine.listen_mode == ListenMode.WATCH
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append(key)
+
+    # listen to a test key
+    assert engine.listen(["test"], callback)
+    # wait a fraction to let the watch be created
+    time.sleep(0.5)
+
+    # create independent changes to the test key, they are delivered without waiting for any polling interval
+    kvs = [{"key": "test1", "value": "1"}]
+    assert engine.push(kvs)
+    kvs = [{"key": "test1", "value": "2"}]
+    assert engine.push(kvs)
+    time.sleep(0.5)
+    assert callback_list == ["test1", "test1"]
+
+    # stop listening
+    resp = engine.stop()
+    assert resp
+    time.sleep(1.5)
+
+    # repeat the push operation and check the function has NOT been triggered
+    kvs = [{"key": "test1", "value": "3"}]
+    assert engine.push(kvs)
+    time.sleep(0.5)
+    assert len(callback_list) == 2
+
+
 @pytest.mark.parametrize("engine", engines)
 def test_listen_old_state(engine):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
@@ -311,6 +567,86 @@ def test_find_revisions(engine):
     assert to_rev_found == second_revision
 
 
+@pytest.mark.parametrize("engine", engines)
+def test_find_revisions_index(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    margin = REVISION_INDEX_MARGIN
+    kvs = [{"key": "test/test", "value": "0"}]
+    assert engine.push_with_status(kvs, base_key="test/", message="test/test0")
+    index = [{"revision": engine._latest_revision("test/"), "timestamp": datetime.datetime.utcnow() - margin}]
+
+    time.sleep(0.1)
+    from_date = datetime.datetime.utcnow()
+    time.sleep(0.1)
+
+    # a few statuses between the dates
+    first_revision = None
+    for i in range(5):
+        kvs = [{"key": f"test/test{i}", "value": "0"}]
+        assert engine.push_with_status(kvs, base_key="test/", message=f"test/test{i}")
+        first_revision = first_revision or engine._latest_revision("test/")
+    second_revision = engine._latest_revision("test/")
+
+    time.sleep(0.1)
+    to_date = datetime.datetime.utcnow()
+    time.sleep(0.1)
+
+    for i in range(5):
+        kvs = [{"key": f"test/test{i}", "value": "1"}]
+        assert engine.push_with_status(kvs, base_key="test/", message=f"test/test{i}")
+
+    # the index has the revision of the server every margin
+    index.append({"revision": first_revision - 1, "timestamp": from_date + margin})
+    index.append({"revision": second_revision, "timestamp": to_date + margin})
+    for i in index:
+        i["timestamp"] = i["timestamp"].strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    engine._revision_index_key = "testindex"
+    assert engine.push([{"key": "testindex", "value": json.dumps(index)}])
+
+    # count the statuses retrieved
+    retrieved = []
+    retrieve_status_history = engine._retrieve_status_history
+
+    def counting_retrieve_status_history(key, rev=None):
+        retrieved.append(rev)
+        return retrieve_status_history(key, rev)
+
+    engine._retrieve_status_history = counting_retrieve_status_history
+    try:
+        assert engine._from_to_revisions("test/", from_date=from_date, to_date=to_date) == (
+            first_revision,
+            second_revision,
+        )
+        with_index = len(retrieved)
+        retrieved.clear()
+        engine._revision_index_key = None
+        assert engine._from_to_revisions("test/", from_date=from_date, to_date=to_date) == (
+            first_revision,
+            second_revision,
+        )
+        without_index = len(retrieved)
+    finally:
+        del engine._retrieve_status_history
+        engine._revision_index_key = "testindex"
+    # the status at the revision of each date is retrieved straight away
+    assert with_index == 3
+    assert without_index == 11
+
+
+def test_indexed_revision():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    date = datetime.datetime(2020, 1, 1)
+    index = [(date + datetime.timedelta(hours=h), 100 * h) for h in range(24)]
+    # the first revision later than the date by at least the margin
+    assert EtcdEngine._indexed_revision(index, date) == 100
+    assert EtcdEngine._indexed_revision(index, date + datetime.timedelta(hours=1)) == 200
+    assert EtcdEngine._indexed_revision(index, date + datetime.timedelta(minutes=50)) == 100
+    assert EtcdEngine._indexed_revision(index, date + datetime.timedelta(minutes=56)) == 200
+    assert EtcdEngine._indexed_revision(index, date - datetime.timedelta(days=1)) == 0
+    assert EtcdEngine._indexed_revision(index, date + datetime.timedelta(hours=23)) is None
+    assert EtcdEngine._indexed_revision([], date) is None
+
+
 @pytest.mark.parametrize("engine", engines)
 def test_find_revisions_limits_from(engine):
     time1 = datetime.datetime.utcnow()
@@ -481,12 +817,20 @@ def test_save_delete_state(engine):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
     # first save state revision
     last_rev = 10
-    assert engine._save_last_revision(last_rev)
-    assert engine._last_saved_revision() == last_rev
+    checkpoint = engine._checkpoint_store(["test1", "test2"])
+    checkpoint.update("test1", last_rev)
+    checkpoint.update("test2", last_rev + 1)
+    assert checkpoint.flush()
+    assert engine._checkpoint_store(["test2", "test1"]).load() == last_rev
+    assert [c["last_revision"] for c in engine.checkpoints()] == [last_rev]
+
+    # a different listener set has its own state
+    assert engine._checkpoint_store(["test1"]).load() == -1
 
     # delete it
-    engine._delete_saved_revision()
-    assert engine._last_saved_revision() == -1
+    assert engine.reset_checkpoints(["test1", "test2"])
+    assert engine._checkpoint_store(["test1", "test2"]).load() == -1
+    assert engine.checkpoints() == []
 
 
 @contextlib.contextmanager
@@ -520,3 +864,21 @@ def test_automatic_retry(engine, caplog):
         assert record.levelname != "ERROR"
     # check that it's trying again in the system log
     assert "Unable to connect to http://127.0.0.1:10001/v3/kv/range, trying again in" in caplog.text
+
+
+@pytest.mark.parametrize("engine_class", [EtcdRestEngine, EtcdGrpcEngine])
+def test_failover(engine_class, caplog):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the first endpoint is not reachable, the requests fail over to the second one
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml", notification_engine={"endpoints": ["127.0.0.1:10002", "localhost:2379"]}
+    )
+    engine = engine_class(c.notification_engine, auth.Auth.get_auth(c))
+    with caplog_for_logger(caplog):
+        assert engine.push([{"key": "test/test0", "value": "0"}])
+        for i in range(3):
+            assert len(engine.pull(key="test/")) == 1
+        assert engine.delete("test")
+    # the member not reachable is ejected
+    assert engine._members.members[0].failures > 0
+    assert "Member 127.0.0.1:10002 of the cluster is unhealthy" in caplog.text
@@ -0,0 +1,138 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import http.client
+import os
+
+import grpc
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from pyaviso import logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.etcd_grpc_engine import EtcdGrpcEngine
+from pyaviso.engine.etcd_rest_engine import EtcdRestEngine
+
+ENDPOINTS = ["member-1:2379", "member-2:2379"]
+
+
+class Unavailable(grpc.RpcError):
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+
+class NeverReady:
+    def result(self, timeout=None):
+        raise grpc.FutureTimeoutError()
+
+
+class Ready:
+    def result(self, timeout=None):
+        return None
+
+
+def config(engine_type: str) -> user_config.UserConfig:
+    return user_config.UserConfig(
+        conf_path="tests/config.yaml", notification_engine={"type": engine_type, "endpoints": ENDPOINTS}
+    )
+
+
+@pytest.fixture()
+def rest_engine() -> EtcdRestEngine:
+    c = config("etcd_rest")
+    e = EtcdRestEngine(c.notification_engine, auth.Auth.get_auth(c))
+    # the leader is not searched, the members are tried in the order configured
+    e._members._status = None
+    yield e
+    e.close()
+
+
+@pytest.fixture()
+def grpc_engine() -> EtcdGrpcEngine:
+    c = config("etcd_grpc")
+    e = EtcdGrpcEngine(c.notification_engine, auth.Auth.get_auth(c))
+    e._members._status = None
+    yield e
+    e.close()
+
+
+def rest_post(errors):
+    """
+    :param errors: error raised by each member
+    :return: a fake post recording the urls called
+    """
+    urls = []
+
+    def post(url, **kwargs):
+        urls.append(url)
+        raise errors[len(urls) - 1]
+
+    return post, urls
+
+
+def test_rest_write_not_connected(rest_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    refused = requests.exceptions.ConnectionError(
+        MaxRetryError(None, "/v3/kv/txn", NewConnectionError(None, "Connection refused"))
+    )
+    post, urls = rest_post([refused, requests.exceptions.ConnectTimeout(), refused])
+    monkeypatch.setattr(rest_engine._http, "post", post)
+    # the request has not been sent, it goes to the next member
+    with pytest.raises(requests.exceptions.ConnectTimeout):
+        rest_engine._write("kv/txn", {})
+    assert urls == ["http://member-1:2379/v3/kv/txn", "http://member-2:2379/v3/kv/txn"]
+
+
+def test_rest_write_sent(rest_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    aborted = requests.exceptions.ConnectionError(
+        ProtocolError("Connection aborted.", http.client.RemoteDisconnected("Remote end closed connection"))
+    )
+    post, urls = rest_post([aborted, aborted])
+    monkeypatch.setattr(rest_engine._http, "post", post)
+    # the request may have been applied, it is not sent again
+    with pytest.raises(requests.exceptions.ConnectionError):
+        rest_engine._write("kv/txn", {})
+    assert urls == ["http://member-1:2379/v3/kv/txn"]
+
+
+def test_grpc_txn_not_connected(grpc_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    member_1 = grpc_engine._servers["member-1:2379"]
+    monkeypatch.setattr(grpc, "channel_ready_future", lambda c: NeverReady() if c is member_1.channel else Ready())
+    called = []
+
+    def request(server):
+        called.append(server)
+        return "response"
+
+    # the channel of the first member never became ready, the request goes to the next one
+    assert grpc_engine._call(request, idempotent=False) == "response"
+    assert called == [grpc_engine._servers["member-2:2379"]]
+
+
+def test_grpc_txn_sent(grpc_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    monkeypatch.setattr(grpc, "channel_ready_future", lambda c: Ready())
+    called = []
+
+    def request(server):
+        called.append(server)
+        raise Unavailable()
+
+    # the stream has been reset once sent, the transaction may have been applied
+    with pytest.raises(Unavailable):
+        grpc_engine._call(request, idempotent=False)
+    assert called == [grpc_engine._servers["member-1:2379"]]
+
+    # reads are sent to the next member
+    called.clear()
+    with pytest.raises(Unavailable):
+        grpc_engine._call(request)
+    assert len(called) == 2
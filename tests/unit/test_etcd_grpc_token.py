@@ -0,0 +1,76 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import threading
+import time
+
+import grpc
+import pytest
+from etcd3.exceptions import WatchTimedOut
+
+from pyaviso import logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.etcd_grpc_engine import EtcdGrpcEngine
+
+
+class StreamInterrupted(grpc.RpcError):
+    pass
+
+
+class FakeWatchStub:
+    """
+    Watch service recording the credentials of each stream created, the first stream is interrupted on request
+    """
+
+    def __init__(self):
+        self.streams = []
+        self.interrupt = threading.Event()
+
+    def Watch(self, requests, credentials=None, metadata=None):
+        self.streams.append((credentials, metadata))
+        first = len(self.streams) == 1
+
+        def responses():
+            if first:
+                self.interrupt.wait()
+                raise StreamInterrupted()
+            threading.Event().wait()  # the next streams stay open
+            yield
+
+        return responses()
+
+
+@pytest.fixture()
+def engine() -> EtcdGrpcEngine:
+    c = user_config.UserConfig(conf_path="tests/config.yaml", notification_engine={"type": "etcd_grpc"})
+    e = EtcdGrpcEngine(c.notification_engine, auth.Auth.get_auth(c))
+    yield e
+    e.close()
+
+
+def test_watcher_token(engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    server = engine._servers[engine._members.members[0].address]
+    stub = FakeWatchStub()
+    server.watcher._watch_stub = stub
+    server.watcher.timeout = 0.1
+
+    # the stream of the watcher is created with the token
+    engine._set_token("token1")
+    with pytest.raises(WatchTimedOut):
+        server.watcher.add_callback("/tmp/aviso/test/", lambda response: None)
+    assert stub.streams[0] == (server.call_credentials, (("token", "token1"),))
+
+    # the stream created again after the refresh uses the new token
+    engine._set_token("token2")
+    stub.interrupt.set()
+    time.sleep(0.5)
+    assert len(stub.streams) == 2
+    assert stub.streams[1] == (server.call_credentials, (("token", "token2"),))
+    assert engine.auth.token == "token2"
@@ -0,0 +1,114 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import threading
+import time
+from shutil import rmtree
+
+import pytest
+from etcd3.etcdrpc import kv_pb2
+from etcd3.events import new_event
+from etcd3.watch import WatchResponse
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine import etcd_grpc_engine
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.etcd_grpc_engine import GRPC_OPTIONS, EtcdGrpcEngine
+
+KEY = "/tmp/aviso/test/"
+
+
+def event(key: str, rev: int):
+    kv = kv_pb2.KeyValue(key=key.encode(), value=b"1", mod_revision=rev, create_revision=rev, version=1)
+    return new_event(kv_pb2.Event(type=kv_pb2.Event.PUT, kv=kv))
+
+
+@pytest.fixture()
+def engine(monkeypatch) -> EtcdGrpcEngine:
+    options = []
+    client = etcd_grpc_engine.Etcd3Client
+
+    def create_client(*args, **kwargs):
+        options.append(kwargs.get("grpc_options"))
+        return client(*args, **kwargs)
+
+    monkeypatch.setattr(etcd_grpc_engine, "Etcd3Client", create_client)
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "etcd_grpc",
+            "endpoints": ["member-1:2379", "member-2:2379"],
+            "listen_mode": "watch",
+            "watch_progress_interval": 0.5,
+            "automatic_retry_delay": 0,
+        },
+    )
+    e = EtcdGrpcEngine(c.notification_engine, auth.Auth.get_auth(c))
+    e._members._status = None
+    # the channels ping the server to detect the connections dropped
+    assert options == [GRPC_OPTIONS, GRPC_OPTIONS]
+    yield e
+    e.stop()
+    e.close()
+    full_state_path = os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        rmtree(full_state_path, ignore_errors=True)
+
+
+def watch(engine: EtcdGrpcEngine, responses, monkeypatch):
+    """
+    :param responses: function called with the callback of each watch created, in turn
+    :return: the members watched, the arguments of each watch, the key-values received
+    """
+    members = []
+    watches = []
+    for address, server in engine._servers.items():
+
+        def add_watch(key, callback, address=address, **kwargs):
+            members.append(address)
+            watches.append(kwargs)
+            threading.Thread(target=responses.pop(0), args=(callback,), daemon=True).start()
+            return len(watches)
+
+        monkeypatch.setattr(server, "add_watch_prefix_callback", add_watch)
+        monkeypatch.setattr(server, "cancel_watch", lambda watch_id: None)
+    received = []
+    engine._add_checkpoint([KEY])
+    engine._add_listener(KEY)
+    t = threading.Thread(target=engine._watching, args=(KEY, 1, lambda kvs: received.extend(kvs)))
+    t.setDaemon(True)
+    t.start()
+    return members, watches, received
+
+
+def test_dead_stream(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the first member never answers, not even with progress notifications
+    responses = [lambda callback: None, lambda callback: callback(WatchResponse(None, [event(KEY + "1", 5)]))]
+    members, watches, received = watch(engine, responses, monkeypatch)
+    time.sleep(3)
+    assert all(w["progress_notify"] for w in watches)
+    # the watch is created again on the other member
+    assert len(members) == 2 and members[0] != members[1]
+    assert [kv["key"] for kv in received] == [KEY + "1"]
+
+
+def test_progress(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+
+    def progress(callback):
+        while KEY in engine._listeners:
+            callback(WatchResponse(None, []))
+            time.sleep(0.2)
+
+    members, watches, received = watch(engine, [progress], monkeypatch)
+    time.sleep(3)
+    # the progress notifications keep the watch alive
+    assert len(members) == 1
@@ -0,0 +1,135 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import base64
+import json
+import os
+import threading
+import time
+from shutil import rmtree
+
+import pytest
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.etcd_rest_engine import EtcdRestEngine
+
+KEY = "/tmp/aviso/test/"
+
+
+class FakeStream:
+    """
+    Watch stream of a member, it sends the lines given and then it hangs like a half-open connection
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.raw = None
+        self.status_code = 200
+        self.closed = threading.Event()
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        for line in self.lines:
+            yield line
+        self.closed.wait()
+
+    def close(self):
+        self.closed.set()
+
+
+def event(key: str, rev: int) -> bytes:
+    kv = {
+        "key": base64.b64encode(key.encode()).decode(),
+        "value": base64.b64encode(b"1").decode(),
+        "mod_revision": str(rev),
+        "create_revision": str(rev),
+        "version": "1",
+    }
+    return json.dumps({"result": {"events": [{"kv": kv}]}}).encode()
+
+
+@pytest.fixture()
+def engine(monkeypatch) -> EtcdRestEngine:
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "etcd_rest",
+            "endpoints": ["member-1:2379", "member-2:2379"],
+            "listen_mode": "watch",
+            "watch_progress_interval": 0.5,
+            "automatic_retry_delay": 0,
+        },
+    )
+    e = EtcdRestEngine(c.notification_engine, auth.Auth.get_auth(c))
+    monkeypatch.setattr(e, "_member_status", lambda member: (member.address, None))
+    yield e
+    e.stop()
+    full_state_path = os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        rmtree(full_state_path, ignore_errors=True)
+
+
+def watch(engine: EtcdRestEngine, streams, monkeypatch):
+    urls = []
+    bodies = []
+
+    def post(url, body, **kwargs):
+        urls.append(url.split("/")[2])
+        bodies.append(body)
+        return streams.pop(0)
+
+    monkeypatch.setattr(engine, "_post", post)
+    received = []
+    engine._add_checkpoint([KEY])
+    engine._add_listener(KEY)
+    t = threading.Thread(target=engine._watching, args=(KEY, 1, lambda kvs: received.extend(kvs)))
+    t.setDaemon(True)
+    t.start()
+    return urls, bodies, received
+
+
+def test_dead_stream(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the first member never answers, not even with progress notifications
+    streams = [FakeStream([]), FakeStream([event(KEY + "1", 5)])]
+    urls, bodies, received = watch(engine, streams, monkeypatch)
+    time.sleep(3)
+    assert all(b["create_request"]["progress_notify"] for b in bodies)
+    # the watch is created again on the other member
+    assert len(urls) == 2 and urls[0] != urls[1]
+    assert [kv["key"] for kv in received] == [KEY + "1"]
+
+
+def test_progress(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    progress = json.dumps({"result": {"header": {"revision": "5"}}}).encode()
+
+    class ProgressStream(FakeStream):
+        def iter_lines(self):
+            while not self.closed.wait(0.2):
+                yield progress
+
+    urls, bodies, received = watch(engine, [ProgressStream([])], monkeypatch)
+    time.sleep(3)
+    # the progress notifications keep the stream alive
+    assert len(urls) == 1
+
+
+def test_interrupted_stream(engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    canceled = json.dumps({"result": {"canceled": True}}).encode()
+    streams = [FakeStream([canceled]), FakeStream([event(KEY + "1", 5)])]
+    urls, bodies, received = watch(engine, streams, monkeypatch)
+    time.sleep(1)
+    # the watch fails over to the other member straight away
+    assert len(urls) == 2 and urls[0] != urls[1]
+    assert [kv["key"] for kv in received] == [KEY + "1"]
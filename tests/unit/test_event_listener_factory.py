@@ -14,7 +14,9 @@ import yaml
 
 from pyaviso import logger, user_config
 from pyaviso.authentication import auth
+from pyaviso.custom_exceptions import EventListenerException
 from pyaviso.engine import engine_factory as ef
+from pyaviso.event_listeners import event_listener as el
 from pyaviso.event_listeners import event_listener_factory as elf
 
 
@@ -208,3 +210,64 @@ def test_multiple_listener(conf: user_config.UserConfig, schema):
     for listener in listeners:
         assert listener.keys is not None
         assert listener.keys[0]  # this will fail if the path was an empty string
+
+
+def test_parse_key(conf: user_config.UserConfig, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    authenticator = auth.Auth.get_auth(conf)
+    engine_factory: ef.EngineFactory = ef.EngineFactory(conf.notification_engine, authenticator)
+    listener_factory = elf.EventListenerFactory(engine_factory, schema)
+    with open("tests/unit/fixtures/good_listeners/basic_flight_listener.yaml", "r") as f:
+        listeners_dict = yaml.safe_load(f.read())
+    listener = listener_factory.create_listeners(listeners_dict).pop()
+    notification = listener.parse_key("/tmp/aviso/flight/italy/20210101/FCO/AZ203")
+    assert notification == {"country": "italy", "date": "20210101", "airport": "FCO", "number": "AZ203"}
+    # the key format is compiled once for the listener
+    parser = listener.key_parser
+    listener.parse_key("/tmp/aviso/flight/germany/20210101/FRA/LH400")
+    assert listener.key_parser is parser
+    with pytest.raises(EventListenerException):
+        listener.parse_key("/tmp/aviso/other/italy")
+
+
+def test_key_expansion(conf: user_config.UserConfig, schema):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    engine = ef.EngineFactory(conf.notification_engine, auth.Auth.get_auth(conf)).create_engine()
+    mars_schema = {
+        "endpoint": [
+            {
+                "engine": ["etcd_rest", "etcd_grpc", "file_based", "in_memory"],
+                "base": "/tmp/aviso/mars/{class}/date={date},time={time:0>2},step={step}",
+                "stem": "/{expver}",
+            }
+        ],
+        "request": {
+            "class": [{"type": "StringHandler"}],
+            "date": [{"type": "IntHandler"}],
+            "time": [{"type": "IntHandler"}],
+            "step": [{"type": "IntHandler"}],
+            "expver": [{"type": "StringHandler"}],
+        },
+    }
+    request = {"class": "od", "date": 20210101, "time": [0, 12], "step": [1, 2, 3]}
+    listener = el.EventListener("mars", engine, request, [{"type": "echo"}], mars_schema)
+    assert len(listener.keys) == 6
+    assert listener.keys[0] == "/tmp/aviso/mars/od/date=20210101,time=00,step=1/"
+    assert listener.keys[-1] == "/tmp/aviso/mars/od/date=20210101,time=12,step=3/"
+
+    # too many keys, the steps are left to the filter
+    request = {"class": "od", "date": list(range(20210101, 20210111)), "time": [0, 12], "step": list(range(100))}
+    listener = el.EventListener("mars", engine, request, [{"type": "echo"}], mars_schema)
+    assert len(listener.keys) == 20
+    assert listener.keys[0] == "/tmp/aviso/mars/od/date=20210101,time=00,step="
+    assert listener.keys[-1] == "/tmp/aviso/mars/od/date=20210110,time=12,step="
+    assert listener.filter["step"] == [str(s) for s in range(100)]
+
+    # a list too large on the first attribute leaves a single prefix
+    request = {"class": [f"c{i}" for i in range(200)], "date": 20210101, "time": 0, "step": 1}
+    listener = el.EventListener("mars", engine, request, [{"type": "echo"}], mars_schema)
+    assert listener.keys == ["/tmp/aviso/mars/"]
+
+    # the list literals are parsed, not evaluated
+    assert el.EventListener._list_literal("[1, 'a']") == [1, "a"]
+    assert el.EventListener._list_literal("[__import__('os')]") == "[__import__('os')]"
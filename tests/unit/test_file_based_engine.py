@@ -6,7 +6,9 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 
+import datetime
 import os
+import threading
 import time
 from shutil import rmtree
 
@@ -104,3 +106,91 @@ def test_listen(test_engine):
     # wait a fraction and check the function has NOT been triggered
     time.sleep(1)
     assert len(callback_list) == 2
+
+
+def test_listen_many_keys(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append(key)
+
+    # a single reactor serves all the keys
+    keys = [f"/tmp/aviso/test/{i}/" for i in range(100)]
+    assert test_engine.listen(keys, callback)
+    time.sleep(0.5)
+    reactor = test_engine._reactor
+    assert reactor is not None
+
+    for i in range(200):
+        assert test_engine.push([{"key": f"/tmp/aviso/test/{i % 100}/test{i}", "value": str(i)}])
+    time.sleep(1)
+    assert len(callback_list) == 200
+    assert test_engine._reactor is reactor
+
+    # the reactor stops with the last key
+    assert test_engine.stop()
+    time.sleep(1.5)
+    assert test_engine._reactor is None
+
+
+def test_slow_trigger(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    callback_list = []
+    release = threading.Event()
+
+    def slow_callback(key, value):
+        release.wait(5)
+
+    # a trigger still running does not hold the listening of new keys
+    assert test_engine.listen(["/tmp/aviso/test/slow/"], slow_callback)
+    time.sleep(0.5)
+    assert test_engine.push([{"key": "/tmp/aviso/test/slow/test1", "value": "1"}])
+    time.sleep(1.5)
+    try:
+        start = time.monotonic()
+        assert test_engine.listen(["/tmp/aviso/test/fast/"], lambda key, value: callback_list.append(key))
+        time.sleep(0.5)
+        assert "/tmp/aviso/test/fast/" in test_engine._reacting
+        assert time.monotonic() - start < 2
+    finally:
+        release.set()
+    assert test_engine.push([{"key": "/tmp/aviso/test/fast/test1", "value": "1"}])
+    time.sleep(1.5)
+    assert callback_list == ["/tmp/aviso/test/fast/test1"]
+
+
+def test_pull_min_rev(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    assert test_engine.push([{"key": "/tmp/aviso/test/test1", "value": "1"}])
+    rev = test_engine.change_log.revision
+    assert test_engine.push([{"key": "/tmp/aviso/test/test2", "value": "2"}])
+    assert test_engine.push([{"key": "/tmp/aviso/test/sub/test3", "value": "3"}])
+
+    assert len(test_engine.pull(key="/tmp/aviso/test", min_rev=rev)) == 3
+    assert len(test_engine.pull(key="/tmp/aviso/test/", min_rev=rev + 1)) == 2
+    assert len(test_engine.pull(key="/tmp/aviso/test/", min_rev=rev + 1, prefix=False)) == 1
+    assert len(test_engine.pull(key="/tmp/aviso/test", min_rev=rev, max_rev=rev)) == 1
+
+    # the keys deleted are not returned
+    test_engine.push([], ks_delete=["/tmp/aviso/test/sub"])
+    assert len(test_engine.pull(key="/tmp/aviso/test", min_rev=rev)) == 2
+
+
+def test_replay(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    assert test_engine.push([{"key": "/tmp/aviso/test/test0", "value": "0"}])
+    time.sleep(0.1)
+    from_date = datetime.datetime.utcnow()
+    for i in range(1, 3):
+        assert test_engine.push([{"key": f"/tmp/aviso/test/test{i}", "value": str(i)}])
+    callback_list = []
+
+    assert test_engine.listen(
+        ["/tmp/aviso/test"],
+        lambda k, v: callback_list.append(k),
+        from_date=from_date,
+        to_date=datetime.datetime.utcnow(),
+    )
+    time.sleep(0.5)
+    assert callback_list == ["/tmp/aviso/test/test1", "/tmp/aviso/test/test2"]
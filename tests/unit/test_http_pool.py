@@ -0,0 +1,69 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+from pyaviso import logger
+from pyaviso.engine.http_pool import HttpConnectionPool
+
+URL = "http://member-1:2379/v3/kv/range"
+
+
+def fake_post(pool: HttpConnectionPool, monkeypatch):
+    """
+    :return: the host pool of the adapter used by each request, no request is sent
+    """
+    used = []
+
+    def post(url, **kwargs):
+        used.append(pool._adapter.poolmanager.connection_from_url(url))
+
+    monkeypatch.setattr(pool._session, "post", post)
+    return used
+
+
+def test_idle_timeout(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    now = [1000]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    pool = HttpConnectionPool(idle_timeout=60)
+    used = fake_post(pool, monkeypatch)
+
+    # the connections are reused while the pool is in use
+    pool.post(URL)
+    now[0] += 59
+    pool.post(URL)
+    now[0] += 59
+    pool.post(URL)
+    assert used[0] is used[1] is used[2]
+    assert len(pool._adapter.poolmanager.pools) == 1
+
+    # they are dropped once the pool has been idle for longer than the timeout
+    now[0] += 61
+    pool.post(URL)
+    assert used[3] is not used[2]
+    now[0] += 1
+    pool.post(URL)
+    assert used[4] is used[3]
+    pool.close()
+    assert len(pool._adapter.poolmanager.pools) == 0
+
+
+def test_no_idle_timeout(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    now = [1000]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    pool = HttpConnectionPool(idle_timeout=None)
+    used = fake_post(pool, monkeypatch)
+    pool.post(URL)
+    now[0] += 3600
+    pool.post(URL)
+    # the connections are never dropped
+    assert used[0] is used[1]
+    pool.close()
@@ -0,0 +1,257 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import asyncio
+import datetime
+import json
+import os
+import threading
+import time
+from shutil import rmtree
+
+import pytest
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.custom_exceptions import EngineHistoryNotAvailableError
+from pyaviso.engine.async_etcd_engine import AsyncEtcdEngine
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+
+
+@pytest.fixture()
+def test_engine():  # this automatically configure the logging
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={"type": "in_memory", "host": "test", "port": 1, "polling_interval": 1},
+    )
+    authenticator = auth.Auth.get_auth(c)
+    engine = InMemoryEngine(c.notification_engine, authenticator)
+    return engine
+
+
+@pytest.fixture(autouse=True)
+def pre_post_test(test_engine):
+    # delete the revision state
+    full_home_path = os.path.expanduser(HOME_FOLDER)
+    full_state_path = os.path.join(full_home_path, LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        try:
+            rmtree(full_state_path)
+        except Exception:
+            pass
+    yield
+    # delete all the keys at the end of the test
+    test_engine.stop()
+    test_engine.delete("test")
+
+
+def test_push_pull_delete(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    kvs = [{"key": "test/test1", "value": "1"}, {"key": "test/test2", "value": "2"}]
+    assert test_engine.push(kvs)
+    rev = test_engine.store.revision
+    assert len(test_engine.pull(key="test")) == 2
+
+    # modify one and delete the other
+    assert test_engine.push([{"key": "test/test1", "value": "3"}], ["test/test2"])
+    resp = test_engine.pull(key="test")
+    assert len(resp) == 1
+    assert resp[0]["value"] == b"3" and resp[0]["version"] == 2
+
+    # the past revision is still available until compacted
+    assert len(test_engine.pull(key="test", rev=rev)) == 2
+    test_engine.compact(test_engine.store.revision)
+    with pytest.raises(EngineHistoryNotAvailableError):
+        test_engine.pull(key="test", rev=rev)
+
+
+def test_engines_share_store(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(conf_path="tests/config.yaml", notification_engine={"type": "in_memory", "host": "test"})
+    c.notification_engine.port = 1
+    other = InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+    assert other.store is test_engine.store
+    assert test_engine.push([{"key": "test/test1", "value": "1"}])
+    assert len(other.pull(key="test")) == 1
+
+
+def test_push_with_status(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    for i in range(3):
+        assert test_engine.push_with_status([{"key": f"test/test{i}", "value": str(i)}], "test/", message=str(i))
+
+    # each status links to the revision of the previous one
+    status = test_engine.pull(key="test/", prefix=False)[0]
+    revs = []
+    while status:
+        revs.append(status["mod_rev"])
+        prev_rev = json.loads(status["value"].decode()).get("prev_rev")
+        status = test_engine.pull(key="test/", rev=prev_rev, prefix=False)[0] if prev_rev else None
+    assert len(revs) == 3 and revs == sorted(revs, reverse=True)
+
+
+def test_listen_catchup(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    callback_list = []
+
+    def callback(key, value):
+        callback_list.append(value)
+
+    assert test_engine.listen(["test/"], callback)
+    time.sleep(0.5)
+    assert test_engine.push_with_status([{"key": "test/test1", "value": "1"}], "test/")
+    time.sleep(1.5)
+    assert callback_list == ["1"]
+
+    # the notification sent while not listening is caught up
+    assert test_engine.stop()
+    assert test_engine.push_with_status([{"key": "test/test1", "value": "2"}], "test/")
+    assert test_engine.listen(["test/"], callback)
+    time.sleep(1.5)
+    assert callback_list == ["1", "2"]
+
+
+def test_listen_pages(test_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # make the pages smaller than the changes to deliver
+    monkeypatch.setattr("pyaviso.engine.in_memory_engine.MAX_TXN_KV_RETURNED", 2)
+    monkeypatch.setattr("pyaviso.engine.in_memory_engine.MAX_KV_RETURNED", 2)
+    deliveries = []
+    deliver = test_engine._deliver
+
+    def recording_deliver(key, kvs, next_rev, trigger_callback):
+        deliveries.append((len(kvs), next_rev))
+        deliver(key, kvs, next_rev, trigger_callback)
+
+    monkeypatch.setattr(test_engine, "_deliver", recording_deliver)
+    callback_list = []
+    assert test_engine.listen(["test/"], lambda key, value: callback_list.append(value))
+    time.sleep(1.5)
+    deliveries.clear()
+    assert test_engine.push([{"key": f"test/test{i}", "value": str(i)} for i in range(5)])
+    time.sleep(1.5)
+    assert sorted(callback_list) == [str(i) for i in range(5)]
+    # delivered a page at the time, the checkpoint moves only with the last one
+    changes = [d for d in deliveries if d[0] > 0]
+    assert [n for n, _ in changes] == [2, 2, 1]
+    assert [rev is None for _, rev in changes] == [True, True, False]
+
+
+def test_listen_batch_limit(test_engine, monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the ranges batched in a transaction return fewer changes than the pages of a single range
+    monkeypatch.setattr("pyaviso.engine.in_memory_engine.MAX_TXN_KV_RETURNED", 2)
+    ranges = []
+    store_ranges = test_engine.store.ranges
+
+    def recording_ranges(batch, limit):
+        ranges.append(limit)
+        return store_ranges(batch, limit)
+
+    monkeypatch.setattr(test_engine.store, "ranges", recording_ranges)
+    callback_list = []
+    assert test_engine.listen(["test/a/", "test/b/"], lambda key, value: callback_list.append(key))
+    time.sleep(1.5)
+    assert test_engine.push([{"key": f"test/a/test{i}", "value": str(i)} for i in range(5)])
+    time.sleep(1.5)
+    # the busy prefix is retrieved a page at the time
+    assert sorted(callback_list) == [f"test/a/test{i}" for i in range(5)]
+    assert set(ranges) == {2}
+
+
+def test_replay(test_engine):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    assert test_engine.push_with_status([{"key": "test/test0", "value": "0"}], "test/")
+    time.sleep(0.1)
+    from_date = datetime.datetime.utcnow()
+    time.sleep(0.1)
+    for i in range(1, 3):
+        assert test_engine.push_with_status([{"key": f"test/test{i}", "value": str(i)}], "test/")
+    callback_list = []
+
+    assert test_engine.listen(
+        ["test/"], lambda k, v: callback_list.append(k), from_date=from_date, to_date=datetime.datetime.utcnow()
+    )
+    time.sleep(1)
+    assert sorted(callback_list) == ["test/test1", "test/test2"]
+
+
+class AsyncInMemoryEngine(AsyncEtcdEngine, InMemoryEngine):
+    """
+    In-memory engine exposing the coroutines of the asynchronous engines
+    """
+
+    async def _pull_page_async(self, key, range_end=None, key_only=False, rev=None, min_rev=None, max_rev=None):
+        return self._pull_page(key, range_end, key_only, rev, min_rev, max_rev)
+
+    async def _pull_batch_async(self, ranges):
+        return self._pull_batch(ranges)
+
+    async def _latest_revision_async(self, key):
+        return self._latest_revision(key)
+
+    async def push_async(self, kvs, ks_delete=None, ttl=None):
+        return self.push(kvs, ks_delete, ttl)
+
+    async def delete_async(self, key, prefix=True):
+        return self.delete(key, prefix)
+
+    async def _lease_async(self, ttl):
+        return self._lease(ttl)
+
+    async def _push_if_statuses_async(self, kvs, ks_delete, lease, status_revs):
+        return self._push_if_statuses(kvs, ks_delete, lease, status_revs)
+
+    async def close_async(self):
+        pass
+
+
+def test_listen_async_slow_trigger():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={
+            "type": "in_memory",
+            "host": "test_async",
+            "port": 1,
+            "polling_interval": 0.1,
+            "trigger_workers": 2,
+            "trigger_ordering": "key",
+        },
+    )
+    engine = AsyncInMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+    release = threading.Event()
+    received = []
+
+    def callback(key, value):
+        if key.startswith("test/a/"):
+            release.wait()
+        received.append(key)
+
+    async def run():
+        assert await engine.listen_async(["test/a/"], callback)
+        assert await engine.listen_async(["test/b/"], callback)
+        await asyncio.sleep(0.5)
+        assert engine.push([{"key": "test/a/1", "value": "1"}])
+        await asyncio.sleep(0.5)
+        # the trigger of test/a/ is still running, the polling of test/b/ goes on
+        assert engine.push([{"key": "test/b/1", "value": "1"}])
+        await asyncio.sleep(0.5)
+        assert received == ["test/b/1"]
+        release.set()
+        await asyncio.sleep(0.5)
+        assert received == ["test/b/1", "test/a/1"]
+        engine.stop()
+        await asyncio.sleep(0.2)
+
+    try:
+        asyncio.new_event_loop().run_until_complete(run())
+    finally:
+        release.set()
+        engine.close()
@@ -0,0 +1,73 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import base64
+import json
+import os
+
+import pytest
+
+from pyaviso import logger
+from pyaviso.engine import key_value
+from pyaviso.engine.key_value import KeyValue, decode_kvs
+
+
+def raw_kv(key: str, value: str) -> dict:
+    return {
+        "key": base64.b64encode(key.encode()).decode(),
+        "value": base64.b64encode(value.encode()).decode(),
+        "version": "2",
+        "create_revision": "10",
+        "mod_revision": "12",
+    }
+
+
+def test_decode():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    kvs = decode_kvs([raw_kv("/test/1", "a"), raw_kv("/test/2", "")])
+    assert kvs[0] == {"key": "/test/1", "value": b"a", "version": 2, "create_rev": 10, "mod_rev": 12}
+    assert kvs[1]["value"] == b""
+
+    # the empty values are omitted by the gateway
+    raw = raw_kv("/test/3", "")
+    del raw["value"]
+    assert decode_kvs([raw])[0]["value"] == b""
+
+    # only the keys
+    kv = decode_kvs([raw_kv("/test/1", "a")], key_only=True)[0]
+    assert "value" not in kv
+    assert kv.get("value") is None
+    with pytest.raises(KeyError):
+        kv["value"]
+    assert kv.keys() == ["key", "version", "create_rev", "mod_rev"]
+
+
+def test_read_as_dict():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    kv = KeyValue("/test/1", b"a", 1, 5, 5)
+    assert kv["key"] == kv.key == "/test/1"
+    assert "mod_rev" in kv
+    assert "other" not in kv
+    assert kv.get("other", 0) == 0
+    with pytest.raises(KeyError):
+        kv["other"]
+    assert dict(kv) == kv.to_dict()
+    assert kv == KeyValue("/test/1", b"a", 1, 5, 5)
+    assert kv != KeyValue("/test/1", b"b", 2, 5, 6)
+    # no dictionary is allocated for each instance
+    with pytest.raises(AttributeError):
+        kv.__dict__
+
+
+def test_loads(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    body = json.dumps({"header": {"revision": "3"}, "kvs": [raw_kv("/test/1", "a")]}).encode()
+    parsed = key_value.loads(body)
+    # same result with the standard json module
+    monkeypatch.setattr(key_value, "orjson", None)
+    assert key_value.loads(body) == parsed == json.loads(body)
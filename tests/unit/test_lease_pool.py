@@ -0,0 +1,73 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+import pytest
+
+from pyaviso import logger
+from pyaviso.engine.lease_pool import LeasePool
+
+
+def test_shared_lease(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    now = [1000]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    pool = LeasePool(granularity=60)
+
+    # the new lease expires at the end of the bucket, never before the ttl
+    bucket, lease_ttl = pool.bucket(3600)
+    assert pool.get(bucket) is None
+    assert lease_ttl == 3620
+    pool.add(bucket, "lease1")
+
+    # the keys expiring in the same bucket share it, also with a different ttl
+    now[0] += 10
+    assert pool.get(pool.bucket(3600)[0]) == "lease1"
+    assert pool.get(pool.bucket(3605)[0]) == "lease1"
+
+    # a new lease is needed once the keys would outlive it
+    now[0] += 20
+    bucket, lease_ttl = pool.bucket(3600)
+    assert pool.get(bucket) is None
+    assert lease_ttl == 3650
+    pool.add(bucket, "lease2")
+    assert len(pool) == 2
+
+    # the expired leases are dropped
+    now[0] += 3700
+    pool.add(pool.bucket(3600)[0], "lease3")
+    assert len(pool) == 1
+
+
+def test_short_ttl(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    monkeypatch.setattr(time, "monotonic", lambda: 1000.5)
+    pool = LeasePool(granularity=60, max_extension=0.1)
+    # the buckets are narrowed to 10% of the ttl
+    assert pool.bucket(100) == ((10, 111), 110)
+    # and the pool is not used if they would be shorter than a second
+    assert pool.bucket(5) == (None, 5)
+    pool.add(None, "lease")
+    assert pool.get(None) is None
+    # as if disabled
+    assert LeasePool(granularity=0).bucket(3600) == (None, 3600)
+
+
+def test_discard():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    pool = LeasePool()
+    bucket, lease_ttl = pool.bucket(3600)
+    pool.add(bucket, "lease")
+    # a lease refused by the server is not used again
+    pool.discard("lease")
+    assert pool.get(bucket) is None
+    pool.discard(None)
+    with pytest.raises(AssertionError):
+        LeasePool(granularity=-1)
@@ -0,0 +1,53 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+from pyaviso import logger, user_config
+from pyaviso.event_listeners.listener_file_watcher import ListenerFileWatcher
+
+user_config.UserConfig(conf_path="tests/config.yaml")  # this automatically configure the logging
+
+
+def test_check(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    listener_file = tmp_path / "listener.yaml"
+    listener_file.write_text("listeners: []\n")
+    changes = []
+    watcher = ListenerFileWatcher([str(listener_file)], lambda: changes.append(True))
+    assert not watcher.check()
+    listener_file.write_text("listeners:\n  - event: flight\n")
+    assert watcher.check()
+    assert not watcher.check()
+    # a file removed is a change too
+    listener_file.unlink()
+    assert watcher.check()
+    assert len(changes) == 2
+
+
+def test_watch(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    listener_file = tmp_path / "listener.yaml"
+    listener_file.write_text("listeners: []\n")
+    changes = []
+
+    def on_change():
+        changes.append(True)
+        raise ValueError("invalid listeners")  # errors are logged, the watching goes on
+
+    watcher = ListenerFileWatcher([str(listener_file)], on_change, interval=0.1)
+    watcher.start()
+    try:
+        listener_file.write_text("listeners:\n  - event: flight\n")
+        time.sleep(0.5)
+        listener_file.write_text("listeners:\n  - event: flight\n    request: {}\n")
+        time.sleep(0.5)
+    finally:
+        watcher.stop()
+    assert len(changes) == 2
@@ -0,0 +1,101 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+from pyaviso import logger
+from pyaviso.engine.member_pool import MemberPool
+
+endpoints = [("etcd-1", 2379), ("etcd-2", 2379), ("etcd-3", 2379)]
+
+
+class Cluster:
+    """
+    Fake cluster answering the status of its members
+    """
+
+    def __init__(self, leader: str):
+        self.leader = leader
+        self.down = set()
+        self.probed = []
+
+    def status(self, member):
+        self.probed.append(member.host)
+        if member.host in self.down:
+            raise ConnectionError(f"{member} is down")
+        return hash(member.host), hash(self.leader)
+
+
+def test_single_member():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    pool = MemberPool(endpoints[:1])
+    member = pool.members[0]
+    assert pool.order() == [member]
+    assert pool.order(serializable=True) == [member]
+    # a single member is always tried
+    pool.failed(member)
+    assert pool.order() == [member]
+
+
+def test_serializable_rotation():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    pool = MemberPool(endpoints)
+    firsts = [pool.order(serializable=True)[0].host for _ in range(6)]
+    # the reads are spread evenly across the members
+    assert sorted(firsts) == ["etcd-1", "etcd-1", "etcd-2", "etcd-2", "etcd-3", "etcd-3"]
+    assert all(len(pool.order(serializable=True)) == 3 for _ in range(3))
+
+
+def test_leader_first():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    cluster = Cluster(leader="etcd-2")
+    pool = MemberPool(endpoints, status=cluster.status)
+    assert [m.host for m in pool.order()] == ["etcd-2", "etcd-1", "etcd-3"]
+    assert pool.leader.host == "etcd-2"
+    # the leader is cached
+    probed = len(cluster.probed)
+    pool.order()
+    assert len(cluster.probed) == probed
+
+    # the leader failing is searched again
+    cluster.leader = "etcd-3"
+    cluster.down.add("etcd-2")
+    pool.failed(pool.leader)
+    assert pool.leader is None
+    assert [m.host for m in pool.order()] == ["etcd-3", "etcd-1", "etcd-2"]
+
+
+def test_ejection():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    cluster = Cluster(leader="etcd-1")
+    pool = MemberPool(endpoints, status=cluster.status, ejection_time=0.2, max_ejection_time=0.3)
+    first = pool.members[0]
+    cluster.down.add("etcd-1")
+    pool.failed(first)
+    # the member ejected is tried last
+    for _ in range(3):
+        assert pool.order(serializable=True)[-1] is first
+
+    # the ejection grows with the failures up to the max
+    pool.failed(first)
+    assert first.ejected_until - time.monotonic() > 0.2
+    pool.failed(first)
+    assert first.ejected_until - time.monotonic() <= 0.3
+
+    # once expired the member is probed, still down it is ejected again
+    time.sleep(0.3)
+    assert pool.order(serializable=True)[-1] is first
+    assert first.failures == 4
+
+    # back up it is used again
+    cluster.down.remove("etcd-1")
+    time.sleep(0.3)
+    pool.order(serializable=True)
+    assert first.failures == 0
+    assert first in [pool.order(serializable=True)[0] for _ in range(3)]
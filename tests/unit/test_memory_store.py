@@ -0,0 +1,127 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+
+import pytest
+
+from pyaviso import logger
+from pyaviso.custom_exceptions import EngineException, EngineHistoryNotAvailableError
+from pyaviso.engine.memory_store import MemoryStore
+
+
+def keys(kvs):
+    return [kv["key"] for kv in kvs]
+
+
+def test_revisions():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    store = MemoryStore()
+    assert store.txn([("test/a", "1", None), ("test/b", "1", None)])[:2] == (True, 2)
+    store.txn([("test/a", "2", None)])
+    store.delete_range("test/b")
+
+    # the latest revision
+    kvs, more, rev = store.range("test/", b"test0")
+    assert rev == 4 and not more
+    assert kvs == [{"key": "test/a", "version": 2, "create_rev": 2, "mod_rev": 3, "value": b"2"}]
+
+    # a past revision, sorted by key in descending order
+    kvs = store.range("test/", b"test0", rev=2)[0]
+    assert keys(kvs) == ["test/b", "test/a"]
+    assert kvs[1]["value"] == b"1"
+
+    # filters and limit
+    assert keys(store.range("test/", b"test0", rev=3, min_rev=3)[0]) == ["test/a"]
+    assert keys(store.range("test/", b"test0", rev=3, max_rev=2)[0]) == ["test/b"]
+    kvs, more, rev = store.range("test/", b"test0", rev=2, limit=1)
+    assert keys(kvs) == ["test/b"] and more
+    assert "value" not in store.range("test/a", key_only=True)[0][0]
+
+    with pytest.raises(EngineException):
+        store.range("test/", b"test0", rev=5)
+
+
+def test_txn_compare():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    store = MemoryStore()
+    assert store.txn([("status", "1", None)], compares={"status": 0})[0]
+    pushed, rev, current = store.txn([("status", "2", None), ("a", "2", None)], compares={"status": 0})
+    assert not pushed and rev == 2
+    assert current["status"][0]["value"] == b"1"
+    assert len(store) == 1
+    assert store.txn([("status", "2", None), ("a", "2", None)], compares={"status": 2})[:2] == (True, 3)
+
+    with pytest.raises(EngineException):
+        store.txn([("a", "3", None), ("a", "4", None)])
+    with pytest.raises(EngineException):
+        store.txn([("a", "3", 100)])
+    assert store.revision == 3
+
+
+def test_lease_expiry(monkeypatch):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    now = [1000]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    store = MemoryStore()
+    lease = store.grant(10)
+    store.txn([("a", "1", lease), ("b", "1", lease), ("c", "1", None)])
+    now[0] += 5
+    assert len(store) == 3
+
+    # the keys of the lease are deleted in a new revision
+    now[0] += 5
+    assert keys(store.range("", b"\0")[0]) == ["c"]
+    assert store.revision == 3
+    with pytest.raises(EngineException):
+        store.txn([("a", "2", lease)])
+
+
+def test_compaction():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    store = MemoryStore()
+    for i in range(5):
+        store.txn([("a", str(i), None)])
+    store.txn([("b", "1", None)])
+    store.delete_range("b")
+    store.compact(4)
+
+    # the revisions after the compaction are still readable
+    assert store.range("a", rev=4)[0][0]["value"] == b"2"
+    assert store.range("a", rev=5)[0][0]["value"] == b"3"
+    with pytest.raises(EngineHistoryNotAvailableError):
+        store.range("a", rev=3)
+    with pytest.raises(EngineException):
+        store.compact(4)
+
+    # the deleted keys are dropped once compacted
+    store.compact(store.revision)
+    assert store.range("b", b"c")[0] == []
+    assert store.range("a")[0][0]["version"] == 5
+
+
+def test_log_replay(tmp_path):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    path = str(tmp_path / "store.log")
+    store = MemoryStore(path)
+    lease = store.grant(3600)
+    store.txn([("test/a", "1", lease), ("test/b", b"\xff", None)])
+    store.txn([("test/a", "2", lease)])
+    store.delete_range("test/b")
+    store.compact(3)
+    store.close()
+
+    replayed = MemoryStore(path)
+    assert replayed.revision == store.revision
+    assert replayed.compact_revision == 3
+    assert replayed.range("test/", b"test0")[0] == store.range("test/", b"test0")[0]
+    assert replayed.range("test/b", rev=3)[0][0]["value"] == b"\xff"
+    # the lease is still valid
+    replayed.txn([("test/c", "1", lease)])
+    replayed.close()
@@ -0,0 +1,91 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import os
+import time
+from shutil import rmtree
+
+import pytest
+
+from pyaviso import HOME_FOLDER, logger, user_config
+from pyaviso.authentication import auth
+from pyaviso.engine import DedupPolicy
+from pyaviso.engine.etcd_engine import LOCAL_STATE_FOLDER
+from pyaviso.engine.in_memory_engine import InMemoryEngine
+from pyaviso.engine.notification_dedup import NotificationDedup
+
+
+@pytest.fixture(autouse=True)
+def pre_post_test():
+    yield
+    # delete the revision state
+    full_state_path = os.path.join(os.path.expanduser(HOME_FOLDER), LOCAL_STATE_FOLDER)
+    if os.path.exists(full_state_path):
+        rmtree(full_state_path, ignore_errors=True)
+
+
+def engine(host: str, dedup: str) -> InMemoryEngine:
+    c = user_config.UserConfig(
+        conf_path="tests/config.yaml",
+        notification_engine={"type": "in_memory", "host": host, "port": 1, "polling_interval": 1, "dedup": dedup},
+    )
+    return InMemoryEngine(c.notification_engine, auth.Auth.get_auth(c))
+
+
+def test_dedup():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    dedup = NotificationDedup(size=2, window=0.5)
+    assert dedup.first("a", "/test/1", 1)
+    assert not dedup.first("a", "/test/1", 1)
+    # another scope or revision
+    assert dedup.first("b", "/test/1", 1)
+    assert dedup.first("a", "/test/1", 2)
+    assert dedup.dropped == 1
+    # only the most recent are kept
+    assert len(dedup) == 2
+    assert dedup.first("a", "/test/1", 1)
+    # and only within the window
+    time.sleep(0.6)
+    assert dedup.first("a", "/test/1", 2)
+    assert len(dedup) == 1
+
+
+@pytest.mark.parametrize("policy", ["listener", "none"])
+def test_nested_keys(policy):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    e = engine(f"dedup_{policy}", policy)
+    assert e._dedup_policy == DedupPolicy[policy.upper()]
+    received = []
+
+    def callback(key, value):
+        received.append(key)
+
+    # the same notification is fetched by both keys
+    assert e.listen(["/test/", "/test/a/"], callback)
+    time.sleep(1)
+    e.push([{"key": "/test/a/1", "value": "1"}])
+    time.sleep(2)
+    e.stop()
+    assert received == ["/test/a/1"] * (1 if policy == "listener" else 2)
+
+
+def test_process():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    e1 = engine("dedup_process", "process")
+    e2 = engine("dedup_process", "process")
+    received = []
+    # the listeners of the process receive the notification once
+    assert e1.listen(["/test/"], lambda key, value: received.append(("e1", key)))
+    assert e2.listen(["/test/a/"], lambda key, value: received.append(("e2", key)))
+    time.sleep(1)
+    e1.push([{"key": "/test/a/1", "value": "1"}])
+    time.sleep(2)
+    e1.stop()
+    e2.stop()
+    assert len(received) == 1
+    assert received[0][1] == "/test/a/1"
@@ -0,0 +1,82 @@
+# (C) Copyright 1996- ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+
+import base64
+import json
+import os
+import threading
+import time
+
+from pyaviso import logger
+from pyaviso.authentication.token_manager import TokenManager
+
+
+class Authenticator:
+    """Stand-in for the server, every authentication returns a new token"""
+
+    def __init__(self, jwt_ttl=None):
+        self.calls = 0
+        self.jwt_ttl = jwt_ttl
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        time.sleep(0.05)  # give time to the other threads to wait for the refresh
+        if self.jwt_ttl is None:
+            return f"token{calls}.{calls}"
+        payload = base64.urlsafe_b64encode(json.dumps({"exp": time.time() + self.jwt_ttl}).encode()).decode()
+        return f"header.{payload.rstrip('=')}.signature{calls}"
+
+
+def test_token_cached():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    authenticator = Authenticator()
+    manager = TokenManager(authenticator)
+    assert manager.token() == "token1.1"
+    assert manager.token() == "token1.1"
+    assert authenticator.calls == 1
+
+
+def test_refresh_deduplicated():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    authenticator = Authenticator()
+    manager = TokenManager(authenticator)
+    rejected = manager.token()
+
+    # all the threads have been rejected with the same token, only one of them authenticates again
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(manager.refresh(rejected))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert authenticator.calls == 2
+    assert tokens == ["token2.2"] * 10
+
+    # an unknown rejected token always refreshes
+    assert manager.refresh(None) == "token3.3"
+    manager.invalidate()
+    assert manager.token() == "token4.4"
+
+
+def test_jwt_expiry():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    # the token expires within the margin, it is requested again at every use
+    authenticator = Authenticator(jwt_ttl=10)
+    manager = TokenManager(authenticator)
+    first = manager.token()
+    assert manager.token() != first
+    assert authenticator.calls == 2
+
+    # the token is still valid
+    authenticator = Authenticator(jwt_ttl=3600)
+    manager = TokenManager(authenticator)
+    assert manager.token() == manager.token()
+    assert authenticator.calls == 1
@@ -103,6 +103,31 @@ def test_function_trigger(conf, listener_factory, caplog):
     assert trigger_list.__len__() == 1
 
 
+def process_function(notification):
+    with open(f"/tmp/aviso/process_trigger_{os.getpid()}", "w") as f:
+        f.write(notification["payload"])
+
+
+def test_function_trigger_process(conf, listener_factory, caplog):
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    trigger = {"type": "function", "function": process_function, "process": True}
+    request = {"country": "Italy"}
+    listener = {"event": "flight", "request": request, "triggers": [trigger]}
+    listeners: list = listener_factory.create_listeners({"listeners": [listener]})
+    listener = listeners.pop()
+
+    os.makedirs("/tmp/aviso", exist_ok=True)
+    listener.callback("/tmp/aviso/flight/20210101/italy/FCO/AZ203", "Landed")
+    time.sleep(1)
+    # the function has run in another process
+    outputs = [f for f in os.listdir("/tmp/aviso") if f.startswith("process_trigger_")]
+    assert outputs and f"process_trigger_{os.getpid()}" not in outputs
+    for f in outputs:
+        with open(os.path.join("/tmp/aviso", f)) as output:
+            assert output.read() == "Landed"
+        os.remove(os.path.join("/tmp/aviso", f))
+
+
 def test_logger_listener(conf, listener_factory, caplog):
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
     with caplog_for_logger(caplog):  # this allows to assert over the logging output
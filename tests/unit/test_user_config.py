@@ -12,7 +12,7 @@ import pytest
 
 from pyaviso import SYSTEM_FOLDER, logger
 from pyaviso.authentication import AuthType
-from pyaviso.engine import EngineType
+from pyaviso.engine import EngineType, ListenMode
 from pyaviso.event_listeners.listener_schema_parser import ListenerSchemaParserType
 from pyaviso.user_config import KEY_FILE, UserConfig
 
@@ -122,6 +122,26 @@ def clear_environment():
         os.environ.pop("AVISO_AUTOMATIC_RETRY_DELAY")
     except KeyError:
         pass
+    try:
+        os.environ.pop("AVISO_LISTEN_MODE")
+    except KeyError:
+        pass
+    try:
+        os.environ.pop("AVISO_POOL_MAXSIZE")
+    except KeyError:
+        pass
+    try:
+        os.environ.pop("AVISO_POLLING_INTERVAL_MIN")
+    except KeyError:
+        pass
+    try:
+        os.environ.pop("AVISO_POLLING_INTERVAL_MAX")
+    except KeyError:
+        pass
+    try:
+        os.environ.pop("AVISO_NOTIFICATION_ENDPOINTS")
+    except KeyError:
+        pass
 
 
 def test_default():
@@ -138,6 +158,17 @@ def test_default():
     assert c["configuration_engine"]["automatic_retry_delay"] == 15
     assert not c["notification_engine"]["https"]
     assert c["notification_engine"]["catchup"]
+    assert c["notification_engine"]["listen_mode"] == "polling"
+    assert c["notification_engine"]["pool_connections"] == 10
+    assert c["notification_engine"]["pool_maxsize"] == 10
+    assert c["notification_engine"]["pool_idle_timeout"] == 60
+    assert c["notification_engine"]["polling_backoff"] == 2
+    assert c["notification_engine"]["polling_jitter"] == 0.1
+    assert c["notification_engine"]["checkpoint_interval"] == 5
+    assert c["notification_engine"]["checkpoint_revisions"] == 100
+    assert c["notification_engine"]["revision_index"] == "/ec/admin/index"
+    assert c["notification_engine"]["lease_granularity"] == 60
+    assert c["configuration_engine"]["pool_maxsize"] == 10
     assert c["configuration_engine"]["timeout"] == 60
     assert c["configuration_engine"]["port"] == 2379
     assert c["configuration_engine"]["host"] == "localhost"
@@ -159,6 +190,7 @@ def test_config_file():
     logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
     c = UserConfig(conf_path=test_config_folder + "config.yaml")
     assert c.debug
+    assert c.notification_engine.listen_mode == ListenMode.POLLING
     assert c.notification_engine.polling_interval == 1
     assert c.notification_engine.type == EngineType.ETCD_GRPC
     assert c.configuration_engine.type == EngineType.ETCD_GRPC
@@ -243,10 +275,20 @@ def test_env_variables():
     os.environ["AVISO_USERNAME_FILE"] = "tests/unit/fixtures/username"
     os.environ["AVISO_REMOTE_SCHEMA"] = "true"
     os.environ["AVISO_SCHEMA_PARSER"] = "ecmwf"
+    os.environ["AVISO_LISTEN_MODE"] = "watch"
+    os.environ["AVISO_POOL_MAXSIZE"] = "20"
+    os.environ["AVISO_POLLING_INTERVAL_MIN"] = "1"
+    os.environ["AVISO_POLLING_INTERVAL_MAX"] = "300"
 
     # create a config with the configuration file but the environment variables take priority
     c = UserConfig()
+    assert c.notification_engine.polling_interval_min == 1
+    assert c.notification_engine.polling_interval_max == 300
     assert c.debug
+    assert c.notification_engine.pool_maxsize == 20
+    assert c.configuration_engine.pool_maxsize == 20
+    assert c.notification_engine.listen_mode == ListenMode.WATCH
+    assert c.configuration_engine.listen_mode == ListenMode.POLLING
     assert c.notification_engine.polling_interval == 3
     assert c.notification_engine.type == EngineType.ETCD_GRPC
     assert c.configuration_engine.type == EngineType.ETCD_GRPC
@@ -342,6 +384,12 @@ def test_constructor():
         "https": False,
         "service": "aviso/v4",
         "catchup": False,
+        "pool_maxsize": 5,
+        "pool_idle_timeout": 30,
+        "polling_interval_max": 600,
+        "polling_backoff": 1.5,
+        "checkpoint_interval": 0,
+        "lease_granularity": 0,
     }
     configuration_engine = {
         "host": "localhost",
@@ -369,6 +417,13 @@ def test_constructor():
     )
     assert not c.debug
     assert c.notification_engine.polling_interval == 60
+    assert c.notification_engine.polling_interval_min == 60
+    assert c.notification_engine.polling_interval_max == 600
+    assert c.notification_engine.polling_backoff == 1.5
+    assert c.notification_engine.polling_jitter == 0.1
+    assert c.notification_engine.checkpoint_interval == 0
+    assert c.notification_engine.checkpoint_revisions == 100
+    assert c.notification_engine.lease_granularity == 0
     assert c.notification_engine.type == EngineType.ETCD_REST
     assert c.configuration_engine.type == EngineType.ETCD_REST
     assert c.auth_type == AuthType.ECMWF
@@ -380,6 +435,9 @@ def test_constructor():
     assert c.notification_engine.automatic_retry_delay == 10
     assert c.configuration_engine.automatic_retry_delay == 10
     assert c.notification_engine.service == "aviso/v4"
+    assert c.notification_engine.pool_maxsize == 5
+    assert c.notification_engine.pool_idle_timeout == 30
+    assert c.configuration_engine.pool_maxsize == 10
     assert not c.notification_engine.https
     assert not c.notification_engine.catchup
     assert not c.configuration_engine.https
@@ -482,3 +540,26 @@ def test_constructor_with_env_var():
     assert c.key_ttl == 30
     assert c.remote_schema
     assert c.schema_parser == ListenerSchemaParserType.ECMWF
+
+
+def test_endpoints():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    notification_engine = {"endpoints": ["etcd-1:2379", "etcd-2:2380"]}
+    c = UserConfig(conf_path=test_config_folder + "config.yaml", notification_engine=notification_engine)
+    # host and port follow the first endpoint
+    assert c.notification_engine.endpoints == [("etcd-1", 2379), ("etcd-2", 2380)]
+    assert c.notification_engine.host == "etcd-1"
+    assert c.notification_engine.port == 2379
+
+    # host and port set afterwards, as from the command line, replace the endpoints
+    c.notification_engine.host = "other"
+    assert c.notification_engine.endpoints == [("other", 2379)]
+
+    os.environ["AVISO_NOTIFICATION_ENDPOINTS"] = "etcd-3:2381,etcd-4:2382"
+    c = UserConfig(conf_path=test_config_folder + "config.yaml")
+    assert c.notification_engine.endpoints == [("etcd-3", 2381), ("etcd-4", 2382)]
+    assert c.notification_engine.host == "etcd-3"
+
+    # the configuration errors are logged and the process exits
+    with pytest.raises(SystemExit):
+        UserConfig(notification_engine={"endpoints": ["etcd-1"]})
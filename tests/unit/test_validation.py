@@ -8,6 +8,8 @@
 
 import os
 
+import pytest
+
 from pyaviso import logger
 from pyaviso.event_listeners.event_listener import EventListener
 from pyaviso.event_listeners.validation import (
@@ -18,6 +20,7 @@ from pyaviso.event_listeners.validation import (
     RegexHandler,
     StringHandler,
     TimeHandler,
+    compile_schema,
 )
 
 
@@ -210,3 +213,30 @@ def test_multiple_types():
     params = {"postproc": 12.5}
     EventListener._validate(params, schema)
     assert params["postproc"] == "12"
+
+
+def test_compiled_schema():
+    logger.debug(os.environ.get("PYTEST_CURRENT_TEST").split(":")[-1].split(" ")[0])
+    schema = {
+        "date": [{"type": "DateHandler", "canonic": "%Y%m%d"}],
+        "step": [{"type": "EnumHandler", "values": [str(i) for i in range(5000)]}, {"type": "IntHandler"}],
+    }
+    compiled = compile_schema(schema)
+    # the validators are built once for the schema
+    assert compile_schema(schema) is compiled
+    validators = compiled.validators("step")
+    assert [type(v) for v in validators] == [EnumHandler, IntHandler]
+    assert compiled.validators("step") is validators
+
+    params = {"date": "202021", "step": ["4999", "10"]}
+    EventListener._validate(params, schema)
+    assert params == {"date": "20200201", "step": ["4999", "10"]}
+    assert compile_schema(schema).validators("step") is validators
+
+    # another schema object has its own validators
+    other = dict(schema)
+    assert compile_schema(other) is not compiled
+
+    schema["other"] = [{"type": "UnknownHandler"}]
+    with pytest.raises(AssertionError, match="type UnknownHandler not recognised"):
+        EventListener._validate({"other": 1}, schema)